@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -73,12 +76,63 @@ WSGI_APPLICATION = 'college_timetable.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Hồ sơ CSDL khi triển khai (biến môi trường TIMETABLE_DB_PROFILE):
+#   "sqlite"     : 1 file SQLite đã tinh chỉnh (mặc định) - WAL (file TIMETABLE_SQLITE_PATH), busy_timeout... qua
+#                  TIMETABLE_SQLITE_PRAGMAS (đặt ở timetable/db_services.py, signal connection_created),
+#                  giữ kết nối giữa các request (CONN_MAX_AGE), transaction ghi lấy khoá ngay (IMMEDIATE)
+#                  để lượt xếp TKB không làm người đọc gặp "database is locked".
+#   "postgresql" : PostgreSQL, giữ kết nối + server-side cursor cho các export lớn
+#                  (values_list().iterator(chunk_size=...)). Đi qua pgBouncer chế độ transaction
+#                  thì đặt TIMETABLE_PG_DISABLE_SERVER_SIDE_CURSORS=1.
+# Đo lại bằng: python manage.py benchmark_db
+TIMETABLE_DB_PROFILE = os.environ.get('TIMETABLE_DB_PROFILE', 'sqlite')
+
+# Số giây giữ 1 kết nối CSDL để dùng lại (0 = đóng sau mỗi request)
+TIMETABLE_DB_CONN_MAX_AGE = int(os.environ.get('TIMETABLE_DB_CONN_MAX_AGE', 600))
+
+# File SQLite khi triển khai; để trống = db.sqlite3 mẫu trong repo (dùng khi phát triển)
+TIMETABLE_SQLITE_PATH = os.environ.get('TIMETABLE_SQLITE_PATH', '')
+
+# PRAGMA áp cho mỗi kết nối SQLite mới (chỉ có hiệu lực trong kết nối, không ghi vào file)
+TIMETABLE_SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',   # đủ an toàn khi dùng WAL, ghi nhanh hơn FULL
+    'busy_timeout': 20000,     # ms chờ khoá ghi thay vì báo lỗi ngay
+    'cache_size': -64000,      # số âm = KB -> ~64MB page cache
+    'temp_store': 'MEMORY',
 }
+# journal_mode=WAL được ghi luôn vào file DB -> chỉ bật cho file triển khai
+# (TIMETABLE_SQLITE_PATH), không sửa db.sqlite3 mẫu đang được git theo dõi
+if TIMETABLE_SQLITE_PATH:
+    TIMETABLE_SQLITE_PRAGMAS['journal_mode'] = 'WAL'  # người đọc không bị chặn khi đang ghi
+
+if TIMETABLE_DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': TIMETABLE_SQLITE_PATH or BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': TIMETABLE_DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+elif TIMETABLE_DB_PROFILE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('TIMETABLE_PG_NAME', 'college_timetable'),
+            'USER': os.environ.get('TIMETABLE_PG_USER', 'college_timetable'),
+            'PASSWORD': os.environ.get('TIMETABLE_PG_PASSWORD', ''),
+            'HOST': os.environ.get('TIMETABLE_PG_HOST', 'localhost'),
+            'PORT': os.environ.get('TIMETABLE_PG_PORT', '5432'),
+            'CONN_MAX_AGE': TIMETABLE_DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('TIMETABLE_PG_DISABLE_SERVER_SIDE_CURSORS') == '1',
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"TIMETABLE_DB_PROFILE không hợp lệ: {TIMETABLE_DB_PROFILE!r}")
 
 
 # Password validation
@@ -117,6 +171,41 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Thư mục tạm lưu file Excel upload, để worker nền import theo lô
+IMPORT_STAGING_DIR = BASE_DIR / 'import_staging'
+
+# Cache (TKB đã render, đoạn lịch .ics...).
+# Khoá cache chứa data_version đọc từ DB nên LocMem (mỗi worker 1 bản) vẫn không trả dữ liệu cũ;
+# chạy nhiều worker thì cache dùng chung (Redis/Memcached/FileBased) giúp các worker dùng lại bản đã render.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'college-timetable',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# Thời gian giữ lưới TKB đã render trong cache (giây).
+# Khoá cache chứa data_version của học kỳ nên dữ liệu đổi là tự bỏ bản cũ.
+TIMETABLE_GRID_CACHE_TIMEOUT = 6 * 60 * 60
+
+# Thời gian giữ data_version của học kỳ trong cache (giây). Tăng phiên bản thì khoá bị xoá ngay;
+# cache riêng từng process (LocMemCache) thì worker khác thấy phiên bản mới chậm tối đa chừng này.
+TIMETABLE_DATA_VERSION_CACHE_TIMEOUT = 60
+
+# Múi giờ ghi trong lịch .ics (giờ tiết học trong PeriodSlot là giờ địa phương)
+TIMETABLE_ICS_TZID = 'Asia/Ho_Chi_Minh'
+
+# Thư mục xuất bản TKB tĩnh (HTML/JSON) theo học kỳ, để web server phục vụ trực tiếp
+TIMETABLE_PUBLISH_DIR = BASE_DIR / 'published_timetables'
+
+# File Excel TKB cả học kỳ đã dựng (theo data_version), tải lại không phải dựng lại
+TIMETABLE_EXPORT_CACHE_DIR = BASE_DIR / 'export_cache'
+
+# Font TTF có tiếng Việt dùng khi xuất TKB ra PDF (VD /usr/share/fonts/truetype/dejavu/DejaVuSans.ttf).
+# None: dùng font chuẩn của PDF, chữ sẽ bị bỏ dấu.
+TIMETABLE_PDF_FONT = None
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
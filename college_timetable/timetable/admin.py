@@ -1,6 +1,8 @@
 from django.contrib import admin,messages
+from .calendar_services import regenerate_semester_weeks
+from .curriculum_services import generate_curriculum_subjects_bulk
 from .models import (
-    AcademicYear, Semester, SemesterBreak, PublicHoliday, SemesterWeek, PeriodSlot,
+    AcademicYear, Semester, SemesterBreak, PublicHoliday, SemesterWeek, PeriodSlot, SemesterIndexMapping,
     TrainingLevel, Department, SpecializationGroup, Major, Curriculum, CurriculumSubject,
     RoomType, Room, RoomCapability,
     Subject, SubjectChapter, AssessmentComponent,
@@ -8,7 +10,8 @@ from .models import (
     InstructorRole, Instructor, InstructorCompetency, InstructorAvailability,InstructorDuty,WorkloadReductionType,
     CourseSection, TeachingSlot,
     # ExamSession, ExamInvigilationAssignment, ExamGradingAssignment,
-    ResearchCategory, ResearchProject, EnterpriseInternship, ProfessionalDevelopment, ResearchMember
+    ResearchCategory, ResearchProject, EnterpriseInternship, ProfessionalDevelopment, ResearchMember,
+    ImportJob, ImportJobSheet,
 )
 
 # ==============================
@@ -26,6 +29,50 @@ class SemesterAdmin(admin.ModelAdmin):
     list_display = ("code", "academic_year", "name", "start_date", "weeks")
     list_filter = ("academic_year",)
     search_fields = ("code", "name")
+    actions = ["publish_timetables_action", "regenerate_weeks_by_index_action", "regenerate_weeks_by_date_action"]
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Sinh tuần là bước riêng: chỉ chạy khi ngày bắt đầu / số tuần / khoảng nghỉ đổi
+        self._regenerate_weeks(request, obj)
+
+    def _regenerate_weeks(self, request, semester, force=False, remap="index"):
+        res = regenerate_semester_weeks(semester, force=force, remap=remap)
+        if res is None:
+            return
+        level = messages.WARNING if res["dropped"] else messages.SUCCESS
+        self.message_user(
+            request,
+            f"{semester}: tuần học tạo {res['created']}, cập nhật {res['updated']}, xoá {res['deleted']}; "
+            f"chuyển {res['remapped']} liên kết buổi học - tuần, bỏ {res['dropped']} (không còn tuần tương ứng).",
+            level,
+        )
+
+    def regenerate_weeks_by_index_action(self, request, queryset):
+        for semester in queryset.select_related("academic_year"):
+            self._regenerate_weeks(request, semester, force=True, remap="index")
+
+    regenerate_weeks_by_index_action.short_description = "Sinh lại tuần học (buổi học giữ theo tuần thứ mấy)"
+
+    def regenerate_weeks_by_date_action(self, request, queryset):
+        for semester in queryset.select_related("academic_year"):
+            self._regenerate_weeks(request, semester, force=True, remap="date")
+
+    regenerate_weeks_by_date_action.short_description = "Sinh lại tuần học (buổi học giữ theo ngày)"
+
+    def publish_timetables_action(self, request, queryset):
+        from .publish_services import publish_semester
+
+        for semester in queryset.select_related("academic_year"):
+            res = publish_semester(semester)
+            self.message_user(
+                request,
+                f"{semester}: đã xuất bản {res['written']} TKB, giữ nguyên {res['unchanged']}, "
+                f"xoá {res['removed']}.",
+                messages.SUCCESS,
+            )
+
+    publish_timetables_action.short_description = "Xuất bản TKB tĩnh (HTML/JSON) cho học kỳ"
 
 
 @admin.register(SemesterBreak)
@@ -42,10 +89,17 @@ class PublicHolidayAdmin(admin.ModelAdmin):
 
 @admin.register(SemesterWeek)
 class SemesterWeekAdmin(admin.ModelAdmin):
-    list_display = ("semester", "index", "start_date", "end_date", "is_break")
+    list_display = ("semester", "index", "start_date", "end_date", "is_break", "days_off")
     list_filter = ("semester", "is_break")
     ordering = ("semester", "index")
 
+    def days_off(self, obj):
+        # Ngày lễ / ngày nghỉ trong tuần (bit tắt trong teaching_days_mask)
+        labels = ["T2", "T3", "T4", "T5", "T6", "T7", "CN"]
+        return ", ".join(label for dow, label in enumerate(labels, start=1) if not obj.is_teaching_day(dow))
+
+    days_off.short_description = "Ngày nghỉ"
+
 
 @admin.register(PeriodSlot)
 class PeriodSlotAdmin(admin.ModelAdmin):
@@ -53,6 +107,53 @@ class PeriodSlotAdmin(admin.ModelAdmin):
     ordering = ("index",)
 
 
+@admin.register(SemesterIndexMapping)
+class SemesterIndexMappingAdmin(admin.ModelAdmin):
+    list_display = ("intake_year", "semester", "semester_index", "is_manual")
+    list_editable = ("semester_index",)
+    list_filter = (
+        "semester__academic_year", "intake_year", "is_manual",
+        ("semester_index", admin.EmptyFieldListFilter),
+    )
+    list_select_related = ("intake_year", "semester__academic_year")
+    ordering = ("semester__academic_year__code", "semester__code", "intake_year__code")
+    actions = ["rebuild_action", "reset_manual_action"]
+
+    def save_model(self, request, obj, form, change):
+        # Sửa tay -> lần tính lại sau không ghi đè
+        if "semester_index" in form.changed_data:
+            obj.is_manual = True
+        super().save_model(request, obj, form, change)
+
+    def rebuild_action(self, request, queryset):
+        from .semester_index_services import rebuild_semester_index_map
+
+        semesters = Semester.objects.filter(
+            pk__in=queryset.values("semester_id")
+        ).select_related("academic_year")
+        res = rebuild_semester_index_map(semesters=semesters)
+        self.message_user(
+            request,
+            f"Đã tính lại: thêm {res['created']}, cập nhật {res['updated']}, "
+            f"{res['unresolved']} dòng chưa xác định (cần sửa tay).",
+            messages.SUCCESS,
+        )
+
+    rebuild_action.short_description = "Tính lại cho các Học kỳ đã chọn (giữ dòng chỉnh tay)"
+
+    def reset_manual_action(self, request, queryset):
+        from .semester_index_services import rebuild_semester_index_map
+
+        semester_ids = set(queryset.values_list("semester_id", flat=True))
+        queryset.update(is_manual=False)
+        rebuild_semester_index_map(
+            semesters=Semester.objects.filter(pk__in=semester_ids).select_related("academic_year")
+        )
+        self.message_user(request, "Đã bỏ chỉnh tay và tính lại theo quy tắc.", messages.SUCCESS)
+
+    reset_manual_action.short_description = "Bỏ chỉnh tay, tính lại theo quy tắc"
+
+
 # ==============================
 # 2. CATALOGS
 # ==============================
@@ -257,10 +358,10 @@ class TeachingSlotInline(admin.TabularInline):
 class CourseSectionAdmin(admin.ModelAdmin):
     list_display = (
         "code", "subject", "semester", "instructor",
-        "planned_periods", "start_week", "week_count",
+        "planned_periods", "student_count", "total_students", "department", "start_week", "week_count",
         "sessions_per_week", "is_locked"
     )
-    list_filter = ("semester", "subject__subject_type", "instructor")
+    list_filter = ("semester", "department", "subject__subject_type", "instructor")
     search_fields = ("code", "subject__name")
     filter_horizontal = ("classes",)
     inlines = [TeachingSlotInline]
@@ -281,8 +382,8 @@ class TeachingSlotAdmin(admin.ModelAdmin):
     filter_horizontal = ("weeks",)   # khi sửa 1 slot, chọn tuần kiểu multi-select cho dễ
 
     def week_list(self, obj):
-        # In ra danh sách tuần dạng: 1, 2, 3, 4...
-        return ", ".join(str(w.index) for w in obj.weeks.order_by("index"))
+        # In ra danh sách tuần dạng: 1, 2, 3, 4... (giải mã weeks_mask, không query)
+        return ", ".join(str(index) for index in obj.week_indexes)
     week_list.short_description = "Tuần"
 
 
@@ -371,13 +472,10 @@ class CurriculumAdmin(admin.ModelAdmin):
         Action: tạo CurriculumSubject cho các CTĐT được chọn
         (không đụng những record đã tồn tại).
         """
-        total_created = total_updated = total_skipped = 0
-
-        for cur in queryset:
-            res = cur.generate_curriculum_subjects(overwrite=False)
-            total_created += res["created"]
-            total_updated += res["updated"]
-            total_skipped += res["skipped"]
+        res = generate_curriculum_subjects_bulk(queryset, overwrite=False)
+        total_created, total_updated, total_skipped = (
+            res["created"], res["updated"], res["skipped"]
+        )
 
         self.message_user(
             request,
@@ -395,13 +493,10 @@ class CurriculumAdmin(admin.ModelAdmin):
         Action: cập nhật lại info (semester_index, total_periods, is_optional)
         cho tất cả CurriculumSubject của các CTĐT được chọn.
         """
-        total_created = total_updated = total_skipped = 0
-
-        for cur in queryset:
-            res = cur.generate_curriculum_subjects(overwrite=True)
-            total_created += res["created"]
-            total_updated += res["updated"]
-            total_skipped += res["skipped"]
+        res = generate_curriculum_subjects_bulk(queryset, overwrite=True)
+        total_created, total_updated, total_skipped = (
+            res["created"], res["updated"], res["skipped"]
+        )
 
         self.message_user(
             request,
@@ -415,3 +510,45 @@ class CurriculumAdmin(admin.ModelAdmin):
     )
 
 
+# ==============================
+# 11. IMPORT JOB
+# ==============================
+
+class ImportJobSheetInline(admin.TabularInline):
+    model = ImportJobSheet
+    extra = 0
+    can_delete = False
+    fields = (
+        "order", "sheet_name", "data_type", "status", "total_rows",
+        "last_committed_row", "batches_done", "created_count", "updated_count", "error_count",
+    )
+    readonly_fields = fields
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "id", "data_type", "original_name", "status", "progress_percent",
+        "created_count", "updated_count", "error_count", "created_at",
+    )
+    list_filter = ("status", "data_type")
+    search_fields = ("original_name",)
+    readonly_fields = (
+        "data_type", "original_name", "file_path", "status", "batch_size",
+        "created_count", "updated_count", "error_count", "message",
+        "created_at", "updated_at", "finished_at",
+    )
+    inlines = [ImportJobSheetInline]
+    actions = ["resume_jobs_action"]
+
+    def has_add_permission(self, request):
+        # Job chỉ được tạo qua trang Import dữ liệu
+        return False
+
+    def resume_jobs_action(self, request, queryset):
+        from .import_job_services import resume_import_job
+
+        started = sum(1 for job in queryset if resume_import_job(job) is not None)
+        self.message_user(request, f"Đã chạy tiếp {started} job import.", messages.SUCCESS)
+
+    resume_jobs_action.short_description = "Chạy tiếp job import bị ngắt / lỗi"
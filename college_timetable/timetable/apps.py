@@ -4,3 +4,6 @@ class TimetableConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'timetable'
     verbose_name = "Quản lý Thời khoá biểu"
+
+    def ready(self):
+        from . import db_services, signals  # noqa: F401  (đăng ký signal)
@@ -0,0 +1,330 @@
+"""
+Lịch học kỳ: sinh tuần học + đánh dấu ngày có dạy trong từng tuần.
+
+- Các khoảng nghỉ (SemesterBreak) được sắp xếp và gộp 1 lần, rồi đi 1 lượt
+  song song với các tuần (không quét lại toàn bộ khoảng nghỉ cho mỗi tuần).
+- Tuần được ghi bằng bulk_create / bulk_update (chỉ dòng thay đổi); dòng tuần
+  cũ được dùng lại theo số thứ tự nên liên kết buổi học - tuần không bị mất.
+- regenerate_semester_weeks chỉ sinh lại khi ngày bắt đầu / số tuần / khoảng nghỉ
+  thật sự đổi (so chữ ký Semester.weeks_signature).
+- TeachingSlot.weeks_mask (bit tuần thứ - 1) là bản sao gọn của TeachingSlot.weeks,
+  tính lại bằng refresh_weeks_mask mỗi khi liên kết buổi học - tuần đổi.
+- Mỗi tuần có teaching_days_mask (bit Thứ - 1): ngày rơi vào khoảng nghỉ hoặc
+  ngày lễ (PublicHoliday, ngày lễ lặp lại hằng năm được so theo ngày/tháng)
+  bị tắt -> tính khối lượng, lịch .ics... chỉ cần đọc bit, không tự tính ngày.
+"""
+import bisect
+import datetime
+import hashlib
+from collections import defaultdict
+
+from django.db import transaction
+
+from .grid_services import bump_semester_data_version
+from .models import PublicHoliday, Semester, SemesterBreak, SemesterWeek, TeachingSlot
+
+ALL_DAYS_MASK = 0b1111111
+WEEK_FIELDS = ["start_date", "end_date", "is_break", "teaching_days_mask"]
+# Cách chuyển liên kết buổi học - tuần khi lịch tuần đổi
+REMAP_MODES = {
+    "index": "Giữ theo tuần thứ mấy",
+    "date": "Giữ theo ngày (tuần mới chứa ngày đầu tuần cũ)",
+}
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def merge_intervals(intervals):
+    """Gộp các khoảng ngày (start, end) chồng / liền nhau; trả về list đã sắp xếp."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + ONE_DAY:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def holiday_dates(holidays, first, last):
+    """
+    Tập ngày lễ trong [first, last].
+    holidays: list (date, is_recurring); ngày lặp lại được nhân ra cho mọi năm trong khoảng.
+    """
+    dates = set()
+    for date, is_recurring in holidays:
+        if not is_recurring:
+            if first <= date <= last:
+                dates.add(date)
+            continue
+        for year in range(first.year, last.year + 1):
+            try:
+                day = date.replace(year=year)
+            except ValueError:  # 29/02 năm không nhuận
+                continue
+            if first <= day <= last:
+                dates.add(day)
+    return dates
+
+
+def _in_intervals(date, merged, starts):
+    pos = bisect.bisect_right(starts, date) - 1
+    return pos >= 0 and date <= merged[pos][1]
+
+
+def week_teaching_mask(week_start, merged_breaks, holidays):
+    """Bitmask ngày có dạy của tuần bắt đầu từ week_start (bit Thứ - 1)."""
+    starts = [start for start, _ in merged_breaks]
+    mask = ALL_DAYS_MASK
+    for day_of_week in range(1, 8):
+        date = week_start + datetime.timedelta(days=(day_of_week - 1 - week_start.weekday()) % 7)
+        if date in holidays or _in_intervals(date, merged_breaks, starts):
+            mask &= ~(1 << (day_of_week - 1))
+    return mask
+
+
+def build_semester_calendar(start_date, teaching_weeks, breaks, holidays):
+    """
+    Tuần học của học kỳ (chỉ tính toán, không ghi DB).
+    breaks  : list (từ ngày, đến ngày)
+    holidays: list (ngày, is_recurring)
+    Quy tắc như trước: tuần bắt đầu rơi vào khoảng nghỉ -> nhảy qua hết khoảng nghỉ
+    rồi mới đếm tuần học tiếp theo; ngày nghỉ lẻ trong tuần chỉ tắt bit của ngày đó.
+    Trả về list dict {index, start_date, end_date, is_break, teaching_days_mask}.
+    """
+    merged = merge_intervals(breaks)
+
+    weeks = []
+    current = start_date
+    pos = 0
+    while len(weeks) < teaching_weeks:
+        # Bỏ các khoảng nghỉ đã qua (mỗi khoảng chỉ bị bỏ 1 lần)
+        while pos < len(merged) and merged[pos][1] < current:
+            pos += 1
+        if pos < len(merged) and merged[pos][0] <= current:
+            current = merged[pos][1] + ONE_DAY
+            continue
+        weeks.append({
+            "index": len(weeks) + 1,
+            "start_date": current,
+            "end_date": current + datetime.timedelta(days=6),
+            "is_break": False,
+        })
+        current += datetime.timedelta(weeks=1)
+
+    if weeks:
+        dates = holiday_dates(holidays, weeks[0]["start_date"], weeks[-1]["end_date"])
+        for week in weeks:
+            week["teaching_days_mask"] = week_teaching_mask(week["start_date"], merged, dates)
+    return weeks
+
+
+def _semester_breaks(semester_ids):
+    breaks = {}
+    for semester_id, start, end in SemesterBreak.objects.filter(
+        semester_id__in=semester_ids, start_date__isnull=False, end_date__isnull=False,
+    ).values_list("semester_id", "start_date", "end_date"):
+        breaks.setdefault(semester_id, []).append((start, end))
+    return breaks
+
+
+def _all_holidays():
+    return list(PublicHoliday.objects.values_list("date", "is_recurring"))
+
+
+def calendar_signature(start_date, teaching_weeks, breaks):
+    """Chữ ký các đầu vào quyết định lịch tuần (ngày lễ chỉ đổi bitmask, không tính)."""
+    raw = f"{start_date}|{teaching_weeks}|{merge_intervals(breaks)}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _remap_targets(old_weeks, calendar, mode):
+    """
+    {id tuần cũ: tuần thứ mấy mới (None = không còn tuần tương ứng)}.
+    index: giữ số thứ tự tuần; date: tuần mới chứa ngày đầu của tuần cũ.
+    """
+    if mode == "index":
+        return {w.pk: w.index if w.index <= len(calendar) else None for w in old_weeks}
+
+    starts = [data["start_date"] for data in calendar]
+    targets = {}
+    for week in old_weeks:
+        pos = bisect.bisect_right(starts, week.start_date) - 1 if week.start_date else -1
+        if pos >= 0 and week.start_date <= calendar[pos]["end_date"]:
+            targets[week.pk] = calendar[pos]["index"]
+        else:
+            targets[week.pk] = None
+    return targets
+
+
+@transaction.atomic
+def sync_semester_weeks(semester, remap="index"):
+    """
+    Ghi tuần học của học kỳ theo build_semester_calendar.
+    Dòng SemesterWeek được dùng lại theo số thứ tự (cập nhật ngày tại chỗ), tuần thừa bị xoá.
+    remap: cách chuyển liên kết buổi học - tuần (REMAP_MODES), làm theo lô trên bảng trung gian.
+    Trả về {"created", "updated", "deleted", "remapped", "dropped"}
+    (remapped / dropped: số liên kết buổi học - tuần được chuyển / bị bỏ vì không còn tuần tương ứng).
+    """
+    if remap not in REMAP_MODES:
+        raise ValueError(f"Cách chuyển liên kết tuần không hợp lệ: {remap}")
+
+    calendar = build_semester_calendar(
+        semester.start_date,
+        semester.weeks or 15,
+        _semester_breaks([semester.pk]).get(semester.pk, []),
+        _all_holidays(),
+    )
+
+    existing_weeks = list(SemesterWeek.objects.filter(semester=semester))
+    existing = {w.index: w for w in existing_weeks}
+    targets = _remap_targets(existing_weeks, calendar, remap)
+
+    # Liên kết cần chuyển: tuần cũ không ứng với chính dòng của nó nữa
+    Through = TeachingSlot.weeks.through
+    moved = {pk: index for pk, index in targets.items() if existing.get(index) is None or existing[index].pk != pk}
+    links = []
+    if moved:
+        links = list(Through.objects.filter(semesterweek_id__in=list(moved)).values_list(
+            "id", "teachingslot_id", "semesterweek_id",
+        ))
+
+    to_create, to_update = [], []
+    for data in calendar:
+        week = existing.get(data["index"])
+        if week is None:
+            to_create.append(SemesterWeek(semester=semester, **data))
+        elif any(getattr(week, field) != data[field] for field in WEEK_FIELDS):
+            for field in WEEK_FIELDS:
+                setattr(week, field, data[field])
+            to_update.append(week)
+
+    SemesterWeek.objects.bulk_create(to_create)
+    SemesterWeek.objects.bulk_update(to_update, WEEK_FIELDS)
+
+    remapped = dropped = 0
+    if links:
+        # Không phải DB nào cũng trả id sau bulk_create -> đọc lại theo số thứ tự
+        week_ids = dict(SemesterWeek.objects.filter(semester=semester).values_list("index", "id"))
+        new_links = []
+        for _, slot_id, week_id in links:
+            index = moved[week_id]
+            if index is None:
+                dropped += 1
+                continue
+            new_links.append(Through(teachingslot_id=slot_id, semesterweek_id=week_ids[index]))
+        Through.objects.filter(pk__in=[link_id for link_id, _, _ in links]).delete()
+        Through.objects.bulk_create(new_links, ignore_conflicts=True)
+        remapped = len(new_links)
+        refresh_weeks_mask({slot_id for _, slot_id, _ in links})
+
+    stale = [w.pk for w in existing_weeks if w.index > len(calendar)]
+    if stale:
+        SemesterWeek.objects.filter(pk__in=stale).delete()
+
+    if to_create or to_update or stale or links:
+        # bulk_create / bulk_update / bảng trung gian không phát signal
+        bump_semester_data_version([semester.pk])
+    return {
+        "created": len(to_create),
+        "updated": len(to_update),
+        "deleted": len(stale),
+        "remapped": remapped,
+        "dropped": dropped,
+    }
+
+
+def regenerate_semester_weeks(semester, force=False, remap="index"):
+    """
+    Bước sinh lại tuần học (idempotent): chỉ ghi khi ngày bắt đầu, số tuần hoặc
+    khoảng nghỉ đổi so với lần sinh trước (force=True: luôn ghi lại).
+    Học kỳ chưa có ngày bắt đầu / số tuần thì bỏ qua.
+    Trả về None nếu không cần sinh lại, ngược lại kết quả của sync_semester_weeks.
+    """
+    if not semester.start_date or not semester.weeks:
+        return None
+
+    breaks = _semester_breaks([semester.pk]).get(semester.pk, [])
+    signature = calendar_signature(semester.start_date, semester.weeks, breaks)
+    if not force and signature == semester.weeks_signature:
+        return None
+
+    with transaction.atomic():
+        result = sync_semester_weeks(semester, remap=remap)
+        Semester.objects.filter(pk=semester.pk).update(weeks_signature=signature)
+    semester.weeks_signature = signature
+    return result
+
+
+@transaction.atomic
+def refresh_teaching_days(semester_ids=None):
+    """
+    Tính lại teaching_days_mask của các tuần đã có (sau khi sửa ngày lễ / khoảng nghỉ).
+    semester_ids: None = mọi học kỳ. Trả về số tuần thay đổi.
+    """
+    weeks = SemesterWeek.objects.filter(start_date__isnull=False)
+    if semester_ids is not None:
+        weeks = weeks.filter(semester_id__in=semester_ids)
+    weeks = list(weeks.only("id", "semester_id", "start_date", "teaching_days_mask"))
+    if not weeks:
+        return 0
+
+    breaks = _semester_breaks({w.semester_id for w in weeks})
+    merged = {semester_id: merge_intervals(items) for semester_id, items in breaks.items()}
+    dates = holiday_dates(
+        _all_holidays(),
+        min(w.start_date for w in weeks),
+        max(w.start_date for w in weeks) + datetime.timedelta(days=6),
+    )
+
+    changed = []
+    for week in weeks:
+        mask = week_teaching_mask(week.start_date, merged.get(week.semester_id, []), dates)
+        if mask != week.teaching_days_mask:
+            week.teaching_days_mask = mask
+            changed.append(week)
+
+    SemesterWeek.objects.bulk_update(changed, ["teaching_days_mask"])
+    bump_semester_data_version({w.semester_id for w in changed})
+    return len(changed)
+
+
+def refresh_weeks_mask(slot_ids):
+    """
+    Tính lại TeachingSlot.weeks_mask từ bảng trung gian (sau khi ghi liên kết theo lô).
+    Không tăng data_version (nơi gọi tự làm). Trả về {slot_id: mask mới}.
+    """
+    slot_ids = set(slot_ids)
+    if not slot_ids:
+        return {}
+
+    masks = dict.fromkeys(slot_ids, 0)
+    for slot_id, index in TeachingSlot.weeks.through.objects.filter(
+        teachingslot_id__in=slot_ids,
+    ).values_list("teachingslot_id", "semesterweek__index"):
+        masks[slot_id] |= 1 << (index - 1)
+
+    changed = []
+    for slot in TeachingSlot.objects.filter(pk__in=slot_ids).only("id", "weeks_mask"):
+        if slot.weeks_mask != masks[slot.pk]:
+            slot.weeks_mask = masks[slot.pk]
+            changed.append(slot)
+    TeachingSlot.objects.bulk_update(changed, ["weeks_mask"], batch_size=500)
+    return masks
+
+
+def teaching_day_week_masks(semester_ids):
+    """
+    {(semester_id, Thứ): bitmask các tuần thứ mấy mà Thứ đó có dạy} (bỏ tuần nghỉ,
+    ngày lễ / ngày nghỉ). Số buổi thực dạy của 1 buổi học = popcount(weeks_mask & mask).
+    """
+    masks = defaultdict(int)
+    for semester_id, index, is_break, days_mask in SemesterWeek.objects.filter(
+        semester_id__in=semester_ids,
+    ).values_list("semester_id", "index", "is_break", "teaching_days_mask"):
+        if is_break:
+            continue
+        for day_of_week in range(1, 8):
+            if days_mask >> (day_of_week - 1) & 1:
+                masks[(semester_id, day_of_week)] |= 1 << (index - 1)
+    return masks
@@ -0,0 +1,159 @@
+"""
+Báo cáo trùng lịch (Phòng / Lớp SV / Giảng viên) của cả học kỳ trong 1 lượt quét.
+
+Khác các hàm has_conflict_for_* trong services.py (mỗi lần kiểm tra 1 slot mới = vài query):
+- Nạp toàn bộ buổi học + Lớp SV của học kỳ bằng 2 query values_list.
+- Tuần học của mỗi buổi đọc thẳng từ TeachingSlot.weeks_mask (bit i-1 = tuần i)
+  -> giao tuần là phép AND, không join bảng trung gian.
+- Chia buổi vào các nhóm (loại, đối tượng, Thứ) rồi quét đoạn tiết theo tiết bắt đầu
+  (interval sweep): mỗi buổi chỉ so với các buổi còn "mở" ở thời điểm đó,
+  không so từng cặp trong cả học kỳ.
+"""
+from collections import defaultdict
+
+from .grid_services import DAYS
+from .import_schemas import format_week_ranges
+from .models import CourseSection, TeachingSlot
+
+CONFLICT_KINDS = {
+    "room": "Phòng",
+    "class": "Lớp SV",
+    "instructor": "Giảng viên",
+}
+
+DAY_LABELS = dict(DAYS)
+DAY_LABELS[7] = "Chủ nhật"
+
+
+def load_semester_slots(semester):
+    """
+    Trả về (slots, class_codes):
+        slots[id] = dict thông tin buổi học (kèm "weeks_mask", "is_split", "class_ids")
+        class_codes[class_id] = mã Lớp SV
+    """
+    slots = {}
+    for (
+        slot_id, section_id, section_code, subject_id, subject_code, day, start, end,
+        room_id, room_code, instructor_id, instructor_name, weeks_mask, student_count,
+    ) in TeachingSlot.objects.filter(semester=semester).values_list(
+        "id", "course_section_id", "course_section__code",
+        "course_section__subject_id", "course_section__subject__code",
+        "day_of_week", "start_period", "end_period",
+        "room_id", "room__code", "course_section__instructor_id", "course_section__instructor__name",
+        "weeks_mask", "course_section__student_count",
+    ):
+        slots[slot_id] = {
+            "id": slot_id,
+            "section_id": section_id,
+            "section_code": section_code,
+            "subject_id": subject_id,
+            "subject_code": subject_code,
+            "day": day,
+            "start": start,
+            "end": end,
+            "room_id": room_id,
+            "room_code": room_code,
+            "instructor_id": instructor_id,
+            "instructor_name": instructor_name,
+            "weeks_mask": weeks_mask,
+            # LHP là 1 nhóm của lớp bị chia (xem services.partition_classes)
+            "is_split": student_count is not None,
+            "class_ids": [],
+        }
+
+    section_classes = defaultdict(list)
+    class_codes = {}
+    for section_id, class_id, class_code in CourseSection.classes.through.objects.filter(
+        coursesection__semester=semester
+    ).values_list("coursesection_id", "studentclass_id", "studentclass__code"):
+        section_classes[section_id].append(class_id)
+        class_codes[class_id] = class_code
+
+    for slot in slots.values():
+        slot["class_ids"] = section_classes.get(slot["section_id"], [])
+
+    return slots, class_codes
+
+
+def _sweep(intervals):
+    """
+    intervals: list (start, end, slot) của 1 nhóm (đối tượng, Thứ).
+    Sinh các cặp (slot_a, slot_b, tiết giao từ, tiết giao đến, mask tuần chung).
+    """
+    intervals.sort(key=lambda item: item[0])
+    active = []
+    for start, end, slot in intervals:
+        # Bỏ các buổi đã kết thúc trước tiết bắt đầu của buổi này
+        active = [item for item in active if item[1] >= start]
+        for a_start, a_end, other in active:
+            common = slot["weeks_mask"] & other["weeks_mask"]
+            if common:
+                yield other, slot, max(start, a_start), min(end, a_end), common
+        active.append((start, end, slot))
+
+
+def find_semester_conflicts(semester):
+    """
+    Mọi cặp buổi học trùng Phòng / Lớp SV / GV trong học kỳ
+    (cùng Thứ, giao tiết và có ít nhất 1 tuần chung).
+    Trả về list dict, sắp theo loại, đối tượng, Thứ, tiết.
+    """
+    slots, class_codes = load_semester_slots(semester)
+
+    buckets = defaultdict(list)
+    for slot in slots.values():
+        if not slot["weeks_mask"]:
+            continue
+        interval = (slot["start"], slot["end"], slot)
+        if slot["room_id"]:
+            buckets[("room", slot["room_id"], slot["day"])].append(interval)
+        if slot["instructor_id"]:
+            buckets[("instructor", slot["instructor_id"], slot["day"])].append(interval)
+        for class_id in slot["class_ids"]:
+            buckets[("class", class_id, slot["day"])].append(interval)
+
+    conflicts = []
+    for (kind, entity_id, day), intervals in buckets.items():
+        if len(intervals) < 2:
+            continue
+        for slot_a, slot_b, from_period, to_period, common in _sweep(intervals):
+            if (
+                kind == "class"
+                and slot_a["section_id"] != slot_b["section_id"]
+                and slot_a["subject_id"] == slot_b["subject_id"]
+                and slot_a["is_split"] and slot_b["is_split"]
+            ):
+                # 2 nhóm của 1 lớp bị chia nhóm (2 LHP cùng môn) học song song được;
+                # LHP học nguyên lớp trùng giờ LHP cùng môn vẫn là trùng
+                continue
+            if kind == "room":
+                entity = slot_a["room_code"]
+            elif kind == "instructor":
+                entity = slot_a["instructor_name"]
+            else:
+                entity = class_codes[entity_id]
+            conflicts.append({
+                "kind": kind,
+                "kind_label": CONFLICT_KINDS[kind],
+                "entity": entity,
+                "day": day,
+                "day_label": DAY_LABELS.get(day, f"Thứ {day + 1}"),
+                "from_period": from_period,
+                "to_period": to_period,
+                "weeks_label": format_week_ranges(TeachingSlot.mask_week_indexes(common), dash="–"),
+                "slot_a": slot_a,
+                "slot_b": slot_b,
+            })
+
+    conflicts.sort(key=lambda c: (
+        list(CONFLICT_KINDS).index(c["kind"]), c["entity"] or "", c["day"], c["from_period"],
+    ))
+    return conflicts
+
+
+def summarize_conflicts(conflicts):
+    """Số cặp trùng theo loại: {"room": n, "class": n, "instructor": n}."""
+    summary = {kind: 0 for kind in CONFLICT_KINDS}
+    for conflict in conflicts:
+        summary[conflict["kind"]] += 1
+    return summary
@@ -0,0 +1,159 @@
+"""
+Sinh / ghi CurriculumSubject (môn trong CTĐT) theo lô.
+
+Thay vì get_or_create + save() cho từng môn:
+- Nạp sẵn toàn bộ Subject cần dùng 1 lần (môn chung + môn chuyên ngành).
+- Đọc các cặp (curriculum_id, subject_id) đã có vào bộ nhớ.
+- Ghi bằng bulk_create / bulk_update.
+=> Sinh CTĐT cho mọi Ngành × Khoá chỉ còn vài query.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import AcademicYear, Curriculum, CurriculumSubject, Major, Subject
+
+BULK_BATCH_SIZE = 500
+CURRICULUM_SUBJECT_FIELDS = ["semester_index", "total_periods", "is_optional"]
+
+
+@transaction.atomic
+def upsert_curriculum_subjects(values, overwrite=True):
+    """
+    Ghi CurriculumSubject theo lô.
+
+    values: {(curriculum_id, subject_id): {"semester_index", "total_periods", "is_optional"}}
+    overwrite:
+        - True: cặp đã tồn tại thì cập nhật (chỉ những dòng thực sự thay đổi mới bị UPDATE)
+        - False: cặp đã tồn tại thì bỏ qua
+    Trả về {"created", "updated", "skipped"}.
+    """
+    result = {"created": 0, "updated": 0, "skipped": 0}
+    if not values:
+        return result
+
+    curriculum_ids = {cur_id for cur_id, _ in values}
+    existing = {
+        (cs.curriculum_id, cs.subject_id): cs
+        for cs in CurriculumSubject.objects.filter(curriculum_id__in=curriculum_ids).only(
+            "id", "curriculum_id", "subject_id", *CURRICULUM_SUBJECT_FIELDS
+        )
+    }
+
+    to_create, to_update = [], []
+    for (cur_id, subj_id), data in values.items():
+        cs = existing.get((cur_id, subj_id))
+        if cs is None:
+            to_create.append(CurriculumSubject(curriculum_id=cur_id, subject_id=subj_id, **data))
+            continue
+
+        if not overwrite:
+            result["skipped"] += 1
+            continue
+
+        # Số dòng "cập nhật" giữ nguyên nghĩa cũ (mọi cặp đã có),
+        # nhưng chỉ UPDATE những dòng có giá trị khác
+        result["updated"] += 1
+        if any(getattr(cs, field) != data[field] for field in CURRICULUM_SUBJECT_FIELDS):
+            for field in CURRICULUM_SUBJECT_FIELDS:
+                setattr(cs, field, data[field])
+            to_update.append(cs)
+
+    if to_create:
+        CurriculumSubject.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+    if to_update:
+        CurriculumSubject.objects.bulk_update(
+            to_update, CURRICULUM_SUBJECT_FIELDS, batch_size=BULK_BATCH_SIZE
+        )
+
+    result["created"] = len(to_create)
+    return result
+
+
+def generate_curriculum_subjects_bulk(curricula, overwrite=False):
+    """
+    Sinh CurriculumSubject cho nhiều CTĐT cùng lúc
+    (cùng quy tắc với Curriculum.generate_curriculum_subjects):
+    - Môn chuyên ngành (subject.major == curriculum.major) + môn chung (subject.major rỗng)
+    - Học kỳ = subject.semester_number, ép vào [1 .. duration_semesters của bậc]
+    - is_optional = False
+    """
+    if hasattr(curricula, "select_related"):
+        # QuerySet -> nạp luôn Ngành + Bậc để lấy duration_semesters
+        curricula = curricula.select_related("major__level")
+    curricula = list(curricula)
+
+    if not curricula:
+        return {"created": 0, "updated": 0, "skipped": 0}
+
+    major_ids = {c.major_id for c in curricula}
+
+    # 1 query cho toàn bộ môn: môn chung dùng cho mọi CTĐT, môn chuyên ngành theo major
+    general_subjects = []
+    subjects_by_major = defaultdict(list)
+    for subj in Subject.objects.filter(
+        Q(major_id__in=major_ids) | Q(major__isnull=True)
+    ).only("id", "major_id", "semester_number", "total_periods"):
+        if subj.major_id is None:
+            general_subjects.append(subj)
+        else:
+            subjects_by_major[subj.major_id].append(subj)
+
+    values = {}
+    for cur in curricula:
+        duration = cur.major.level.duration_semesters or 5  # 4 hoặc 5 tuỳ bậc
+        for subj in subjects_by_major[cur.major_id] + general_subjects:
+            sem = min(max(subj.semester_number or 1, 1), duration)
+            values[(cur.pk, subj.pk)] = {
+                "semester_index": sem,
+                "total_periods": subj.total_periods,
+                "is_optional": False,
+            }
+
+    return upsert_curriculum_subjects(values, overwrite=overwrite)
+
+
+@transaction.atomic
+def ensure_curricula(majors=None, intake_years=None):
+    """
+    Tạo Curriculum còn thiếu cho mọi cặp Ngành × Khoá (mặc định: tất cả).
+    Trả về số CTĐT được tạo mới.
+    """
+    major_ids = list((majors if majors is not None else Major.objects.all()).values_list("id", flat=True))
+    year_ids = list(
+        (intake_years if intake_years is not None else AcademicYear.objects.all())
+        .values_list("id", flat=True)
+    )
+
+    existing = set(
+        Curriculum.objects.filter(major_id__in=major_ids, intake_year_id__in=year_ids)
+        .values_list("major_id", "intake_year_id")
+    )
+    missing = [
+        Curriculum(major_id=major_id, intake_year_id=year_id)
+        for major_id in major_ids
+        for year_id in year_ids
+        if (major_id, year_id) not in existing
+    ]
+    Curriculum.objects.bulk_create(missing, batch_size=BULK_BATCH_SIZE)
+    return len(missing)
+
+
+@transaction.atomic
+def generate_all_curricula(majors=None, intake_years=None, overwrite=False, create_missing=True):
+    """
+    Sinh CTĐT cho mọi Ngành × Khoá trong 1 lần:
+    tạo Curriculum còn thiếu (nếu create_missing) rồi sinh CurriculumSubject theo lô.
+    """
+    curricula_created = ensure_curricula(majors, intake_years) if create_missing else 0
+
+    qs = Curriculum.objects.select_related("major__level")
+    if majors is not None:
+        qs = qs.filter(major__in=majors)
+    if intake_years is not None:
+        qs = qs.filter(intake_year__in=intake_years)
+
+    result = generate_curriculum_subjects_bulk(qs, overwrite=overwrite)
+    result["curricula_created"] = curricula_created
+    return result
@@ -0,0 +1,182 @@
+"""
+Tinh chỉnh kết nối CSDL theo hồ sơ triển khai (settings.TIMETABLE_DB_PROFILE) + bộ đo hiệu năng.
+
+- SQLite: mỗi kết nối mới được đặt PRAGMA theo settings.TIMETABLE_SQLITE_PRAGMAS
+  (busy_timeout...; WAL chỉ với file TIMETABLE_SQLITE_PATH vì journal_mode ghi vào file)
+  qua signal connection_created. Kết nối được giữ lại (CONN_MAX_AGE) nên PRAGMA
+  chỉ chạy 1 lần cho mỗi kết nối.
+- run_benchmark: chạy các tải điển hình (kiểm tra trùng lịch khi xếp, quét trùng
+  cả học kỳ, payload API, export Excel theo iterator) và kịch bản nhiều người đọc
+  trong lúc có transaction ghi, đếm số lần "database is locked".
+  Chạy lại trên từng hồ sơ (sqlite / postgresql) để so sánh.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.dispatch import receiver
+
+from .models import SemesterWeek, StudentClass, TeachingSlot
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    pragmas = getattr(settings, "TIMETABLE_SQLITE_PRAGMAS", {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def database_profile_info():
+    """Hồ sơ CSDL đang chạy: {"profile", "vendor", "conn_max_age", "settings"} (settings = PRAGMA / tuỳ chọn)."""
+    db = connection.settings_dict
+    info = {
+        "profile": getattr(settings, "TIMETABLE_DB_PROFILE", ""),
+        "vendor": connection.vendor,
+        "conn_max_age": db.get("CONN_MAX_AGE", 0),
+        "settings": {},
+    }
+    if connection.vendor == "sqlite":
+        with connection.cursor() as cursor:
+            for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store"):
+                cursor.execute(f"PRAGMA {name}")
+                info["settings"][name] = cursor.fetchone()[0]
+        info["settings"]["transaction_mode"] = db.get("OPTIONS", {}).get("transaction_mode", "DEFERRED")
+    elif connection.vendor == "postgresql":
+        info["settings"]["server_side_cursors"] = not db.get("DISABLE_SERVER_SIDE_CURSORS", False)
+    return info
+
+
+def _timed(fn, repeat):
+    """(số giây trung bình / lần, kết quả lần cuối)."""
+    result = None
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def _conflict_checks(semester):
+    """Kiểm tra trùng phòng / Lớp SV / GV cho mọi buổi học của học kỳ (như engine xếp lịch)."""
+    from .services import has_conflict_for_class, has_conflict_for_instructor, has_conflict_for_room
+
+    weeks = {w.index: w for w in SemesterWeek.objects.filter(semester=semester)}
+    slots = TeachingSlot.objects.filter(semester=semester).select_related(
+        "room", "course_section__instructor",
+    ).prefetch_related("course_section__classes")
+    checks = 0
+    for slot in slots:
+        slot_weeks = [weeks[i] for i in slot.week_indexes if i in weeks]
+        section = slot.course_section
+        args = (semester, slot.day_of_week, slot.start_period, slot.end_period, slot_weeks)
+        has_conflict_for_room(slot.room, *args)
+        has_conflict_for_class(section.classes.all(), *args, section=section)
+        has_conflict_for_instructor(section.instructor, *args)
+        checks += 3
+    return checks
+
+
+def _api_payloads(semester):
+    from .grid_services import timetable_api_payload
+
+    classes = list(StudentClass.objects.filter(course_sections__semester=semester).distinct())
+    for cls in classes:
+        timetable_api_payload(semester, "class", cls)
+    return len(classes)
+
+
+def _export_slots(semester):
+    from .export_services import iter_export_rows
+
+    return sum(1 for _ in iter_export_rows("teaching_slots", semester=semester))
+
+
+def _contention(semester, readers, writers, hold):
+    """
+    readers thread đọc lặp load_semester_slots trong lúc writers thread lần lượt giữ
+    transaction ghi hold giây. Trả về {"reads", "writes", "locked"}.
+    """
+    from .conflict_services import load_semester_slots
+
+    stats = {"reads": 0, "writes": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def count(key):
+        with lock:
+            stats[key] += 1
+
+    def reader():
+        try:
+            while not stop.is_set():
+                try:
+                    load_semester_slots(semester)
+                    count("reads")
+                except OperationalError:
+                    count("locked")
+        finally:
+            connections.close_all()
+
+    def writer():
+        try:
+            try:
+                with transaction.atomic():
+                    TeachingSlot.objects.filter(semester=semester).update(weeks_mask=F("weeks_mask"))
+                    time.sleep(hold)
+                count("writes")
+            except OperationalError:
+                count("locked")
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    write_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for t in write_threads:
+        t.start()
+    for t in write_threads:
+        t.join()
+    stop.set()
+    for t in threads:
+        t.join()
+    return stats
+
+
+def run_benchmark(semester, repeat=3, readers=4, writers=2, hold=0.5):
+    """
+    Đo các tải điển hình trên CSDL hiện tại.
+    Trả về list {"name", "label", "seconds", "detail"}.
+    """
+    from .conflict_services import find_semester_conflicts
+
+    results = []
+
+    def add(name, label, fn, detail):
+        seconds, value = _timed(fn, repeat)
+        results.append({"name": name, "label": label, "seconds": seconds, "detail": detail(value)})
+
+    add("conflict_checks", "Kiểm tra trùng khi xếp (has_conflict_for_*)",
+        lambda: _conflict_checks(semester), lambda n: f"{n} lần kiểm tra")
+    add("semester_conflicts", "Quét trùng lịch cả học kỳ",
+        lambda: find_semester_conflicts(semester), lambda c: f"{len(c)} cặp trùng")
+    add("api_payloads", "Payload API TKB mọi Lớp SV",
+        lambda: _api_payloads(semester), lambda n: f"{n} lớp")
+    add("export_slots", "Export buổi học (iterator)",
+        lambda: _export_slots(semester), lambda n: f"{n} dòng")
+
+    started = time.perf_counter()
+    stats = _contention(semester, readers, writers, hold)
+    results.append({
+        "name": "contention",
+        "label": f"{readers} người đọc + {writers} transaction ghi",
+        "seconds": time.perf_counter() - started,
+        "detail": f"{stats['reads']} lượt đọc, {stats['writes']} lượt ghi, {stats['locked']} lỗi khoá",
+        "locked": stats["locked"],
+    })
+    return results
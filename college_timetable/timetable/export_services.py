@@ -0,0 +1,237 @@
+"""
+Export danh mục ra Excel đúng layout các hàm import (sửa xong import lại được).
+
+- Cột và thứ tự cột lấy từ schema import (IMPORT_CONFIG[...]["schema"]).
+- Ghi bằng openpyxl write-only, dữ liệu đọc bằng values_list().iterator(chunk_size=...)
+  => không nạp object ORM, bộ nhớ gần như không tăng theo số dòng.
+- Cột nhiều mã (Nhóm CM của phòng, Lớp SV của Lớp HP, tuần học...) đọc từ bảng
+  trung gian thành map {id: "mã1, mã2"} (chỉ chứa chuỗi, không chứa object).
+"""
+import datetime
+import tempfile
+from collections import defaultdict
+
+from openpyxl import Workbook
+
+from .import_schemas import format_week_ranges
+from .import_services import ALL_SHEETS, IMPORT_CONFIG
+from .models import (
+    AcademicYear, Curriculum, CurriculumSubject, CourseSection, Department, Instructor,
+    Major, Room, RoomCapability, RoomType, Semester, SpecializationGroup, StudentClass,
+    Subject, TeachingSlot, TrainingLevel,
+)
+
+ITERATOR_CHUNK_SIZE = 2000
+
+# Tên sheet khi export (trùng tên sheet của import 1 file nhiều sheet nếu có)
+SHEET_NAMES = {data_type: sheet_name for sheet_name, data_type in ALL_SHEETS}
+SHEET_NAMES.update({
+    "room_capabilities": "RoomCapabilities",
+    "curriculums": "Curriculums",
+    "curriculum_subjects": "CurriculumSubjects",
+    "course_sections": "CourseSections",
+    "teaching_slots": "TeachingSlots",
+})
+
+
+class M2MCodes:
+    """
+    Cột gom nhiều mã từ bảng trung gian, VD mã Nhóm CM của 1 phòng -> "NET, DEV".
+    through      : model bảng trung gian
+    owner_field  : field trỏ về bản ghi đang export (VD "room_id")
+    value_lookup : lookup lấy mã (VD "group__code")
+    weeks        : True nếu là số tuần -> gộp dạng "1-8, 10"
+    """
+
+    def __init__(self, through, owner_field, value_lookup, weeks=False):
+        self.through = through
+        self.owner_field = owner_field
+        self.value_lookup = value_lookup
+        self.weeks = weeks
+
+    def load(self, owner_filter=None):
+        values = defaultdict(list)
+        qs = self.through.objects.all()
+        if owner_filter:
+            qs = qs.filter(**owner_filter)
+        rows = qs.order_by(self.owner_field, self.value_lookup).values_list(
+            self.owner_field, self.value_lookup
+        )
+        for owner_id, value in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            values[owner_id].append(value)
+
+        if self.weeks:
+            return {owner_id: format_week_ranges(v) for owner_id, v in values.items()}
+        return {owner_id: ", ".join(v) for owner_id, v in values.items()}
+
+
+# data_type -> (model, thứ tự sắp xếp, lookup cho từng cột theo đúng schema import,
+#               field lọc theo Học kỳ nếu export theo HK)
+EXPORT_SPECS = {
+    "departments": (Department, ["code"], ["code", "name"], None),
+    "training_levels": (TrainingLevel, ["code"], ["code", "name", "form"], None),
+    "academic_years": (AcademicYear, ["code"], ["code"], None),
+    "semesters": (
+        Semester, ["academic_year__code", "code"],
+        ["academic_year__code", "code", "name", "start_date", "weeks"],
+        "id",
+    ),
+    "room_types": (RoomType, ["code"], ["code", "name"], None),
+    "specialization_groups": (SpecializationGroup, ["code"], ["code", "name"], None),
+    "room_capabilities": (
+        RoomCapability, ["room__code", "group__code"],
+        ["room__code", "group__code", "priority"],
+        None,
+    ),
+    "rooms": (
+        Room, ["code"],
+        [
+            "code", "name", "room_type__code", "capacity",
+            M2MCodes(RoomCapability, "room_id", "group__code"),
+            M2MCodes(Room.allowed_majors.through, "room_id", "major__code"),
+        ],
+        None,
+    ),
+    "majors": (
+        Major, ["code"],
+        ["code", "name", "level__code", "department__code", "is_general", "total_credits", "total_semesters"],
+        None,
+    ),
+    "instructors": (
+        Instructor, ["code"],
+        ["code", "name", "department__code", "is_leader", "teaching_quota", "admin_quota", "conversion_ratio"],
+        None,
+    ),
+    "student_classes": (
+        StudentClass, ["code"],
+        ["code", "name", "size", "major__code", "academic_year__code", "department__code", "homeroom_teacher__code"],
+        None,
+    ),
+    "subjects": (
+        Subject, ["code"],
+        [
+            "code", "name", "major__code", "managing_department__code", "subject_type",
+            "total_periods", "max_class_size", "required_room_type__code",
+            "specialization_group__code", "is_external_managed", "exam_form",
+            "has_separate_marking", "semester_number",
+        ],
+        None,
+    ),
+    "curriculums": (
+        Curriculum, ["major__code", "intake_year__code"],
+        ["major__code", "intake_year__code", "name"],
+        None,
+    ),
+    "curriculum_subjects": (
+        CurriculumSubject, ["curriculum__major__code", "curriculum__intake_year__code", "semester_index", "subject__code"],
+        [
+            "curriculum__major__code", "curriculum__intake_year__code", "subject__code",
+            "semester_index", "is_optional", "total_periods",
+        ],
+        None,
+    ),
+    "course_sections": (
+        CourseSection, ["code"],
+        [
+            "semester__academic_year__code", "semester__code", "code", "subject__code",
+            M2MCodes(CourseSection.classes.through, "coursesection_id", "studentclass__code"),
+            "instructor__code", "planned_periods", "start_week", "week_count",
+            "sessions_per_week", "is_locked", "note",
+        ],
+        "semester_id",
+    ),
+    "teaching_slots": (
+        TeachingSlot, ["course_section__code", "day_of_week", "start_period"],
+        [
+            "course_section__semester__academic_year__code", "course_section__semester__code",
+            "course_section__code", "day_of_week", "start_period", "end_period", "room__code",
+            M2MCodes(TeachingSlot.weeks.through, "teachingslot_id", "semesterweek__index", weeks=True),
+            "method", "is_locked",
+        ],
+        "course_section__semester_id",
+    ),
+}
+
+# Đường dẫn từ bảng trung gian về Học kỳ (khi export theo HK chỉ đọc liên kết của HK đó)
+M2M_SEMESTER_FILTERS = {
+    "course_sections": "coursesection__semester_id",
+    "teaching_slots": "teachingslot__course_section__semester_id",
+}
+
+
+def export_columns(data_type):
+    return IMPORT_CONFIG[data_type]["columns"]
+
+
+def _cell(value):
+    """Giá trị ghi ra Excel: bool -> 1/0 (đúng kiểu import đọc lại)."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, datetime.datetime):
+        return value.replace(tzinfo=None)
+    return value
+
+
+def iter_export_rows(data_type, semester=None):
+    """
+    Sinh từng dòng (tuple) của 1 loại dữ liệu theo đúng thứ tự cột import.
+    semester: chỉ export dữ liệu của Học kỳ này (Học kỳ, Lớp HP, Buổi học).
+    """
+    model, ordering, lookups, semester_field = EXPORT_SPECS[data_type]
+
+    qs = model.objects.all()
+    if semester is not None and semester_field:
+        qs = qs.filter(**{semester_field: semester.pk})
+
+    m2m_filter = None
+    if semester is not None and data_type in M2M_SEMESTER_FILTERS:
+        m2m_filter = {M2M_SEMESTER_FILTERS[data_type]: semester.pk}
+
+    # Cột nhiều mã: nạp map {id: chuỗi mã} trước, dòng chính chỉ cần id
+    m2m_maps = {
+        pos: lookup.load(m2m_filter)
+        for pos, lookup in enumerate(lookups)
+        if isinstance(lookup, M2MCodes)
+    }
+    value_lookups = ["pk"] + [lookup for lookup in lookups if not isinstance(lookup, M2MCodes)]
+
+    rows = qs.order_by(*ordering).values_list(*value_lookups)
+    for pk, *values in rows.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+        values = iter(values)
+        yield tuple(
+            m2m_maps[pos].get(pk) if pos in m2m_maps else _cell(next(values))
+            for pos in range(len(lookups))
+        )
+
+
+def write_export_sheet(wb, data_type, semester=None):
+    """Thêm 1 sheet (write-only) vào workbook: dòng 1 tiêu đề, từ dòng 2 là dữ liệu."""
+    ws = wb.create_sheet(title=SHEET_NAMES[data_type])
+    ws.append(export_columns(data_type))
+    count = 0
+    for row in iter_export_rows(data_type, semester=semester):
+        ws.append(row)
+        count += 1
+    return count
+
+
+def build_export_workbook(data_types, semester=None):
+    """
+    Tạo file Excel export (1 sheet / loại dữ liệu) vào file tạm.
+    Trả về file tạm đã tua về đầu (caller đóng file / FileResponse tự đóng).
+    """
+    wb = Workbook(write_only=True)
+    for data_type in data_types:
+        write_export_sheet(wb, data_type, semester=semester)
+
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    wb.save(tmp)
+    tmp.seek(0)
+    return tmp
+
+
+def export_filename(data_type, semester=None):
+    name = "all" if data_type == "all" else data_type
+    if semester is not None:
+        name += f"_{semester.academic_year.code}_{semester.code}"
+    return f"export_{name}.xlsx"
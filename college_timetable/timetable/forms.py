@@ -55,6 +55,13 @@ class ClassTimetableForm(forms.Form):
         queryset=StudentClass.objects.all(),
         label="Lớp sinh viên",
     )
+    # Xem theo tuần: nhập số tuần hoặc 1 ngày bất kỳ trong tuần
+    week = forms.IntegerField(required=False, min_value=1, label="Tuần")
+    date = forms.DateField(
+        required=False,
+        label="Ngày",
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
 
 
 class InstructorTimetableForm(forms.Form):
@@ -66,6 +73,14 @@ class InstructorTimetableForm(forms.Form):
         queryset=Instructor.objects.all(),
         label="Giảng viên",
     )
+    # Xem theo tuần: nhập số tuần hoặc 1 ngày bất kỳ trong tuần
+    week = forms.IntegerField(required=False, min_value=1, label="Tuần")
+    date = forms.DateField(
+        required=False,
+        label="Ngày",
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+
 
 class RoomTimetableForm(forms.Form):
     semester = forms.ModelChoiceField(
@@ -76,6 +91,14 @@ class RoomTimetableForm(forms.Form):
         queryset=Room.objects.all(),
         label="Phòng học",
     )
+    # Xem theo tuần: nhập số tuần hoặc 1 ngày bất kỳ trong tuần
+    week = forms.IntegerField(required=False, min_value=1, label="Tuần")
+    date = forms.DateField(
+        required=False,
+        label="Ngày",
+        widget=forms.DateInput(attrs={"type": "date"}),
+    )
+
 
 class InstructorWorkloadForm(forms.Form):
     academic_year = forms.ModelChoiceField(
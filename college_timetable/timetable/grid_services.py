@@ -0,0 +1,354 @@
+"""
+Lưới thời khoá biểu (theo Lớp / Phòng / Giảng viên) + cache lưới đã render.
+
+- Mỗi Học kỳ có data_version, tăng khi TeachingSlot / tuần học của slot, hoặc
+  tên phòng / GV / môn / lớp hiện trong ô TKB thay đổi (xem signals.py).
+  Phiên bản được giữ trong cache Django (hết cache thì đọc DB, 1 query theo khoá chính);
+  bump_semester_data_version xoá khoá cache ngay và sau khi transaction commit.
+  Chạy nhiều worker thì CACHES phải là cache dùng chung (Redis / Memcached) để lượt tăng
+  ở worker này thấy ngay ở worker khác; với LocMemCache, chậm tối đa
+  TIMETABLE_DATA_VERSION_CACHE_TIMEOUT giây.
+- Lưới đã render (HTML) được cache theo khoá
+  (học kỳ, loại đối tượng, id đối tượng, data_version)
+  => dữ liệu đổi thì khoá đổi, bản cũ tự hết hạn; lượt xem lặp lại không tốn query nào.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
+
+from .import_schemas import format_week_ranges
+from .models import CourseSection, PublicHoliday, Semester, SemesterWeek, TeachingSlot
+
+DAYS = [
+    (1, "Thứ 2"),
+    (2, "Thứ 3"),
+    (3, "Thứ 4"),
+    (4, "Thứ 5"),
+    (5, "Thứ 6"),
+    (6, "Thứ 7"),
+]
+
+# Tối đa 14 tiết / ngày
+PERIODS = list(range(1, 15))
+
+# Loại đối tượng xem TKB -> điều kiện lọc TeachingSlot
+ENTITY_FILTERS = {
+    "class": "course_section__classes",
+    "room": "room",
+    "instructor": "course_section__instructor",
+    "section": "course_section",
+}
+
+
+# =============== PHIÊN BẢN DỮ LIỆU HỌC KỲ ===============
+
+def _data_stamp_key(semester_id):
+    return f"timetable:semester:{semester_id}:stamp"
+
+
+def get_semester_data_stamp(semester_id):
+    """
+    (data_version, data_updated_at) hiện tại của học kỳ.
+    Đọc từ cache, hết cache thì đọc DB (1 query theo khoá chính) rồi ghi lại vào cache.
+    """
+    key = _data_stamp_key(semester_id)
+    stamp = cache.get(key)
+    if stamp is None:
+        stamp = (
+            Semester.objects.filter(pk=semester_id)
+            .values_list("data_version", "data_updated_at")
+            .first()
+        ) or (0, None)
+        cache.set(key, stamp, settings.TIMETABLE_DATA_VERSION_CACHE_TIMEOUT)
+    return stamp
+
+
+def get_semester_data_version(semester_id) -> int:
+    """data_version hiện tại của học kỳ."""
+    return get_semester_data_stamp(semester_id)[0]
+
+
+def bump_semester_data_version(semester_ids):
+    """Đánh dấu TKB của các học kỳ đã thay đổi: tăng data_version trong DB, bỏ bản trong cache."""
+    ids = {sid for sid in semester_ids if sid}
+    if not ids:
+        return
+
+    Semester.objects.filter(pk__in=ids).update(
+        data_version=F("data_version") + 1,
+        data_updated_at=timezone.now(),
+    )
+    keys = [_data_stamp_key(sid) for sid in ids]
+    cache.delete_many(keys)
+    # Request khác có thể đọc lại phiên bản cũ trước khi transaction này commit -> xoá lần nữa sau commit
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+# =============== DỰNG LƯỚI TKB ===============
+
+def timetable_slots(semester, entity_type, entity, week=None):
+    """
+    Các TeachingSlot của 1 Lớp / Phòng / GV trong học kỳ.
+    week: chỉ lấy các buổi có học trong tuần này (lọc theo bit của weeks_mask).
+    """
+    qs = TeachingSlot.objects.filter(
+        semester=semester,
+        **{ENTITY_FILTERS[entity_type]: entity},
+    )
+    if week is not None:
+        qs = qs.alias(in_week=F("weeks_mask").bitand(1 << (week.index - 1))).filter(in_week__gt=0)
+    return qs.select_related(
+        "course_section__subject",
+        "course_section__instructor",
+        "room",
+    ).prefetch_related("course_section__classes").order_by(
+        "day_of_week", "start_period"
+    )
+
+
+# =============== CHẾ ĐỘ XEM THEO TUẦN ===============
+
+def week_day_date(week, day_of_week):
+    """Ngày của Thứ day_of_week (1 = Thứ 2) trong tuần học week."""
+    return week.start_date + datetime.timedelta(
+        days=(day_of_week - 1 - week.start_date.weekday()) % 7
+    )
+
+
+def resolve_semester_week(semester, week_index=None, date=None):
+    """
+    Tuần học của học kỳ theo số tuần (?week=N) hoặc theo ngày (?date=YYYY-MM-DD).
+    Trả về SemesterWeek hoặc None nếu không có tuần tương ứng.
+    """
+    weeks = SemesterWeek.objects.filter(semester=semester)
+    if week_index is not None:
+        return weeks.filter(index=week_index).first()
+    if date is not None:
+        return weeks.filter(start_date__lte=date).filter(
+            Q(end_date__gte=date)
+            | Q(end_date__isnull=True, start_date__gt=date - datetime.timedelta(days=7))
+        ).order_by("-start_date").first()
+    return None
+
+
+def week_holidays(week):
+    """
+    Ngày lễ rơi vào tuần học: {Thứ: tên ngày lễ}.
+    Ngày lễ lặp lại hằng năm (is_recurring) được so theo ngày/tháng.
+    """
+    dates = {week_day_date(week, day): day for day, _ in DAYS}
+    holidays = {}
+    for date, name, is_recurring in PublicHoliday.objects.filter(
+        Q(date__in=list(dates)) | Q(is_recurring=True)
+    ).values_list("date", "name", "is_recurring"):
+        if date in dates:
+            holidays[dates[date]] = name
+        elif is_recurring:
+            for day_date, day in dates.items():
+                if (day_date.month, day_date.day) == (date.month, date.day):
+                    holidays[day] = name
+    return holidays
+
+
+def day_columns(week=None, holidays=None):
+    """Tiêu đề các cột Thứ; xem theo tuần thì kèm ngày và tên ngày lễ (nếu có)."""
+    holidays = holidays or {}
+    return [
+        {
+            "value": day,
+            "label": label,
+            "date": week_day_date(week, day) if week is not None and week.start_date else None,
+            "holiday": holidays.get(day, ""),
+        }
+        for day, label in DAYS
+    ]
+
+
+# =============== LƯỚI GỌN (ROWSPAN) ===============
+
+# Vị trí cột của từng Thứ trong lưới
+DAY_COLUMNS = {day: col for col, (day, _) in enumerate(DAYS)}
+
+# Đánh dấu ô đã bị 1 ô phía trên chiếm (rowspan) -> không render <td>
+COVERED = object()
+
+
+def slot_cell_data(slot):
+    """
+    Dữ liệu hiển thị của 1 buổi, tính sẵn 1 lần (template không phải lặp
+    weeks / classes cho từng tiết nữa).
+    """
+    section = slot.course_section
+    return {
+        "subject_code": section.subject.code,
+        "subject_name": section.subject.name,
+        "section_code": section.code,
+        "room_code": slot.room.code if slot.room_id else "",
+        "instructor": str(section.instructor) if section.instructor_id else "",
+        "class_codes": ", ".join(cls.code for cls in section.classes.all()),
+        "weeks_label": format_week_ranges(slot.week_indexes, dash="–"),
+    }
+
+
+def build_compact_grid(slots, cell_data=slot_cell_data):
+    """
+    Dựng lưới TKB gọn: mỗi buổi chỉ là 1 ô với rowspan = số tiết.
+
+    Lưới là 1 mảng phẳng len(PERIODS) * len(DAYS), ô (tiết p, cột c)
+    nằm ở vị trí (p - 1) * len(DAYS) + c. Các buổi chồng tiết trong cùng 1 ngày
+    (xung đột) được gộp chung 1 ô, rowspan phủ hết các tiết của cả nhóm.
+
+    Trả về list dòng: {"period": p, "cells": [...]} trong đó mỗi phần tử là
+    {"day"} (ô trống) hoặc {"day", "rowspan", "slots": [slot_cell_data...]};
+    ô bị rowspan phía trên chiếm thì không có trong "cells".
+    cell_data: hàm slot -> dữ liệu hiển thị (mặc định slot_cell_data).
+    """
+    n_days, n_periods = len(DAYS), len(PERIODS)
+    layout = [None] * (n_periods * n_days)
+    day_values = [day for day, _ in DAYS]
+
+    by_day = defaultdict(list)
+    for s in slots:
+        if s.day_of_week not in DAY_COLUMNS:
+            continue
+        start, end = max(s.start_period, 1), min(s.end_period, n_periods)
+        if start <= end:
+            by_day[s.day_of_week].append((start, end, s))
+
+    def place(col, start, end, cell):
+        cell["rowspan"] = end - start + 1
+        layout[(start - 1) * n_days + col] = cell
+        for p in range(start + 1, end + 1):
+            layout[(p - 1) * n_days + col] = COVERED
+
+    for day, items in by_day.items():
+        col = DAY_COLUMNS[day]
+        items.sort(key=lambda item: (item[0], item[1]))
+        cell, cell_start, cell_end = None, 0, 0
+        for start, end, s in items:
+            if cell is not None and start <= cell_end:
+                # Chồng tiết với ô đang mở -> gộp chung
+                cell["slots"].append(cell_data(s))
+                cell_end = max(cell_end, end)
+                continue
+            if cell is not None:
+                place(col, cell_start, cell_end, cell)
+            cell = {"day": day, "slots": [cell_data(s)]}
+            cell_start, cell_end = start, end
+        if cell is not None:
+            place(col, cell_start, cell_end, cell)
+
+    return [
+        {
+            "period": p,
+            "cells": [
+                cell if cell is not None else {"day": day_values[col]}
+                for col, cell in enumerate(layout[(p - 1) * n_days:p * n_days])
+                if cell is not COVERED
+            ],
+        }
+        for p in PERIODS
+    ]
+
+
+def _grid_cache_key(semester_id, entity_type, entity_id, week_id, version):
+    return (
+        f"timetable:compact-grid:{semester_id}:{entity_type}:{entity_id}"
+        f":w{week_id or 'all'}:v{version}"
+    )
+
+
+def render_timetable_grid(semester, entity_type, entity, week=None):
+    """
+    HTML bảng TKB của 1 Lớp / Phòng / GV, lấy từ cache nếu dữ liệu học kỳ chưa đổi.
+    week: chỉ hiện các buổi học trong tuần đó (kèm ngày và ngày lễ trên tiêu đề cột).
+    """
+    version = get_semester_data_version(semester.pk)
+    key = _grid_cache_key(semester.pk, entity_type, entity.pk, week.pk if week else None, version)
+
+    html = cache.get(key)
+    if html is None:
+        holidays = week_holidays(week) if week is not None and week.start_date else {}
+        grid_rows = build_compact_grid(timetable_slots(semester, entity_type, entity, week=week))
+        html = render_to_string("timetable/_timetable_grid.html", {
+            "grid_rows": grid_rows,
+            "days": day_columns(week, holidays),
+            "holiday_days": list(holidays),
+            "entity_type": entity_type,
+            "week": week,
+        })
+        cache.set(key, html, settings.TIMETABLE_GRID_CACHE_TIMEOUT)
+
+    return mark_safe(html)
+
+
+# =============== DỮ LIỆU TKB DẠNG JSON (API) ===============
+
+# Thứ tự cột của mỗi dòng "slots" trong payload API
+API_SLOT_FIELDS = [
+    "id", "day_of_week", "start_period", "end_period",
+    "section_code", "subject_code", "subject_name",
+    "room_code", "instructor_code", "instructor_name",
+    "class_codes", "weeks_mask",
+]
+
+
+def weeks_to_mask(indexes) -> int:
+    """[1, 2, 3, 5] -> 0b10111 (bit i-1 bật nếu có tuần i)."""
+    mask = 0
+    for index in indexes:
+        mask |= 1 << (index - 1)
+    return mask
+
+
+def timetable_api_payload(semester, entity_type, entity):
+    """
+    TKB của 1 Lớp / Phòng / GV / Lớp HP ở dạng gọn cho API:
+    mỗi buổi là 1 mảng theo API_SLOT_FIELDS, tuần học là bitmask (bit 0 = tuần 1).
+    Chỉ đọc values_list (không dựng object ORM): 2 query cho cả payload.
+    """
+    slot_qs = TeachingSlot.objects.filter(
+        semester=semester,
+        **{ENTITY_FILTERS[entity_type]: entity},
+    )
+
+    class_codes = defaultdict(list)
+    for section_id, code in CourseSection.classes.through.objects.filter(
+        coursesection_id__in=slot_qs.values("course_section_id")
+    ).order_by("studentclass__code").values_list("coursesection_id", "studentclass__code"):
+        class_codes[section_id].append(code)
+
+    rows = []
+    for (
+        slot_id, day, start, end, section_id, section_code, subject_code, subject_name,
+        room_code, instructor_code, instructor_name, weeks_mask,
+    ) in slot_qs.order_by("day_of_week", "start_period", "id").values_list(
+        "id", "day_of_week", "start_period", "end_period",
+        "course_section_id", "course_section__code",
+        "course_section__subject__code", "course_section__subject__name",
+        "room__code", "course_section__instructor__code", "course_section__instructor__name",
+        "weeks_mask",
+    ):
+        rows.append([
+            slot_id, day, start, end, section_code, subject_code, subject_name,
+            room_code, instructor_code, instructor_name,
+            class_codes.get(section_id, []), weeks_mask,
+        ])
+
+    return {
+        "semester": {
+            "id": semester.pk,
+            "code": semester.code,
+            "data_version": semester.data_version,
+        },
+        "entity": {"type": entity_type, "id": entity.pk, "code": entity.code},
+        "fields": API_SLOT_FIELDS,
+        "slots": rows,
+    }
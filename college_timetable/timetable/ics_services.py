@@ -0,0 +1,178 @@
+"""
+Lịch iCalendar (.ics) theo Lớp SV / Phòng / Giảng viên để thêm vào lịch điện thoại.
+
+- Mỗi TeachingSlot × SemesterWeek thành 1 VEVENT có ngày giờ cụ thể:
+  ngày = SemesterWeek.start_date dời tới đúng Thứ, giờ lấy từ PeriodSlot.
+  Ngày lễ / ngày nghỉ (tắt trong teaching_days_mask của tuần) không có VEVENT.
+- Các VEVENT của 1 buổi học được dựng thành 1 đoạn text và cache theo
+  (slot, data_version của học kỳ) -> 1 buổi dùng chung cho feed Lớp, Phòng và GV,
+  dữ liệu chưa đổi thì không dựng lại.
+- Response là StreamingHttpResponse: ghi từng đoạn, không dựng cả file trong bộ nhớ.
+"""
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .grid_services import ENTITY_FILTERS, get_semester_data_version, week_day_date
+from .models import PeriodSlot, TeachingSlot
+
+ICS_PRODID = "-//HOTEC//Thoi khoa bieu//VI"
+ICS_UID_DOMAIN = "hotec-timetable"
+# Số buổi đọc cache / dựng lại mỗi lượt
+ICS_CHUNK_SIZE = 200
+
+ICS_VTIMEZONE = {
+    # Việt Nam: UTC+7, không có giờ mùa hè
+    "Asia/Ho_Chi_Minh": (
+        "BEGIN:VTIMEZONE\r\n"
+        "TZID:Asia/Ho_Chi_Minh\r\n"
+        "BEGIN:STANDARD\r\n"
+        "DTSTART:19700101T000000\r\n"
+        "TZOFFSETFROM:+0700\r\n"
+        "TZOFFSETTO:+0700\r\n"
+        "TZNAME:ICT\r\n"
+        "END:STANDARD\r\n"
+        "END:VTIMEZONE\r\n"
+    ),
+}
+
+
+def _escape(text) -> str:
+    return (
+        str(text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Gập dòng dài hơn 75 byte theo RFC 5545 (dòng tiếp theo bắt đầu bằng 1 dấu cách)."""
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while data:
+        cut = min(limit, len(data))
+        # Không cắt giữa 1 ký tự UTF-8 nhiều byte
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(data[:cut].decode("utf-8"))
+        data = data[cut:]
+        limit = 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _fmt_local(dt: datetime.datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%M%S")
+
+
+def load_period_times():
+    """{số tiết: (giờ bắt đầu, giờ kết thúc)} cho các tiết đã cấu hình đủ giờ."""
+    return {
+        index: (start, end)
+        for index, start, end in PeriodSlot.objects.values_list("index", "start_time", "end_time")
+        if start and end
+    }
+
+
+def build_slot_vevents(slot, period_times, dtstamp, tzid):
+    """
+    Các VEVENT (đã gập dòng, CRLF) của 1 buổi học cho mọi tuần học của nó.
+    slot cần select_related Lớp HP / Môn / GV / Phòng, prefetch weeks và classes.
+    Buổi có tiết chưa cấu hình giờ (PeriodSlot) thì bỏ qua.
+    """
+    start = period_times.get(slot.start_period)
+    end = period_times.get(slot.end_period)
+    if not start or not end:
+        return ""
+
+    section = slot.course_section
+    summary = f"{section.subject.name} ({section.code})"
+    location = slot.room.code if slot.room_id else ""
+    description = "\n".join([
+        f"Môn: {section.subject.code} - {section.subject.name}",
+        f"Lớp HP: {section.code}",
+        "Lớp SV: " + ", ".join(c.code for c in section.classes.all()),
+        f"GV: {section.instructor.name if section.instructor_id else '(chưa phân công)'}",
+        f"Tiết {slot.start_period}–{slot.end_period}",
+    ])
+    stamp = dtstamp.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    lines = []
+    for week in slot.weeks.all():
+        if week.is_break or not week.start_date or not week.is_teaching_day(slot.day_of_week):
+            continue
+        day = week_day_date(week, slot.day_of_week)
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:slot-{slot.pk}-w{week.index}@{ICS_UID_DOMAIN}",
+            f"DTSTAMP:{stamp}",
+            f"DTSTART;TZID={tzid}:{_fmt_local(datetime.datetime.combine(day, start[0]))}",
+            f"DTEND;TZID={tzid}:{_fmt_local(datetime.datetime.combine(day, end[1]))}",
+            f"SUMMARY:{_escape(summary)}",
+            f"LOCATION:{_escape(location)}",
+            f"DESCRIPTION:{_escape(description)}",
+            "END:VEVENT",
+        ]
+    return "".join(_fold(line) for line in lines)
+
+
+def _fragment_cache_key(slot_id, version):
+    return f"timetable:ics:slot:{slot_id}:v{version}"
+
+
+def iter_ics_feed(semester, entity_type, entity, calendar_name):
+    """
+    Sinh file .ics từng đoạn: header, rồi VEVENT của từng buổi (lấy từ cache,
+    buổi nào chưa có thì dựng lại theo lô), cuối cùng là footer.
+    """
+    tzid = settings.TIMETABLE_ICS_TZID
+    version = get_semester_data_version(semester.pk)
+    dtstamp = semester.data_updated_at or datetime.datetime.now(datetime.timezone.utc)
+
+    yield (
+        "BEGIN:VCALENDAR\r\n"
+        "VERSION:2.0\r\n"
+        f"PRODID:{ICS_PRODID}\r\n"
+        "CALSCALE:GREGORIAN\r\n"
+        "METHOD:PUBLISH\r\n"
+        + _fold(f"X-WR-CALNAME:{_escape(calendar_name)}")
+        + f"X-WR-TIMEZONE:{tzid}\r\n"
+        + ICS_VTIMEZONE.get(tzid, "")
+    )
+
+    slot_ids = list(
+        TeachingSlot.objects.filter(
+            semester=semester,
+            **{ENTITY_FILTERS[entity_type]: entity},
+        ).order_by("day_of_week", "start_period", "id").values_list("id", flat=True)
+    )
+
+    period_times = None
+    for pos in range(0, len(slot_ids), ICS_CHUNK_SIZE):
+        chunk = slot_ids[pos:pos + ICS_CHUNK_SIZE]
+        keys = {slot_id: _fragment_cache_key(slot_id, version) for slot_id in chunk}
+        cached = cache.get_many(keys.values())
+
+        missing = [slot_id for slot_id in chunk if keys[slot_id] not in cached]
+        if missing:
+            if period_times is None:
+                period_times = load_period_times()
+            built = {}
+            for slot in TeachingSlot.objects.filter(pk__in=missing).select_related(
+                "course_section__subject", "course_section__instructor", "room",
+            ).prefetch_related("weeks", "course_section__classes"):
+                built[keys[slot.pk]] = build_slot_vevents(slot, period_times, dtstamp, tzid)
+            cache.set_many(built, settings.TIMETABLE_GRID_CACHE_TIMEOUT)
+            cached.update(built)
+
+        for slot_id in chunk:
+            fragment = cached.get(keys[slot_id])
+            if fragment:
+                yield fragment
+
+    yield "END:VCALENDAR\r\n"
@@ -0,0 +1,290 @@
+"""
+Import dữ liệu Excel chạy nền (không cần broker ngoài như Celery/Redis).
+
+- File upload được lưu vào thư mục tạm settings.IMPORT_STAGING_DIR.
+- Một thread nền đọc file (read-only), xử lý từng sheet theo lô (batch_size dòng).
+- Trước lô đầu tiên, cả sheet được kiểm tra theo schema (import_schemas);
+  sheet có lỗi thì dừng job, báo toàn bộ lỗi và chưa ghi dòng nào.
+- Mỗi lô chạy trong 1 transaction, commit CÙNG với tiến độ (last_committed_row) và lỗi
+  => server tắt giữa chừng thì chạy lại job sẽ tiếp tục từ lô sau lô cuối cùng đã commit.
+"""
+import threading
+from itertools import islice
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from .import_schemas import validate_sheet
+from .import_services import ALL_SHEETS, IMPORT_CONFIG, SheetWindow
+from .models import ImportJob, ImportJobError, ImportJobSheet
+
+IMPORT_ALL = "all"  # data_type đặc biệt: 1 file nhiều sheet (xem ALL_SHEETS)
+DEFAULT_BATCH_SIZE = 500
+
+
+
+class SheetValidationError(Exception):
+    """Sheet không qua bước kiểm tra dữ liệu, chưa ghi gì."""
+
+
+# Các job đang chạy trong process này (tránh chạy trùng 1 job ở 2 thread)
+_running_jobs = set()
+_running_lock = threading.Lock()
+
+
+def _staging_dir() -> Path:
+    path = Path(settings.IMPORT_STAGING_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def stage_upload(uploaded_file) -> Path:
+    """Lưu file upload vào thư mục tạm, trả về đường dẫn file đã lưu."""
+    suffix = Path(uploaded_file.name or "").suffix or ".xlsx"
+    path = _staging_dir() / f"{uuid.uuid4().hex}{suffix}"
+    with open(path, "wb") as fh:
+        for chunk in uploaded_file.chunks():
+            fh.write(chunk)
+    return path
+
+
+def _count_data_rows(ws) -> int:
+    """Số dòng dữ liệu (không tính dòng tiêu đề)."""
+    max_row = ws.max_row
+    if max_row is None:
+        # File không ghi dimension -> phải đếm thủ công
+        max_row = sum(1 for _ in ws.iter_rows(values_only=True))
+    return max(0, max_row - 1)
+
+
+def _plan_sheets(data_type, wb):
+    """
+    Danh sách (tên sheet, loại dữ liệu) cần xử lý:
+    - Import 1 loại: dùng sheet đang active (giống _load_ws).
+    - Import tất cả: theo thứ tự ALL_SHEETS.
+    """
+    if data_type == IMPORT_ALL:
+        return list(ALL_SHEETS)
+    return [(wb.active.title, data_type)]
+
+
+def create_import_job(data_type, uploaded_file, batch_size=DEFAULT_BATCH_SIZE) -> ImportJob:
+    """
+    Lưu file vào thư mục tạm và tạo ImportJob (+ ImportJobSheet cho từng sheet).
+    Chưa import gì cả, việc đó do start_import_job / run_import_job làm.
+    """
+    if data_type != IMPORT_ALL and data_type not in IMPORT_CONFIG:
+        raise ValueError(f"Loại dữ liệu không hợp lệ: {data_type}")
+
+    path = stage_upload(uploaded_file)
+    try:
+        wb = load_workbook(path, read_only=True, data_only=True)
+    except Exception as e:
+        path.unlink(missing_ok=True)
+        raise ValueError(f"Không đọc được file Excel: {e}")
+
+    try:
+        with transaction.atomic():
+            job = ImportJob.objects.create(
+                data_type=data_type,
+                original_name=uploaded_file.name or "",
+                file_path=str(path),
+                batch_size=batch_size,
+            )
+            missing = []
+            for order, (sheet_name, sheet_type) in enumerate(_plan_sheets(data_type, wb)):
+                if sheet_name not in wb.sheetnames:
+                    missing.append(f"Sheet '{sheet_name}' không tồn tại, bỏ qua.")
+                    continue
+                ImportJobSheet.objects.create(
+                    job=job,
+                    order=order,
+                    sheet_name=sheet_name,
+                    data_type=sheet_type,
+                    total_rows=_count_data_rows(wb[sheet_name]),
+                )
+            if missing:
+                ImportJobError.objects.bulk_create(
+                    [ImportJobError(job=job, message=msg) for msg in missing]
+                )
+                job.error_count = len(missing)
+                job.save(update_fields=["error_count"])
+    finally:
+        wb.close()
+
+    return job
+
+
+def is_job_running(job_id) -> bool:
+    with _running_lock:
+        return job_id in _running_jobs
+
+
+def start_import_job(job: ImportJob) -> threading.Thread:
+    """Chạy job trong 1 thread nền (daemon) và trả về ngay."""
+    thread = threading.Thread(
+        target=run_import_job,
+        args=(job.pk,),
+        name=f"import-job-{job.pk}",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def resume_import_job(job: ImportJob):
+    """
+    Chạy tiếp 1 job bị ngắt (RUNNING nhưng không còn worker) hoặc bị lỗi.
+    Các lô đã commit được giữ nguyên, chỉ xử lý tiếp từ last_committed_row.
+    """
+    if job.status == "DONE" or is_job_running(job.pk):
+        return None
+    job.status = "PENDING"
+    job.message = ""
+    job.save(update_fields=["status", "message", "updated_at"])
+    return start_import_job(job)
+
+
+def run_import_job(job_id) -> bool:
+    """
+    Xử lý (hoặc xử lý tiếp) 1 ImportJob trong thread hiện tại.
+    Trả về False nếu job đang được 1 thread khác xử lý.
+    """
+    with _running_lock:
+        if job_id in _running_jobs:
+            return False
+        _running_jobs.add(job_id)
+
+    close_old_connections()
+    try:
+        _run_job(ImportJob.objects.get(pk=job_id))
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job_id)
+        # Thread nền có connection riêng, phải tự đóng
+        connection.close()
+    return True
+
+
+def _run_job(job: ImportJob):
+    if job.status == "DONE":
+        return
+
+    job.status = "RUNNING"
+    job.save(update_fields=["status", "updated_at"])
+
+    try:
+        wb = load_workbook(job.file_path, read_only=True, data_only=True)
+    except Exception as e:
+        _mark_failed(job, f"Không mở được file tạm '{job.file_path}': {e}")
+        return
+
+    try:
+        for sheet in job.sheets.exclude(status="DONE"):
+            _run_sheet(job, sheet, wb[sheet.sheet_name])
+    except SheetValidationError as e:
+        _mark_failed(job, str(e))
+        return
+    except Exception as e:
+        # Các lô trước đó đã commit, job có thể chạy tiếp sau khi sửa lỗi
+        _mark_failed(job, f"Lỗi hệ thống: {e}")
+        return
+    finally:
+        wb.close()
+
+    job.status = "DONE"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at", "updated_at"])
+
+    # Xong thì dọn file tạm
+    Path(job.file_path).unlink(missing_ok=True)
+
+
+def _run_sheet(job: ImportJob, sheet: ImportJobSheet, ws):
+    importer = IMPORT_CONFIG[sheet.data_type]["function"]
+    last_row = sheet.total_rows + 1  # dòng 1 là tiêu đề
+
+    if sheet.last_committed_row <= 1:
+        _validate_sheet(job, sheet, ws)
+
+    sheet.status = "RUNNING"
+    sheet.save(update_fields=["status"])
+
+    # 1 bộ duyệt cho cả phần còn lại của sheet, mỗi lô lấy tiếp đoạn kế
+    # (không mở lại iter_rows theo min_row cho từng lô: read_only sẽ đọc lại từ dòng 1)
+    rows = ws.iter_rows(min_row=sheet.last_committed_row + 1, max_row=last_row, values_only=True)
+
+    while sheet.last_committed_row < last_row:
+        first = sheet.last_committed_row + 1
+        last = min(first + job.batch_size - 1, last_row)
+        batch = list(islice(rows, last - first + 1))
+
+        # 1 lô = 1 transaction: dữ liệu, lỗi và tiến độ cùng commit hoặc cùng rollback
+        with transaction.atomic():
+            created, updated, errors = importer(SheetWindow(batch, first))
+
+            ImportJobError.objects.bulk_create(
+                [ImportJobError(job=job, sheet=sheet, message=str(err)) for err in errors]
+            )
+
+            sheet.last_committed_row = last
+            sheet.batches_done += 1
+            sheet.created_count += created
+            sheet.updated_count += updated
+            sheet.error_count += len(errors)
+            sheet.save()
+
+            ImportJob.objects.filter(pk=job.pk).update(
+                created_count=F("created_count") + created,
+                updated_count=F("updated_count") + updated,
+                error_count=F("error_count") + len(errors),
+                updated_at=timezone.now(),
+            )
+
+    sheet.status = "DONE"
+    sheet.save(update_fields=["status"])
+
+
+def _validate_sheet(job: ImportJob, sheet: ImportJobSheet, ws):
+    """
+    Kiểm tra cả sheet theo schema trước khi ghi lô đầu tiên.
+    Lỗi của lần kiểm tra trước (nếu chạy lại) được thay bằng kết quả mới.
+    """
+    schema = IMPORT_CONFIG[sheet.data_type].get("schema")
+    if schema is None:
+        return
+
+    _, _, errors, _ = validate_sheet(ws, schema)
+
+    with transaction.atomic():
+        old_count = sheet.errors.count()
+        sheet.errors.all().delete()
+        ImportJobError.objects.bulk_create(
+            [ImportJobError(job=job, sheet=sheet, message=err) for err in errors]
+        )
+        sheet.error_count = len(errors)
+        sheet.status = "FAILED" if errors else "PENDING"
+        sheet.save(update_fields=["error_count", "status"])
+        ImportJob.objects.filter(pk=job.pk).update(
+            error_count=F("error_count") + len(errors) - old_count,
+            updated_at=timezone.now(),
+        )
+
+    if errors:
+        raise SheetValidationError(
+            f"Sheet '{sheet.sheet_name}' có {len(errors)} lỗi dữ liệu, chưa ghi dòng nào. "
+            f"Sửa file rồi import lại."
+        )
+
+
+def _mark_failed(job: ImportJob, message: str):
+    ImportJob.objects.filter(pk=job.pk).update(
+        status="FAILED",
+        message=message,
+        updated_at=timezone.now(),
+    )
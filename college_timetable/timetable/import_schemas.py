@@ -0,0 +1,426 @@
+"""
+Khai báo cấu trúc sheet import (schema) + kiểm tra dữ liệu theo cột trước khi ghi.
+
+- Mỗi sheet khai báo 1 SheetSchema: danh sách Column (kiểu, mặc định, bắt buộc,
+  FK tra theo mã, tập giá trị hợp lệ, độ dài tối đa...).
+- validate_sheet() đọc hết sheet rồi kiểm tra TỪNG CỘT cho mọi dòng
+  (mỗi cột FK chỉ 1 query), gom toàn bộ lỗi của sheet để báo 1 lần.
+- Sheet sạch lỗi mới được ghi, bằng bulk_upsert() (bulk_create / bulk_update).
+"""
+import datetime
+
+from django.db import transaction
+
+BULK_BATCH_SIZE = 500
+
+TRUE_VALUES = {"1", "true", "x", "y", "yes", "có", "co"}
+FALSE_VALUES = {"0", "false", "n", "no", "không", "khong"}
+
+
+class Column:
+    """
+    1 cột trong sheet import.
+
+    name      : tên cột (hiển thị ở trang Import và trong thông báo lỗi)
+    type      : "str" | "int" | "float" | "bool" | "date" | "codes" (mã cách nhau dấu phẩy)
+                | "weeks" (danh sách tuần dạng "1-8, 10, 12-15")
+    field     : tên field trên model (mặc định = name); None nếu cột không ghi thẳng vào model
+    required  : bắt buộc có giá trị
+    default   : giá trị khi ô trống; có thể là hàm nhận dict dòng đã làm sạch
+    fk        : Model tra cứu theo field "code" -> giá trị làm sạch là id
+    label     : tên đối tượng FK trong thông báo lỗi (VD: "Khoa")
+    choices   : tập giá trị hợp lệ (list giá trị hoặc list cặp (giá trị, nhãn) của Django)
+    max_length: số ký tự tối đa cho cột "str"
+    min_value / max_value: khoảng giá trị cho số
+    lenient   : ô sai thì chỉ cảnh báo và dùng default, không chặn cả sheet
+    """
+
+    def __init__(
+        self, name, type="str", field="", required=False, default=None, fk=None,
+        label="", choices=None, max_length=None, min_value=None, max_value=None, lenient=False,
+    ):
+        self.name = name
+        self.type = type
+        self.field = name if field == "" else field
+        self.required = required
+        self.default = default
+        self.fk = fk
+        self.label = label or (fk._meta.verbose_name if fk else name)
+        self.choices = (
+            {c[0] if isinstance(c, (tuple, list)) else c for c in choices} if choices else None
+        )
+        self.max_length = max_length
+        self.min_value = min_value
+        self.max_value = max_value
+        self.lenient = lenient
+
+    @property
+    def attname(self):
+        """Khoá trong dict dòng đã làm sạch (FK dùng <field>_id)."""
+        if self.field is None:
+            return self.name
+        return f"{self.field}_id" if self.fk and self.type != "codes" else self.field
+
+    # ---------- ép kiểu 1 giá trị (raise ValueError kèm lý do) ----------
+
+    def _coerce(self, value):
+        if isinstance(value, str):
+            value = value.strip()
+
+        if self.type == "str":
+            # Excel hay trả số cho các mã toàn chữ số (2025 -> 2025.0)
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            value = str(value)
+            if self.max_length is not None and len(value) > self.max_length:
+                raise ValueError(f"dài quá {self.max_length} ký tự")
+            return value
+
+        if self.type == "int":
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                raise ValueError("không phải số nguyên")
+            if not number.is_integer():
+                raise ValueError("không phải số nguyên")
+            return self._check_range(int(number))
+
+        if self.type == "float":
+            try:
+                return self._check_range(float(value))
+            except (TypeError, ValueError):
+                raise ValueError("không phải số")
+
+        if self.type == "bool":
+            if isinstance(value, (bool, int, float)):
+                return bool(value)
+            text = str(value).lower()
+            if text in TRUE_VALUES:
+                return True
+            if text in FALSE_VALUES:
+                return False
+            raise ValueError("phải là 1/0")
+
+        if self.type == "date":
+            if isinstance(value, datetime.datetime):
+                return value.date()
+            if isinstance(value, datetime.date):
+                return value
+            for fmt in ("%Y-%m-%d", "%d/%m/%Y"):
+                try:
+                    return datetime.datetime.strptime(str(value), fmt).date()
+                except ValueError:
+                    pass
+            raise ValueError("ngày không đúng định dạng yyyy-mm-dd")
+
+        if self.type == "codes":
+            return [c.strip() for c in str(value).split(",") if c.strip()]
+
+        if self.type == "weeks":
+            return parse_week_ranges(value)
+
+        raise ValueError(f"kiểu cột '{self.type}' không hỗ trợ")
+
+    def _check_range(self, number):
+        if self.min_value is not None and number < self.min_value:
+            raise ValueError(f"phải >= {self.min_value}")
+        if self.max_value is not None and number > self.max_value:
+            raise ValueError(f"phải <= {self.max_value}")
+        return number
+
+    # ---------- làm sạch cả cột ----------
+
+    def clean_column(self, values):
+        """
+        Làm sạch toàn bộ giá trị của cột.
+        Trả về (giá trị đã làm sạch, [(vị trí dòng, thông báo, là_cảnh_báo)]).
+        Ô trống để _MISSING, default được điền sau khi mọi cột đã làm sạch.
+        """
+        cleaned = []
+        problems = []
+
+        for pos, value in enumerate(values):
+            if value is None or (isinstance(value, str) and not value.strip()):
+                if self.required:
+                    problems.append((pos, f"Thiếu giá trị cột '{self.name}'", False))
+                cleaned.append(_MISSING)
+                continue
+            try:
+                value = self._coerce(value)
+                if self.choices is not None and value not in self.choices:
+                    raise ValueError(
+                        f"không thuộc {'/'.join(str(c) for c in sorted(self.choices, key=str))}"
+                    )
+            except ValueError as e:
+                problems.append((pos, f"{self.name}='{values[pos]}' {e}", self.lenient))
+                cleaned.append(_MISSING)
+                continue
+            cleaned.append(value)
+
+        if self.fk is not None:
+            self._resolve_fk(cleaned, problems)
+
+        return cleaned, problems
+
+    def _resolve_fk(self, cleaned, problems):
+        """Đổi mã -> id cho cả cột bằng đúng 1 query."""
+        if self.type == "codes":
+            codes = {c for value in cleaned if value is not _MISSING for c in value}
+        else:
+            codes = {value for value in cleaned if value is not _MISSING}
+        if not codes:
+            return
+
+        id_map = dict(self.fk.objects.filter(code__in=codes).values_list("code", "id"))
+
+        for pos, value in enumerate(cleaned):
+            if value is _MISSING:
+                continue
+            if self.type == "codes":
+                missing = [c for c in value if c not in id_map]
+                for code in missing:
+                    problems.append((pos, f"Không tìm thấy {self.label} '{code}'", self.lenient))
+                cleaned[pos] = {id_map[c] for c in value if c in id_map}
+            elif value in id_map:
+                cleaned[pos] = id_map[value]
+            else:
+                problems.append((pos, f"Không tìm thấy {self.label} '{value}'", self.lenient))
+                cleaned[pos] = _MISSING
+
+
+class _Missing:
+    def __repr__(self):
+        return "<ô trống>"
+
+
+_MISSING = _Missing()
+
+
+def parse_week_ranges(value):
+    """
+    "1-8, 10, 12–15" -> [1, 2, ..., 8, 10, 12, 13, 14, 15]
+    (chấp nhận cả gạch nối "-" và gạch ngang "–"; 1 số đơn từ Excel cũng được).
+    """
+    if isinstance(value, (int, float)):
+        if not float(value).is_integer() or value < 1:
+            raise ValueError("tuần không hợp lệ")
+        return [int(value)]
+
+    weeks = set()
+    for part in str(value).replace("–", "-").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        try:
+            first = int(first)
+            last = int(last) if last.strip() else first
+        except ValueError:
+            raise ValueError(f"tuần '{part}' không hợp lệ")
+        if first < 1 or last < first:
+            raise ValueError(f"tuần '{part}' không hợp lệ")
+        weeks.update(range(first, last + 1))
+    return sorted(weeks)
+
+
+def format_week_ranges(indexes, dash="-"):
+    """[1, 2, 3, 5, 7, 8] -> "1-3, 5, 7-8" (ngược lại của parse_week_ranges)."""
+    parts = []
+    run_start = prev = None
+    for index in sorted(set(indexes)):
+        if prev is not None and index == prev + 1:
+            prev = index
+            continue
+        if run_start is not None:
+            parts.append(str(run_start) if run_start == prev else f"{run_start}{dash}{prev}")
+        run_start = prev = index
+    if run_start is not None:
+        parts.append(str(run_start) if run_start == prev else f"{run_start}{dash}{prev}")
+    return ", ".join(parts)
+
+
+class SheetSchema:
+    """
+    Cấu trúc 1 sheet import.
+
+    model        : Model được ghi
+    columns      : list Column theo đúng thứ tự cột A, B, C...
+    key          : các field xác định 1 bản ghi (update nếu đã có), VD ("code",)
+    skip_unless  : bỏ qua dòng nếu 1 trong các cột này trống (mặc định: cột đầu tiên)
+    finalize     : hàm(rows, line_numbers) -> list[(vị trí dòng, thông báo, là_cảnh_báo)],
+                   chạy sau khi làm sạch để xử lý ràng buộc giữa nhiều cột
+    after_write  : hàm(list object đã tạo/cập nhật), chạy trong cùng transaction ghi
+    computed     : field của model không có cột riêng, do finalize điền
+                   (VD: semester tra từ cặp Năm học + mã Học kỳ)
+    """
+
+    def __init__(
+        self, model, columns, key=("code",), skip_unless=None,
+        finalize=None, after_write=None, computed=(),
+    ):
+        self.model = model
+        self.columns = columns
+        self.key = tuple(key)
+        self.skip_unless = tuple(skip_unless or (columns[0].name,))
+        self.finalize = finalize
+        self.after_write = after_write
+        self.computed = tuple(computed)
+
+    @property
+    def column_names(self):
+        return [c.name for c in self.columns]
+
+    def column(self, name):
+        return next(c for c in self.columns if c.name == name)
+
+    @property
+    def write_fields(self):
+        """[(tên field, attname)] được ghi thẳng vào model."""
+        fields = [
+            (c.field, c.attname) for c in self.columns
+            if c.field is not None and c.type not in ("codes", "weeks")
+        ]
+        fields += [(name, self.attname(name)) for name in self.computed]
+        return fields
+
+    def attname(self, field_name):
+        for c in self.columns:
+            if c.field == field_name:
+                return c.attname
+        return self.model._meta.get_field(field_name).attname
+
+
+def read_sheet(ws, schema):
+    """Đọc các dòng dữ liệu (đủ số cột của schema), bỏ các dòng thiếu cột skip_unless."""
+    from .import_services import _iter_rows  # tránh import vòng
+
+    width = len(schema.columns)
+    skip_pos = [schema.column_names.index(name) for name in schema.skip_unless]
+
+    line_numbers, rows = [], []
+    for idx, row in _iter_rows(ws, max_col=width):
+        row = tuple(row[:width]) + (None,) * (width - len(row[:width]))
+        if any(row[p] is None or (isinstance(row[p], str) and not row[p].strip()) for p in skip_pos):
+            continue
+        line_numbers.append(idx)
+        rows.append(row)
+    return line_numbers, rows
+
+
+def validate_sheet(ws, schema):
+    """
+    Kiểm tra toàn bộ sheet theo schema, KHÔNG ghi gì vào DB.
+    Trả về (rows, line_numbers, errors, warnings):
+      - rows: list dict {attname: giá trị đã làm sạch}
+      - errors: lỗi chặn ghi; warnings: ô sai của cột lenient (đã thay bằng default)
+    """
+    line_numbers, raw_rows = read_sheet(ws, schema)
+    if not raw_rows:
+        return [], [], [], []
+
+    rows = [{} for _ in raw_rows]
+    problems = []
+
+    # Làm sạch theo cột: mỗi cột duyệt 1 lượt qua mọi dòng
+    for col, values in zip(schema.columns, zip(*raw_rows)):
+        cleaned, col_problems = col.clean_column(list(values))
+        problems.extend(col_problems)
+        for row, value in zip(rows, cleaned):
+            row[col.attname] = value
+
+    # Điền default (default dạng hàm được gọi sau khi đủ các cột khác)
+    for col in schema.columns:
+        for row in rows:
+            if row[col.attname] is _MISSING:
+                default = col.default(row) if callable(col.default) else col.default
+                if default is None and col.type == "codes":
+                    default = set()
+                elif default is None and col.type == "weeks":
+                    default = []
+                row[col.attname] = default
+
+    if schema.finalize:
+        problems.extend(schema.finalize(rows, line_numbers))
+
+    problems.sort(key=lambda p: p[0])
+    errors = [f"Dòng {line_numbers[pos]}: {msg}" for pos, msg, is_warning in problems if not is_warning]
+    warnings = [
+        f"Dòng {line_numbers[pos]}: {msg} -> bỏ qua, dùng giá trị mặc định."
+        for pos, msg, is_warning in problems if is_warning
+    ]
+    return rows, line_numbers, errors, warnings
+
+
+def bulk_upsert(schema, rows):
+    """
+    Ghi các dòng đã làm sạch theo khoá schema.key:
+    chưa có -> bulk_create, đã có -> bulk_update (chỉ các bản ghi có thay đổi).
+    Trùng khoá trong file: dòng sau ghi đè, tính là cập nhật.
+    Trả về (created, updated, objs) với objs = object đã tạo mới + đã thay đổi.
+    """
+    model = schema.model
+    key_attnames = [schema.attname(k) for k in schema.key]
+    fields = schema.write_fields
+
+    by_key = {}
+    duplicates = 0
+    for row in rows:
+        k = tuple(row[a] for a in key_attnames)
+        if k in by_key:
+            duplicates += 1
+        by_key[k] = row
+
+    existing = {
+        tuple(getattr(obj, a) for a in key_attnames): obj
+        for obj in model.objects.filter(**{f"{key_attnames[0]}__in": {k[0] for k in by_key}})
+    }
+
+    to_create, to_update = [], []
+    for k, row in by_key.items():
+        obj = existing.get(k)
+        if obj is None:
+            to_create.append(model(**{attname: row[attname] for _, attname in fields}))
+            continue
+        changed = False
+        for _, attname in fields:
+            if getattr(obj, attname) != row[attname]:
+                setattr(obj, attname, row[attname])
+                changed = True
+        if changed:
+            to_update.append(obj)
+
+    with transaction.atomic():
+        if to_create:
+            model.objects.bulk_create(to_create, batch_size=BULK_BATCH_SIZE)
+        if to_update:
+            model.objects.bulk_update(
+                to_update,
+                [name for name, attname in fields if attname not in key_attnames],
+                batch_size=BULK_BATCH_SIZE,
+            )
+
+        saved = to_create + to_update
+        if schema.after_write and saved:
+            if any(obj.pk is None for obj in to_create):
+                # CSDL không trả pk sau bulk_create -> nạp lại theo khoá
+                saved = list(model.objects.filter(
+                    **{f"{key_attnames[0]}__in": {k[0] for k in by_key}}
+                ))
+            schema.after_write(saved)
+
+    return len(to_create), len(by_key) - len(to_create) + duplicates, saved
+
+
+def import_with_schema(ws, schema):
+    """
+    Import 1 sheet theo schema: kiểm tra toàn bộ trước,
+    có lỗi thì không ghi gì và trả về toàn bộ lỗi; sạch thì ghi theo lô.
+    """
+    rows, _, errors, warnings = validate_sheet(ws, schema)
+    if errors:
+        return 0, 0, errors + warnings
+    if not rows:
+        return 0, 0, warnings
+
+    created, updated, _ = bulk_upsert(schema, rows)
+    return created, updated, warnings
@@ -1,11 +1,20 @@
+from django.db import transaction
 from openpyxl import load_workbook
+
+from .calendar_services import refresh_weeks_mask, regenerate_semester_weeks
+from .curriculum_services import upsert_curriculum_subjects
+from .grid_services import bump_semester_data_version
+from .import_schemas import Column, SheetSchema, bulk_upsert, import_with_schema, validate_sheet
 from .models import (
     Department, TrainingLevel, Major,
     AcademicYear, Semester,
     RoomType, SpecializationGroup, Room,RoomCapability,
     Instructor, StudentClass, Subject,
-    Curriculum,  CurriculumSubject
+    Curriculum,  CurriculumSubject,
+    SemesterWeek, CourseSection, TeachingSlot,
 )
+from .semester_index_services import rebuild_semester_index_map
+from .services import refresh_section_rollups
 
 def _load_ws(file):
     wb = load_workbook(file, data_only=True)
@@ -24,8 +33,85 @@ def _get_ws(file_or_ws):
     return _load_ws(file_or_ws)
 
 
+class SheetWindow:
+    """
+    "Cửa sổ" các dòng của 1 lô, bắt đầu từ dòng first_row của worksheet.
+    Dùng khi import theo lô (ImportJob): rows là đoạn liên tiếp cắt ra từ 1 bộ duyệt
+    duy nhất của cả sheet (workbook read_only mà gọi ws.iter_rows(min_row=...) cho từng
+    lô thì openpyxl phải đọc lại XML từ dòng 1), số dòng báo lỗi vẫn là số dòng thật.
+    """
+
+    def __init__(self, rows, first_row):
+        self.rows = rows
+        self.first_row = first_row
+
+    @property
+    def last_row(self):
+        return self.first_row + len(self.rows) - 1
+
+    def iter_rows(self, min_row=None, max_col=None, values_only=True):
+        return iter(self.rows)
+
+
+def _iter_rows(ws, max_col=None):
+    """
+    Duyệt các dòng dữ liệu (bỏ dòng tiêu đề), trả về (số dòng Excel, giá trị các ô).
+    Nếu ws là SheetWindow thì chỉ duyệt trong cửa sổ của lô.
+    """
+    first_row = getattr(ws, "first_row", 2)
+    rows = ws.iter_rows(min_row=first_row, max_col=max_col, values_only=True)
+    return enumerate(rows, start=first_row)
+
+
+def _sync_links(model, owner_field, target_field, desired):
+    """
+    Đồng bộ bảng liên kết (through M2M) theo kiểu diff:
+    desired = {owner_id: set(target_id)}, chỉ xét các owner có trong desired.
+    Chỉ xoá liên kết thừa và bulk insert liên kết thiếu; liên kết đã có giữ nguyên
+    (cùng các cột phụ như priority).
+    Trả về (số liên kết thêm, số liên kết xoá).
+    """
+    if not desired:
+        return 0, 0
+
+    current = {}
+    stale_ids = []
+    rows = model.objects.filter(
+        **{f"{owner_field}__in": list(desired)}
+    ).values_list("pk", owner_field, target_field)
+    for pk, owner_id, target_id in rows:
+        if target_id in desired[owner_id]:
+            current.setdefault(owner_id, set()).add(target_id)
+        else:
+            stale_ids.append(pk)
+
+    new_links = [
+        model(**{owner_field: owner_id, target_field: target_id})
+        for owner_id, targets in desired.items()
+        for target_id in targets - current.get(owner_id, set())
+    ]
+
+    if stale_ids:
+        model.objects.filter(pk__in=stale_ids).delete()
+    if new_links:
+        model.objects.bulk_create(new_links)
+    return len(new_links), len(stale_ids)
+
+
 # =============== IMPORT TỪNG MODEL (ĐÃ SỬA ĐỂ NHẬN WS) ===============
 
+CURRICULUM_SCHEMA = SheetSchema(
+    Curriculum,
+    [
+        Column("major_code", field="major", fk=Major, label="Ngành", required=True),
+        Column("intake_year_code", field="intake_year", fk=AcademicYear, label="Năm học", required=True),
+        Column("name", default=""),
+    ],
+    key=("major", "intake_year"),
+    skip_unless=("major_code", "intake_year_code"),
+)
+
+
 def import_curriculums_from_excel(file_or_ws):
     """
     Sheet Curriculums:
@@ -33,45 +119,54 @@ def import_curriculums_from_excel(file_or_ws):
     B: intake_year_code    (VD: 2025-2026)
     C: name                (tuỳ chọn, có thể để trống)
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        major_code, intake_year_code, name = row[:3]
-
-        # bỏ qua dòng trống hoặc thiếu thông tin chính
-        if not major_code or not intake_year_code:
-            continue
-
-        try:
-            major = Major.objects.get(code=str(major_code).strip())
-        except Major.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Ngành '{major_code}'")
-            continue
-
-        try:
-            ay = AcademicYear.objects.get(code=str(intake_year_code).strip())
-        except AcademicYear.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Năm học '{intake_year_code}'")
-            continue
-
-        try:
-            obj, is_created = Curriculum.objects.update_or_create(
-                major=major,
-                intake_year=ay,
-                defaults={
-                    "name": str(name).strip() if name else "",
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
+    return import_with_schema(_get_ws(file_or_ws), CURRICULUM_SCHEMA)
+
+
+def _finalize_curriculum_subjects(rows, line_numbers):
+    """Tra Curriculum theo (Ngành, Khoá) và điền semester_index mặc định theo Môn."""
+    problems = []
+    curriculum_map = {
+        (major_id, year_id): cur_id
+        for major_id, year_id, cur_id in Curriculum.objects.filter(
+            major_id__in={r["major_id"] for r in rows},
+            intake_year_id__in={r["intake_year_id"] for r in rows},
+        ).values_list("major_id", "intake_year_id", "id")
+    }
+    subject_semesters = dict(
+        Subject.objects.filter(id__in={r["subject_id"] for r in rows})
+        .values_list("id", "semester_number")
+    )
+
+    for pos, row in enumerate(rows):
+        if row["major_id"] is None or row["intake_year_id"] is None:
+            continue  # đã báo lỗi ở cột tương ứng
+        row["curriculum_id"] = curriculum_map.get((row["major_id"], row["intake_year_id"]))
+        if row["curriculum_id"] is None:
+            problems.append((
+                pos,
+                f"Không tìm thấy Curriculum cho Ngành '{row['major_code']}' - Năm '{row['intake_year_code']}'",
+                False,
+            ))
+        if row["semester_index"] is None:
+            row["semester_index"] = subject_semesters.get(row["subject_id"]) or 1
+    return problems
+
+
+CURRICULUM_SUBJECT_SCHEMA = SheetSchema(
+    CurriculumSubject,
+    [
+        Column("curriculum_major_code", field="major", fk=Major, label="Ngành", required=True),
+        Column("curriculum_intake_year_code", field="intake_year", fk=AcademicYear, label="Năm học", required=True),
+        Column("subject_code", field="subject", fk=Subject, label="Môn", required=True),
+        Column("semester_index", type="int", min_value=1, lenient=True),
+        Column("is_optional", type="bool", default=False, lenient=True),
+        Column("total_periods", type="float", min_value=0, lenient=True),
+    ],
+    key=("curriculum", "subject"),
+    skip_unless=("curriculum_major_code", "curriculum_intake_year_code", "subject_code"),
+    finalize=_finalize_curriculum_subjects,
+)
 
-    return created, updated, errors
 
 def import_curriculum_subjects_from_excel(file_or_ws):
     """
@@ -82,109 +177,38 @@ def import_curriculum_subjects_from_excel(file_or_ws):
     D: semester_index              (Học kỳ trong CTĐT, 1..N; nếu trống sẽ dùng subject.semester_number hoặc 1)
     E: is_optional                 (1/0; nếu trống = 0)
     F: total_periods               (override tổng tiết; nếu trống = None)
-    """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        # Đảm bảo list đủ 6 phần tử
-        values = list(row[:6]) + [None] * (6 - len(row[:6]))
-        (
-            major_code,
-            intake_year_code,
-            subject_code,
-            semester_index,
-            is_optional_val,
-            total_periods,
-        ) = values
-
-        if not major_code or not intake_year_code or not subject_code:
-            continue
 
-        # 1. Tìm Major, AcademicYear, Curriculum
-        try:
-            major = Major.objects.get(code=str(major_code).strip())
-        except Major.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Ngành '{major_code}'")
-            continue
+    Kiểm tra cả sheet theo CURRICULUM_SUBJECT_SCHEMA rồi ghi theo lô
+    bằng upsert_curriculum_subjects.
+    """
+    rows, _, errors, warnings = validate_sheet(_get_ws(file_or_ws), CURRICULUM_SUBJECT_SCHEMA)
+    if errors:
+        return 0, 0, errors + warnings
+
+    data = {}  # (curriculum_id, subject_id) -> giá trị cần ghi
+    duplicates = 0
+    for row in rows:
+        key = (row["curriculum_id"], row["subject_id"])
+        if key in data:
+            # Trùng cặp CTĐT - Môn trong file: dòng sau ghi đè, tính là cập nhật
+            duplicates += 1
+        data[key] = {
+            "semester_index": row["semester_index"],
+            "is_optional": row["is_optional"],
+            "total_periods": row["total_periods"],
+        }
 
-        try:
-            ay = AcademicYear.objects.get(code=str(intake_year_code).strip())
-        except AcademicYear.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Năm học '{intake_year_code}'")
-            continue
+    res = upsert_curriculum_subjects(data, overwrite=True)
+    return res["created"], res["updated"] + duplicates, warnings
 
-        try:
-            curriculum = Curriculum.objects.get(major=major, intake_year=ay)
-        except Curriculum.DoesNotExist:
-            errors.append(
-                f"Dòng {idx}: Không tìm thấy Curriculum cho Ngành '{major_code}' - Năm '{intake_year_code}'"
-            )
-            continue
-
-        # 2. Tìm Subject
-        try:
-            subject = Subject.objects.get(code=str(subject_code).strip())
-        except Subject.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Môn '{subject_code}'")
-            continue
 
-        # 3. Xử lý semester_index
-        sem = None
-        if semester_index not in (None, ""):
-            try:
-                sem = int(float(semester_index))
-            except Exception:
-                errors.append(
-                    f"Dòng {idx}: semester_index='{semester_index}' không hợp lệ, dùng subject.semester_number hoặc 1."
-                )
-                sem = None
-
-        if sem is None:
-            sem = subject.semester_number or 1
-
-        # 4. Xử lý is_optional (1/0)
-        is_optional = False
-        if is_optional_val not in (None, ""):
-            try:
-                is_optional = bool(int(is_optional_val))
-            except Exception:
-                errors.append(
-                    f"Dòng {idx}: is_optional='{is_optional_val}' không hợp lệ, dùng 0."
-                )
-                is_optional = False
-
-        # 5. Xử lý total_periods
-        tp = None
-        if total_periods not in (None, ""):
-            try:
-                tp = float(total_periods)
-            except Exception:
-                errors.append(
-                    f"Dòng {idx}: total_periods='{total_periods}' không hợp lệ, để trống (None)."
-                )
-                tp = None
-
-        # 6. Lưu vào DB
-        try:
-            obj, is_created = CurriculumSubject.objects.update_or_create(
-                curriculum=curriculum,
-                subject=subject,
-                defaults={
-                    "semester_index": sem,
-                    "is_optional": is_optional,
-                    "total_periods": tp,
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-
-    return created, updated, errors
+DEPARTMENT_SCHEMA = SheetSchema(
+    Department,
+    [
+        Column("code"),
+        Column("name", default=""),
+    ],
+)
 
 
 def import_departments_from_excel(file_or_ws):
@@ -193,27 +217,17 @@ def import_departments_from_excel(file_or_ws):
     A: code   (Mã Khoa)
     B: name   (Tên Khoa)
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
+    return import_with_schema(_get_ws(file_or_ws), DEPARTMENT_SCHEMA)
 
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name = row[:2]
-        if not code:
-            continue
-        try:
-            obj, is_created = Department.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={"name": str(name).strip() if name else ""},
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
 
-    return created, updated, errors
+TRAINING_LEVEL_SCHEMA = SheetSchema(
+    TrainingLevel,
+    [
+        Column("code"),
+        Column("name", default=""),
+        Column("form", default="Tập trung"),
+    ],
+)
 
 
 def import_training_levels_from_excel(file_or_ws):
@@ -223,28 +237,21 @@ def import_training_levels_from_excel(file_or_ws):
     B: name
     C: form (VD: Tập trung, Liên thông...)
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name, form = row[:3]
-        if not code:
-            continue
-        try:
-            obj, is_created = TrainingLevel.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "form": str(form).strip() if form else "Tập trung",
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
+    return import_with_schema(_get_ws(file_or_ws), TRAINING_LEVEL_SCHEMA)
+
+
+def _rebuild_index_map_for_years(years):
+    """Năm học mới / đổi mã: tính lại bảng tra học kỳ thứ mấy (như signal academic_year_saved)."""
+    rebuild_semester_index_map()
+
+
+ACADEMIC_YEAR_SCHEMA = SheetSchema(
+    AcademicYear,
+    [
+        Column("code"),
+    ],
+    after_write=_rebuild_index_map_for_years,
+)
 
 
 def import_academic_years_from_excel(file_or_ws):
@@ -252,25 +259,34 @@ def import_academic_years_from_excel(file_or_ws):
     Sheet AcademicYears:
     A: code (VD: 2025, 2025-2026...)
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        (code,) = row[:1]
-        if not code:
-            continue
-        try:
-            obj, is_created = AcademicYear.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={},
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
+    return import_with_schema(_get_ws(file_or_ws), ACADEMIC_YEAR_SCHEMA)
+
+
+def _regenerate_semester_weeks(semesters):
+    """
+    Sinh tuần cho HK mới / đổi ngày bắt đầu, số tuần (HK không đổi thì bỏ qua);
+    tính bảng tra học kỳ thứ mấy cho các HK vừa ghi (bulk_upsert không phát signal).
+    """
+    for sem in semesters:
+        regenerate_semester_weeks(sem)
+    rebuild_semester_index_map(
+        semesters=Semester.objects.filter(pk__in=[s.pk for s in semesters]).select_related("academic_year"),
+    )
+
+
+SEMESTER_SCHEMA = SheetSchema(
+    Semester,
+    [
+        Column("academic_year_code", field="academic_year", fk=AcademicYear, label="Năm học", required=True),
+        Column("code", required=True),
+        Column("name", default=""),
+        Column("start_date", type="date"),
+        Column("weeks", type="int", default=20, min_value=1),
+    ],
+    key=("academic_year", "code"),
+    skip_unless=("academic_year_code", "code"),
+    after_write=_regenerate_semester_weeks,
+)
 
 
 def import_semesters_from_excel(file_or_ws):
@@ -282,47 +298,16 @@ def import_semesters_from_excel(file_or_ws):
     D: start_date          (yyyy-mm-dd)
     E: weeks               (số tuần, VD: 20)
     """
-    import datetime
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        year_code, code, name, start_date, weeks = row[:5]
-        if not year_code or not code:
-            continue
-        try:
-            ay = AcademicYear.objects.get(code=str(year_code).strip())
-        except AcademicYear.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Năm học '{year_code}'")
-            continue
+    return import_with_schema(_get_ws(file_or_ws), SEMESTER_SCHEMA)
 
-        # start_date có thể là datetime hoặc string
-        if isinstance(start_date, str):
-            try:
-                start_date = datetime.datetime.strptime(start_date, "%Y-%m-%d").date()
-            except ValueError:
-                errors.append(f"Dòng {idx}: Ngày bắt đầu không đúng định dạng yyyy-mm-dd")
-                start_date = None
-
-        try:
-            obj, is_created = Semester.objects.update_or_create(
-                academic_year=ay,
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "start_date": start_date,
-                    "weeks": int(weeks or 20),
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
 
-    return created, updated, errors
+ROOM_TYPE_SCHEMA = SheetSchema(
+    RoomType,
+    [
+        Column("code"),
+        Column("name", default=""),
+    ],
+)
 
 
 def import_roomtypes_from_excel(file_or_ws):
@@ -331,25 +316,16 @@ def import_roomtypes_from_excel(file_or_ws):
     A: code
     B: name
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name = row[:2]
-        if not code:
-            continue
-        try:
-            obj, is_created = RoomType.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={"name": str(name).strip() if name else ""},
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
+    return import_with_schema(_get_ws(file_or_ws), ROOM_TYPE_SCHEMA)
+
+
+SPECIALIZATION_GROUP_SCHEMA = SheetSchema(
+    SpecializationGroup,
+    [
+        Column("code"),
+        Column("name", default=""),
+    ],
+)
 
 
 def import_specialization_groups_from_excel(file_or_ws):
@@ -358,77 +334,35 @@ def import_specialization_groups_from_excel(file_or_ws):
     A: code
     B: name
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name = row[:2]
-        if not code:
-            continue
-        try:
-            obj, is_created = SpecializationGroup.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={"name": str(name).strip() if name else ""},
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
-
-
-# def import_rooms_from_excel(file_or_ws):
-#     """
-#     Sheet Rooms:
-#     A: code
-#     B: name
-#     C: room_type_code
-#     D: specialization_group_codes (mã nhóm chuyên môn, phân cách bằng dấu phẩy)
-#     """
-#     ws = _get_ws(file_or_ws)
-#     created = updated = 0
-#     errors = []
-#     for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-#         code, name, room_type_code, group_codes = row[:4]
-#         if not code:
-#             continue
-#         try:
-#             rt = RoomType.objects.get(code=str(room_type_code).strip())
-#         except RoomType.DoesNotExist:
-#             errors.append(f"Dòng {idx}: Không tìm thấy Loại phòng '{room_type_code}'")
-#             continue
-
-#         try:
-#             room, is_created = Room.objects.update_or_create(
-#                 code=str(code).strip(),
-#                 defaults={
-#                     "name": str(name).strip() if name else "",
-#                     "room_type": rt,
-#                 },
-#             )
-#             # cập nhật nhóm chuyên môn (nếu có)
-#             room.capabilities.clear()
-#             if group_codes:
-#                 for gcode in str(group_codes).split(","):
-#                     gcode = gcode.strip()
-#                     if not gcode:
-#                         continue
-#                     try:
-#                         g = SpecializationGroup.objects.get(code=gcode)
-#                         room.capabilities.add(g)
-#                     except SpecializationGroup.DoesNotExist:
-#                         errors.append(f"Dòng {idx}: Không tìm thấy Nhóm CM '{gcode}'")
-#             room.save()
-
-#             if is_created:
-#                 created += 1
-#             else:
-#                 updated += 1
-#         except Exception as e:
-#             errors.append(f"Dòng {idx}: {e}")
-#     return created, updated, errors
+    return import_with_schema(_get_ws(file_or_ws), SPECIALIZATION_GROUP_SCHEMA)
+
+
+def _bump_semesters_showing(model, field):
+    """
+    after_write cho danh mục có mã / tên hiện trong ô TKB (Phòng, GV, Môn, Lớp SV):
+    bulk_upsert không phát signal -> tự tăng data_version các học kỳ có dùng các dòng vừa ghi.
+    """
+    def after_write(objs):
+        bump_semester_data_version(
+            model.objects.filter(**{f"{field}__in": [o.pk for o in objs]})
+            .values_list("semester_id", flat=True).distinct()
+        )
+    return after_write
+
+
+ROOM_SCHEMA = SheetSchema(
+    Room,
+    [
+        Column("code"),
+        Column("name", default=""),
+        Column("room_type_code", field="room_type", fk=RoomType, label="Loại phòng", required=True),
+        Column("capacity", type="int", default=0, min_value=0, lenient=True),
+        Column("capabilities", type="codes", field=None, fk=SpecializationGroup, label="Nhóm CM"),
+        Column("allowed_majors", type="codes", field=None, fk=Major, label="Ngành"),
+    ],
+    after_write=_bump_semesters_showing(TeachingSlot, "room"),
+)
+
 
 def import_rooms_from_excel(file_or_ws):
     """
@@ -440,92 +374,48 @@ def import_rooms_from_excel(file_or_ws):
     D: capacity (Sức chứa - Số nguyên)
     E: capabilities (Mã nhóm CM, cách nhau dấu phẩy)
     F: allowed_majors (Mã ngành ưu tiên, cách nhau dấu phẩy)
-    """
-    # Hàm _get_ws giả định bạn đã có sẵn như trong code cũ
-    ws = _get_ws(file_or_ws) 
-    created = updated = 0
-    errors = []
-
-    # Lấy dữ liệu từ dòng 2, giới hạn đọc đúng 6 cột đầu tiên (A->F)
-    for idx, row in enumerate(ws.iter_rows(min_row=2, max_col=6, values_only=True), start=2):
-        # 1. Unpack đủ 6 giá trị
-        # Lưu ý: Nếu file Excel dòng đó thiếu cột, openpyxl sẽ trả về None, cần xử lý kỹ
-        if not row or row[0] is None:
-            continue
-            
-        # Đảm bảo row có ít nhất 6 phần tử (đề phòng dòng ngắn)
-        row = list(row) + [None]*(6-len(row))
-        code, name, room_type_code, capacity_val, group_codes, major_codes = row
-
-        if not code:
-            continue
-
-        # --- Xử lý Loại phòng ---
-        try:
-            rt = RoomType.objects.get(code=str(room_type_code).strip())
-        except RoomType.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Loại phòng '{room_type_code}'")
-            continue
-
-        # --- Xử lý Sức chứa (Fix lỗi bị 0) ---
-        try:
-            capacity = int(capacity_val) if capacity_val else 0
-        except ValueError:
-            capacity = 0 # Nếu nhập chữ hoặc lỗi định dạng thì về 0
-
-        try:
-            # --- Tạo hoặc Update Room ---
-            room, is_created = Room.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "room_type": rt,
-                    "capacity": capacity,
-                },
-            )
-
-            # --- 2. Xử lý Capabilities (RoomCapability - Model trung gian) ---
-            # Xóa liên kết cũ của phòng này để cập nhật mới
-            RoomCapability.objects.filter(room=room).delete()
-
-            if group_codes:
-                # Tách chuỗi bằng dấu phẩy
-                for gcode in str(group_codes).split(","):
-                    gcode = gcode.strip()
-                    if not gcode: continue
-                    try:
-                        g = SpecializationGroup.objects.get(code=gcode)
-                        # Tạo record trong bảng trung gian
-                        # Lưu ý: trường trong model bạn là 'group' (không phải specialization_group)
-                        RoomCapability.objects.create(room=room, group=g) 
-                    except SpecializationGroup.DoesNotExist:
-                        errors.append(f"Dòng {idx}: Không tìm thấy Nhóm CM '{gcode}'")
-
-            # --- 3. Xử lý Allowed Majors (Many-to-Many thường) ---
-            major_objs = []
-            if major_codes:
-                for mcode in str(major_codes).split(","):
-                    mcode = mcode.strip()
-                    if not mcode: continue
-                    try:
-                        m = Major.objects.get(code=mcode)
-                        major_objs.append(m)
-                    except Major.DoesNotExist:
-                        errors.append(f"Dòng {idx}: Không tìm thấy Ngành '{mcode}'")
-            
-            # Gán danh sách ngành vào phòng (tự động xóa cũ thay mới)
-            room.allowed_majors.set(major_objs)
-
-            # Đếm kết quả
-            if is_created:
-                created += 1
-            else:
-                updated += 1
 
-        except Exception as e:
-            errors.append(f"Dòng {idx}: Lỗi hệ thống - {str(e)}")
+    Sau khi ghi Phòng theo lô, chỉ ghi phần chênh lệch (bulk insert / delete)
+    vào RoomCapability và bảng trung gian Room.allowed_majors. Liên kết Nhóm CM
+    đã có giữ nguyên (kể cả priority đã chỉnh ở sheet RoomCapabilities).
+    """
+    rows, _, errors, warnings = validate_sheet(_get_ws(file_or_ws), ROOM_SCHEMA)
+    if errors:
+        return 0, 0, errors + warnings
+    if not rows:
+        return 0, 0, warnings
+
+    with transaction.atomic():
+        created, updated, _ = bulk_upsert(ROOM_SCHEMA, rows)
+
+        # bulk_create trên SQLite/MySQL có thể không trả pk -> lấy lại id theo mã
+        room_ids = dict(Room.objects.filter(
+            code__in={r["code"] for r in rows}
+        ).values_list("code", "id"))
+
+        # Dòng sau cùng mã phòng ghi đè dòng trước
+        desired_groups = {room_ids[r["code"]]: r["capabilities"] for r in rows}
+        desired_majors = {room_ids[r["code"]]: r["allowed_majors"] for r in rows}
+
+        _sync_links(RoomCapability, "room_id", "group_id", desired_groups)
+        _sync_links(Room.allowed_majors.through, "room_id", "major_id", desired_majors)
+
+    return created, updated, warnings
+
+
+MAJOR_SCHEMA = SheetSchema(
+    Major,
+    [
+        Column("code"),
+        Column("name", default=""),
+        Column("level_code", field="level", fk=TrainingLevel, label="Bậc đào tạo", required=True),
+        Column("department_code", field="department", fk=Department, label="Khoa", required=True),
+        Column("is_general", type="bool", default=False),
+        Column("total_credits", type="float", default=0, min_value=0),
+        Column("total_semesters", type="int", default=0, min_value=0),
+    ],
+)
 
-    return created, updated, errors
 
 def import_majors_from_excel(file_or_ws):
     """
@@ -538,39 +428,22 @@ def import_majors_from_excel(file_or_ws):
     F: total_credits
     G: total_semesters
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name, level_code, dept_code, is_general, total_credits, total_semesters = row[:7]
-        if not code:
-            continue
-        try:
-            level = TrainingLevel.objects.get(code=str(level_code).strip())
-            dept = Department.objects.get(code=str(dept_code).strip())
-        except (TrainingLevel.DoesNotExist, Department.DoesNotExist) as e:
-            errors.append(f"Dòng {idx}: {e}")
-            continue
-
-        try:
-            obj, is_created = Major.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "level": level,
-                    "department": dept,
-                    "is_general": bool(is_general),
-                    "total_credits": float(total_credits or 0),
-                    "total_semesters": int(total_semesters or 0),
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
+    return import_with_schema(_get_ws(file_or_ws), MAJOR_SCHEMA)
+
+
+INSTRUCTOR_SCHEMA = SheetSchema(
+    Instructor,
+    [
+        Column("code"),
+        Column("name", default=""),
+        Column("department_code", field="department", fk=Department, label="Khoa", required=True),
+        Column("is_leader", type="bool", default=False),
+        Column("teaching_quota", type="float", default=415, min_value=0),
+        Column("admin_quota", type="float", default=480, min_value=0),
+        Column("conversion_ratio", type="float", default=3.2, min_value=0),
+    ],
+    after_write=_bump_semesters_showing(CourseSection, "instructor"),
+)
 
 
 def import_instructors_from_excel(file_or_ws):
@@ -584,91 +457,56 @@ def import_instructors_from_excel(file_or_ws):
     F: admin_quota
     G: conversion_ratio
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name, dept_code, is_leader, tq, aq, ratio = row[:7]
-        if not code:
-            continue
-        try:
-            dept = Department.objects.get(code=str(dept_code).strip())
-        except Department.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Khoa '{dept_code}'")
-            continue
-
-        try:
-            obj, is_created = Instructor.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "department": dept,
-                    "is_leader": bool(is_leader),
-                    "teaching_quota": float(tq or 415),
-                    "admin_quota": float(aq or 480),
-                    "conversion_ratio": float(ratio or 3.2),
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
-
-
-#def import_student_classes_from_excel(file_or_ws):
-    """
-    Sheet StudentClasses:
-    A: code
-    B: name
-    C: size
-    D: major_code
-    E: academic_year_code (Năm nhập học)
-    F: department
-    G: homeroom_teacher_code (Mã GV chủ nhiệm - có thể để trống)
-
-    """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        code, name, size, major_code, year_code, gv_code = row[:6]
-        if not code:
-            continue
-        try:
-            major = Major.objects.get(code=str(major_code).strip())
-            ay = AcademicYear.objects.get(code=str(year_code).strip())
-        except (Major.DoesNotExist, AcademicYear.DoesNotExist) as e:
-            errors.append(f"Dòng {idx}: {e}")
-            continue
+    return import_with_schema(_get_ws(file_or_ws), INSTRUCTOR_SCHEMA)
+
+
+def _finalize_student_classes(rows, line_numbers):
+    """Khoa trống -> lấy Khoa của Ngành (1 query cho cả sheet)."""
+    problems = []
+    major_departments = dict(
+        Major.objects.filter(id__in={r["major_id"] for r in rows if r["major_id"]})
+        .values_list("id", "department_id")
+    )
+    for pos, row in enumerate(rows):
+        if row["department_id"] is None and row["major_id"] is not None:
+            row["department_id"] = major_departments.get(row["major_id"])
+            if row["department_id"] is None:
+                problems.append((
+                    pos,
+                    "Không xác định được Khoa cho lớp (department trống & major không có department).",
+                    False,
+                ))
+    return problems
+
+
+def _refresh_class_sections(classes):
+    """
+    Sĩ số / Khoa của lớp đổi -> tính lại tổng sĩ số, Khoa của các Lớp HP có lớp đó;
+    mã / tên lớp hiện trong ô TKB -> tăng data_version các học kỳ có lớp.
+    """
+    refresh_section_rollups(
+        CourseSection.classes.through.objects.filter(
+            studentclass_id__in=[c.pk for c in classes],
+        ).values_list("coursesection_id", flat=True)
+    )
+    _bump_semesters_showing(CourseSection, "classes")(classes)
+
+
+STUDENT_CLASS_SCHEMA = SheetSchema(
+    StudentClass,
+    [
+        Column("code"),
+        Column("name", default=lambda row: row["code"]),
+        Column("size", type="int", default=0, min_value=0),
+        Column("major_code", field="major", fk=Major, label="Ngành", required=True),
+        Column("academic_year_code", field="academic_year", fk=AcademicYear, label="Năm học", required=True),
+        Column("department_code", field="department", fk=Department, label="Khoa"),
+        Column("homeroom_teacher_code", field="homeroom_teacher", fk=Instructor, label="GV (GVCN)", lenient=True),
+    ],
+    finalize=_finalize_student_classes,
+    after_write=_refresh_class_sections,
+)
 
-        homeroom = None
-        if gv_code:
-            try:
-                homeroom = Instructor.objects.get(code=str(gv_code).strip())
-            except Instructor.DoesNotExist:
-                errors.append(f"Dòng {idx}: Không tìm thấy GV '{gv_code}' (GVCN), bỏ qua GVCN")
-
-        try:
-            obj, is_created = StudentClass.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "size": int(size or 0),
-                    "major": major,
-                    "academic_year": ay,
-                    "homeroom_teacher": homeroom,
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-    return created, updated, errors
 
 def import_student_classes_from_excel(file_or_ws):
     """
@@ -678,169 +516,41 @@ def import_student_classes_from_excel(file_or_ws):
     C: size
     D: major_code
     E: academic_year_code (Năm nhập học)
-    F: department_code      <-- mới: đọc cột khoa
+    F: department_code      (trống -> dùng Khoa của Ngành)
     G: homeroom_teacher_code (Mã GV chủ nhiệm - có thể để trống)
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-
-    # Kiểm tra StudentClass có field 'department' không (để set vào defaults)
-    has_department_fk = "department" in {f.name for f in StudentClass._meta.get_fields()}
-
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        # Lấy đúng 7 cột theo thứ tự A..G
-        row = list(row[:7]) + [None] * 7
-        code, name, size, major_code, year_code, dept_code, gv_code = row[:7]
-
-        if not code:
-            continue
-
-        try:
-            major = Major.objects.get(code=str(major_code).strip())
-        except Major.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Ngành '{major_code}'")
-            continue
+    return import_with_schema(_get_ws(file_or_ws), STUDENT_CLASS_SCHEMA)
+
+
+# Loại môn: ngoài các mã trong Subject.SUBJECT_TYPE_CHOICES, dữ liệu đang dùng còn có "LT" (Lý thuyết)
+SUBJECT_TYPE_CODES = [code for code, _ in Subject.SUBJECT_TYPE_CHOICES] + ["LT"]
+
+SUBJECT_SCHEMA = SheetSchema(
+    Subject,
+    [
+        Column("code"),
+        Column("name", default=""),
+        Column("major_code", field="major", fk=Major, label="Ngành"),
+        Column("managing_department_code", field="managing_department", fk=Department, label="Khoa"),
+        Column("subject_type", choices=SUBJECT_TYPE_CODES, default="KHAC"),
+        Column("total_periods", type="float", default=0, min_value=0),
+        Column("max_class_size", type="int", default=35, min_value=1),
+        Column("required_room_type_code", field="required_room_type", fk=RoomType, label="Loại phòng"),
+        Column("specialization_group_code", field="specialization_group", fk=SpecializationGroup, label="Nhóm CM"),
+        Column("is_external_managed", type="bool", default=False),
+        # Hình thức thi ghi tự do (TN, TL, BTL, Viết...); trống -> dùng loại môn
+        Column(
+            "exam_form", max_length=Subject._meta.get_field("exam_form").max_length,
+            default=lambda row: row["subject_type"],
+        ),
+        Column("has_separate_marking", type="bool", default=False),
+        Column("semester_number", type="int", min_value=1, max_value=5, lenient=True),
+    ],
+    after_write=_bump_semesters_showing(CourseSection, "subject"),
+)
 
-        try:
-            ay = AcademicYear.objects.get(code=str(year_code).strip())
-        except AcademicYear.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Năm học '{year_code}'")
-            continue
 
-        # Department: đọc từ cột F; nếu không có, fallback major.department (nếu model có FK này)
-        department = None
-        if has_department_fk:
-            if dept_code:
-                try:
-                    department = Department.objects.get(code=str(dept_code).strip())
-                except Department.DoesNotExist:
-                    errors.append(f"Dòng {idx}: Không tìm thấy Khoa '{dept_code}'")
-            if department is None:
-                department = getattr(major, "department", None)
-                if department is None:
-                    errors.append(f"Dòng {idx}: Không xác định được Khoa cho lớp (department trống & major không có department). Bỏ qua dòng.")
-                    continue
-
-        # GVCN (tùy chọn)
-        homeroom = None
-        if gv_code:
-            try:
-                homeroom = Instructor.objects.get(code=str(gv_code).strip())
-            except Instructor.DoesNotExist:
-                errors.append(f"Dòng {idx}: Không tìm thấy GV '{gv_code}' (GVCN), bỏ qua GVCN")
-
-        try:
-            obj, is_created = StudentClass.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else str(code).strip(),
-                    "size": int(float(size or 0)),
-                    "major": major,
-                    "academic_year": ay,
-                    "homeroom_teacher": homeroom,
-                    **({"department": department} if has_department_fk else {}),
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
-
-    return created, updated, errors
-
-# def import_subjects_from_excel(file_or_ws):
-#     """
-#     Sheet Subjects (đÃ CHỈNH THEO MODEL Subject MỚI):
-
-#     A: code
-#     B: name
-#     C: major_code
-#     D: managing_department_code
-#     E: subject_type              (TN/TL/TH/BC/KHAC)
-#     F: total_periods
-#     G: max_class_size
-#     H: required_room_type_code
-#     I: specialization_group_code
-#     J: is_external_managed       (1/0)
-#     K: exam_form                 (TN/TL/TH/BC/KHAC, nếu trống dùng subject_type)
-#     L: has_separate_marking      (1/0)
-#     """
-#     ws = _get_ws(file_or_ws)
-#     created = updated = 0
-#     errors = []
-
-#     for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-#         (
-#             code, name, major_code, dept_code,
-#             subject_type, total_periods, max_class_size,
-#             rt_code, group_code,
-#             is_external_managed, exam_form, has_separate_marking,
-#         ) = row[:12]
-
-#         if not code:
-#             continue
-
-#         major = None
-#         if major_code:
-#             try:
-#                 major = Major.objects.get(code=str(major_code).strip())
-#             except Major.DoesNotExist:
-#                 errors.append(f"Dòng {idx}: Không tìm thấy Ngành '{major_code}'")
-
-#         managing_dept = None
-#         if dept_code:
-#             try:
-#                 managing_dept = Department.objects.get(code=str(dept_code).strip())
-#             except Department.DoesNotExist:
-#                 errors.append(f"Dòng {idx}: Không tìm thấy Khoa '{dept_code}'")
-
-#         rt = None
-#         if rt_code:
-#             try:
-#                 rt = RoomType.objects.get(code=str(rt_code).strip())
-#             except RoomType.DoesNotExist:
-#                 errors.append(f"Dòng {idx}: Không tìm thấy Loại phòng '{rt_code}'")
-
-#         group = None
-#         if group_code:
-#             try:
-#                 group = SpecializationGroup.objects.get(code=str(group_code).strip())
-#             except SpecializationGroup.DoesNotExist:
-#                 errors.append(f"Dòng {idx}: Không tìm thấy Nhóm CM '{group_code}'")
-
-#         subject_type = (subject_type or "").strip() or "KHAC"
-#         exam_form = (exam_form or "").strip() or subject_type
-
-#         try:
-#             obj, is_created = Subject.objects.update_or_create(
-#                 code=str(code).strip(),
-#                 defaults={
-#                     "name": str(name).strip() if name else "",
-#                     "major": major,
-#                     "managing_department": managing_dept,
-#                     "subject_type": subject_type,
-#                     "total_periods": float(total_periods or 0),
-#                     "max_class_size": int(max_class_size or 35),
-#                     "required_room_type": rt,
-#                     "specialization_group": group,
-#                     "is_external_managed": bool(is_external_managed),
-#                     "exam_form": exam_form,
-#                     "has_separate_marking": bool(has_separate_marking),
-#                 },
-#             )
-#             if is_created:
-#                 created += 1
-#             else:
-#                 updated += 1
-#         except Exception as e:
-#             errors.append(f"Dòng {idx}: {e}")
-
-#     return created, updated, errors
-
-def import_subjects_from_excel(file_or_ws): 
+def import_subjects_from_excel(file_or_ws):
     """
     Sheet Subjects (đÃ CHỈNH THEO MODEL Subject MỚI):
 
@@ -848,103 +558,30 @@ def import_subjects_from_excel(file_or_ws):
     B: name
     C: major_code
     D: managing_department_code
-    E: subject_type              (TN/TL/TH/BC/KHAC)
+    E: subject_type              (TN/TL/TH/BC/KHAC/LT)
     F: total_periods
     G: max_class_size
     H: required_room_type_code
     I: specialization_group_code
     J: is_external_managed       (1/0)
-    K: exam_form                 (TN/TL/TH/BC/KHAC, nếu trống dùng subject_type)
+    K: exam_form                 (tối đa 10 ký tự, VD TN/TL/BTL/Viết; nếu trống dùng subject_type)
     L: has_separate_marking      (1/0)
-    M: semester_number           (1..5)  <-- mới, tùy chọn
+    M: semester_number           (1..5, tùy chọn)
     """
-    ws = _get_ws(file_or_ws)
-    created = updated = 0
-    errors = []
-
-    for idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        # đọc tối đa 13 cột (A..M)
-        values = list(row[:13]) + [None] * (13 - len(row[:13]))
-        (
-            code, name, major_code, dept_code,
-            subject_type, total_periods, max_class_size,
-            rt_code, group_code,
-            is_external_managed, exam_form, has_separate_marking,
-            semester_number,   # <-- cột mới
-        ) = values
-
-        if not code:
-            continue
+    return import_with_schema(_get_ws(file_or_ws), SUBJECT_SCHEMA)
 
-        major = None
-        if major_code:
-            try:
-                major = Major.objects.get(code=str(major_code).strip())
-            except Major.DoesNotExist:
-                errors.append(f"Dòng {idx}: Không tìm thấy Ngành '{major_code}'")
-
-        managing_dept = None
-        if dept_code:
-            try:
-                managing_dept = Department.objects.get(code=str(dept_code).strip())
-            except Department.DoesNotExist:
-                errors.append(f"Dòng {idx}: Không tìm thấy Khoa '{dept_code}'")
-
-        rt = None
-        if rt_code:
-            try:
-                rt = RoomType.objects.get(code=str(rt_code).strip())
-            except RoomType.DoesNotExist:
-                errors.append(f"Dòng {idx}: Không tìm thấy Loại phòng '{rt_code}'")
-
-        group = None
-        if group_code:
-            try:
-                group = SpecializationGroup.objects.get(code=str(group_code).strip())
-            except SpecializationGroup.DoesNotExist:
-                errors.append(f"Dòng {idx}: Không tìm thấy Nhóm CM '{group_code}'")
-
-        subject_type = (subject_type or "").strip() or "KHAC"
-        exam_form = (exam_form or "").strip() or subject_type
-
-        # chuyển semester_number -> int trong khoảng 1..5 (nếu có)
-        sem_no = None
-        if semester_number not in (None, ""):
-            try:
-                sem_no = int(float(semester_number))
-                if not (1 <= sem_no <= 5):
-                    errors.append(f"Dòng {idx}: semester_number='{semester_number}' không nằm trong khoảng 1..5 → bỏ qua.")
-                    sem_no = None
-            except Exception:
-                errors.append(f"Dòng {idx}: semester_number='{semester_number}' không hợp lệ → bỏ qua.")
-                sem_no = None
-
-        try:
-            obj, is_created = Subject.objects.update_or_create(
-                code=str(code).strip(),
-                defaults={
-                    "name": str(name).strip() if name else "",
-                    "major": major,
-                    "managing_department": managing_dept,
-                    "subject_type": subject_type,
-                    "total_periods": float(total_periods or 0),
-                    "max_class_size": int(max_class_size or 35),
-                    "required_room_type": rt,
-                    "specialization_group": group,
-                    "is_external_managed": bool(is_external_managed),
-                    "exam_form": exam_form,
-                    "has_separate_marking": bool(has_separate_marking),
-                    "semester_number": sem_no,   # <-- lưu vào model
-                },
-            )
-            if is_created:
-                created += 1
-            else:
-                updated += 1
-        except Exception as e:
-            errors.append(f"Dòng {idx}: {e}")
 
-    return created, updated, errors
+ROOM_CAPABILITY_SCHEMA = SheetSchema(
+    RoomCapability,
+    [
+        Column("room_code", field="room", fk=Room, label="Phòng mã", required=True),
+        Column("group_code", field="group", fk=SpecializationGroup, label="Nhóm CM mã", required=True),
+        # Mức ưu tiên sai hoặc trống -> 1
+        Column("priority", type="int", choices=[1, 2, 3], default=1, lenient=True),
+    ],
+    key=("room", "group"),
+    skip_unless=("room_code", "group_code"),
+)
 
 
 def import_room_capabilities_from_excel(file_or_ws):
@@ -955,66 +592,211 @@ def import_room_capabilities_from_excel(file_or_ws):
     B: group_code (Mã nhóm CM)
     C: priority (Mức ưu tiên: 1, 2, 3 - Mặc định là 1)
     """
-    ws = _get_ws(file_or_ws) # Hàm helper lấy worksheet
-    created = updated = 0
-    errors = []
-
-    # Duyệt từ dòng 2, đọc 3 cột đầu tiên
-    for idx, row in enumerate(ws.iter_rows(min_row=2, max_col=3, values_only=True), start=2):
-        # Đảm bảo row có đủ độ dài để tránh lỗi index
-        row = list(row) + [None] * (3 - len(row))
-        
-        r_code, g_code, priority_val = row
-
-        # Nếu thiếu mã phòng hoặc mã nhóm thì bỏ qua
-        if not r_code or not g_code:
-            continue
-
-        # 1. Tìm Phòng (Room)
-        try:
-            room_obj = Room.objects.get(code=str(r_code).strip())
-        except Room.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Phòng mã '{r_code}'")
-            continue
+    return import_with_schema(_get_ws(file_or_ws), ROOM_CAPABILITY_SCHEMA)
+
+
+def _semester_map(rows):
+    """{(academic_year_id, mã HK): semester_id} cho các dòng của sheet (1 query)."""
+    return {
+        (ay_id, code): sem_id
+        for ay_id, code, sem_id in Semester.objects.filter(
+            academic_year_id__in={r["academic_year_code"] for r in rows if r["academic_year_code"]},
+            code__in={r["semester_code"] for r in rows},
+        ).values_list("academic_year_id", "code", "id")
+    }
+
+
+def _finalize_course_sections(rows, line_numbers):
+    """Tra Học kỳ theo (Năm học, mã HK)."""
+    problems = []
+    semester_map = _semester_map(rows)
+    for pos, row in enumerate(rows):
+        if row["academic_year_code"] is None:
+            continue  # đã báo lỗi ở cột Năm học
+        row["semester_id"] = semester_map.get((row["academic_year_code"], row["semester_code"]))
+        if row["semester_id"] is None:
+            problems.append((pos, f"Không tìm thấy Học kỳ '{row['semester_code']}' trong Năm học", False))
+    return problems
+
+
+COURSE_SECTION_SCHEMA = SheetSchema(
+    CourseSection,
+    [
+        Column("academic_year_code", field=None, fk=AcademicYear, label="Năm học", required=True),
+        Column("semester_code", field=None, required=True),
+        Column("code", required=True),
+        Column("subject_code", field="subject", fk=Subject, label="Môn", required=True),
+        Column("class_codes", type="codes", field=None, fk=StudentClass, label="Lớp"),
+        Column("instructor_code", field="instructor", fk=Instructor, label="GV"),
+        Column("planned_periods", type="float", min_value=0),
+        Column("start_week", type="int", min_value=1),
+        Column("week_count", type="int", min_value=1),
+        Column("sessions_per_week", type="int", default=1, min_value=1),
+        Column("is_locked", type="bool", default=False),
+        Column("note", default=""),
+    ],
+    key=("semester", "code"),
+    skip_unless=("academic_year_code", "semester_code", "code"),
+    finalize=_finalize_course_sections,
+    computed=("semester",),
+)
 
-        # 2. Tìm Nhóm chuyên môn (SpecializationGroup)
-        try:
-            group_obj = SpecializationGroup.objects.get(code=str(g_code).strip())
-        except SpecializationGroup.DoesNotExist:
-            errors.append(f"Dòng {idx}: Không tìm thấy Nhóm CM mã '{g_code}'")
-            continue
 
-        # 3. Xử lý Mức ưu tiên (Priority)
-        # Mặc định là 1 nếu dữ liệu lỗi hoặc trống
-        try:
-            p = int(priority_val) if priority_val else 1
-            if p not in [1, 2, 3]: # Nếu nhập số khác 1,2,3 thì ép về 1
-                p = 1
-        except ValueError:
-            p = 1
-
-        try:
-            # 4. Lưu vào Database
-            # Dùng update_or_create dựa trên cặp khóa (room, group)
-            # Nếu đã tồn tại cặp này -> cập nhật priority
-            # Nếu chưa -> tạo mới
-            cap, is_created = RoomCapability.objects.update_or_create(
-                room=room_obj,
-                group=group_obj,
-                defaults={
-                    "priority": p
-                }
-            )
-
-            if is_created:
-                created += 1
+def import_course_sections_from_excel(file_or_ws):
+    """
+    Sheet CourseSections (đúng layout file export):
+    A: academic_year_code
+    B: semester_code       (VD: HK1)
+    C: code                (Mã Lớp HP, duy nhất trong Học kỳ)
+    D: subject_code
+    E: class_codes         (mã Lớp SV, cách nhau dấu phẩy)
+    F: instructor_code
+    G: planned_periods
+    H: start_week
+    I: week_count
+    J: sessions_per_week
+    K: is_locked (1/0)
+    L: note
+    """
+    rows, _, errors, warnings = validate_sheet(_get_ws(file_or_ws), COURSE_SECTION_SCHEMA)
+    if errors:
+        return 0, 0, errors + warnings
+    if not rows:
+        return 0, 0, warnings
+
+    with transaction.atomic():
+        created, updated, _ = bulk_upsert(COURSE_SECTION_SCHEMA, rows)
+
+        section_ids = {
+            (sem_id, code): pk
+            for sem_id, code, pk in CourseSection.objects.filter(
+                semester_id__in={r["semester_id"] for r in rows},
+                code__in={r["code"] for r in rows},
+            ).values_list("semester_id", "code", "id")
+        }
+        _sync_links(
+            CourseSection.classes.through, "coursesection_id", "studentclass_id",
+            {section_ids[(r["semester_id"], r["code"])]: r["class_codes"] for r in rows},
+        )
+        refresh_section_rollups(section_ids.values())
+        # bulk_create/bulk_update không phát signal -> tự đánh dấu TKB học kỳ đã đổi
+        bump_semester_data_version({r["semester_id"] for r in rows})
+
+    return created, updated, warnings
+
+
+def _finalize_teaching_slots(rows, line_numbers):
+    """Tra Lớp HP theo (Học kỳ, mã Lớp HP) và đổi số tuần -> SemesterWeek id."""
+    problems = []
+    semester_map = _semester_map(rows)
+    for row in rows:
+        row["semester_id"] = semester_map.get((row["academic_year_code"], row["semester_code"]))
+
+    semester_ids = {r["semester_id"] for r in rows if r["semester_id"]}
+    section_map = {
+        (sem_id, code): pk
+        for sem_id, code, pk in CourseSection.objects.filter(
+            semester_id__in=semester_ids, code__in={r["section_code"] for r in rows},
+        ).values_list("semester_id", "code", "id")
+    }
+    week_map = {
+        (sem_id, index): pk
+        for sem_id, index, pk in SemesterWeek.objects.filter(
+            semester_id__in=semester_ids
+        ).values_list("semester_id", "index", "id")
+    }
+
+    for pos, row in enumerate(rows):
+        if row["academic_year_code"] is None:
+            continue  # đã báo lỗi ở cột Năm học
+        if row["semester_id"] is None:
+            problems.append((pos, f"Không tìm thấy Học kỳ '{row['semester_code']}' trong Năm học", False))
+            continue
+
+        row["course_section_id"] = section_map.get((row["semester_id"], row["section_code"]))
+        if row["course_section_id"] is None:
+            problems.append((pos, f"Không tìm thấy Lớp HP '{row['section_code']}'", False))
+
+        if row["end_period"] is not None and row["start_period"] is not None \
+                and row["end_period"] < row["start_period"]:
+            problems.append((pos, "end_period phải >= start_period", False))
+
+        week_ids = set()
+        for index in row["weeks"]:
+            week_id = week_map.get((row["semester_id"], index))
+            if week_id is None:
+                problems.append((pos, f"Học kỳ không có Tuần {index}", False))
             else:
-                updated += 1
+                week_ids.add(week_id)
+        row["week_ids"] = week_ids
+    return problems
+
+
+TEACHING_SLOT_SCHEMA = SheetSchema(
+    TeachingSlot,
+    [
+        Column("academic_year_code", field=None, fk=AcademicYear, label="Năm học", required=True),
+        Column("semester_code", field=None, required=True),
+        Column("section_code", field=None, required=True),
+        Column("day_of_week", type="int", min_value=1, max_value=7, required=True),
+        Column("start_period", type="int", min_value=1, required=True),
+        Column("end_period", type="int", min_value=1, required=True),
+        Column("room_code", field="room", fk=Room, label="Phòng"),
+        Column("weeks", type="weeks"),
+        Column("method", default=""),
+        Column("is_locked", type="bool", default=False),
+    ],
+    key=("course_section", "day_of_week", "start_period"),
+    skip_unless=("academic_year_code", "semester_code", "section_code"),
+    finalize=_finalize_teaching_slots,
+    computed=("course_section", "semester"),
+)
+
+
+def import_teaching_slots_from_excel(file_or_ws):
+    """
+    Sheet TeachingSlots (đúng layout file export):
+    A: academic_year_code
+    B: semester_code
+    C: section_code        (Mã Lớp HP)
+    D: day_of_week         (1=Thứ 2 ... 7=CN)
+    E: start_period
+    F: end_period
+    G: room_code
+    H: weeks               (VD: 1-8, 10, 12-15)
+    I: method
+    J: is_locked (1/0)
+
+    1 buổi được xác định bởi (Lớp HP, Thứ, Tiết bắt đầu): đã có thì cập nhật.
+    """
+    rows, _, errors, warnings = validate_sheet(_get_ws(file_or_ws), TEACHING_SLOT_SCHEMA)
+    if errors:
+        return 0, 0, errors + warnings
+    if not rows:
+        return 0, 0, warnings
+
+    with transaction.atomic():
+        created, updated, _ = bulk_upsert(TEACHING_SLOT_SCHEMA, rows)
+
+        slot_ids = {
+            (section_id, day, start): pk
+            for pk, section_id, day, start in TeachingSlot.objects.filter(
+                course_section_id__in={r["course_section_id"] for r in rows}
+            ).values_list("id", "course_section_id", "day_of_week", "start_period")
+        }
+        _sync_links(
+            TeachingSlot.weeks.through, "teachingslot_id", "semesterweek_id",
+            {
+                slot_ids[(r["course_section_id"], r["day_of_week"], r["start_period"])]: r["week_ids"]
+                for r in rows
+            },
+        )
+        refresh_weeks_mask(slot_ids.values())
+        bump_semester_data_version({r["semester_id"] for r in rows})
+
+    return created, updated, warnings
 
-        except Exception as e:
-            errors.append(f"Dòng {idx}: Lỗi hệ thống - {str(e)}")
 
-    return created, updated, errors
 # =============== IMPORT ALL TỪ 1 FILE NHIỀU SHEET ===============
 
 def import_all_from_excel(file):
@@ -1027,31 +809,18 @@ def import_all_from_excel(file):
       4. Semesters
       5. RoomTypes
       6. SpecializationGroups
-      7. Rooms
-      8. Majors
+      7. Majors   (trước Rooms vì Rooms tham chiếu allowed_majors)
+      8. Rooms
       9. Instructors
       10. StudentClasses
       11. Subjects
     """
     wb = load_workbook(file, data_only=True)
 
-    sheet_importers = [
-        ("Departments",          import_departments_from_excel),
-        ("TrainingLevels",       import_training_levels_from_excel),
-        ("AcademicYears",        import_academic_years_from_excel),
-        ("Semesters",            import_semesters_from_excel),
-        ("RoomTypes",            import_roomtypes_from_excel),
-        ("SpecializationGroups", import_specialization_groups_from_excel),
-        ("Rooms",                import_rooms_from_excel),
-        ("Majors",               import_majors_from_excel),
-        ("Instructors",          import_instructors_from_excel),
-        ("StudentClasses",       import_student_classes_from_excel),
-        ("Subjects",             import_subjects_from_excel),
-    ]
-
     overall_result = {}
 
-    for sheet_name, importer in sheet_importers:
+    for sheet_name, data_type in ALL_SHEETS:
+        importer = IMPORT_CONFIG[data_type]["function"]
         if sheet_name not in wb.sheetnames:
             overall_result[sheet_name] = {
                 "created": 0,
@@ -1070,3 +839,136 @@ def import_all_from_excel(file):
         }
 
     return overall_result
+
+
+# =============== CẤU HÌNH CÁC LOẠI DỮ LIỆU IMPORT ===============
+
+IMPORT_CONFIG = {
+    "departments": {
+        "label": "Khoa (Department)",
+        "function": import_departments_from_excel,
+        "schema": DEPARTMENT_SCHEMA,
+        "columns": DEPARTMENT_SCHEMA.column_names,
+        "description": "Danh sách Khoa quản lý.",
+    },
+    "training_levels": {
+        "label": "Bậc đào tạo (TrainingLevel)",
+        "function": import_training_levels_from_excel,
+        "schema": TRAINING_LEVEL_SCHEMA,
+        "columns": TRAINING_LEVEL_SCHEMA.column_names,
+        "description": "VD: Cao đẳng, Trung cấp...",
+    },
+    "academic_years": {
+        "label": "Năm học (AcademicYear)",
+        "function": import_academic_years_from_excel,
+        "schema": ACADEMIC_YEAR_SCHEMA,
+        "columns": ACADEMIC_YEAR_SCHEMA.column_names,
+        "description": "VD: 2025, 2025-2026...",
+    },
+    "semesters": {
+        "label": "Học kỳ (Semester)",
+        "function": import_semesters_from_excel,
+        "schema": SEMESTER_SCHEMA,
+        "columns": SEMESTER_SCHEMA.column_names,
+        "description": "HK1, HK2... với ngày bắt đầu & số tuần.",
+    },
+    "room_types": {
+        "label": "Loại phòng (RoomType)",
+        "function": import_roomtypes_from_excel,
+        "schema": ROOM_TYPE_SCHEMA,
+        "columns": ROOM_TYPE_SCHEMA.column_names,
+        "description": "LT, TH, ONLINE, SÂN...",
+    },
+    "specialization_groups": {
+        "label": "Nhóm chuyên môn (SpecializationGroup)",
+        "function": import_specialization_groups_from_excel,
+        "schema": SPECIALIZATION_GROUP_SCHEMA,
+        "columns": SPECIALIZATION_GROUP_SCHEMA.column_names,
+        "description": "Nhóm ngành, nhóm môn thực hành...",
+    },
+    "room_capabilities": {
+        "label": "Khả năng chuyên môn chi tiết (RoomCapability)",
+        "function": import_room_capabilities_from_excel,
+        "schema": ROOM_CAPABILITY_SCHEMA,
+        "columns": ROOM_CAPABILITY_SCHEMA.column_names,
+        "description": "Cập nhật mức ưu tiên (1-3) cho cặp Phòng - Nhóm CM.",
+    },
+    "rooms": {
+        "label": "Phòng học (Room)",
+        "function": import_rooms_from_excel,
+        "schema": ROOM_SCHEMA,
+        "columns": ROOM_SCHEMA.column_names,
+        "description": "Phòng Lý thuyết / Thực hành / Online...",
+    },
+    "majors": {
+        "label": "Ngành (Major)",
+        "function": import_majors_from_excel,
+        "schema": MAJOR_SCHEMA,
+        "columns": MAJOR_SCHEMA.column_names,
+        "description": "Ngành Cao đẳng/Trung cấp CNTT...",
+    },
+    "instructors": {
+        "label": "Giảng viên (Instructor)",
+        "function": import_instructors_from_excel,
+        "schema": INSTRUCTOR_SCHEMA,
+        "columns": INSTRUCTOR_SCHEMA.column_names,
+        "description": "Danh sách Giảng viên khoa.",
+    },
+    "student_classes": {
+        "label": "Lớp sinh viên (StudentClass)",
+        "function": import_student_classes_from_excel,
+        "schema": STUDENT_CLASS_SCHEMA,
+        "columns": STUDENT_CLASS_SCHEMA.column_names,
+        "description": "Các lớp K25..., sĩ số, GVCN...",
+    },
+    "subjects": {
+        "label": "Môn học (Subject)",
+        "function": import_subjects_from_excel,
+        "schema": SUBJECT_SCHEMA,
+        "columns": SUBJECT_SCHEMA.column_names,
+        "description": "Danh mục môn dùng để xếp TKB.",
+    },
+    "curriculums": {
+        "label": "Chương trình đào tạo (Curriculum)",
+        "function": import_curriculums_from_excel,
+        "schema": CURRICULUM_SCHEMA,
+        "columns": CURRICULUM_SCHEMA.column_names,
+        "description": "Mỗi Ngành + Khoá tuyển tạo 1 Curriculum.",
+    },
+    "curriculum_subjects": {
+        "label": "Môn trong CTĐT (CurriculumSubject)",
+        "function": import_curriculum_subjects_from_excel,
+        "schema": CURRICULUM_SUBJECT_SCHEMA,
+        "columns": CURRICULUM_SUBJECT_SCHEMA.column_names,
+        "description": "Gán Môn vào từng CTĐT, học kỳ, tự chọn/BB, số tiết.",
+    },
+    "course_sections": {
+        "label": "Lớp học phần (CourseSection)",
+        "function": import_course_sections_from_excel,
+        "schema": COURSE_SECTION_SCHEMA,
+        "columns": COURSE_SECTION_SCHEMA.column_names,
+        "description": "Lớp HP theo Học kỳ: môn, lớp SV, GV, số tiết, tuần bắt đầu...",
+    },
+    "teaching_slots": {
+        "label": "Buổi học trong TKB (TeachingSlot)",
+        "function": import_teaching_slots_from_excel,
+        "schema": TEACHING_SLOT_SCHEMA,
+        "columns": TEACHING_SLOT_SCHEMA.column_names,
+        "description": "Thứ, tiết, phòng và các tuần học của từng Lớp HP.",
+    },
+}
+
+# Thứ tự sheet khi import 1 file nhiều sheet (phụ thuộc FK): (tên sheet, loại dữ liệu)
+ALL_SHEETS = [
+    ("Departments",          "departments"),
+    ("TrainingLevels",       "training_levels"),
+    ("AcademicYears",        "academic_years"),
+    ("Semesters",            "semesters"),
+    ("RoomTypes",            "room_types"),
+    ("SpecializationGroups", "specialization_groups"),
+    ("Majors",               "majors"),
+    ("Rooms",                "rooms"),
+    ("Instructors",          "instructors"),
+    ("StudentClasses",       "student_classes"),
+    ("Subjects",             "subjects"),
+]
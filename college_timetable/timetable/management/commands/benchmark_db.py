@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from timetable.db_services import database_profile_info, run_benchmark
+from timetable.models import Semester
+
+
+class Command(BaseCommand):
+    help = (
+        "Đo hiệu năng các tải điển hình (kiểm tra trùng lịch, API, export, nhiều người đọc "
+        "khi đang ghi) trên hồ sơ CSDL hiện tại (TIMETABLE_DB_PROFILE). "
+        "Báo lỗi nếu có truy vấn gặp 'database is locked'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("semester_id", type=int, help="ID Học kỳ dùng làm dữ liệu đo")
+        parser.add_argument("--repeat", type=int, default=3, help="Số lần lặp mỗi tải")
+        parser.add_argument("--readers", type=int, default=4, help="Số thread đọc đồng thời")
+        parser.add_argument("--writers", type=int, default=2, help="Số transaction ghi chen vào")
+        parser.add_argument("--hold", type=float, default=0.5, help="Số giây mỗi transaction ghi giữ khoá")
+
+    def handle(self, *args, **options):
+        semester = Semester.objects.select_related("academic_year").filter(pk=options["semester_id"]).first()
+        if semester is None:
+            raise CommandError(f"Không tìm thấy Học kỳ id={options['semester_id']}")
+
+        info = database_profile_info()
+        self.stdout.write(
+            f"Hồ sơ: {info['profile']} ({info['vendor']}), CONN_MAX_AGE={info['conn_max_age']}; "
+            + ", ".join(f"{k}={v}" for k, v in info["settings"].items())
+        )
+
+        results = run_benchmark(
+            semester,
+            repeat=max(1, options["repeat"]),
+            readers=options["readers"],
+            writers=options["writers"],
+            hold=options["hold"],
+        )
+        for r in results:
+            self.stdout.write(f"{r['label']:<45} {r['seconds'] * 1000:10.1f} ms   {r['detail']}")
+
+        locked = sum(r.get("locked", 0) for r in results)
+        if locked:
+            raise CommandError(f"{locked} truy vấn gặp lỗi khoá CSDL")
+        self.stdout.write(self.style.SUCCESS(f"{semester}: xong, không có lỗi khoá CSDL"))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timetable.conflict_services import CONFLICT_KINDS, find_semester_conflicts, summarize_conflicts
+from timetable.models import Semester
+
+
+class Command(BaseCommand):
+    help = "Kiểm tra trùng lịch Phòng / Lớp SV / GV của cả học kỳ (1 lượt quét)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("semester_id", type=int, help="ID Học kỳ")
+        parser.add_argument("--limit", type=int, default=50, help="Số cặp trùng in ra tối đa (0 = tất cả)")
+
+    def handle(self, *args, **options):
+        semester = Semester.objects.select_related("academic_year").filter(pk=options["semester_id"]).first()
+        if semester is None:
+            raise CommandError(f"Không tìm thấy Học kỳ id={options['semester_id']}")
+
+        started = time.perf_counter()
+        conflicts = find_semester_conflicts(semester)
+        elapsed = time.perf_counter() - started
+
+        limit = options["limit"] or len(conflicts)
+        for c in conflicts[:limit]:
+            self.stdout.write(
+                f"[{c['kind_label']}] {c['entity']} - {c['day_label']} tiết {c['from_period']}–{c['to_period']} "
+                f"tuần {c['weeks_label']}: {c['slot_a']['section_code']} / {c['slot_b']['section_code']}"
+            )
+        if len(conflicts) > limit:
+            self.stdout.write(f"... và {len(conflicts) - limit} cặp khác")
+
+        counts = summarize_conflicts(conflicts)
+        summary = ", ".join(f"{label}: {counts[kind]}" for kind, label in CONFLICT_KINDS.items())
+        style = self.style.ERROR if conflicts else self.style.SUCCESS
+        self.stdout.write(style(f"{semester}: {len(conflicts)} cặp trùng lịch ({summary}) - {elapsed:.3f}s"))
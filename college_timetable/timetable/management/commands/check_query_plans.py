@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from timetable.query_plan_services import explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN các truy vấn nóng của engine xếp TKB; báo lỗi (exit code 1) nếu truy vấn nào "
+        "quét toàn bảng, tức là thiếu index ghép tương ứng (chạy trên DB thật; kiểm tra tự động "
+        "nằm ở timetable.tests.HotQueryPlanTests)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verbose-plan", action="store_true", help="In đầy đủ kế hoạch truy vấn")
+
+    def handle(self, *args, **options):
+        results = explain_hot_queries()
+        if results and results[0]["full_scans"] is None:
+            raise CommandError(f"Chưa hỗ trợ đọc kế hoạch truy vấn của DB '{connection.vendor}'")
+
+        failed = []
+        for r in results:
+            if r["full_scans"]:
+                failed.append(r["name"])
+                self.stdout.write(self.style.ERROR(f"[QUÉT TOÀN BẢNG] {r['name']}: {r['label']}"))
+                for line in r["full_scans"]:
+                    self.stdout.write(f"    {line}")
+            elif not r["uses_index"]:
+                self.stdout.write(self.style.WARNING(
+                    f"[KHÁC INDEX] {r['name']}: {r['label']} (không dùng {r['index']})"
+                ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[OK] {r['name']}: {r['label']}"))
+            if options["verbose_plan"]:
+                for line in r["plan"].splitlines():
+                    self.stdout.write(f"    | {line}")
+
+        if failed:
+            raise CommandError(f"{len(failed)} truy vấn nóng quét toàn bảng: {', '.join(failed)}")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} truy vấn nóng đều dùng index ({connection.vendor})"))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timetable.models import Department, Semester
+from timetable.pdf_render import PdfUnavailable
+from timetable.pdf_services import DEFAULT_WORKERS, build_department_pdf_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Xuất PDF TKB của mọi Lớp SV / Phòng / GV thuộc 1 Khoa trong học kỳ "
+        "(vẽ song song nhiều process) và gom vào 1 file zip."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("semester_id", type=int, help="ID Học kỳ")
+        parser.add_argument("--department", required=True, help="Mã Khoa")
+        parser.add_argument("--out", help="File zip đích (mặc định TKB_<Khoa>_<Học kỳ>.zip)")
+        parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Số process vẽ song song")
+
+    def handle(self, *args, **options):
+        semester = Semester.objects.select_related("academic_year").filter(pk=options["semester_id"]).first()
+        if semester is None:
+            raise CommandError(f"Không tìm thấy Học kỳ: {options['semester_id']}")
+        department = Department.objects.filter(code=options["department"]).first()
+        if department is None:
+            raise CommandError(f"Không tìm thấy Khoa: {options['department']}")
+
+        out = options["out"] or f"TKB_{department.code}_{semester.academic_year.code}_{semester.code}.zip"
+        started = time.perf_counter()
+        try:
+            with open(out, "wb") as fh:
+                _, count = build_department_pdf_zip(semester, department, workers=options["workers"], fh=fh)
+        except PdfUnavailable as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{department.code} - {semester}: {count} file PDF -> {out} ({elapsed:.2f}s)"
+        ))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from timetable.curriculum_services import generate_all_curricula
+from timetable.models import AcademicYear, Major
+
+
+class Command(BaseCommand):
+    help = (
+        "Sinh CTĐT cho mọi Ngành × Khoá: tạo Curriculum còn thiếu "
+        "và sinh CurriculumSubject theo lô."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--major", action="append", help="Chỉ sinh cho mã Ngành này (lặp lại được)")
+        parser.add_argument("--intake-year", action="append", help="Chỉ sinh cho mã Khoá/Năm học này (lặp lại được)")
+        parser.add_argument(
+            "--overwrite",
+            action="store_true",
+            help="Cập nhật lại semester_index, total_periods, is_optional cho môn đã có",
+        )
+        parser.add_argument(
+            "--no-create",
+            action="store_true",
+            help="Không tạo Curriculum mới, chỉ sinh môn cho các CTĐT đã có",
+        )
+
+    def handle(self, *args, **options):
+        majors = Major.objects.filter(code__in=options["major"]) if options["major"] else None
+        years = (
+            AcademicYear.objects.filter(code__in=options["intake_year"])
+            if options["intake_year"] else None
+        )
+
+        started = time.perf_counter()
+        res = generate_all_curricula(
+            majors=majors,
+            intake_years=years,
+            overwrite=options["overwrite"],
+            create_missing=not options["no_create"],
+        )
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Tạo mới {res['curricula_created']} CTĐT; CurriculumSubject: "
+            f"tạo mới {res['created']}, cập nhật {res['updated']}, bỏ qua {res['skipped']} "
+            f"({elapsed:.2f}s)"
+        ))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from timetable.models import Semester
+from timetable.publish_services import DEFAULT_WORKERS, publish_semester, semester_publish_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Xuất bản TKB tĩnh (HTML + JSON) của mọi Lớp / Phòng / GV trong học kỳ; "
+        "chỉ ghi lại những đối tượng có buổi học thay đổi từ lần trước."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("semester_ids", nargs="+", type=int, help="ID Học kỳ cần xuất bản")
+        parser.add_argument("--force", action="store_true", help="Bỏ qua manifest cũ, ghi lại toàn bộ")
+        parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Số thread render song song")
+
+    def handle(self, *args, **options):
+        semesters = Semester.objects.select_related("academic_year").filter(pk__in=options["semester_ids"])
+        missing = set(options["semester_ids"]) - {s.pk for s in semesters}
+        if missing:
+            raise CommandError(f"Không tìm thấy Học kỳ: {sorted(missing)}")
+
+        for semester in semesters:
+            started = time.perf_counter()
+            res = publish_semester(semester, force=options["force"], workers=options["workers"])
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(
+                f"{semester}: ghi {res['written']}, giữ nguyên {res['unchanged']}, "
+                f"xoá {res['removed']} đối tượng -> {semester_publish_dir(semester)} ({elapsed:.2f}s)"
+            ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from timetable.calendar_services import REMAP_MODES, regenerate_semester_weeks
+from timetable.models import Semester
+
+
+class Command(BaseCommand):
+    help = (
+        "Sinh lại tuần học của học kỳ (không xoá tuần cũ, liên kết buổi học - tuần được chuyển theo lô). "
+        "Mặc định chỉ ghi khi ngày bắt đầu / số tuần / khoảng nghỉ đã đổi."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("semester_ids", nargs="*", type=int, help="ID Học kỳ (bỏ trống = tất cả)")
+        parser.add_argument("--remap", choices=list(REMAP_MODES), default="index", help="Cách giữ liên kết buổi học - tuần")
+        parser.add_argument("--force", action="store_true", help="Ghi lại kể cả khi lịch tuần không đổi")
+
+    def handle(self, *args, **options):
+        semesters = Semester.objects.select_related("academic_year").order_by("id")
+        if options["semester_ids"]:
+            semesters = semesters.filter(pk__in=options["semester_ids"])
+            missing = set(options["semester_ids"]) - {s.pk for s in semesters}
+            if missing:
+                raise CommandError(f"Không tìm thấy Học kỳ id={sorted(missing)}")
+
+        for semester in semesters:
+            res = regenerate_semester_weeks(semester, force=options["force"], remap=options["remap"])
+            if res is None:
+                self.stdout.write(f"{semester}: lịch tuần không đổi, bỏ qua")
+                continue
+            style = self.style.WARNING if res["dropped"] else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{semester}: tạo {res['created']}, cập nhật {res['updated']}, xoá {res['deleted']} tuần; "
+                f"chuyển {res['remapped']} liên kết, bỏ {res['dropped']}"
+            ))
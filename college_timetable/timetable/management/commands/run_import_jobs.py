@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from timetable.import_job_services import run_import_job
+from timetable.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Chạy (tiếp) các job import Excel chưa xong ngay trong process hiện tại. "
+        "Dùng sau khi server khởi động lại: job tiếp tục từ lô cuối cùng đã commit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, help="Chỉ chạy 1 job theo ID")
+        parser.add_argument(
+            "--include-failed",
+            action="store_true",
+            help="Chạy lại cả các job đang ở trạng thái FAILED",
+        )
+
+    def handle(self, *args, **options):
+        if options["job"]:
+            if not ImportJob.objects.filter(pk=options["job"]).exists():
+                raise CommandError(f"Không tìm thấy ImportJob #{options['job']}")
+            job_ids = [options["job"]]
+        else:
+            statuses = ["PENDING", "RUNNING"]
+            if options["include_failed"]:
+                statuses.append("FAILED")
+            job_ids = list(
+                ImportJob.objects.filter(status__in=statuses)
+                .order_by("created_at")
+                .values_list("pk", flat=True)
+            )
+
+        if not job_ids:
+            self.stdout.write("Không có job import nào cần chạy.")
+            return
+
+        for job_id in job_ids:
+            self.stdout.write(f"Đang chạy ImportJob #{job_id}...")
+            run_import_job(job_id)
+            job = ImportJob.objects.get(pk=job_id)
+            self.stdout.write(
+                f"  -> {job.get_status_display()}: tạo mới {job.created_count}, "
+                f"cập nhật {job.updated_count}, lỗi {job.error_count}"
+                + (f" ({job.message})" if job.message else "")
+            )
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0002_subject_semester_number'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_type', models.CharField(max_length=50, verbose_name='Loại dữ liệu')),
+                ('original_name', models.CharField(blank=True, max_length=255, verbose_name='Tên file gốc')),
+                ('file_path', models.CharField(max_length=500, verbose_name='File trong thư mục tạm')),
+                ('status', models.CharField(choices=[('PENDING', 'Chờ xử lý'), ('RUNNING', 'Đang xử lý'), ('DONE', 'Hoàn tất'), ('FAILED', 'Lỗi')], default='PENDING', max_length=10, verbose_name='Trạng thái')),
+                ('batch_size', models.PositiveIntegerField(default=500, verbose_name='Số dòng mỗi lô')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Tạo mới')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='Cập nhật')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Số lỗi')),
+                ('message', models.TextField(blank=True, verbose_name='Thông báo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Tạo lúc')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Cập nhật lúc')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Hoàn tất lúc')),
+            ],
+            options={
+                'verbose_name_plural': '22. Lịch sử Import dữ liệu',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportJobSheet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.PositiveSmallIntegerField(default=0, verbose_name='Thứ tự')),
+                ('sheet_name', models.CharField(max_length=100, verbose_name='Tên sheet')),
+                ('data_type', models.CharField(max_length=50, verbose_name='Loại dữ liệu')),
+                ('status', models.CharField(choices=[('PENDING', 'Chờ xử lý'), ('RUNNING', 'Đang xử lý'), ('DONE', 'Hoàn tất'), ('FAILED', 'Lỗi')], default='PENDING', max_length=10, verbose_name='Trạng thái')),
+                ('total_rows', models.PositiveIntegerField(default=0, verbose_name='Tổng số dòng dữ liệu')),
+                ('last_committed_row', models.PositiveIntegerField(default=1, verbose_name='Dòng cuối đã commit')),
+                ('batches_done', models.PositiveIntegerField(default=0, verbose_name='Số lô đã xong')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='Tạo mới')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='Cập nhật')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Số lỗi')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sheets', to='timetable.importjob', verbose_name='Import job')),
+            ],
+            options={
+                'verbose_name_plural': '22.1 Tiến độ Import theo sheet',
+                'ordering': ['job', 'order'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportJobError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.TextField(verbose_name='Nội dung lỗi')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='timetable.importjob', verbose_name='Import job')),
+                ('sheet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='errors', to='timetable.importjobsheet', verbose_name='Sheet')),
+            ],
+            options={
+                'verbose_name_plural': '22.2 Lỗi Import',
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0003_importjob_importjobsheet_importjoberror'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semester',
+            name='data_updated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='TKB cập nhật lúc'),
+        ),
+        migrations.AddField(
+            model_name='semester',
+            name='data_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Phiên bản dữ liệu TKB'),
+        ),
+    ]
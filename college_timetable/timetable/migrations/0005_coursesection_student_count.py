@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0004_semester_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursesection',
+            name='student_count',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Sĩ số Lớp HP'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0005_coursesection_student_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SemesterIndexMapping',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('semester_index', models.IntegerField(blank=True, null=True, verbose_name='Học kỳ thứ (trong CTĐT)')),
+                ('is_manual', models.BooleanField(default=False, verbose_name='Đã chỉnh tay')),
+                ('intake_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='timetable.academicyear', verbose_name='Khoá (Năm nhập học)')),
+                ('semester', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='index_mappings', to='timetable.semester', verbose_name='Học kỳ')),
+            ],
+            options={
+                'verbose_name_plural': '1.6 Học kỳ thứ mấy trong CTĐT theo Khoá',
+                'unique_together': {('intake_year', 'semester')},
+            },
+        ),
+    ]
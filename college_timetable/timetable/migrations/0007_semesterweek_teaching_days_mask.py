@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:26
+
+import datetime
+
+from django.db import migrations, models
+
+
+def backfill_teaching_days(apps, schema_editor):
+    """
+    Tính teaching_days_mask cho các tuần đã có (khoảng nghỉ + ngày lễ).
+    Quy tắc chép lại từ calendar_services.week_teaching_mask tại thời điểm viết
+    migration (không import code đang chạy: code đó còn đổi theo model mới).
+    """
+    SemesterWeek = apps.get_model("timetable", "SemesterWeek")
+    SemesterBreak = apps.get_model("timetable", "SemesterBreak")
+    PublicHoliday = apps.get_model("timetable", "PublicHoliday")
+
+    weeks = list(SemesterWeek.objects.filter(start_date__isnull=False))
+    if not weeks:
+        return
+
+    breaks = {}
+    for semester_id, start, end in SemesterBreak.objects.filter(
+        start_date__isnull=False, end_date__isnull=False,
+    ).values_list("semester_id", "start_date", "end_date"):
+        breaks.setdefault(semester_id, []).append((start, end))
+    fixed_dates = set()
+    recurring_days = set()
+    for date, is_recurring in PublicHoliday.objects.values_list("date", "is_recurring"):
+        if is_recurring:
+            recurring_days.add((date.month, date.day))
+        else:
+            fixed_dates.add(date)
+
+    for week in weeks:
+        mask = 0b1111111
+        for day_of_week in range(1, 8):
+            date = week.start_date + datetime.timedelta(days=(day_of_week - 1 - week.start_date.weekday()) % 7)
+            if (
+                date in fixed_dates
+                or (date.month, date.day) in recurring_days
+                or any(start <= date <= end for start, end in breaks.get(week.semester_id, []))
+            ):
+                mask &= ~(1 << (day_of_week - 1))
+        week.teaching_days_mask = mask
+    SemesterWeek.objects.bulk_update(weeks, ["teaching_days_mask"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0006_semesterindexmapping'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semesterweek',
+            name='teaching_days_mask',
+            field=models.PositiveSmallIntegerField(default=127, verbose_name='Ngày có dạy trong tuần (bitmask)'),
+        ),
+        migrations.RunPython(backfill_teaching_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:29
+
+import datetime
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_weeks_signature(apps, schema_editor):
+    """
+    Ghi chữ ký lịch tuần cho các học kỳ đã có tuần học, để lần lưu Học kỳ đầu tiên
+    sau khi nâng cấp không sinh lại tuần (chữ ký trống = khác chữ ký hiện tại).
+    Cách tính chép lại từ calendar_services.calendar_signature tại thời điểm viết migration.
+    """
+    Semester = apps.get_model("timetable", "Semester")
+    SemesterWeek = apps.get_model("timetable", "SemesterWeek")
+    SemesterBreak = apps.get_model("timetable", "SemesterBreak")
+
+    with_weeks = set(SemesterWeek.objects.values_list("semester_id", flat=True))
+    semesters = list(Semester.objects.filter(
+        pk__in=with_weeks, start_date__isnull=False, weeks__isnull=False,
+    ).exclude(weeks=0))
+    if not semesters:
+        return
+
+    breaks = {}
+    for semester_id, start, end in SemesterBreak.objects.filter(
+        semester_id__in=[s.pk for s in semesters], start_date__isnull=False, end_date__isnull=False,
+    ).values_list("semester_id", "start_date", "end_date"):
+        breaks.setdefault(semester_id, []).append((start, end))
+
+    for semester in semesters:
+        # Gộp các khoảng nghỉ chồng / liền nhau (như calendar_services.merge_intervals)
+        merged = []
+        for start, end in sorted(breaks.get(semester.pk, [])):
+            if merged and start <= merged[-1][1] + datetime.timedelta(days=1):
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        raw = f"{semester.start_date}|{semester.weeks}|{merged}"
+        semester.weeks_signature = hashlib.sha1(raw.encode()).hexdigest()
+    Semester.objects.bulk_update(semesters, ["weeks_signature"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0007_semesterweek_teaching_days_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semester',
+            name='weeks_signature',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Chữ ký lịch tuần'),
+        ),
+        migrations.RunPython(backfill_weeks_signature, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:30
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def backfill_weeks_mask(apps, schema_editor):
+    """Tính weeks_mask của các buổi học đã có từ bảng trung gian TeachingSlot.weeks."""
+    TeachingSlot = apps.get_model("timetable", "TeachingSlot")
+
+    masks = defaultdict(int)
+    for slot_id, index in TeachingSlot.weeks.through.objects.values_list(
+        "teachingslot_id", "semesterweek__index",
+    ):
+        masks[slot_id] |= 1 << (index - 1)
+
+    slots = list(TeachingSlot.objects.filter(pk__in=list(masks)).only("id"))
+    for slot in slots:
+        slot.weeks_mask = masks[slot.pk]
+    TeachingSlot.objects.bulk_update(slots, ["weeks_mask"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0008_semester_weeks_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teachingslot',
+            name='weeks_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Các tuần học (bitmask)'),
+        ),
+        migrations.RunPython(backfill_weeks_mask, migrations.RunPython.noop),
+    ]
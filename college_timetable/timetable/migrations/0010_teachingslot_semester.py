@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_slot_semester(apps, schema_editor):
+    """TeachingSlot.semester = Học kỳ của Lớp HP (1 câu UPDATE)."""
+    TeachingSlot = apps.get_model("timetable", "TeachingSlot")
+    CourseSection = apps.get_model("timetable", "CourseSection")
+    TeachingSlot.objects.update(
+        semester_id=Subquery(
+            CourseSection.objects.filter(pk=OuterRef("course_section_id")).values("semester_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0009_teachingslot_weeks_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='teachingslot',
+            name='semester',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='teaching_slots', to='timetable.semester', verbose_name='Học kỳ'),
+        ),
+        migrations.RunPython(backfill_slot_semester, migrations.RunPython.noop),
+    ]
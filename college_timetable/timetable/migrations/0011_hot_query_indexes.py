@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0010_teachingslot_semester'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='coursesection',
+            index=models.Index(fields=['semester', 'instructor'], name='section_sem_instructor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instructoravailability',
+            index=models.Index(fields=['instructor', 'day_of_week', 'is_available'], name='avail_ins_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teachingslot',
+            index=models.Index(fields=['semester', 'room', 'day_of_week', 'start_period'], name='slot_sem_room_day_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teachingslot',
+            index=models.Index(fields=['course_section', 'day_of_week'], name='slot_section_day_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='teachingslot',
+            index=models.Index(fields=['semester', 'day_of_week', 'start_period'], name='slot_sem_day_period_idx'),
+        ),
+    ]
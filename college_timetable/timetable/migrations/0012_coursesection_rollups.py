@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:37
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_section_rollups(apps, schema_editor):
+    """total_students / department của các LHP đã có (cùng quy tắc services.refresh_section_rollups)."""
+    CourseSection = apps.get_model("timetable", "CourseSection")
+
+    totals = defaultdict(int)
+    by_department = defaultdict(lambda: defaultdict(int))
+    for section_id, size, department_id in CourseSection.classes.through.objects.values_list(
+        "coursesection_id", "studentclass__size", "studentclass__department_id",
+    ):
+        totals[section_id] += size or 0
+        if department_id is not None:
+            by_department[section_id][department_id] += size or 0
+
+    sections = list(CourseSection.objects.filter(pk__in=list(totals)).only("id"))
+    for section in sections:
+        counts = by_department.get(section.pk)
+        section.total_students = totals[section.pk]
+        section.department_id = min(counts, key=lambda d: (-counts[d], d)) if counts else None
+    CourseSection.objects.bulk_update(sections, ["total_students", "department"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='coursesection',
+            name='department',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='course_sections', to='timetable.department', verbose_name='Khoa'),
+        ),
+        migrations.AddField(
+            model_name='coursesection',
+            name='total_students',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Tổng sĩ số các Lớp SV'),
+        ),
+        migrations.AddIndex(
+            model_name='coursesection',
+            index=models.Index(fields=['semester', 'department'], name='section_sem_department_idx'),
+        ),
+        migrations.RunPython(backfill_section_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+import re
+
+from django.db import migrations
+
+FIRST_TERM_CODES = {"HK1", "1", "HKI"}
+SECOND_TERM_CODES = {"HK2", "2", "HKII"}
+SUMMER_TERM_CODES = {"HK3", "3", "HKIII", "HE", "HÈ", "HKHE", "HKHÈ", "SUMMER"}
+
+
+def _year_start(code):
+    text = str(code or "")
+    match = re.search(r"\d{4}", text)
+    if match:
+        return int(match.group())
+    match = re.search(r"\d{2}", text)
+    if match:
+        return 2000 + int(match.group())
+    return None
+
+
+def _semester_index(intake_start, semester_code, year_start):
+    if intake_start is None or year_start is None or year_start < intake_start:
+        return None
+    term = (semester_code or "").upper().replace(" ", "").replace("_", "")
+    if term in FIRST_TERM_CODES:
+        return 1 + 2 * (year_start - intake_start)
+    if term in SECOND_TERM_CODES or term in SUMMER_TERM_CODES:
+        return 2 + 2 * (year_start - intake_start)
+    return None
+
+
+def backfill_semester_index_mapping(apps, schema_editor):
+    """
+    Điền bảng tra "học kỳ thứ mấy trong CTĐT" cho các Năm học / Học kỳ có sẵn
+    (0006 chỉ tạo bảng; dữ liệu cũ và dữ liệu import theo lô không qua signal).
+    Quy tắc chép lại từ semester_index_services.rebuild_semester_index_map tại thời điểm
+    viết migration; chỉ thêm cặp còn thiếu, dòng đã có giữ nguyên.
+    """
+    AcademicYear = apps.get_model("timetable", "AcademicYear")
+    Semester = apps.get_model("timetable", "Semester")
+    SemesterIndexMapping = apps.get_model("timetable", "SemesterIndexMapping")
+
+    intakes = [(pk, _year_start(code)) for pk, code in AcademicYear.objects.values_list("id", "code")]
+    existing = set(SemesterIndexMapping.objects.values_list("intake_year_id", "semester_id"))
+
+    to_create = []
+    for semester_id, code, year_code in Semester.objects.values_list("id", "code", "academic_year__code"):
+        year_start = _year_start(year_code)
+        for intake_id, intake_start in intakes:
+            if intake_start is not None and year_start is not None and intake_start > year_start:
+                continue
+            if (intake_id, semester_id) in existing:
+                continue
+            to_create.append(SemesterIndexMapping(
+                intake_year_id=intake_id, semester_id=semester_id,
+                semester_index=_semester_index(intake_start, code, year_start),
+            ))
+    SemesterIndexMapping.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timetable', '0013_coursesection_student_count_label'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_semester_index_mapping, migrations.RunPython.noop),
+    ]
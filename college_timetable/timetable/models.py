@@ -1,7 +1,6 @@
 
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models, transaction
-from django.db.models import Q
 # ==================================================
 # 1. THỜI GIAN & CẤU HÌNH
 # ==================================================
@@ -29,6 +28,13 @@ class Semester(models.Model):
     start_date = models.DateField(verbose_name="Ngày bắt đầu (Tuần 1)",null=True, blank=True) #mới thêm blank với null
     weeks = models.IntegerField(default=15, verbose_name="Tổng số tuần (không tính tuần nghỉ)",null=True, blank=True) #mới thêm blank với null
 
+    # Tăng mỗi khi TKB của học kỳ thay đổi (slot, tuần học...) -> dùng làm khoá cache
+    data_version = models.PositiveIntegerField(default=0, editable=False, verbose_name="Phiên bản dữ liệu TKB")
+    data_updated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="TKB cập nhật lúc")
+    # Chữ ký (ngày bắt đầu, số tuần, khoảng nghỉ) của lần sinh tuần gần nhất
+    # -> chỉ sinh lại tuần khi các giá trị này đổi (calendar_services.regenerate_semester_weeks)
+    weeks_signature = models.CharField(max_length=40, blank=True, editable=False, verbose_name="Chữ ký lịch tuần")
+
     class Meta:
         unique_together = ("academic_year", "code")
         verbose_name_plural = "1.1 Cấu hình Học kỳ"
@@ -36,18 +42,6 @@ class Semester(models.Model):
 
     def __str__(self):
         return f"{self.code} ({self.academic_year.code})"
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-
-        # Sau khi lưu Semester, nếu có start_date và weeks thì tự sinh tuần
-        try:
-            from .services import generate_semester_weeks
-            if self.start_date and self.weeks:
-                generate_semester_weeks(self, delete_old=True)
-        except Exception as e:
-            # Không nên raise để tránh lỗi khi lưu Admin, chỉ log nếu cần
-            print(f"[Semester.save] Lỗi generate_semester_weeks: {e}")    
 
 class SemesterBreak(models.Model):
     """
@@ -86,6 +80,11 @@ class SemesterWeek(models.Model):
     start_date = models.DateField(verbose_name="Ngày bắt đầu tuần",null=True, blank=True) #mới thêm blank với null
     end_date = models.DateField(verbose_name="Ngày kết thúc tuần",null=True, blank=True) #mới thêm blank với null
     is_break = models.BooleanField(default=False, verbose_name="Tuần nghỉ")
+    # Bit (Thứ - 1) = 1 nếu ngày đó có dạy (bit 0 = Thứ 2 ... bit 6 = Chủ nhật);
+    # ngày rơi vào SemesterBreak / PublicHoliday bị tắt (xem calendar_services)
+    teaching_days_mask = models.PositiveSmallIntegerField(
+        default=0b1111111, verbose_name="Ngày có dạy trong tuần (bitmask)"
+    )
 
     class Meta:
         verbose_name_plural = "1.4 Cấu hình Tuần trong Học kỳ"
@@ -95,6 +94,10 @@ class SemesterWeek(models.Model):
     def __str__(self):
         return f"{self.semester} - Tuần {self.index}"
 
+    def is_teaching_day(self, day_of_week):
+        """Thứ day_of_week (1 = Thứ 2) của tuần này có dạy không (không nghỉ lễ / nghỉ)."""
+        return bool(self.teaching_days_mask >> (day_of_week - 1) & 1)
+
 class PeriodSlot(models.Model):
     """
     Khung tiết trong ngày. Ví dụ:
@@ -113,6 +116,29 @@ class PeriodSlot(models.Model):
     def __str__(self):
         return f"Tiết {self.index} ({self.start_time}-{self.end_time})"
 
+class SemesterIndexMapping(models.Model):
+    """
+    Học kỳ thứ mấy trong CTĐT của 1 Khoá (năm nhập học) tại 1 Học kỳ cụ thể.
+    Tính sẵn bởi semester_index_services (HK1 / HK2 / HK3 - hè);
+    sửa tay trong admin cho trường hợp đặc biệt (is_manual: không bị tính lại ghi đè).
+    """
+    intake_year = models.ForeignKey(
+        AcademicYear, on_delete=models.CASCADE, verbose_name="Khoá (Năm nhập học)"
+    )
+    semester = models.ForeignKey(
+        Semester, on_delete=models.CASCADE, related_name="index_mappings", verbose_name="Học kỳ"
+    )
+    # Để trống = chưa xác định được (mã học kỳ lạ...) -> không sinh LHP cho Khoá này
+    semester_index = models.IntegerField(null=True, blank=True, verbose_name="Học kỳ thứ (trong CTĐT)")
+    is_manual = models.BooleanField(default=False, verbose_name="Đã chỉnh tay")
+
+    class Meta:
+        verbose_name_plural = "1.6 Học kỳ thứ mấy trong CTĐT theo Khoá"
+        unique_together = ("intake_year", "semester")
+
+    def __str__(self):
+        return f"Khoá {self.intake_year.code} - {self.semester}: HK {self.semester_index or '?'}"
+
 # ==================================================
 # 2. DANH MỤC CHUNG
 # ==================================================
@@ -293,7 +319,6 @@ class Major(models.Model):
 
 # models.py
 from django.db import models, transaction
-from django.db.models import Q
 
 class Curriculum(models.Model):
     major = models.ForeignKey(Major, on_delete=models.CASCADE, verbose_name="Ngành")
@@ -329,51 +354,10 @@ class Curriculum(models.Model):
             - False: nếu đã có CurriculumSubject thì bỏ qua
             - True: update lại semester_index, total_periods, is_optional
         """
-        from .models import Subject, CurriculumSubject  # tránh import vòng
-
-        duration = self.major.level.duration_semesters or 5  # 4 hoặc 5 tuỳ bậc
-
-        subjects = Subject.objects.filter(
-            Q(major=self.major) | Q(major__isnull=True)
-        ).distinct()
-
-        created = updated = skipped = 0
+        from .curriculum_services import generate_curriculum_subjects_bulk  # tránh import vòng
 
-        for subj in subjects:
-            sem = subj.semester_number or 1
-            if sem > duration:
-                sem = duration
-            if sem < 1:
-                sem = 1
-
-            defaults = {
-                "semester_index": sem,
-                "total_periods": subj.total_periods,
-                "is_optional": False,
-            }
-
-            cs, is_created = CurriculumSubject.objects.get_or_create(
-                curriculum=self,
-                subject=subj,
-                defaults=defaults,
-            )
-
-            if is_created:
-                created += 1
-            else:
-                if overwrite:
-                    for field, value in defaults.items():
-                        setattr(cs, field, value)
-                    cs.save(update_fields=list(defaults.keys()))
-                    updated += 1
-                else:
-                    skipped += 1
-
-        return {
-            "created": created,
-            "updated": updated,
-            "skipped": skipped,
-        }
+        # Dùng chung engine ghi theo lô (xem curriculum_services)
+        return generate_curriculum_subjects_bulk([self], overwrite=overwrite)
 
 # ==================================================
 # 4. MÔN HỌC, CẤU TRÚC MÔN
@@ -708,6 +692,9 @@ class InstructorAvailability(models.Model):
 
     class Meta:
         verbose_name_plural = "6.3 Khung thời gian rảnh/bận của GV"
+        indexes = [
+            models.Index(fields=["instructor", "day_of_week", "is_available"], name="avail_ins_day_idx"),
+        ]
 
 class WorkloadReductionType(models.Model):
     code = models.CharField(max_length=20, unique=True, verbose_name="Mã loại giảm")
@@ -796,6 +783,27 @@ class CourseSection(models.Model):
         default=1, verbose_name="Số buổi/tuần dự kiến (để engine auto xếp)"
     )
 
+    # 2 cột sĩ số, nghĩa không chồng nhau; cần "số SV của LHP" thì dùng
+    # services.section_student_count (nhóm -> student_count, nguyên lớp -> total_students).
+    # - student_count: CHỈ ghi khi LHP là 1 nhóm của lớp bị chia (services.partition_classes);
+    #   đồng thời là dấu hiệu "chia nhóm": các nhóm cùng môn của 1 lớp được học song song.
+    #   Để trống = LHP học nguyên các Lớp SV.
+    student_count = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name="Sĩ số nhóm (lớp bị chia)"
+    )
+    # - total_students: tổng sĩ số các Lớp SV gắn vào LHP (cả lớp, kể cả khi LHP chỉ là 1 nhóm).
+    #   Tính sẵn từ các Lớp SV (services.refresh_section_rollups, gọi từ signals / ghi theo lô).
+    total_students = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Tổng sĩ số các Lớp SV"
+    )
+    # Khoa phụ trách xếp TKB của LHP, tính sẵn từ các Lớp SV: LHP ghép lớp nhiều Khoa
+    # thuộc Khoa có đông SV nhất. Lọc LHP theo Khoa (auto_schedule, trang xếp TKB) dùng
+    # cột này: LHP ghép chỉ hiện / được xếp ở 1 Khoa, không ở các Khoa ít SV hơn.
+    department = models.ForeignKey(
+        Department, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+        related_name="course_sections", verbose_name="Khoa",
+    )
+
     is_locked = models.BooleanField(
         default=False,
         verbose_name="Khoá Lớp HP (không tự động thay đổi khi chạy auto xếp TKB)",
@@ -805,7 +813,11 @@ class CourseSection(models.Model):
 
     class Meta:
         verbose_name_plural = "16. Lớp học phần"
-        unique_together = ("semester", "code")
+        unique_together = ("semester", "code")  # index (semester, code) cho tra LHP theo mã
+        indexes = [
+            models.Index(fields=["semester", "instructor"], name="section_sem_instructor_idx"),
+            models.Index(fields=["semester", "department"], name="section_sem_department_idx"),
+        ]
 
     def __str__(self):
         return f"{self.code} - {self.subject.name}"
@@ -822,6 +834,12 @@ class TeachingSlot(models.Model):
     course_section = models.ForeignKey(
         CourseSection, on_delete=models.CASCADE, related_name="slots", verbose_name="Lớp học phần"
     )
+    # Bản sao course_section.semester (gán trong save, signal CourseSection giữ đồng bộ)
+    # -> các truy vấn "buổi học của học kỳ" dùng được index ghép, không cần join Lớp HP
+    semester = models.ForeignKey(
+        Semester, on_delete=models.CASCADE, null=True, blank=True, editable=False,
+        related_name="teaching_slots", verbose_name="Học kỳ",
+    )
     room = models.ForeignKey(
         Room, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Phòng"
     )
@@ -833,6 +851,10 @@ class TeachingSlot(models.Model):
     weeks = models.ManyToManyField(
         SemesterWeek, related_name="teaching_slots", verbose_name="Các tuần học"
     )
+    # Bản sao gọn của weeks: bit (tuần thứ - 1) bật nếu buổi học có ở tuần đó.
+    # Giữ đồng bộ qua m2m_changed (signals) / calendar_services.refresh_weeks_mask
+    # -> kiểm tra trùng tuần = a & b, số tuần = popcount, không cần join bảng trung gian.
+    weeks_mask = models.BigIntegerField(default=0, editable=False, verbose_name="Các tuần học (bitmask)")
 
     method = models.CharField(max_length=50, blank=True, verbose_name="Phương thức dạy")
     is_locked = models.BooleanField(
@@ -843,10 +865,40 @@ class TeachingSlot(models.Model):
     class Meta:
         verbose_name_plural = "19. Chi tiết Thời khoá biểu"
         ordering = ["day_of_week", "start_period"]
+        indexes = [
+            # Kiểm tra trùng phòng: học kỳ + phòng + thứ (+ tiết bắt đầu cho điều kiện đoạn tiết)
+            models.Index(fields=["semester", "room", "day_of_week", "start_period"], name="slot_sem_room_day_period_idx"),
+            # Trùng GV / Lớp SV: đi từ Lớp HP (đã lọc theo GV / lớp) sang buổi học theo thứ
+            models.Index(fields=["course_section", "day_of_week"], name="slot_section_day_idx"),
+            # Quét cả học kỳ theo thứ tự lưới TKB (báo cáo trùng lịch, xuất bản...)
+            models.Index(fields=["semester", "day_of_week", "start_period"], name="slot_sem_day_period_idx"),
+        ]
 
     def __str__(self):
         return f"{self.course_section.code} - Thứ {self.day_of_week}, Tiết {self.start_period}-{self.end_period}"
 
+    def save(self, *args, **kwargs):
+        if self.course_section_id and not self.semester_id:
+            self.semester_id = (
+                CourseSection.objects.filter(pk=self.course_section_id)
+                .values_list("semester_id", flat=True).first()
+            )
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def mask_week_indexes(mask):
+        """Bitmask tuần (bit tuần thứ - 1) -> danh sách tuần thứ mấy."""
+        return [bit + 1 for bit in range(mask.bit_length()) if mask >> bit & 1]
+
+    @property
+    def week_indexes(self):
+        """Danh sách tuần thứ mấy (giải mã weeks_mask, không query)."""
+        return self.mask_week_indexes(self.weeks_mask)
+
+    @property
+    def week_count(self):
+        return self.weeks_mask.bit_count()
+
 # ==================================================
 # 9. THI, COI THI, CHẤM THI
 # ==================================================
@@ -1314,3 +1366,115 @@ class MarkingDuty(models.Model):
 #     instructor = models.ForeignKey(Instructor, on_delete=models.CASCADE)
 #     role = models.CharField(max_length=20, choices=[("GT1","Giám thị 1"), ("GT2","Giám thị 2"), ("TS","Thư ký"), ...])
 #     hours = models.FloatField(default=0, verbose_name="Giờ coi thi quy đổi")
+
+# ==================================================
+# 11. NHẬP DỮ LIỆU NỀN (IMPORT JOB)
+# ==================================================
+
+class ImportJob(models.Model):
+    """
+    Một lần import file Excel chạy nền.
+    - File upload được lưu vào thư mục tạm (settings.IMPORT_STAGING_DIR).
+    - Worker nền xử lý từng sheet, mỗi sheet chia thành nhiều lô (batch).
+    - Mỗi lô commit cùng với tiến độ => job bị ngắt có thể chạy tiếp từ lô cuối cùng đã commit.
+    """
+    STATUS_CHOICES = [
+        ("PENDING", "Chờ xử lý"),
+        ("RUNNING", "Đang xử lý"),
+        ("DONE", "Hoàn tất"),
+        ("FAILED", "Lỗi"),
+    ]
+
+    data_type = models.CharField(max_length=50, verbose_name="Loại dữ liệu")
+    original_name = models.CharField(max_length=255, blank=True, verbose_name="Tên file gốc")
+    file_path = models.CharField(max_length=500, verbose_name="File trong thư mục tạm")
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default="PENDING", verbose_name="Trạng thái"
+    )
+    batch_size = models.PositiveIntegerField(default=500, verbose_name="Số dòng mỗi lô")
+
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Tạo mới")
+    updated_count = models.PositiveIntegerField(default=0, verbose_name="Cập nhật")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Số lỗi")
+    message = models.TextField(blank=True, verbose_name="Thông báo")
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Tạo lúc")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Cập nhật lúc")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Hoàn tất lúc")
+
+    class Meta:
+        verbose_name_plural = "22. Lịch sử Import dữ liệu"
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"Import {self.data_type} #{self.pk} ({self.get_status_display()})"
+
+    @property
+    def total_rows(self):
+        return sum(s.total_rows for s in self.sheets.all())
+
+    @property
+    def processed_rows(self):
+        return sum(s.processed_rows for s in self.sheets.all())
+
+    @property
+    def progress_percent(self):
+        total = self.total_rows
+        if not total:
+            return 100 if self.status == "DONE" else 0
+        return int(self.processed_rows * 100 / total)
+
+
+class ImportJobSheet(models.Model):
+    """
+    Tiến độ của 1 sheet trong ImportJob.
+    last_committed_row: số dòng Excel cuối cùng đã được commit (1 = mới có dòng tiêu đề).
+    """
+    job = models.ForeignKey(
+        ImportJob, on_delete=models.CASCADE, related_name="sheets", verbose_name="Import job"
+    )
+    order = models.PositiveSmallIntegerField(default=0, verbose_name="Thứ tự")
+    sheet_name = models.CharField(max_length=100, verbose_name="Tên sheet")
+    data_type = models.CharField(max_length=50, verbose_name="Loại dữ liệu")
+    status = models.CharField(
+        max_length=10, choices=ImportJob.STATUS_CHOICES, default="PENDING", verbose_name="Trạng thái"
+    )
+    total_rows = models.PositiveIntegerField(default=0, verbose_name="Tổng số dòng dữ liệu")
+    last_committed_row = models.PositiveIntegerField(default=1, verbose_name="Dòng cuối đã commit")
+    batches_done = models.PositiveIntegerField(default=0, verbose_name="Số lô đã xong")
+
+    created_count = models.PositiveIntegerField(default=0, verbose_name="Tạo mới")
+    updated_count = models.PositiveIntegerField(default=0, verbose_name="Cập nhật")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Số lỗi")
+
+    class Meta:
+        verbose_name_plural = "22.1 Tiến độ Import theo sheet"
+        ordering = ["job", "order"]
+
+    def __str__(self):
+        return f"{self.job} - {self.sheet_name}"
+
+    @property
+    def processed_rows(self):
+        return min(self.total_rows, max(0, self.last_committed_row - 1))
+
+
+class ImportJobError(models.Model):
+    """
+    Lỗi phát sinh khi import, lưu lại để xem (phân trang) sau khi job chạy xong.
+    """
+    job = models.ForeignKey(
+        ImportJob, on_delete=models.CASCADE, related_name="errors", verbose_name="Import job"
+    )
+    sheet = models.ForeignKey(
+        ImportJobSheet, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="errors", verbose_name="Sheet"
+    )
+    message = models.TextField(verbose_name="Nội dung lỗi")
+
+    class Meta:
+        verbose_name_plural = "22.2 Lỗi Import"
+        ordering = ["id"]
+
+    def __str__(self):
+        return self.message
@@ -0,0 +1,114 @@
+"""
+Vẽ 1 TKB ra PDF bằng fpdf2 (thư viện Python thuần, không cần trình duyệt).
+
+Module này KHÔNG import Django: hàm render_timetable_pdf chỉ nhận dữ liệu thuần
+(chuỗi, số, dict) nên chạy được trong process con của ProcessPoolExecutor.
+fpdf2 chỉ được import khi thực sự vẽ PDF (không cài thì các chức năng khác vẫn chạy).
+"""
+import unicodedata
+
+PAGE_MARGIN = 8       # mm
+FIRST_COL_WIDTH = 16  # cột "Tiết"
+HEADER_HEIGHT = 8
+TITLE_FONT_SIZE = 13
+TEXT_FONT_SIZE = 6.5
+LINE_HEIGHT = 2.9
+
+
+class PdfUnavailable(Exception):
+    """Chưa cài fpdf2."""
+
+
+def _ascii(text):
+    """Bỏ dấu tiếng Việt khi không có font Unicode (font chuẩn của PDF chỉ có Latin-1)."""
+    text = str(text).replace("đ", "d").replace("Đ", "D")
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return text.replace("–", "-").encode("latin-1", "replace").decode("latin-1")
+
+
+def render_timetable_pdf(title, subtitle, days, grid_rows, font_path=None):
+    """
+    Vẽ TKB lên 1 trang A4 ngang:
+        days      : list (giá trị Thứ, nhãn cột)
+        grid_rows : lưới dạng build_compact_grid, mỗi ô buổi học có sẵn
+                    "rowspan" và "text" (nội dung đã ghép, xem pdf_services)
+        font_path : font TTF có tiếng Việt (VD DejaVuSans.ttf); None = font chuẩn, bỏ dấu
+    Trả về bytes của file PDF.
+    """
+    try:
+        from fpdf import FPDF
+        from fpdf.enums import MethodReturnValue, XPos, YPos
+    except ImportError as e:  # pragma: no cover - tuỳ môi trường
+        raise PdfUnavailable("Cần cài fpdf2 (pip install fpdf2) để xuất PDF.") from e
+
+    pdf = FPDF(orientation="L", unit="mm", format="A4")
+    pdf.set_margins(PAGE_MARGIN, PAGE_MARGIN, PAGE_MARGIN)
+    pdf.set_auto_page_break(False)
+    pdf.add_page()
+
+    if font_path:
+        pdf.add_font("tkb", "", font_path)
+        family = "tkb"
+        clean = str
+    else:
+        family = "Helvetica"
+        clean = _ascii
+
+    pdf.set_font(family, size=TITLE_FONT_SIZE)
+    pdf.cell(0, 7, clean(title), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+    pdf.set_font(family, size=8)
+    pdf.cell(0, 5, clean(subtitle), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    top = pdf.get_y() + 2
+    day_width = (pdf.w - 2 * PAGE_MARGIN - FIRST_COL_WIDTH) / len(days)
+    row_height = (pdf.h - PAGE_MARGIN - top - HEADER_HEIGHT) / max(len(grid_rows), 1)
+    day_index = {}
+
+    # Tiêu đề cột
+    pdf.set_fill_color(221, 221, 221)
+    pdf.set_font(family, size=8)
+    pdf.set_xy(PAGE_MARGIN, top)
+    pdf.cell(FIRST_COL_WIDTH, HEADER_HEIGHT, clean("Tiết"), border=1, align="C", fill=True)
+    for col, (day, label) in enumerate(days):
+        day_index[day] = col
+        pdf.cell(day_width, HEADER_HEIGHT, clean(label), border=1, align="C", fill=True)
+
+    body_top = top + HEADER_HEIGHT
+    for pos, row in enumerate(grid_rows):
+        y = body_top + pos * row_height
+        pdf.set_font(family, size=8)
+        pdf.set_fill_color(238, 238, 238)
+        pdf.set_xy(PAGE_MARGIN, y)
+        pdf.cell(FIRST_COL_WIDTH, row_height, clean(f"Tiết {row['period']}"), border=1, align="C", fill=True)
+
+        for cell in row["cells"]:
+            x = PAGE_MARGIN + FIRST_COL_WIDTH + day_index[cell["day"]] * day_width
+            height = row_height * cell.get("rowspan", 1)
+            if "text" not in cell:
+                pdf.rect(x, y, day_width, height)
+                continue
+
+            pdf.set_fill_color(232, 240, 254)
+            pdf.rect(x, y, day_width, height, style="DF")
+            pdf.set_font(family, size=TEXT_FONT_SIZE)
+            lines = pdf.multi_cell(
+                day_width - 1, LINE_HEIGHT, clean(cell["text"]),
+                dry_run=True, output=MethodReturnValue.LINES,
+            )
+            max_lines = max(int((height - 1) // LINE_HEIGHT), 1)
+            if len(lines) > max_lines:
+                lines = lines[:max_lines - 1] + ["..."]
+            pdf.set_xy(x + 0.5, y + 0.5)
+            pdf.multi_cell(day_width - 1, LINE_HEIGHT, "\n".join(lines), align="L")
+
+    return bytes(pdf.output())
+
+
+def render_job(job):
+    """
+    Hàm cho process pool (cả Khoa): job = (tên file, tiêu đề, dòng phụ, cột Thứ, lưới, font).
+    Trả về (tên file, bytes PDF).
+    """
+    name, title, subtitle, days, grid_rows, font_path = job
+    return name, render_timetable_pdf(title, subtitle, days, grid_rows, font_path=font_path)
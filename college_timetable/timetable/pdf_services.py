@@ -0,0 +1,134 @@
+"""
+Xuất TKB ra PDF (bản in phát cho Lớp / Phòng / GV).
+
+- Vẽ PDF ở pdf_render.py (fpdf2, import lười; module đó không đụng Django).
+- 1 đối tượng: dựng lưới như trang web rồi vẽ 1 trang A4 ngang.
+- Cả Khoa: nạp buổi học của học kỳ bằng 1 query (collect_semester_slots), tính sẵn
+  lưới + nội dung ô ở process chính, rồi vẽ song song bằng process pool
+  (worker chỉ nhận dữ liệu thuần, không chạm DB) và gom vào 1 file zip.
+"""
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from .grid_services import DAYS, build_compact_grid, slot_cell_data, timetable_slots
+from .models import Instructor, StudentClass
+from .pdf_render import render_job, render_timetable_pdf
+from .publish_services import ENTITY_LABELS, collect_semester_slots
+from .timetable_excel_services import cell_text
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+
+
+def _pdf_grid(grid_rows, entity_type):
+    """Lưới chỉ gồm dữ liệu thuần (pickle được): ô buổi học có "rowspan" + "text"."""
+    rows = []
+    for row in grid_rows:
+        cells = []
+        for cell in row["cells"]:
+            if cell.get("slots"):
+                cells.append({
+                    "day": cell["day"],
+                    "rowspan": cell["rowspan"],
+                    "text": "\n\n".join(cell_text(s, entity_type) for s in cell["slots"]),
+                })
+            else:
+                cells.append({"day": cell["day"]})
+        rows.append({"period": row["period"], "cells": cells})
+    return rows
+
+
+def _font_path():
+    font = settings.TIMETABLE_PDF_FONT
+    return str(font) if font else None
+
+
+def _title(semester, entity_type, code, name):
+    label = "Lớp HP" if entity_type == "section" else ENTITY_LABELS[entity_type]
+    return f"TKB {label} {code}" + (f" - {name}" if name and name != code else "")
+
+
+def _subtitle(semester):
+    return f"{semester.academic_year.code} - {semester}"
+
+
+def timetable_pdf_filename(semester, entity_type, code):
+    return f"TKB_{entity_type}_{code}_{semester.code}.pdf"
+
+
+def build_timetable_pdf(semester, entity_type, entity):
+    """PDF (bytes) TKB cả học kỳ của 1 Lớp SV / Phòng / GV / Lớp HP."""
+    slots = list(timetable_slots(semester, entity_type, entity))
+    grid_rows = _pdf_grid(build_compact_grid(slots, cell_data=slot_cell_data), entity_type)
+    return render_timetable_pdf(
+        _title(semester, entity_type, entity.code, getattr(entity, "name", "")),
+        _subtitle(semester),
+        DAYS,
+        grid_rows,
+        font_path=_font_path(),
+    )
+
+
+# =============== CẢ KHOA ===============
+
+def department_pdf_jobs(semester, department):
+    """
+    Các job vẽ PDF của 1 Khoa trong học kỳ:
+    Lớp SV và GV thuộc Khoa, cùng các Phòng mà Lớp SV của Khoa học trong kỳ.
+    Mỗi job: (tên file trong zip, tiêu đề, dòng phụ, cột Thứ, lưới, font).
+    """
+    class_ids = set(StudentClass.objects.filter(department=department).values_list("id", flat=True))
+    instructor_ids = set(Instructor.objects.filter(department=department).values_list("id", flat=True))
+
+    entities, cell_data = collect_semester_slots(semester)
+
+    room_ids = set()
+    for (entity_type, entity_id), entity in entities.items():
+        if entity_type == "class" and entity_id in class_ids:
+            room_ids.update(s.room_id for s in entity["slots"] if s.room_id)
+    wanted = {"class": class_ids, "room": room_ids, "instructor": instructor_ids}
+
+    subtitle = _subtitle(semester)
+    font_path = _font_path()
+    jobs = []
+    for (entity_type, entity_id), entity in sorted(entities.items(), key=lambda item: (item[0][0], item[1]["code"])):
+        if entity_id not in wanted[entity_type]:
+            continue
+        grid_rows = build_compact_grid(entity["slots"], cell_data=lambda s: cell_data[s.pk])
+        jobs.append((
+            f"{entity_type}/{entity['code'].replace('/', '_')}.pdf",
+            _title(semester, entity_type, entity["code"], entity["name"]),
+            subtitle,
+            DAYS,
+            _pdf_grid(grid_rows, entity_type),
+            font_path,
+        ))
+    return jobs
+
+
+def build_department_pdf_zip(semester, department, workers=DEFAULT_WORKERS, fh=None):
+    """
+    Vẽ PDF TKB mọi Lớp SV / Phòng / GV của Khoa và ghi vào zip
+    (class/<mã>.pdf, room/<mã>.pdf, instructor/<mã>.pdf).
+    fh: file đích; None = file tạm (đã tua về đầu).
+    Trả về (file zip, số file PDF).
+    """
+    jobs = department_pdf_jobs(semester, department)
+    if fh is None:
+        fh = tempfile.TemporaryFile(suffix=".zip")
+
+    with zipfile.ZipFile(fh, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        if workers > 1 and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                for name, data in pool.map(render_job, jobs, chunksize=4):
+                    zf.writestr(name, data)
+        else:
+            for job in jobs:
+                name, data = render_job(job)
+                zf.writestr(name, data)
+
+    fh.seek(0)
+    return fh, len(jobs)
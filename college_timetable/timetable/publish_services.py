@@ -0,0 +1,226 @@
+"""
+Xuất bản TKB cả học kỳ ra file tĩnh (HTML + JSON), để đầu kỳ web server
+phục vụ trực tiếp thay vì mọi SV / GV cùng gọi view động.
+
+- Nạp toàn bộ TeachingSlot của học kỳ bằng 1 query (+ prefetch tuần, Lớp SV),
+  tính sẵn dữ liệu hiển thị của từng buổi 1 lần rồi chia theo Lớp / Phòng / GV.
+- Render song song bằng thread pool (không worker nào chạm DB).
+- manifest.json lưu fingerprint + ETag của từng đối tượng: lần xuất bản sau chỉ
+  ghi lại những Lớp / Phòng / GV có dữ liệu buổi học thay đổi, và xoá file
+  của đối tượng không còn buổi nào.
+
+Cấu trúc thư mục: <TIMETABLE_PUBLISH_DIR>/<semester_id>/
+    manifest.json
+    class/<id>.html, class/<id>.json
+    room/<id>.html, ...
+    instructor/<id>.html, ...
+"""
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .grid_services import build_compact_grid, day_columns, slot_cell_data
+from .models import TeachingSlot
+
+MANIFEST_NAME = "manifest.json"
+# Tăng khi đổi layout HTML/JSON -> lần xuất bản sau ghi lại toàn bộ
+PUBLISH_FORMAT = 2
+DEFAULT_WORKERS = 8
+
+ENTITY_LABELS = {
+    "class": "Lớp",
+    "room": "Phòng",
+    "instructor": "GV",
+}
+
+
+def semester_publish_dir(semester) -> Path:
+    return Path(settings.TIMETABLE_PUBLISH_DIR) / str(semester.pk)
+
+
+def load_manifest(semester):
+    path = semester_publish_dir(semester) / MANIFEST_NAME
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Ghi file tạm rồi đổi tên -> người đọc không bao giờ thấy file dở dang."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, path)
+
+
+def _etag(data: bytes) -> str:
+    return '"' + hashlib.sha1(data).hexdigest() + '"'
+
+
+def _json_bytes(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def _slot_payload(slot, data):
+    return {
+        "day_of_week": slot.day_of_week,
+        "start_period": slot.start_period,
+        "end_period": slot.end_period,
+        **data,
+    }
+
+
+def collect_semester_slots(semester):
+    """
+    1 query lấy mọi buổi học của học kỳ (+ prefetch), chia theo đối tượng.
+    Trả về (entities, cell_data):
+        entities[(loại, id)] = {"code", "name", "slots": [TeachingSlot...]}
+        cell_data[slot.pk]   = dữ liệu hiển thị tính sẵn (kèm list số tuần)
+    """
+    slots = TeachingSlot.objects.filter(
+        semester=semester,
+    ).select_related(
+        "course_section__subject",
+        "course_section__instructor",
+        "room",
+    ).prefetch_related("course_section__classes").order_by(
+        "day_of_week", "start_period"
+    )
+
+    entities = {}
+    cell_data = {}
+
+    def add(entity_type, obj, slot):
+        key = (entity_type, obj.pk)
+        if key not in entities:
+            entities[key] = {"code": obj.code, "name": obj.name, "slots": []}
+        entities[key]["slots"].append(slot)
+
+    for slot in slots:
+        data = slot_cell_data(slot)
+        data["weeks"] = slot.week_indexes
+        cell_data[slot.pk] = data
+
+        section = slot.course_section
+        for cls in section.classes.all():
+            add("class", cls, slot)
+        if slot.room_id:
+            add("room", slot.room, slot)
+        if section.instructor_id:
+            add("instructor", section.instructor, slot)
+
+    return entities, cell_data
+
+
+def _entity_json(semester, entity_type, entity_id, entity, cell_data):
+    return _json_bytes({
+        "semester": {"id": semester.pk, "code": semester.code, "academic_year": semester.academic_year.code},
+        "entity": {"type": entity_type, "id": entity_id, "code": entity["code"], "name": entity["name"]},
+        "slots": [_slot_payload(s, cell_data[s.pk]) for s in entity["slots"]],
+    })
+
+
+def _render_entity_html(semester, entity_type, entity, cell_data, published_at):
+    grid_rows = build_compact_grid(entity["slots"], cell_data=lambda s: cell_data[s.pk])
+    grid_html = render_to_string("timetable/_timetable_grid.html", {
+        "grid_rows": grid_rows,
+        "days": day_columns(),
+        "entity_type": entity_type,
+    })
+    return render_to_string("timetable/published_timetable.html", {
+        "semester": semester,
+        "entity_label": ENTITY_LABELS[entity_type],
+        "entity": entity,
+        "grid_html": grid_html,
+        "published_at": published_at,
+    }).encode("utf-8")
+
+
+def publish_semester(semester, force=False, workers=DEFAULT_WORKERS):
+    """
+    Xuất bản TKB tĩnh của 1 học kỳ.
+    force: bỏ qua manifest cũ, ghi lại mọi file.
+    Trả về {"written", "unchanged", "removed", "data_version"}.
+    """
+    out_dir = semester_publish_dir(semester)
+    old = load_manifest(semester) or {}
+    if old.get("format") != PUBLISH_FORMAT:
+        force = True
+    old_entities = {} if force else old.get("entities", {})
+
+    data_version = semester.data_version
+    if not force and old.get("data_version") == data_version:
+        # Dữ liệu học kỳ chưa đổi từ lần xuất bản trước -> không cần query
+        return {"written": 0, "unchanged": len(old_entities), "removed": 0, "data_version": data_version}
+
+    published_at = timezone.now()
+    entities, cell_data = collect_semester_slots(semester)
+
+    # Bước 1: JSON (rẻ) -> fingerprint, so với manifest để biết đối tượng nào đổi
+    jobs = []
+    new_entities = {}
+    unchanged = 0
+    for (entity_type, entity_id), entity in entities.items():
+        name = f"{entity_type}/{entity_id}"
+        json_data = _entity_json(semester, entity_type, entity_id, entity, cell_data)
+        fingerprint = hashlib.sha1(json_data).hexdigest()
+
+        prev = old_entities.get(name)
+        if prev and prev["fingerprint"] == fingerprint and (out_dir / prev["html"]).exists():
+            new_entities[name] = prev
+            unchanged += 1
+            continue
+        jobs.append((name, entity_type, entity, json_data, fingerprint))
+
+    # Bước 2: render HTML + ghi file song song
+    def publish_one(job):
+        name, entity_type, entity, json_data, fingerprint = job
+        html_data = _render_entity_html(semester, entity_type, entity, cell_data, published_at)
+        _write_atomic(out_dir / f"{name}.html", html_data)
+        _write_atomic(out_dir / f"{name}.json", json_data)
+        return name, {
+            "type": entity_type,
+            "code": entity["code"],
+            "name": entity["name"],
+            "fingerprint": fingerprint,
+            "html": f"{name}.html",
+            "json": f"{name}.json",
+            "html_etag": _etag(html_data),
+            "json_etag": _etag(json_data),
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for name, info in pool.map(publish_one, jobs):
+            new_entities[name] = info
+
+    # Đối tượng không còn buổi học nào trong học kỳ -> xoá file cũ
+    removed = 0
+    for name, info in old.get("entities", {}).items():
+        if name not in new_entities:
+            for key in ("html", "json"):
+                (out_dir / info[key]).unlink(missing_ok=True)
+            removed += 1
+
+    _write_atomic(out_dir / MANIFEST_NAME, json.dumps({
+        "format": PUBLISH_FORMAT,
+        "semester_id": semester.pk,
+        "data_version": data_version,
+        "published_at": published_at.isoformat(),
+        "entities": new_entities,
+    }, ensure_ascii=False, indent=1, sort_keys=True).encode("utf-8"))
+
+    return {
+        "written": len(jobs),
+        "unchanged": unchanged,
+        "removed": removed,
+        "data_version": data_version,
+    }
@@ -0,0 +1,110 @@
+"""
+Kiểm tra kế hoạch truy vấn (EXPLAIN) của các truy vấn nóng khi xếp TKB.
+
+Mỗi truy vấn nóng được dựng bằng đúng hàm mà engine xếp lịch dùng
+(room_conflict_slots, class_conflict_slots...), với id giả (không cần dữ liệu),
+rồi đọc EXPLAIN: dòng nào quét toàn bảng (SQLite "SCAN <bảng>", PostgreSQL
+"Seq Scan") là thiếu index cho truy vấn đó. Kèm theo: index ghép dự kiến
+có xuất hiện trong kế hoạch không (không có thì chỉ cảnh báo, planner có thể chọn khác).
+PostgreSQL tắt enable_seqscan khi EXPLAIN để bảng nhỏ / rỗng vẫn lộ ra việc có index dùng được hay không.
+"""
+import re
+
+from django.db import connection, transaction
+
+from .models import CourseSection, SemesterWeek, StudentClass
+from .services import (
+    blocking_availabilities,
+    class_conflict_slots,
+    instructor_conflict_slots,
+    room_conflict_slots,
+)
+
+# Id giả: EXPLAIN chỉ cần dạng câu truy vấn, không cần dòng thật
+_ID = 1
+_WEEKS = [SemesterWeek(index=1), SemesterWeek(index=2)]
+
+HOT_QUERIES = [
+    (
+        "room_conflict",
+        "Trùng phòng: buổi học theo học kỳ + phòng + thứ",
+        "slot_sem_room_day_period_idx",
+        lambda: room_conflict_slots(_ID, _ID, 1, 1, 4, _WEEKS),
+    ),
+    (
+        "instructor_conflict",
+        "Trùng GV: buổi học theo học kỳ + GV + thứ",
+        "slot_section_day_idx",
+        lambda: instructor_conflict_slots(_ID, _ID, 1, 1, 4, _WEEKS),
+    ),
+    (
+        "class_conflict",
+        "Trùng Lớp SV: buổi học theo học kỳ + lớp + thứ",
+        "slot_section_day_idx",
+        lambda: class_conflict_slots(
+            [StudentClass(pk=_ID)], _ID, 1, 1, 4, _WEEKS,
+            # LHP là nhóm của lớp bị chia -> có thêm điều kiện loại các nhóm cùng môn
+            section=CourseSection(pk=_ID, subject_id=_ID, student_count=1),
+        ),
+    ),
+    (
+        "instructor_availability",
+        "Khung bận của GV theo GV + thứ",
+        "avail_ins_day_idx",
+        lambda: blocking_availabilities(_ID, 1, 1, 4),
+    ),
+    (
+        "section_by_code",
+        "Lớp HP theo học kỳ + mã",
+        "semester_id_code",  # index của unique_together (tên do Django sinh)
+        lambda: CourseSection.objects.filter(semester_id=_ID, code="X"),
+    ),
+    (
+        "sections_by_department",
+        "Lớp HP theo học kỳ + Khoa (xếp TKB / xem LHP theo Khoa)",
+        "section_sem_department_idx",
+        lambda: CourseSection.objects.filter(semester_id=_ID, department__code="X"),
+    ),
+]
+
+_SQLITE_SCAN = re.compile(r"\bSCAN (\w+)")
+
+
+def full_scan_lines(plan, vendor):
+    """Các dòng kế hoạch là quét toàn bảng (rỗng = mọi bảng đều đi qua index)."""
+    lines = []
+    for line in plan.splitlines():
+        if vendor == "sqlite":
+            match = _SQLITE_SCAN.search(line)
+            # "SCAN CONSTANT ROW" / subquery tạm không phải bảng thật
+            if match and match.group(1) not in ("CONSTANT", "SUBQUERY"):
+                lines.append(line.strip())
+        elif vendor == "postgresql":
+            if "Seq Scan" in line:
+                lines.append(line.strip())
+    return lines
+
+
+def explain_hot_queries():
+    """
+    EXPLAIN từng truy vấn nóng trên DB hiện tại.
+    Trả về list {"name", "label", "index", "plan", "full_scans", "uses_index"};
+    full_scans = None nếu DB không hỗ trợ đọc kế hoạch.
+    """
+    vendor = connection.vendor
+    results = []
+    for name, label, index, build in HOT_QUERIES:
+        with transaction.atomic():
+            if vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = build().explain()
+        results.append({
+            "name": name,
+            "label": label,
+            "index": index,
+            "plan": plan,
+            "uses_index": index in plan,
+            "full_scans": full_scan_lines(plan, vendor) if vendor in ("sqlite", "postgresql") else None,
+        })
+    return results
@@ -0,0 +1,337 @@
+"""
+Sinh Lớp học phần theo kiểu "xem trước rồi áp dụng".
+
+- plan_course_sections: tính toàn bộ LHP cần có của học kỳ (mã, môn, số tiết,
+  sĩ số, lớp) trong bộ nhớ - vài query, không ghi gì.
+- preview_course_sections: so kế hoạch với CourseSection đang có -> danh sách thay đổi
+  (tạo mới / cập nhật số tiết, sĩ số, lớp / LHP không còn trong kế hoạch) để UI hiển thị.
+- apply_course_section_changes: chỉ ghi các thay đổi được chọn, theo lô
+  (bulk_create / bulk_update / bảng trung gian LHP–lớp), tăng data_version 1 lần.
+LHP đã khoá (is_locked) không bị sửa; LHP đã có buổi học không bị xoá.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .grid_services import bump_semester_data_version
+from .models import CourseSection, Curriculum, CurriculumSubject, StudentClass
+from .semester_index_services import get_semester_index_map
+from .services import clamp_semester_index, get_max_size_for_subject, partition_classes, refresh_section_rollups
+
+CHANGE_ACTIONS = {
+    "create": "Tạo mới",
+    "update": "Cập nhật",
+    "delete": "Không còn trong kế hoạch",
+}
+FIELD_LABELS = {
+    "subject": "Môn",
+    "planned_periods": "Số tiết",
+    "student_count": "Sĩ số",
+}
+
+
+def plan_course_sections(semester, department_code=None):
+    """
+    Kế hoạch LHP của học kỳ (quy tắc xem generate_course_sections_for_semester).
+    Trả về (targets, class_ids):
+        targets[code] = {"code", "subject", "planned_periods", "student_count", "classes"}
+        (student_count = None nếu LHP học nguyên các lớp, xem partition_classes)
+        class_ids     = id các Lớp SV trong phạm vi (Khoa) đã xét
+    """
+    # --- Lọc lớp theo Khoa (nếu có) ---
+    classes_qs = StudentClass.objects.select_related(
+        "major__level", "academic_year",
+    ).order_by("id")
+    if department_code:
+        classes_qs = classes_qs.filter(department__code=department_code)
+
+    # --- Gom lớp theo (Ngành, Khoá) ---
+    groups = defaultdict(list)
+    for cls in classes_qs:
+        groups[(cls.major_id, cls.academic_year_id)].append(cls)
+    class_ids = {cls.pk for group_classes in groups.values() for cls in group_classes}
+    if not groups:
+        return {}, class_ids
+
+    # --- Nạp trước CTĐT + môn CTĐT của mọi nhóm (2 query) ---
+    curricula = {
+        (c.major_id, c.intake_year_id): c.pk
+        for c in Curriculum.objects.filter(
+            major_id__in={major_id for major_id, _ in groups},
+            intake_year_id__in={year_id for _, year_id in groups},
+        )
+    }
+    # Học kỳ thứ mấy của từng Khoá: tra bảng SemesterIndexMapping (1 query)
+    index_map = get_semester_index_map(semester, {year_id for _, year_id in groups})
+    group_semester_index = {}
+    for key, group_classes in groups.items():
+        if key not in curricula or index_map.get(key[1]) is None:
+            # Không có CTĐT / chưa xác định học kỳ thứ mấy -> bỏ cả nhóm
+            continue
+        # Dùng 1 lớp trong nhóm để giới hạn theo bậc đào tạo (cùng ngành nên giống nhau)
+        group_semester_index[key] = clamp_semester_index(index_map[key[1]], group_classes[0])
+    cur_subjects = defaultdict(list)
+    for cs in CurriculumSubject.objects.filter(
+        curriculum_id__in=set(curricula.values()),
+        semester_index__in=set(group_semester_index.values()),
+    ).select_related("subject").order_by("id"):
+        cur_subjects[(cs.curriculum_id, cs.semester_index)].append(cs)
+
+    # --- Tính toàn bộ LHP cần có ---
+    targets = {}
+    for key, semester_index in group_semester_index.items():
+        group_classes = groups[key]
+        # Code LHP: dùng mã lớp đầu tiên + mã môn + số thứ tự
+        base_class_code = group_classes[0].code  # ví dụ: 26SPIT1
+
+        for cs in cur_subjects.get((curricula[key], semester_index), []):
+            subject = cs.subject
+
+            # Bỏ môn do đơn vị khác xếp
+            if subject.is_external_managed:
+                continue
+
+            total_periods = cs.total_periods or subject.total_periods
+            partitions = partition_classes(group_classes, get_max_size_for_subject(subject))
+
+            for i, members in enumerate(partitions, start=1):
+                section_code = f"{base_class_code}_{subject.code}_{i:02d}"
+                # Chỉ LHP có nhóm của lớp bị chia mới ghi sĩ số riêng (dấu hiệu "chia nhóm"),
+                # LHP học nguyên các lớp để trống -> dùng total_students
+                is_split = any(count < (cls.size or 0) for cls, count in members)
+                if section_code not in targets:
+                    targets[section_code] = {
+                        "code": section_code,
+                        "subject": subject,
+                        "planned_periods": total_periods,
+                        "student_count": sum(count for _, count in members) if is_split else None,
+                        "classes": [cls for cls, _ in members],
+                    }
+
+    return targets, class_ids
+
+
+def _load_existing_sections(semester, codes, class_ids):
+    """LHP đang có của học kỳ: trùng mã với kế hoạch hoặc có lớp trong phạm vi."""
+    scope = Q(code__in=codes)
+    if class_ids:
+        scope |= Q(classes__in=class_ids)
+    ids = CourseSection.objects.filter(semester=semester).filter(scope).values("pk")
+    sections = {
+        section.code: section
+        for section in CourseSection.objects.filter(pk__in=ids).select_related("subject").annotate(
+            slot_count=Count("slots"),
+        )
+    }
+    links = defaultdict(set)
+    for section_id, class_id in CourseSection.classes.through.objects.filter(
+        coursesection_id__in=[s.pk for s in sections.values()],
+    ).values_list("coursesection_id", "studentclass_id"):
+        links[section_id].add(class_id)
+    return sections, links
+
+
+def preview_course_sections(semester, department_code=None):
+    """
+    So kế hoạch LHP với dữ liệu hiện có, không ghi gì.
+    Mỗi thay đổi là 1 dict:
+        key            : "<action>:<mã LHP>" (dùng để chọn áp dụng)
+        action         : create / update / delete
+        code, subject, section (LHP đang có hoặc None)
+        fields         : {tên trường: (giá trị cũ, giá trị mới)}
+        action_label, field_changes : để hiển thị (field_changes = list (nhãn, cũ, mới))
+        add_classes, remove_classes : list Lớp SV
+        blocked        : lý do không áp dụng được ("" nếu được)
+        default        : có chọn sẵn trên UI không
+    """
+    targets, class_ids = plan_course_sections(semester, department_code)
+    sections, links = _load_existing_sections(semester, list(targets), class_ids)
+
+    # Lớp SV được nhắc tới trong LHP đang có mà không thuộc kế hoạch (để hiển thị mã)
+    class_map = {cls.pk: cls for target in targets.values() for cls in target["classes"]}
+    unknown = {cid for ids in links.values() for cid in ids} - set(class_map)
+    if unknown:
+        class_map.update(StudentClass.objects.in_bulk(unknown))
+
+    changes = []
+    for code, target in targets.items():
+        section = sections.get(code)
+        target_ids = {cls.pk for cls in target["classes"]}
+        if section is None:
+            changes.append({
+                "key": f"create:{code}",
+                "action": "create",
+                "code": code,
+                "subject": target["subject"],
+                "section": None,
+                "fields": {
+                    "planned_periods": (None, target["planned_periods"]),
+                    "student_count": (None, target["student_count"]),
+                },
+                "add_classes": target["classes"],
+                "remove_classes": [],
+                "blocked": "",
+                "default": True,
+            })
+            continue
+
+        fields = {}
+        if section.subject_id != target["subject"].pk:
+            fields["subject"] = (section.subject, target["subject"])
+        for field in ("planned_periods", "student_count"):
+            if getattr(section, field) != target[field]:
+                fields[field] = (getattr(section, field), target[field])
+        current_ids = links.get(section.pk, set())
+        add_ids = target_ids - current_ids
+        remove_ids = current_ids - target_ids
+        if not (fields or add_ids or remove_ids):
+            continue
+        changes.append({
+            "key": f"update:{code}",
+            "action": "update",
+            "code": code,
+            "subject": target["subject"],
+            "section": section,
+            "fields": fields,
+            "add_classes": [class_map[cid] for cid in sorted(add_ids)],
+            "remove_classes": [class_map[cid] for cid in sorted(remove_ids)],
+            "blocked": "LHP đã khoá" if section.is_locked else "",
+            "default": not section.is_locked,
+        })
+
+    for code, section in sections.items():
+        if code in targets:
+            continue
+        blocked = ""
+        if section.is_locked:
+            blocked = "LHP đã khoá"
+        elif section.slot_count:
+            blocked = f"Đã có {section.slot_count} buổi học"
+        changes.append({
+            "key": f"delete:{code}",
+            "action": "delete",
+            "code": code,
+            "subject": section.subject,
+            "section": section,
+            "fields": {},
+            "add_classes": [],
+            "remove_classes": [class_map[cid] for cid in sorted(links.get(section.pk, ()))],
+            "blocked": blocked,
+            "default": False,
+        })
+
+    for change in changes:
+        change["action_label"] = CHANGE_ACTIONS[change["action"]]
+        change["field_changes"] = [
+            (FIELD_LABELS[field], old, new) for field, (old, new) in change["fields"].items()
+            if old is not None or new is not None
+        ]
+
+    order = list(CHANGE_ACTIONS)
+    changes.sort(key=lambda c: (order.index(c["action"]), c["code"]))
+    return changes
+
+
+def summarize_changes(changes):
+    """Số thay đổi theo loại: {"create": n, "update": n, "delete": n}."""
+    summary = {action: 0 for action in CHANGE_ACTIONS}
+    for change in changes:
+        summary[change["action"]] += 1
+    return summary
+
+
+@transaction.atomic
+def apply_course_section_changes(semester, changes, accepted_keys=None):
+    """
+    Ghi các thay đổi (kết quả preview_course_sections) có key thuộc accepted_keys
+    (None = mọi thay đổi chọn sẵn). Thay đổi bị chặn (blocked) luôn bỏ qua.
+    Trả về {"created": [LHP mới], "updated": n, "deleted": số LHP thật sự xoá,
+    "delete_skipped": [mã LHP không xoá vì đã khoá / đã xếp lịch]}.
+    """
+    if accepted_keys is None:
+        accepted = [c for c in changes if c["default"] and not c["blocked"]]
+    else:
+        accepted_keys = set(accepted_keys)
+        accepted = [c for c in changes if c["key"] in accepted_keys and not c["blocked"]]
+
+    Through = CourseSection.classes.through
+    new_links = []
+    remove_q = Q()
+
+    # --- Tạo mới ---
+    created = [
+        CourseSection(
+            semester=semester,
+            code=c["code"],
+            subject=c["subject"],
+            planned_periods=c["fields"]["planned_periods"][1],
+            student_count=c["fields"]["student_count"][1],
+        )
+        for c in accepted if c["action"] == "create"
+    ]
+    if created:
+        CourseSection.objects.bulk_create(created)
+        # Không phải DB nào cũng trả id sau bulk_create -> đọc lại theo mã
+        ids = dict(
+            CourseSection.objects.filter(semester=semester, code__in=[s.code for s in created])
+            .values_list("code", "id")
+        )
+        for section in created:
+            section.pk = ids[section.code]
+        created_by_code = {s.code: s for s in created}
+        for c in accepted:
+            if c["action"] == "create":
+                section_id = created_by_code[c["code"]].pk
+                new_links += [Through(coursesection_id=section_id, studentclass_id=cls.pk) for cls in c["add_classes"]]
+
+    # --- Cập nhật ---
+    to_update = []
+    update_fields = set()
+    for c in accepted:
+        if c["action"] != "update":
+            continue
+        section = c["section"]
+        for field, (_, new) in c["fields"].items():
+            setattr(section, field, new)
+            update_fields.add(field)
+        if c["fields"]:
+            to_update.append(section)
+        new_links += [Through(coursesection_id=section.pk, studentclass_id=cls.pk) for cls in c["add_classes"]]
+        if c["remove_classes"]:
+            remove_q |= Q(coursesection_id=section.pk, studentclass_id__in=[cls.pk for cls in c["remove_classes"]])
+    if to_update:
+        CourseSection.objects.bulk_update(to_update, sorted(update_fields))
+
+    if new_links:
+        Through.objects.bulk_create(new_links, ignore_conflicts=True)
+    if remove_q:
+        Through.objects.filter(remove_q).delete()
+
+    # --- Xoá LHP không còn trong kế hoạch (chưa có buổi học, chưa khoá) ---
+    delete_ids = [c["section"].pk for c in accepted if c["action"] == "delete"]
+    deleted, delete_skipped = 0, []
+    if delete_ids:
+        _, per_model = CourseSection.objects.filter(
+            pk__in=delete_ids, is_locked=False, slots__isnull=True,
+        ).delete()
+        deleted = per_model.get(CourseSection._meta.label, 0)
+        # Còn lại = LHP đã khoá / đã có buổi học từ lúc xem trước -> không xoá, báo riêng
+        delete_skipped = list(
+            CourseSection.objects.filter(pk__in=delete_ids).order_by("code").values_list("code", flat=True)
+        )
+
+    if accepted:
+        # bulk_create / bulk_update / bảng trung gian không phát signal
+        # -> tự tính lại tổng sĩ số, Khoa của LHP và tăng phiên bản dữ liệu học kỳ
+        refresh_section_rollups(
+            [s.pk for s in created] + [c["section"].pk for c in accepted if c["action"] == "update"]
+        )
+        bump_semester_data_version([semester.pk])
+
+    return {
+        "created": created,
+        "updated": sum(1 for c in accepted if c["action"] == "update"),
+        "deleted": deleted,
+        "delete_skipped": delete_skipped,
+    }
@@ -0,0 +1,118 @@
+"""
+Bảng tra "học kỳ thứ mấy trong CTĐT" theo (Khoá nhập học, Học kỳ).
+
+Trước đây mỗi lần sinh LHP đều tách số năm khỏi AcademicYear.code rồi áp quy
+tắc HK1/HK2, mã lạ (HK hè...) âm thầm thành học kỳ 1. Giờ kết quả được tính
+1 lần, lưu ở SemesterIndexMapping, các nơi dùng chỉ tra dict:
+- HK1 năm thứ d (tính từ năm nhập học, d = 0, 1, ...) -> 1 + 2d
+- HK2                                                   -> 2 + 2d
+- HK3 / học kỳ hè: học tiếp chương trình của HK2 cùng năm học -> 2 + 2d
+- Không xác định được -> để trống, admin sửa tay (is_manual).
+"""
+import re
+from typing import Optional
+
+from django.db import transaction
+
+from .models import AcademicYear, Semester, SemesterIndexMapping
+
+FIRST_TERM_CODES = {"HK1", "1", "HKI"}
+SECOND_TERM_CODES = {"HK2", "2", "HKII"}
+SUMMER_TERM_CODES = {"HK3", "3", "HKIII", "HE", "HÈ", "HKHE", "HKHÈ", "SUMMER"}
+
+
+def academic_year_start(code) -> Optional[int]:
+    """
+    Năm bắt đầu của mã năm học / khoá:
+    '2025' -> 2025, '2025-2026' -> 2025, 'K25' / 'NH25-26' -> 2025.
+    """
+    text = str(code or "")
+    match = re.search(r"\d{4}", text)
+    if match:
+        return int(match.group())
+    match = re.search(r"\d{2}", text)
+    if match:
+        return 2000 + int(match.group())
+    return None
+
+
+def compute_semester_index(intake_start: Optional[int], semester_code, semester_year_start: Optional[int]):
+    """Học kỳ thứ mấy trong CTĐT; None nếu không xác định được."""
+    if intake_start is None or semester_year_start is None:
+        return None
+    year_diff = semester_year_start - intake_start
+    if year_diff < 0:
+        return None
+
+    term = (semester_code or "").upper().replace(" ", "").replace("_", "")
+    if term in FIRST_TERM_CODES:
+        return 1 + 2 * year_diff
+    if term in SECOND_TERM_CODES or term in SUMMER_TERM_CODES:
+        return 2 + 2 * year_diff
+    return None
+
+
+@transaction.atomic
+def rebuild_semester_index_map(semesters=None, intake_years=None):
+    """
+    Tính lại bảng tra cho các Học kỳ × Khoá (mặc định: tất cả).
+    Dòng đã chỉnh tay (is_manual) giữ nguyên. Chỉ tạo cặp có năm nhập học <= năm học của Học kỳ.
+    Trả về {"created", "updated", "unresolved"}.
+    """
+    if semesters is None:
+        semesters = Semester.objects.select_related("academic_year")
+    if intake_years is None:
+        intake_years = AcademicYear.objects.all()
+    semesters = list(semesters)
+    intakes = [(year.pk, academic_year_start(year.code)) for year in intake_years]
+
+    existing = {
+        (row.intake_year_id, row.semester_id): row
+        for row in SemesterIndexMapping.objects.filter(
+            semester__in=semesters, intake_year_id__in=[pk for pk, _ in intakes],
+        )
+    }
+
+    to_create, to_update = [], []
+    unresolved = 0
+    for semester in semesters:
+        year_start = academic_year_start(semester.academic_year.code)
+        for intake_id, intake_start in intakes:
+            if intake_start is not None and year_start is not None and intake_start > year_start:
+                continue
+            index = compute_semester_index(intake_start, semester.code, year_start)
+            row = existing.get((intake_id, semester.pk))
+            if row is None:
+                to_create.append(SemesterIndexMapping(
+                    intake_year_id=intake_id, semester=semester, semester_index=index,
+                ))
+            elif not row.is_manual and row.semester_index != index:
+                row.semester_index = index
+                to_update.append(row)
+            else:
+                index = row.semester_index
+            if index is None:
+                unresolved += 1
+
+    SemesterIndexMapping.objects.bulk_create(to_create, ignore_conflicts=True)
+    SemesterIndexMapping.objects.bulk_update(to_update, ["semester_index"])
+    return {"created": len(to_create), "updated": len(to_update), "unresolved": unresolved}
+
+
+def get_semester_index_map(semester, intake_year_ids):
+    """
+    {intake_year_id: học kỳ thứ mấy (None = chưa xác định)} của 1 Học kỳ.
+    1 query khi bảng tra đã đủ; Khoá nào chưa có dòng thì tính bổ sung rồi đọc lại.
+    """
+    intake_year_ids = set(intake_year_ids)
+    rows = SemesterIndexMapping.objects.filter(semester=semester, intake_year_id__in=intake_year_ids)
+    mapping = dict(rows.values_list("intake_year_id", "semester_index"))
+
+    missing = intake_year_ids - set(mapping)
+    if missing:
+        rebuild_semester_index_map(
+            semesters=Semester.objects.filter(pk=semester.pk).select_related("academic_year"),
+            intake_years=AcademicYear.objects.filter(pk__in=missing),
+        )
+        mapping = dict(rows.values_list("intake_year_id", "semester_index"))
+    return mapping
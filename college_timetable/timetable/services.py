@@ -1,6 +1,5 @@
 from math import ceil
-from django.db.models import Q
-from datetime import timedelta
+from django.db.models import F, Q
 from django.db import models
 from typing import Optional
 from collections import defaultdict 
@@ -8,8 +7,6 @@ from collections import defaultdict
 from .models import (    
     AcademicYear,    
     CourseSection,  
-    Curriculum,
-    CurriculumSubject,  
     EnterpriseInternship,
     Instructor,
     InstructorAvailability,    
@@ -21,10 +18,11 @@ from .models import (
     StudentClass,
     Semester,
     SemesterWeek,
-    SemesterBreak, 
     Subject,
     TeachingSlot,   
 )
+from .calendar_services import regenerate_semester_weeks, teaching_day_week_masks
+from .semester_index_services import get_semester_index_map
 
 ACADEMIC_YEAR_MONTHS = 10  # hoặc 12 nếu bạn muốn tính theo năm dương lịch
 
@@ -174,59 +172,25 @@ def auto_distribute_research_members(project: ResearchProject):
 #         # Nếu dùng code khác (VD: 'HK3', 'Hè'...), bạn xử lý thêm.
 #         raise ValueError(f"Không hiểu mã Học kỳ: {semester.code}")
 
-def _extract_year_int(code: str) -> Optional[int]:
-    """
-    Lấy ra phần số trong mã năm học, ví dụ:
-    - '2025'      -> 2025
-    - '2025-2026' -> 2025
-    - 'NH25-26'   -> 25  (tuỳ bạn muốn xử lý sao)
-    """
-    if not code:
-        return None
-    digits = "".join(ch for ch in str(code) if ch.isdigit())
-    if not digits:
-        return None
-    return int(digits)
+def clamp_semester_index(semester_index: int, student_class: StudentClass) -> int:
+    """Giới hạn học kỳ thứ mấy trong [1 .. số học kỳ toàn khoá] của bậc đào tạo."""
+    duration = getattr(student_class.major.level, "duration_semesters", 5) or 5
+    return min(max(semester_index, 1), duration)
 
-def get_semester_index_for_class(student_class: StudentClass, semester: Semester) -> int:
+def get_semester_index_for_class(student_class: StudentClass, semester: Semester) -> Optional[int]:
     """
     Xác định 'học kỳ thứ mấy' trong CTĐT của một lớp tại một Học kỳ cụ thể.
 
-    Quy ước:
-    - Mỗi năm có 2 học kỳ: HK1, HK2.
-    - HK1 của khoá nhập học -> học kỳ 1
-    - HK2 của năm nhập học  -> học kỳ 2
-    - HK1 của năm kế tiếp   -> học kỳ 3
-    - HK2 của năm kế tiếp   -> học kỳ 4
-    ...
+    Tra bảng SemesterIndexMapping theo (Khoá của lớp, Học kỳ) - quy tắc tính
+    (HK1 / HK2 / HK3 - hè) ở semester_index_services, chỉnh tay trong admin.
+    Trả về None nếu bảng tra chưa xác định được.
     """
-    cur_year = _extract_year_int(semester.academic_year.code)
-    intake_year = _extract_year_int(student_class.academic_year.code)
-
-    if cur_year is None or intake_year is None:
-        # Không parse được -> mặc định HK1
-        return 1
-
-    year_diff = cur_year - intake_year  # 0, 1, 2, ...
-
-    code = (semester.code or "").upper()
-    # Mặc định HK1/HK2
-    if code in ("HK1", "1"):
-        sem_index = 1 + 2 * year_diff     # 0 -> 1, 1 -> 3, 2 -> 5...
-    elif code in ("HK2", "2"):
-        sem_index = 2 + 2 * year_diff     # 0 -> 2, 1 -> 4, 2 -> 6...
-    else:
-        # nếu có HK Hè, HK3... bạn bổ sung thêm
-        sem_index = 1
-
-    # Giới hạn trong số học kỳ của bậc đào tạo
-    duration = getattr(student_class.major.level, "duration_semesters", 5) or 5
-    if sem_index < 1:
-        sem_index = 1
-    if sem_index > duration:
-        sem_index = duration
-
-    return sem_index
+    index = get_semester_index_map(semester, [student_class.academic_year_id]).get(
+        student_class.academic_year_id
+    )
+    if index is None:
+        return None
+    return clamp_semester_index(index, student_class)
 
 # def generate_course_sections_for_semester(semester: Semester, department_code: str = "CNTT"):
 #     """
@@ -499,6 +463,52 @@ def get_semester_index_for_class(student_class: StudentClass, semester: Semester
 
 #     return created_sections
 
+def partition_classes(classes, max_size: int) -> list[list[tuple[StudentClass, int]]]:
+    """
+    Chia các lớp của 1 nhóm ngành–khoá vào các LHP sao cho mỗi LHP <= max_size
+    và sĩ số các LHP lệch nhau không quá 1.
+
+    - Số LHP = ceil(tổng sĩ số / max_size) (ít nhất 1); sĩ số mục tiêu của từng
+      LHP = tổng sĩ số chia đều (VD 33 SV / 2 LHP -> 17 + 16).
+    - Xếp lớp từ lớn đến nhỏ: lớp vừa chỗ còn trống của 1 LHP thì vào nguyên lớp
+      (LHP còn ít chỗ nhất mà vẫn vừa); không LHP nào vừa thì tách lớp đó,
+      lấp đầy các LHP còn nhiều chỗ nhất trước (ít nhóm nhất).
+    Trả về list LHP, mỗi LHP là list (lớp, số SV của lớp đó học trong LHP).
+    """
+    total = sum(c.size or 0 for c in classes)
+    num_sections = ceil(total / max_size) if total > 0 else 1
+    base, extra = divmod(total, num_sections)
+    room_left = [base + (1 if i < extra else 0) for i in range(num_sections)]
+
+    bins: list[dict[int, list]] = [{} for _ in range(num_sections)]
+
+    def put(idx, cls, count):
+        entry = bins[idx].setdefault(cls.pk, [cls, 0])
+        entry[1] += count
+        room_left[idx] -= count
+
+    for cls in sorted(classes, key=lambda c: -(c.size or 0)):
+        size = cls.size or 0
+        fits = [i for i in range(num_sections) if room_left[i] >= size]
+        if fits:
+            put(min(fits, key=lambda i: (room_left[i], i)), cls, size)
+            continue
+        # Không LHP nào đủ chỗ cho cả lớp -> chia nhóm
+        remaining = size
+        for i in sorted(range(num_sections), key=lambda i: (-room_left[i], i)):
+            take = min(remaining, room_left[i])
+            if take > 0:
+                put(i, cls, take)
+                remaining -= take
+            if not remaining:
+                break
+
+    return [
+        [(cls, count) for cls, count in bin_.values()]
+        for bin_ in bins if bin_
+    ]
+
+
 def generate_course_sections_for_semester(
     semester: Semester,
     department_code: str | None = "CNTT",
@@ -511,86 +521,31 @@ def generate_course_sections_for_semester(
     - Chỉ lấy lớp thuộc department_code (nếu truyền).
     - Với mỗi nhóm ngành–khoá:
         + Lấy Curriculum tương ứng.
-        + Tính semester_index bằng get_semester_index_for_class
-          (dùng bất kỳ lớp nào trong nhóm vì cùng khoá).
+        + Tra semester_index trong bảng SemesterIndexMapping (cùng khoá nên
+          cả nhóm dùng chung); Khoá chưa xác định được thì bỏ qua.
         + Lấy CurriculumSubject của học kỳ đó.
         + Với mỗi môn:
-            * tổng_sĩ_số = sum(size của tất cả lớp trong nhóm)
             * max_size = get_max_size_for_subject(subject)
-            * số_LHP = ceil(tổng_sĩ_số / max_size)
-        + Tạo đúng số_LHP CourseSection và gán TẤT CẢ các lớp trong nhóm
-          vào từng section (course_section.classes.add(*group_classes)).
+            * chia các lớp vào ceil(tổng_sĩ_số / max_size) LHP bằng
+              partition_classes (lớp quá đông được chia nhóm)
+        + Mỗi LHP chỉ gắn các lớp (hoặc nhóm của lớp) được chia vào nó;
+          LHP có nhóm của lớp bị chia thì ghi student_count = sĩ số thực.
+
+    Kế hoạch được tính trong bộ nhớ (section_plan_services.plan_course_sections)
+    rồi so với LHP đang có; hàm này chỉ ghi các LHP còn thiếu (bulk_create),
+    LHP đã có giữ nguyên. Muốn xem trước / cập nhật / dọn LHP cũ: dùng
+    preview_course_sections + apply_course_section_changes.
+    Trả về list LHP mới tạo.
     """
+    from .section_plan_services import apply_course_section_changes, preview_course_sections  # tránh circular import
 
-    # --- Lọc lớp theo Khoa (nếu có) ---
-    classes_qs = StudentClass.objects.all().select_related("major", "academic_year", "department")
-    if department_code:
-        classes_qs = classes_qs.filter(department__code=department_code)
-
-    # --- Gom lớp theo (Ngành, Khoá) ---
-    groups: dict[tuple[int, int], list[StudentClass]] = defaultdict(list)
-    for cls in classes_qs:
-        key = (cls.major_id, cls.academic_year_id)
-        groups[key].append(cls)
-
-    created_sections: list[CourseSection] = []
-
-    for (major_id, intake_year_id), group_classes in groups.items():
-        # Lấy Curriculum cho ngành–khoá này
-        try:
-            curriculum = Curriculum.objects.get(
-                major_id=major_id,
-                intake_year_id=intake_year_id,
-            )
-        except Curriculum.DoesNotExist:
-            # Không có CTĐT -> bỏ cả nhóm
-            continue
-
-        # Dùng 1 lớp trong nhóm để tính semester_index (cùng khoá nên giống nhau)
-        sample_class = group_classes[0]
-        semester_index = get_semester_index_for_class(sample_class, semester)
-
-        # Các môn học kỳ này trong CTĐT
-        cur_subjects = CurriculumSubject.objects.filter(
-            curriculum=curriculum,
-            semester_index=semester_index,
-        ).select_related("subject")
-
-        # Tổng sĩ số của cả nhóm ngành–khoá
-        total_group_size = sum(c.size or 0 for c in group_classes)
-
-        for cs in cur_subjects:
-            subject: Subject = cs.subject
-
-            # Bỏ môn do đơn vị khác xếp
-            if subject.is_external_managed:
-                continue
-
-            total_periods = cs.total_periods or subject.total_periods
-
-            max_size = get_max_size_for_subject(subject)
-            num_sections = ceil(total_group_size / max_size) if total_group_size > 0 else 1
-
-            for i in range(1, num_sections + 1):
-                # Code LHP: dùng mã lớp đầu tiên + mã môn + số thứ tự
-                base_class_code = sample_class.code  # ví dụ: 26SPIT1
-                section_code = f"{base_class_code}_{subject.code}_{i:02d}"
-
-                section, is_created = CourseSection.objects.get_or_create(
-                    semester=semester,
-                    code=section_code,
-                    defaults={
-                        "subject": subject,
-                        "planned_periods": total_periods,
-                    },
-                )
-                # Gán tất cả lớp trong nhóm ngành–khoá vào LHP này
-                section.classes.add(*group_classes)
-
-                if is_created:
-                    created_sections.append(section)
-
-    return created_sections
+    changes = preview_course_sections(semester, department_code)
+    result = apply_course_section_changes(
+        semester,
+        changes,
+        accepted_keys=[c["key"] for c in changes if c["action"] == "create"],
+    )
+    return result["created"]
 
 # ================
 # HELPER TOOL
@@ -694,13 +649,58 @@ def periods_per_session_for_subject(section: CourseSection) -> int:
         qs = qs.filter(Q(allowed_majors__isnull=True) | Q(allowed_majors__in=majors)).distinct()
 
     return list(qs)
+
+
+def section_student_count(section: CourseSection) -> int:
+    """
+    Số SV thực học trong LHP (dùng khi cần sĩ số: chọn phòng theo sức chứa...):
+    - LHP là 1 nhóm của lớp bị chia (student_count có giá trị): sĩ số nhóm;
+    - LHP học nguyên các Lớp SV: tổng sĩ số các lớp (total_students, tính sẵn).
+    Không đọc thẳng 2 cột: total_students của nhóm là sĩ số cả lớp, không phải của nhóm.
+    """
+    if section.student_count is not None:
+        return section.student_count
+    return section.total_students
+
+
+def refresh_section_rollups(section_ids):
+    """
+    Tính lại CourseSection.total_students / department từ các Lớp SV (1 query đọc + bulk_update).
+    Gọi sau khi đổi Lớp SV của LHP, sĩ số / Khoa của Lớp SV. Trả về số LHP thay đổi.
+    """
+    section_ids = set(section_ids)
+    if not section_ids:
+        return 0
+
+    totals = dict.fromkeys(section_ids, 0)
+    by_department = defaultdict(lambda: defaultdict(int))
+    for section_id, size, department_id in CourseSection.classes.through.objects.filter(
+        coursesection_id__in=section_ids,
+    ).values_list("coursesection_id", "studentclass__size", "studentclass__department_id"):
+        totals[section_id] += size or 0
+        if department_id is not None:
+            by_department[section_id][department_id] += size or 0
+
+    changed = []
+    for section in CourseSection.objects.filter(pk__in=section_ids).only("id", "total_students", "department_id"):
+        counts = by_department.get(section.pk)
+        # Khoa đông SV nhất (bằng nhau -> id nhỏ hơn), không có Lớp SV -> để trống
+        department_id = min(counts, key=lambda d: (-counts[d], d)) if counts else None
+        if section.total_students != totals[section.pk] or section.department_id != department_id:
+            section.total_students = totals[section.pk]
+            section.department_id = department_id
+            changed.append(section)
+    CourseSection.objects.bulk_update(changed, ["total_students", "department"], batch_size=500)
+    return len(changed)
+
+
 def get_candidate_rooms_for_section(section: CourseSection):
     """
     Lấy danh sách phòng phù hợp cho Lớp học phần:
     - Nếu môn là 'thực tập' (per_session = 0) -> trả [] (không cần phòng)
     """
     subject = section.subject
-    total_students = sum(cls.size for cls in section.classes.all())
+    total_students = section_student_count(section)
 
     # Nếu môn thực tập (không dạy trong phòng)
     from .services import periods_per_session_for_subject  # nếu cùng file thì có thể bỏ import này
@@ -733,11 +733,21 @@ def time_overlap(a_start, a_end, b_start, b_end) -> bool:
     """Hai đoạn tiết có giao nhau không?"""
     return not (a_end < b_start or b_end < a_start)
 
-def weeks_overlap(weeks_a, weeks_b) -> bool:
-    """Hai tập tuần có giao nhau không?"""
-    set_a = {w.id for w in weeks_a}
-    set_b = {w.id for w in weeks_b}
-    return bool(set_a & set_b)
+def weeks_mask_of(weeks) -> int:
+    """Bitmask (bit tuần thứ - 1) của danh sách SemesterWeek, so với TeachingSlot.weeks_mask."""
+    mask = 0
+    for w in weeks:
+        mask |= 1 << (w.index - 1)
+    return mask
+
+def overlapping_slots(slots, start_period, end_period, weeks):
+    """Lọc (trong DB) các buổi trùng đoạn tiết và có chung ít nhất 1 tuần."""
+    return slots.filter(
+        start_period__lte=end_period,
+        end_period__gte=start_period,
+    ).alias(
+        common_weeks=F("weeks_mask").bitand(weeks_mask_of(weeks)),
+    ).filter(common_weeks__gt=0)
 
 def instructor_is_available(instructor, day_of_week, start_period, end_period):
     """
@@ -747,70 +757,82 @@ def instructor_is_available(instructor, day_of_week, start_period, end_period):
     if instructor is None:
         return True
 
-    blocked = InstructorAvailability.objects.filter(
+    return not blocking_availabilities(instructor, day_of_week, start_period, end_period).exists()
+
+def blocking_availabilities(instructor, day_of_week, start_period, end_period):
+    """Các khung 'không rảnh' của GV trùng đoạn tiết (index avail_ins_day_idx)."""
+    return InstructorAvailability.objects.filter(
         instructor=instructor,
         day_of_week=day_of_week,
         is_available=False,
         start_period__lte=end_period,
         end_period__gte=start_period,
-    ).exists()
-
-    return not blocked
-
-def has_conflict_for_room(room, semester, day_of_week, start_period, end_period, weeks):
-    if room is None:
-        return False
+    )
 
+def room_conflict_slots(room, semester, day_of_week, start_period, end_period, weeks):
+    """Buổi học trùng phòng (index slot_sem_room_day_period_idx trên TeachingSlot.semester)."""
     slots = TeachingSlot.objects.filter(
-        course_section__semester=semester,
+        semester=semester,
         room=room,
         day_of_week=day_of_week,
-    ).prefetch_related("weeks")
-
-    for slot in slots:
-        if not time_overlap(start_period, end_period, slot.start_period, slot.end_period):
-            continue
-        if weeks_overlap(weeks, slot.weeks.all()):
-            return True
+    )
+    return overlapping_slots(slots, start_period, end_period, weeks)
 
-    return False
+def has_conflict_for_room(room, semester, day_of_week, start_period, end_period, weeks):
+    if room is None:
+        return False
 
-def has_conflict_for_class(student_classes, semester, day_of_week, start_period, end_period, weeks):
-    from .models import StudentClass  # tránh circular import
+    return room_conflict_slots(room, semester, day_of_week, start_period, end_period, weeks).exists()
 
+def class_conflict_slots(student_classes, semester, day_of_week, start_period, end_period, weeks, section=None):
+    """
+    Buổi học trùng Lớp SV: Lớp SV -> Lớp HP của học kỳ -> buổi theo thứ
+    (index slot_section_day_idx). Xem has_conflict_for_class.
+    """
     class_ids = [c.id for c in student_classes]
 
     slots = TeachingSlot.objects.filter(
         course_section__semester=semester,
         course_section__classes__in=class_ids,
         day_of_week=day_of_week,
-    ).distinct().prefetch_related("weeks")
-
-    for slot in slots:
-        if not time_overlap(start_period, end_period, slot.start_period, slot.end_period):
-            continue
-        if weeks_overlap(weeks, slot.weeks.all()):
-            return True
+    )
+    if section is not None and section.student_count is not None:
+        slots = slots.exclude(
+            Q(course_section__subject_id=section.subject_id)
+            & Q(course_section__student_count__isnull=False)
+            & ~Q(course_section_id=section.pk)
+        )
 
-    return False
+    return overlapping_slots(slots, start_period, end_period, weeks)
 
-def has_conflict_for_instructor(instructor, semester, day_of_week, start_period, end_period, weeks):
-    if instructor is None:
-        return False
+def has_conflict_for_class(student_classes, semester, day_of_week, start_period, end_period, weeks, section=None):
+    """
+    section: LHP đang xếp. Nếu LHP này là 1 nhóm của lớp bị chia (student_count
+    có giá trị, xem partition_classes) thì bỏ qua buổi của các nhóm khác cùng môn:
+    mỗi SV chỉ học 1 nhóm nên các nhóm học song song được. LHP học nguyên lớp
+    (student_count trống) trùng giờ với LHP cùng môn vẫn tính là trùng.
+    """
+    return class_conflict_slots(
+        student_classes, semester, day_of_week, start_period, end_period, weeks, section=section,
+    ).exists()
 
+def instructor_conflict_slots(instructor, semester, day_of_week, start_period, end_period, weeks):
+    """
+    Buổi học trùng GV: Lớp HP (index section_sem_instructor_idx) -> buổi theo thứ
+    (index slot_section_day_idx).
+    """
     slots = TeachingSlot.objects.filter(
         course_section__semester=semester,
         course_section__instructor=instructor,
         day_of_week=day_of_week,
-    ).prefetch_related("weeks")
+    )
+    return overlapping_slots(slots, start_period, end_period, weeks)
 
-    for slot in slots:
-        if not time_overlap(start_period, end_period, slot.start_period, slot.end_period):
-            continue
-        if weeks_overlap(weeks, slot.weeks.all()):
-            return True
+def has_conflict_for_instructor(instructor, semester, day_of_week, start_period, end_period, weeks):
+    if instructor is None:
+        return False
 
-    return False
+    return instructor_conflict_slots(instructor, semester, day_of_week, start_period, end_period, weeks).exists()
 
 def auto_schedule(semester: Semester, department_code: str = "CNTT"):
     """
@@ -822,6 +844,8 @@ def auto_schedule(semester: Semester, department_code: str = "CNTT"):
         + 1 TeachingSlot duy nhất
         + gắn nhiều tuần (weeks)
       => hiển thị ra: 1 dòng, "Tuần: 1,2,3,...".
+    - Lọc LHP theo CourseSection.department (Khoa có đông SV nhất): LHP ghép lớp
+      nhiều Khoa chỉ được xếp khi chạy cho Khoa đó, không xếp lại ở Khoa còn lại.
     """
     from .models import CourseSection, SemesterWeek
     # dùng lại các helper đã có trong file:
@@ -832,8 +856,8 @@ def auto_schedule(semester: Semester, department_code: str = "CNTT"):
     # Lấy tất cả LHP thuộc khoa cần xếp
     sections = CourseSection.objects.filter(
         semester=semester,
-        classes__department__code=department_code,
-    ).distinct().select_related("subject", "instructor").prefetch_related("classes")
+        department__code=department_code,
+    ).select_related("subject", "instructor").prefetch_related("classes")
 
     # Lấy tất cả tuần học (không nghỉ) của học kỳ
     all_weeks = list(
@@ -918,7 +942,7 @@ def auto_schedule(semester: Semester, department_code: str = "CNTT"):
                     if has_conflict_for_room(room, semester, day, start_p, end_p, weeks_for_course):
                         continue
 
-                    if has_conflict_for_class(section.classes.all(), semester, day, start_p, end_p, weeks_for_course):
+                    if has_conflict_for_class(section.classes.all(), semester, day, start_p, end_p, weeks_for_course, section=section):
                         continue
 
                     if has_conflict_for_instructor(section.instructor, semester, day, start_p, end_p, weeks_for_course):
@@ -1071,7 +1095,7 @@ def semi_auto_schedule_section(
                         continue
 
                     # Check trùng lớp
-                    if has_conflict_for_class(section.classes.all(), semester, day, start_p, end_p, [week]):
+                    if has_conflict_for_class(section.classes.all(), semester, day, start_p, end_p, [week], section=section):
                         continue
 
                     # Check trùng GV
@@ -1132,89 +1156,31 @@ def semi_auto_schedule_section(
 
 #     return created
 
-def _date_in_any_break(d, breaks):
-    """
-    Kiểm tra 1 ngày có nằm trong bất kỳ khoảng SemesterBreak nào không.
-    breaks: list[SemesterBreak]
-    """
-    for br in breaks:
-        if br.start_date and br.end_date and br.start_date <= d <= br.end_date:
-            return True
-    return False
-
-
-def _jump_after_break(d, breaks):
-    """
-    Nếu d nằm trong 1 khoảng SemesterBreak, nhảy tới ngày sau khi kết thúc khoảng đó.
-    Nếu không nằm trong khoảng nào -> trả chính d.
-    """
-    for br in breaks:
-        if br.start_date and br.end_date and br.start_date <= d <= br.end_date:
-            return br.end_date + timedelta(days=1)
-    return d
-
-
-def generate_semester_weeks(semester: Semester, delete_old: bool = False):
+def generate_semester_weeks(semester: Semester, force: bool = False, remap: str = "index"):
     """
     Sinh các bản ghi SemesterWeek cho 1 Học kỳ dựa vào:
       - semester.start_date
       - semester.weeks  (số TUẦN HỌC, KHÔNG tính tuần nghỉ)
       - các khoảng nghỉ SemesterBreak (Tết, nghỉ giữa kỳ...)
+      - ngày lễ PublicHoliday (chỉ tắt ngày đó trong teaching_days_mask của tuần)
 
     Quy tắc:
       - Chỉ tạo tuần HỌC (is_break=False).
       - Tuần nghỉ được mô tả riêng qua SemesterBreak, KHÔNG tạo SemesterWeek.
       - Nếu tuần bắt đầu rơi vào khoảng nghỉ -> nhảy qua hết khoảng nghỉ rồi mới đếm tuần học tiếp theo.
+      - Không xoá tuần cũ: dòng tuần được cập nhật tại chỗ, liên kết buổi học - tuần
+        được chuyển theo remap ("index" / "date"); chỉ ghi khi lịch thật sự đổi (force=True: luôn ghi).
+
+    Tính toán + ghi theo lô ở calendar_services.regenerate_semester_weeks.
 
     Kết quả:
-      - Trả về (created_count, updated_count)
+      - None nếu lịch tuần không đổi, ngược lại dict
+        {"created", "updated", "deleted", "remapped", "dropped"}
     """
     if not semester.start_date:
         raise ValueError(f"Semester {semester} chưa có start_date, không thể sinh tuần.")
 
-    # Số tuần học cần sinh. Nếu chưa nhập, tạm cho 15.
-    teaching_weeks = semester.weeks or 15
-
-    # Lấy danh sách khoảng nghỉ của học kỳ
-    breaks = list(SemesterBreak.objects.filter(semester=semester))
-
-    if delete_old:
-        SemesterWeek.objects.filter(semester=semester).delete()
-
-    created = 0
-    updated = 0
-
-    current_date = semester.start_date
-    week_index = 1
-
-    while week_index <= teaching_weeks:
-        # Nếu ngày hiện tại rơi vào kỳ nghỉ -> nhảy qua
-        if _date_in_any_break(current_date, breaks):
-            current_date = _jump_after_break(current_date, breaks)
-            continue
-
-        week_start = current_date
-        week_end = week_start + timedelta(days=6)
-
-        sw, is_created = SemesterWeek.objects.update_or_create(
-            semester=semester,
-            index=week_index,
-            defaults={
-                "start_date": week_start,
-                "end_date": week_end,
-                "is_break": False,
-            },
-        )
-        if is_created:
-            created += 1
-        else:
-            updated += 1
-
-        # Chuẩn bị cho tuần tiếp theo
-        week_index += 1
-        current_date = week_start + timedelta(weeks=1)
-
-    return created, updated
+    return regenerate_semester_weeks(semester, force=force, remap=remap)
 
 
 def auto_schedule_single_section_fixed(section: CourseSection):
@@ -1292,7 +1258,7 @@ def auto_schedule_single_section_fixed(section: CourseSection):
                 if has_conflict_for_room(room, semester, day, start_p, end_p, weeks_for_course):
                     continue
 
-                if has_conflict_for_class(section.classes.all(), semester, day, start_p, end_p, weeks_for_course):
+                if has_conflict_for_class(section.classes.all(), semester, day, start_p, end_p, weeks_for_course, section=section):
                     continue
 
                 if has_conflict_for_instructor(section.instructor, semester, day, start_p, end_p, weeks_for_course):
@@ -1322,6 +1288,9 @@ def auto_schedule_whole_semester_fixed(semester: Semester, department_code: str
           + (tuỳ chọn) Xoá toàn bộ slot cũ nếu reset_existing=True
           + Gọi auto_schedule_single_section_fixed(section)
       - Ưu tiên: 1 buổi/tuần, cùng 1 Thứ/Tiết/Phòng/GV cho tất cả tuần.
+      - "Theo khoa" = CourseSection.department (Khoa có đông SV nhất): LHP ghép lớp
+        nhiều Khoa chỉ do Khoa đó xếp; chạy cho Khoa còn lại không xoá / xếp lại
+        các LHP này (tránh 2 Khoa lần lượt ghi đè buổi học của nhau).
 
     Trả về:
       (scheduled_sections, failed_sections)
@@ -1332,8 +1301,8 @@ def auto_schedule_whole_semester_fixed(semester: Semester, department_code: str
 
     sections = CourseSection.objects.filter(
         semester=semester,
-        classes__department__code=department_code,
-    ).distinct().select_related("subject", "instructor").prefetch_related("classes")
+        department__code=department_code,
+    ).select_related("subject", "instructor").prefetch_related("classes")
 
     scheduled = []
     failed = []
@@ -1376,6 +1345,11 @@ def calculate_instructor_workload(academic_year: AcademicYear):
     # LẤY TẤT CẢ GIẢNG VIÊN (KHÔNG FILTER GÌ HẾT)
     instructors = Instructor.objects.all().order_by("name")
 
+    # Tuần có dạy theo (Học kỳ, Thứ) của cả năm học: 1 query cho mọi GV
+    day_masks = teaching_day_week_masks(
+        Semester.objects.filter(academic_year=academic_year).values_list("id", flat=True)
+    )
+
     for ins in instructors:
         # ====== ĐỊNH MỨC GỐC ======
         base_teaching_quota = ins.teaching_quota or 0
@@ -1423,12 +1397,13 @@ def calculate_instructor_workload(academic_year: AcademicYear):
         slots = TeachingSlot.objects.filter(
             course_section__semester__academic_year=academic_year,
             course_section__instructor=ins,
-        ).prefetch_related("weeks")
+        ).values_list("course_section__semester_id", "day_of_week", "start_period", "end_period", "weeks_mask")
 
         total_periods = 0
-        for s in slots:
-            num_weeks = s.weeks.count()
-            periods_per_session = (s.end_period - s.start_period + 1)
+        for semester_id, day_of_week, start_period, end_period, weeks_mask in slots:
+            # Chỉ tính tuần mà Thứ của buổi không rơi vào ngày lễ / ngày nghỉ
+            num_weeks = (weeks_mask & day_masks.get((semester_id, day_of_week), 0)).bit_count()
+            periods_per_session = (end_period - start_period + 1)
             total_periods += periods_per_session * num_weeks
 
         teaching_hours = float(total_periods)  # 1 tiết = 1 giờ chuẩn (tạm)
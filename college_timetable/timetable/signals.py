@@ -0,0 +1,214 @@
+"""
+Tín hiệu đánh dấu TKB của học kỳ đã thay đổi (tăng Semester.data_version),
+để các cache theo phiên bản (lưới TKB đã render...) tự làm mới. Ngoài buổi học,
+sửa Phòng / GV / Môn / Lớp SV cũng tăng phiên bản các học kỳ có hiện chúng trong ô TKB.
+
+Lưu ý: bulk_create / bulk_update / queryset.update không phát signal,
+code ghi hàng loạt phải tự gọi grid_services.bump_semester_data_version.
+
+Ngoài ra: lưu Năm học / Học kỳ thì tính lại bảng tra "học kỳ thứ mấy trong CTĐT"
+(SemesterIndexMapping, các dòng chỉnh tay giữ nguyên); sửa khoảng nghỉ thì sinh lại
+tuần học của học kỳ (chỉ khi lịch tuần thật sự đổi).
+
+Các cột tính sẵn cũng được giữ đồng bộ ở đây: TeachingSlot.weeks_mask (tuần học),
+CourseSection.total_students / department (từ các Lớp SV của LHP).
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .grid_services import bump_semester_data_version
+from .calendar_services import refresh_teaching_days, refresh_weeks_mask, regenerate_semester_weeks
+from .models import (
+    AcademicYear, CourseSection, Instructor, PeriodSlot, PublicHoliday, Room, Semester, SemesterBreak,
+    SemesterWeek, StudentClass, Subject, TeachingSlot,
+)
+from .semester_index_services import rebuild_semester_index_map
+from .services import refresh_section_rollups
+
+
+def _section_semester_id(section_id):
+    return (
+        CourseSection.objects.filter(pk=section_id)
+        .values_list("semester_id", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=TeachingSlot)
+@receiver(post_delete, sender=TeachingSlot)
+def teaching_slot_changed(sender, instance, **kwargs):
+    bump_semester_data_version([_section_semester_id(instance.course_section_id)])
+
+
+@receiver(m2m_changed, sender=TeachingSlot.weeks.through)
+def teaching_slot_weeks_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # instance là SemesterWeek: nhớ các buổi sắp bị gỡ để tính lại weeks_mask
+        instance._cleared_slot_ids = list(instance.teaching_slots.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance là SemesterWeek
+        if action == "post_clear":
+            pk_set = getattr(instance, "_cleared_slot_ids", [])
+        refresh_weeks_mask(pk_set or [])
+        bump_semester_data_version([instance.semester_id])
+    else:
+        masks = refresh_weeks_mask([instance.pk])
+        instance.weeks_mask = masks[instance.pk]
+        bump_semester_data_version([_section_semester_id(instance.course_section_id)])
+
+
+@receiver(post_save, sender=CourseSection)
+@receiver(post_delete, sender=CourseSection)
+def course_section_changed(sender, instance, created=False, raw=False, **kwargs):
+    # Môn / GV / mã Lớp HP hiển thị trong từng ô TKB
+    if kwargs.get("signal") is post_save and not created and not raw:
+        # Chuyển Lớp HP sang học kỳ khác -> bản sao TeachingSlot.semester đổi theo
+        moved = TeachingSlot.objects.filter(course_section=instance).exclude(semester_id=instance.semester_id)
+        semester_ids = set(moved.values_list("semester_id", flat=True))
+        if semester_ids:
+            moved.update(semester_id=instance.semester_id)
+            bump_semester_data_version(semester_ids)
+    bump_semester_data_version([instance.semester_id])
+
+
+@receiver(m2m_changed, sender=CourseSection.classes.through)
+def course_section_classes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # instance là StudentClass: nhớ các Lớp HP sắp bị gỡ
+        instance._cleared_section_ids = list(instance.course_sections.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if reverse:
+        # instance là StudentClass: các Lớp HP bị đổi nằm trong pk_set
+        if action == "post_clear":
+            pk_set = getattr(instance, "_cleared_section_ids", [])
+        refresh_section_rollups(pk_set or [])
+        semester_ids = CourseSection.objects.filter(pk__in=pk_set or []).values_list("semester_id", flat=True)
+        bump_semester_data_version(set(semester_ids))
+    else:
+        refresh_section_rollups([instance.pk])
+        bump_semester_data_version([instance.semester_id])
+
+
+# Đối tượng có mã / tên hiện trong ô TKB -> (model tra học kỳ, field trỏ tới đối tượng)
+SHOWN_IN_TIMETABLE = {
+    Room: (TeachingSlot, "room"),
+    Instructor: (CourseSection, "instructor"),
+    Subject: (CourseSection, "subject"),
+    StudentClass: (CourseSection, "classes"),
+}
+
+
+def _semesters_showing(instance):
+    model, field = SHOWN_IN_TIMETABLE[type(instance)]
+    return set(
+        model.objects.filter(**{field: instance}).values_list("semester_id", flat=True).distinct()
+    )
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_save, sender=Instructor)
+@receiver(post_save, sender=Subject)
+@receiver(post_save, sender=StudentClass)
+def timetable_entity_saved(sender, instance, created=False, raw=False, **kwargs):
+    # Đổi tên / mã -> lưới TKB, lịch .ics... đã cache của các học kỳ liên quan phải dựng lại
+    if created or raw:
+        return
+    bump_semester_data_version(_semesters_showing(instance))
+
+
+@receiver(pre_delete, sender=Room)
+@receiver(pre_delete, sender=Instructor)
+@receiver(pre_delete, sender=Subject)
+@receiver(pre_delete, sender=StudentClass)
+def timetable_entity_deleting(sender, instance, **kwargs):
+    # Xoá thì buổi học / Lớp HP bị gỡ theo (SET_NULL / cascade bảng trung gian, không có signal)
+    instance._shown_semester_ids = _semesters_showing(instance)
+
+
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Instructor)
+@receiver(post_delete, sender=Subject)
+@receiver(post_delete, sender=StudentClass)
+def timetable_entity_deleted(sender, instance, **kwargs):
+    bump_semester_data_version(getattr(instance, "_shown_semester_ids", ()))
+
+
+@receiver(post_save, sender=StudentClass)
+def student_class_saved(sender, instance, raw=False, **kwargs):
+    # Sĩ số / Khoa của lớp đổi -> tổng sĩ số, Khoa của các Lớp HP có lớp này
+    if raw:
+        return
+    refresh_section_rollups(instance.course_sections.values_list("id", flat=True))
+
+
+@receiver(pre_delete, sender=StudentClass)
+def student_class_deleting(sender, instance, **kwargs):
+    # Xoá lớp thì liên kết Lớp HP - lớp bị xoá theo (cascade, không có m2m_changed)
+    instance._linked_section_ids = list(instance.course_sections.values_list("id", flat=True))
+
+
+@receiver(post_delete, sender=StudentClass)
+def student_class_deleted(sender, instance, **kwargs):
+    refresh_section_rollups(getattr(instance, "_linked_section_ids", []))
+
+
+@receiver(pre_delete, sender=SemesterWeek)
+def semester_week_deleting(sender, instance, **kwargs):
+    # Xoá tuần thì liên kết slot-tuần bị xoá theo (cascade, không có m2m_changed)
+    # -> nhớ các buổi liên quan để tính lại weeks_mask sau khi xoá
+    instance._linked_slot_ids = list(instance.teaching_slots.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=SemesterWeek)
+@receiver(post_delete, sender=SemesterWeek)
+def semester_week_changed(sender, instance, raw=False, **kwargs):
+    if kwargs.get("signal") is post_delete:
+        refresh_weeks_mask(getattr(instance, "_linked_slot_ids", []))
+    elif not raw and not kwargs.get("created"):
+        # Sửa số thứ tự tuần -> bit của các buổi học tuần đó đổi theo
+        refresh_weeks_mask(instance.teaching_slots.values_list("id", flat=True))
+    bump_semester_data_version([instance.semester_id])
+
+
+@receiver(post_save, sender=PeriodSlot)
+@receiver(post_delete, sender=PeriodSlot)
+@receiver(post_save, sender=PublicHoliday)
+@receiver(post_delete, sender=PublicHoliday)
+def calendar_config_changed(sender, instance, **kwargs):
+    # Giờ tiết học (lịch .ics) và ngày lễ (TKB theo tuần) dùng chung cho mọi học kỳ
+    if sender is PublicHoliday:
+        refresh_teaching_days()
+    bump_semester_data_version(Semester.objects.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=SemesterBreak)
+@receiver(post_delete, sender=SemesterBreak)
+def semester_break_changed(sender, instance, origin=None, **kwargs):
+    # Xoá dây chuyền từ Học kỳ (origin không phải SemesterBreak) -> không sinh lại tuần
+    if origin is not None and getattr(origin, "model", type(origin)) is not SemesterBreak:
+        return
+    # Khoảng nghỉ đổi -> tuần có thể lùi ngày (liên kết buổi học giữ theo tuần thứ mấy)
+    # và ngày nghỉ lẻ trong tuần bị tắt bit ngày dạy
+    semester = Semester.objects.filter(pk=instance.semester_id).first()
+    if semester is not None:
+        regenerate_semester_weeks(semester)
+
+
+@receiver(post_save, sender=Semester)
+def semester_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    rebuild_semester_index_map(semesters=[instance])
+
+
+@receiver(post_save, sender=AcademicYear)
+def academic_year_saved(sender, instance, raw=False, **kwargs):
+    # Mã năm học đổi thì cả vai trò Khoá lẫn năm của các Học kỳ đều đổi
+    if raw:
+        return
+    rebuild_semester_index_map()
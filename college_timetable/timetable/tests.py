@@ -1,3 +1,1552 @@
-from django.test import TestCase
+import datetime
+import importlib
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook, load_workbook
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+from .calendar_services import (
+    build_semester_calendar, merge_intervals, regenerate_semester_weeks, teaching_day_week_masks,
+)
+from .conflict_services import find_semester_conflicts, summarize_conflicts
+from .curriculum_services import generate_all_curricula
+from .export_services import EXPORT_SPECS, build_export_workbook, iter_export_rows
+from .grid_services import (
+    DAYS, PERIODS, build_compact_grid, bump_semester_data_version, day_columns, get_semester_data_version,
+    render_timetable_grid, resolve_semester_week, timetable_slots, week_holidays,
+)
+from .db_services import database_profile_info, tune_sqlite_connection
+from .ics_services import _escape, _fold, iter_ics_feed
+from .import_job_services import _run_job, create_import_job
+from .import_services import (
+    IMPORT_CONFIG, import_academic_years_from_excel, import_instructors_from_excel, import_rooms_from_excel,
+    import_semesters_from_excel, import_subjects_from_excel,
+)
+from .models import (
+    AcademicYear, CourseSection, Curriculum, CurriculumSubject, Department, ImportJob, Instructor, Major,
+    PeriodSlot, PublicHoliday, Room, RoomCapability, RoomType, Semester, SemesterBreak, SemesterIndexMapping,
+    SemesterWeek, SpecializationGroup, StudentClass, Subject, TeachingSlot, TrainingLevel,
+)
+from .pdf_render import PdfUnavailable, _ascii
+from .pdf_services import build_department_pdf_zip, department_pdf_jobs
+from .query_plan_services import explain_hot_queries, full_scan_lines
+from .publish_services import load_manifest, publish_semester, semester_publish_dir
+from .section_plan_services import apply_course_section_changes, preview_course_sections, summarize_changes
+from .semester_index_services import academic_year_start, compute_semester_index, get_semester_index_map
+from .services import (
+    auto_schedule_whole_semester_fixed, generate_course_sections_for_semester, generate_semester_weeks,
+    has_conflict_for_class, partition_classes, refresh_section_rollups, section_student_count,
+)
+from .timetable_excel_services import build_section_workbook, semester_workbook_path
+
+
+def make_workbook(header, rows, title="Sheet"):
+    """Workbook 1 sheet: dòng 1 tiêu đề, từ dòng 2 là dữ liệu."""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = title
+    ws.append(header)
+    for row in rows:
+        ws.append(row)
+    return wb
+
+
+def make_catalog():
+    """Danh mục tối thiểu dùng chung cho các test."""
+    c = SimpleNamespace()
+    c.dept = Department.objects.create(code="CNTT", name="Công nghệ thông tin")
+    c.level = TrainingLevel.objects.create(code="CD", name="Cao đẳng")
+    c.major = Major.objects.create(code="CD_CNTT", name="CNTT", level=c.level, department=c.dept)
+    c.major2 = Major.objects.create(code="CD_MMT", name="Mạng máy tính", level=c.level, department=c.dept)
+    c.lt = RoomType.objects.create(code="LT", name="Lý thuyết")
+    c.net = SpecializationGroup.objects.create(code="NET", name="Mạng")
+    c.dev = SpecializationGroup.objects.create(code="DEV", name="Lập trình")
+    c.room = Room.objects.create(code="P101", name="P101", room_type=c.lt, capacity=50)
+    return c
+
+
+def add_slot(section, room, day, start, end, weeks):
+    slot = TeachingSlot.objects.create(
+        course_section=section, room=room, day_of_week=day, start_period=start, end_period=end,
+    )
+    slot.weeks.set(SemesterWeek.objects.filter(semester=section.semester_id, index__in=weeks))
+    return slot
+
+
+def make_timetable():
+    """
+    make_catalog + 1 học kỳ 15 tuần (bắt đầu 01/09/2025), GV, Lớp SV, môn, CTĐT
+    và 2 Lớp HP đã xếp buổi học:
+      - section : MH01 cho K25A, GV01, P101, Thứ 2 tiết 1-3, tuần 1-8
+      - section2: CT01 ghép K25A + K25B, GV02, P201, Thứ 3 tiết 4-6, tuần 1, 3, 5
+    """
+    c = make_catalog()
+    c.year = AcademicYear.objects.create(code="2025-2026")
+    c.semester = Semester.objects.create(
+        academic_year=c.year, code="HK1", name="Học kỳ 1", start_date=datetime.date(2025, 9, 1), weeks=15,
+    )
+    generate_semester_weeks(c.semester)
+    c.room2 = Room.objects.create(code="P201", name="P201", room_type=c.lt, capacity=80)
+    RoomCapability.objects.create(room=c.room2, group=c.net, priority=2)
+    c.room2.allowed_majors.add(c.major)
+
+    c.instructor = Instructor.objects.create(code="GV01", name="Nguyễn Văn A", department=c.dept)
+    c.instructor2 = Instructor.objects.create(code="GV02", name="Trần Thị B", department=c.dept)
+    c.k25a = StudentClass.objects.create(
+        code="K25A", name="K25A", size=40, major=c.major, academic_year=c.year, department=c.dept,
+        homeroom_teacher=c.instructor,
+    )
+    c.k25b = StudentClass.objects.create(
+        code="K25B", name="K25B", size=30, major=c.major, academic_year=c.year, department=c.dept,
+    )
+    c.subject = Subject.objects.create(
+        code="MH01", name="Lập trình", subject_type="TH", total_periods=45, major=c.major,
+        managing_department=c.dept, required_room_type=c.lt, specialization_group=c.net,
+        exam_form="BTL", semester_number=1,
+    )
+    c.subject2 = Subject.objects.create(
+        code="CT01", name="Chính trị", subject_type="LT", total_periods=30, exam_form="Viết",
+    )
+    c.curriculum = Curriculum.objects.create(major=c.major, intake_year=c.year, name="CTĐT K25")
+    CurriculumSubject.objects.create(curriculum=c.curriculum, subject=c.subject, semester_index=1, total_periods=45)
+
+    c.section = CourseSection.objects.create(
+        subject=c.subject, semester=c.semester, code="MH01_K25A", instructor=c.instructor,
+        planned_periods=45, start_week=1, week_count=15,
+    )
+    c.section.classes.set([c.k25a])
+    c.section2 = CourseSection.objects.create(
+        subject=c.subject2, semester=c.semester, code="CT01_K25", instructor=c.instructor2,
+        planned_periods=30, note="Ghép lớp",
+    )
+    c.section2.classes.set([c.k25a, c.k25b])
+    c.slot = add_slot(c.section, c.room, 2, 1, 3, range(1, 9))
+    c.slot2 = add_slot(c.section2, c.room2, 3, 4, 6, [1, 3, 5])
+    return c
+
+
+def workbook_upload(wb, name="data.xlsx"):
+    buf = BytesIO()
+    wb.save(buf)
+    return SimpleUploadedFile(name, buf.getvalue())
+
+
+# =============== Import chạy nền theo lô ===============
+
+class ImportJobResumeTests(TestCase):
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        patcher = override_settings(IMPORT_STAGING_DIR=staging.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+
+        rows = [(f"K{i}", f"Khoa {i}") for i in range(1, 6)]
+        wb = make_workbook(IMPORT_CONFIG["departments"]["columns"], rows)
+        self.job = create_import_job("departments", workbook_upload(wb), batch_size=2)
+
+    def test_job_runs_in_batches(self):
+        _run_job(self.job)
+
+        self.job.refresh_from_db()
+        sheet = self.job.sheets.get()
+        self.assertEqual(self.job.status, "DONE")
+        self.assertEqual(self.job.created_count, 5)
+        self.assertEqual(sheet.total_rows, 5)
+        self.assertEqual(sheet.batches_done, 3)
+        self.assertEqual(Department.objects.count(), 5)
+
+    def test_sheet_read_once_for_all_batches(self):
+        real_iter_rows = ReadOnlyWorksheet.iter_rows
+        seen = []
+
+        def record(ws):
+            seen.extend((ws.first_row + i, code) for i, (code, _) in enumerate(ws.iter_rows()))
+            return 0, 0, []
+
+        with mock.patch.object(ReadOnlyWorksheet, "iter_rows", autospec=True, side_effect=real_iter_rows) as it, \
+                mock.patch.dict(IMPORT_CONFIG["departments"], function=record):
+            _run_job(self.job)
+
+        # 1 lần kiểm tra cả sheet + 1 bộ duyệt chung cho 3 lô
+        self.assertEqual(it.call_count, 2)
+        self.assertEqual(seen, [(2, "K1"), (3, "K2"), (4, "K3"), (5, "K4"), (6, "K5")])
+
+    def test_resume_continues_after_last_committed_batch(self):
+        real_import = IMPORT_CONFIG["departments"]["function"]
+        calls = []
+
+        def crash_on_second_batch(ws):
+            calls.append((ws.first_row, ws.last_row))
+            if calls == [(2, 3), (4, 5)]:
+                raise RuntimeError("mất kết nối")
+            return real_import(ws)
+
+        with mock.patch.dict(IMPORT_CONFIG["departments"], function=crash_on_second_batch):
+            _run_job(self.job)
+
+        self.job.refresh_from_db()
+        sheet = self.job.sheets.get()
+        self.assertEqual(self.job.status, "FAILED")
+        self.assertEqual(sheet.last_committed_row, 3)
+        self.assertEqual(Department.objects.count(), 2)
+
+        # Chạy lại: chỉ xử lý từ dòng 4, lô đã commit không ghi lại
+        calls.clear()
+        with mock.patch.dict(IMPORT_CONFIG["departments"], function=crash_on_second_batch):
+            _run_job(ImportJob.objects.get(pk=self.job.pk))
+
+        self.job.refresh_from_db()
+        self.assertEqual(calls, [(4, 5), (6, 6)])
+        self.assertEqual(self.job.status, "DONE")
+        self.assertEqual(self.job.created_count, 5)
+        self.assertEqual(Department.objects.count(), 5)
+
+    def test_invalid_sheet_fails_before_any_write(self):
+        wb = make_workbook(IMPORT_CONFIG["majors"]["columns"], [("M1", "Ngành 1", "XX", "YY")])
+        job = create_import_job("majors", workbook_upload(wb))
+
+        _run_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "FAILED")
+        self.assertEqual(job.error_count, 2)
+        self.assertEqual(job.sheets.get().last_committed_row, 1)
+
+
+# =============== Import phòng đồng bộ liên kết theo diff ===============
+
+class RoomImportLinkDiffTests(TestCase):
+    def setUp(self):
+        self.c = make_catalog()
+        RoomCapability.objects.create(room=self.c.room, group=self.c.net, priority=3)
+        self.c.room.allowed_majors.add(self.c.major)
+        self.columns = IMPORT_CONFIG["rooms"]["columns"]
+
+    def test_existing_links_kept_and_diff_applied(self):
+        kept = RoomCapability.objects.get(room=self.c.room, group=self.c.net)
+        wb = make_workbook(self.columns, [
+            ("P101", "P101", "LT", 50, "NET, DEV", "CD_MMT"),
+            ("P102", "P102", "LT", 30, "DEV", ""),
+        ])
+
+        created, updated, errors = import_rooms_from_excel(wb.active)
+
+        self.assertEqual((created, updated, errors), (1, 1, []))
+        # Liên kết đã có giữ nguyên dòng cũ (cùng priority đã chỉnh)
+        self.assertEqual(RoomCapability.objects.get(pk=kept.pk).priority, 3)
+        self.assertEqual(
+            set(self.c.room.capabilities.values_list("code", flat=True)), {"NET", "DEV"},
+        )
+        self.assertEqual(list(self.c.room.allowed_majors.values_list("code", flat=True)), ["CD_MMT"])
+        p102 = Room.objects.get(code="P102")
+        self.assertEqual(list(p102.capabilities.values_list("code", flat=True)), ["DEV"])
+
+    def test_removed_codes_delete_only_stale_links(self):
+        wb = make_workbook(self.columns, [("P101", "P101", "LT", 50, "", "")])
+
+        import_rooms_from_excel(wb.active)
+
+        self.assertFalse(RoomCapability.objects.filter(room=self.c.room).exists())
+        self.assertFalse(self.c.room.allowed_majors.exists())
+
+    def test_unknown_code_rejects_sheet(self):
+        wb = make_workbook(self.columns, [("P101", "P101", "LT", 50, "XYZ", "")])
+
+        created, updated, errors = import_rooms_from_excel(wb.active)
+
+        self.assertEqual((created, updated), (0, 0))
+        self.assertEqual(errors, ["Dòng 2: Không tìm thấy Nhóm CM 'XYZ'"])
+        self.assertTrue(RoomCapability.objects.filter(room=self.c.room, group=self.c.net).exists())
+
+
+# =============== Sinh môn trong CTĐT theo lô ===============
+
+class CurriculumBulkGenerationTests(TestCase):
+    def setUp(self):
+        self.c = make_catalog()
+        self.c.level.duration_semesters = 4
+        self.c.level.save()
+        self.years = [AcademicYear.objects.create(code=code) for code in ("2024-2025", "2025-2026")]
+        Subject.objects.create(code="CT01", name="Chính trị", subject_type="TL", total_periods=30, semester_number=1)
+        Subject.objects.create(
+            code="MH01", name="Lập trình", subject_type="TH", total_periods=60,
+            major=self.c.major, semester_number=5,
+        )
+        Subject.objects.create(code="MMT01", name="Mạng", subject_type="TH", total_periods=45, major=self.c.major2)
+
+    def test_creates_curricula_and_subjects_for_every_major_and_intake(self):
+        result = generate_all_curricula()
+
+        self.assertEqual(result["curricula_created"], 4)
+        self.assertEqual(result["created"], 8)  # mỗi CTĐT: 1 môn chuyên ngành + 1 môn chung
+        cs = CurriculumSubject.objects.get(curriculum__major=self.c.major, curriculum__intake_year=self.years[0],
+                                           subject__code="MH01")
+        # semester_number 5 ép về số học kỳ của bậc (4)
+        self.assertEqual((cs.semester_index, cs.total_periods, cs.is_optional), (4, 60, False))
+        self.assertFalse(CurriculumSubject.objects.filter(
+            curriculum__major=self.c.major, subject__code="MMT01",
+        ).exists())
+
+    def test_rerun_respects_overwrite_and_keeps_manual_edits(self):
+        generate_all_curricula()
+        CurriculumSubject.objects.filter(subject__code="CT01").update(total_periods=99)
+
+        again = generate_all_curricula()
+        self.assertEqual((again["curricula_created"], again["created"], again["skipped"]), (0, 0, 8))
+        self.assertEqual(set(CurriculumSubject.objects.filter(subject__code="CT01")
+                             .values_list("total_periods", flat=True)), {99})
+
+        forced = generate_all_curricula(overwrite=True)
+        self.assertEqual(forced["updated"], 8)
+        self.assertEqual(set(CurriculumSubject.objects.filter(subject__code="CT01")
+                             .values_list("total_periods", flat=True)), {30})
+
+    def test_query_count_does_not_grow_with_curricula(self):
+        Curriculum.objects.bulk_create([
+            Curriculum(major=major, intake_year=year)
+            for major in (self.c.major, self.c.major2) for year in self.years
+        ])
+        # CTĐT, môn, cặp đã có, 1 bulk insert (+ 2 cặp savepoint của transaction.atomic)
+        with self.assertNumQueries(8):
+            generate_all_curricula(create_missing=False)
+
+
+# =============== Kiểm tra sheet theo schema ===============
+
+class SubjectSchemaImportTests(TestCase):
+    """Các dòng có cùng dạng với dữ liệu Môn học đang dùng (exam_form BTL / Viết, loại môn LT)."""
+
+    def setUp(self):
+        self.c = make_catalog()
+        self.columns = IMPORT_CONFIG["subjects"]["columns"]
+
+    def test_imports_stored_exam_forms_and_subject_types(self):
+        wb = make_workbook(self.columns, [
+            ("MH01", "Lập trình web", "CD_CNTT", "CNTT", "TH", 60, 35, "LT", "DEV", 0, "BTL", 1, 3),
+            ("MH02", "Văn bản", None, "CNTT", "TH", 30.0, 40, None, None, 0, "Viết", 0, None),
+            ("MH03", "Nhập môn", None, None, "LT", 45, 35, None, None, 0, "TN", 0, 1),
+            ("MH04", "Đồ án", None, None, "KHAC", 90, 20, None, None, 1, None, 0, None),
+        ])
+
+        created, updated, errors = import_subjects_from_excel(wb.active)
+
+        self.assertEqual((created, updated, errors), (4, 0, []))
+        values = dict(Subject.objects.values_list("code", "exam_form"))
+        self.assertEqual(values, {"MH01": "BTL", "MH02": "Viết", "MH03": "TN", "MH04": "KHAC"})
+        self.assertEqual(Subject.objects.get(code="MH03").subject_type, "LT")
+        mh01 = Subject.objects.get(code="MH01")
+        self.assertEqual((mh01.major, mh01.specialization_group, mh01.has_separate_marking), (self.c.major, self.c.dev, True))
+
+    def test_reports_every_error_without_writing(self):
+        wb = make_workbook(self.columns, [
+            ("MH01", "A", "XX", None, "ABC", 60, 35, None, None, 0, "Thi vấn đáp trực tiếp", 0, None),
+            ("MH02", "B", None, None, "TH", "nhiều", 0, None, None, 0, None, 0, 9),
+        ])
+
+        created, updated, errors = import_subjects_from_excel(wb.active)
+
+        self.assertEqual((created, updated), (0, 0))
+        self.assertEqual(errors, [
+            "Dòng 2: Không tìm thấy Ngành 'XX'",
+            "Dòng 2: subject_type='ABC' không thuộc BC/KHAC/LT/TH/TL/TN",
+            "Dòng 2: exam_form='Thi vấn đáp trực tiếp' dài quá 10 ký tự",
+            "Dòng 3: total_periods='nhiều' không phải số",
+            "Dòng 3: max_class_size='0' phải >= 1",
+            "Dòng 3: semester_number='9' phải <= 5 -> bỏ qua, dùng giá trị mặc định.",
+        ])
+        self.assertFalse(Subject.objects.exists())
+
+
+# =============== Export danh mục đúng layout import (round-trip) ===============
+
+class CatalogExportRoundTripTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+
+    def test_every_catalog_round_trips(self):
+        self.assertEqual(set(EXPORT_SPECS), set(IMPORT_CONFIG))
+        for data_type in EXPORT_SPECS:
+            with self.subTest(data_type=data_type):
+                before = list(iter_export_rows(data_type))
+                self.assertTrue(before)
+
+                ws = load_workbook(build_export_workbook([data_type])).active
+                self.assertEqual([cell.value for cell in ws[1]], IMPORT_CONFIG[data_type]["columns"])
+                created, updated, errors = IMPORT_CONFIG[data_type]["function"](ws)
+
+                self.assertEqual(errors, [])
+                self.assertEqual((created, updated), (0, len(before)))
+                self.assertEqual(list(iter_export_rows(data_type)), before)
+
+    def test_semester_export_keeps_only_that_semester(self):
+        other = Semester.objects.create(academic_year=self.c.year, code="HK2", name="Học kỳ 2")
+        CourseSection.objects.create(subject=self.c.subject, semester=other, code="MH01_HK2")
+
+        rows = list(iter_export_rows("course_sections", semester=self.c.semester))
+
+        self.assertEqual([row[2] for row in rows], ["CT01_K25", "MH01_K25A"])
+        self.assertEqual(rows[0][4], "K25A, K25B")
+        slot_rows = list(iter_export_rows("teaching_slots", semester=self.c.semester))
+        self.assertEqual([row[7] for row in slot_rows], ["1, 3, 5", "1-8"])
+
+
+# =============== Cache lưới TKB theo data_version của học kỳ ===============
+
+class GridCacheVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = make_timetable()
+        self.other = Semester.objects.create(academic_year=self.c.year, code="HK2", name="Học kỳ 2")
+
+    def version(self, semester=None):
+        return get_semester_data_version((semester or self.c.semester).pk)
+
+    def test_version_cached_until_bumped(self):
+        before = self.version()
+        # Sửa thẳng DB (không qua bump) thì chỉ thấy khi khoá cache hết hạn
+        Semester.objects.filter(pk=self.c.semester.pk).update(data_version=F("data_version") + 1)
+        self.assertEqual(self.version(), before)
+        cache.delete(f"timetable:semester:{self.c.semester.pk}:stamp")
+        self.assertEqual(self.version(), before + 1)
+
+        bump_semester_data_version([self.c.semester.pk])
+        self.assertEqual(self.version(), before + 2)
+
+    def test_cached_grid_costs_no_query(self):
+        html = render_timetable_grid(self.c.semester, "class", self.c.k25a)
+        with self.assertNumQueries(0):
+            self.assertEqual(render_timetable_grid(self.c.semester, "class", self.c.k25a), html)
+
+    def test_renaming_shown_entities_refreshes_grid(self):
+        renames = [
+            (self.c.room, "code", "A101"),
+            (self.c.instructor, "name", "Lê Văn C"),
+            (self.c.subject, "name", "Lập trình Python"),
+        ]
+        for obj, field, value in renames:
+            with self.subTest(model=type(obj).__name__):
+                render_timetable_grid(self.c.semester, "class", self.c.k25a)
+                before, other_before = self.version(), self.version(self.other)
+
+                setattr(obj, field, value)
+                obj.save()
+
+                self.assertEqual(self.version(), before + 1)
+                self.assertEqual(self.version(self.other), other_before)
+                self.assertIn(value, render_timetable_grid(self.c.semester, "class", self.c.k25a))
+
+    def test_excel_import_rename_bumps_semester(self):
+        # Import ghi theo lô (bulk_update, không phát signal) cũng phải tăng phiên bản
+        render_timetable_grid(self.c.semester, "class", self.c.k25a)
+        before, other_before = self.version(), self.version(self.other)
+        rooms = make_workbook(IMPORT_CONFIG["rooms"]["columns"], [("P101", "Phòng A101", "LT", 50, "", "")])
+        self.assertEqual(import_rooms_from_excel(rooms.active), (0, 1, []))
+        self.assertEqual(self.version(), before + 1)
+        self.assertEqual(self.version(self.other), other_before)
+
+        instructors = make_workbook(IMPORT_CONFIG["instructors"]["columns"], [("GV01", "Lê Văn C", "CNTT")])
+        self.assertEqual(import_instructors_from_excel(instructors.active), (0, 1, []))
+        self.assertEqual(self.version(), before + 2)
+        self.assertIn("Lê Văn C", render_timetable_grid(self.c.semester, "class", self.c.k25a))
+
+    def test_renaming_class_refreshes_room_grid(self):
+        render_timetable_grid(self.c.semester, "room", self.c.room2)
+        self.c.k25b.code = "K25B1"
+        self.c.k25b.save()
+        self.assertIn("K25A, K25B1", render_timetable_grid(self.c.semester, "room", self.c.room2))
+
+    def test_deleting_room_bumps_semester(self):
+        before = self.version()
+        self.c.room.delete()
+        self.assertEqual(self.version(), before + 1)
+        self.assertIn("(Không phòng)", render_timetable_grid(self.c.semester, "class", self.c.k25a))
+
+    def test_unused_entity_does_not_bump(self):
+        spare = Room.objects.create(code="P999", name="P999", room_type=self.c.lt)
+        before = self.version()
+        spare.name = "Kho"
+        spare.save()
+        self.assertEqual(self.version(), before)
+
+
+# =============== Lưới TKB gọn, mỗi buổi 1 ô rowspan ===============
+
+def fake_slot(name, day, start, end):
+    return SimpleNamespace(name=name, day_of_week=day, start_period=start, end_period=end)
+
+
+class CompactGridTests(TestCase):
+    def build(self, *slots):
+        rows = build_compact_grid(slots, cell_data=lambda s: s.name)
+        return {
+            (row["period"], cell["day"]): cell for row in rows for cell in row["cells"]
+        }
+
+    def test_slot_is_one_cell_with_rowspan(self):
+        cells = self.build(fake_slot("A", 1, 2, 4))
+
+        self.assertEqual(cells[(2, 1)], {"day": 1, "rowspan": 3, "slots": ["A"]})
+        # Tiết 3, 4 của Thứ 2 bị ô trên chiếm -> không có trong cells
+        self.assertNotIn((3, 1), cells)
+        self.assertNotIn((4, 1), cells)
+        self.assertEqual(cells[(3, 2)], {"day": 2})
+        self.assertEqual(len(cells), len(PERIODS) * len(DAYS) - 2)
+
+    def test_overlapping_slots_share_one_cell(self):
+        cells = self.build(fake_slot("B", 3, 3, 5), fake_slot("A", 3, 1, 3), fake_slot("C", 3, 7, 8))
+
+        self.assertEqual(cells[(1, 3)], {"day": 3, "rowspan": 5, "slots": ["A", "B"]})
+        self.assertEqual(cells[(6, 3)], {"day": 3})
+        self.assertEqual(cells[(7, 3)]["slots"], ["C"])
+
+    def test_out_of_grid_slots_are_clipped_or_skipped(self):
+        cells = self.build(fake_slot("Sunday", 7, 1, 2), fake_slot("Late", 1, 13, 20))
+
+        self.assertEqual(cells[(13, 1)], {"day": 1, "rowspan": 2, "slots": ["Late"]})
+        self.assertFalse(any("slots" in cell for key, cell in cells.items() if key != (13, 1)))
+
+
+# =============== Xuất bản TKB tĩnh (HTML/JSON) theo học kỳ ===============
+
+class PublishSemesterTests(TestCase):
+    def setUp(self):
+        out = tempfile.TemporaryDirectory()
+        self.addCleanup(out.cleanup)
+        patcher = override_settings(TIMETABLE_PUBLISH_DIR=out.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.c = make_timetable()
+
+    def publish(self):
+        self.c.semester.refresh_from_db()
+        return publish_semester(self.c.semester, workers=2)
+
+    def test_first_publish_writes_every_entity(self):
+        result = self.publish()
+
+        self.assertEqual((result["written"], result["unchanged"], result["removed"]), (6, 0, 0))
+        manifest = load_manifest(self.c.semester)
+        self.assertEqual(sorted(manifest["entities"]), [
+            f"class/{self.c.k25a.pk}", f"class/{self.c.k25b.pk}",
+            f"instructor/{self.c.instructor.pk}", f"instructor/{self.c.instructor2.pk}",
+            f"room/{self.c.room.pk}", f"room/{self.c.room2.pk}",
+        ])
+        out_dir = semester_publish_dir(self.c.semester)
+        html = (out_dir / f"class/{self.c.k25a.pk}.html").read_text(encoding="utf-8")
+        self.assertIn("MH01", html)
+        self.assertIn("CT01", html)
+
+    def test_unchanged_version_skips_without_queries(self):
+        self.publish()
+        self.c.semester.refresh_from_db()
+        with self.assertNumQueries(0):
+            result = publish_semester(self.c.semester)
+        self.assertEqual((result["written"], result["unchanged"]), (0, 6))
+
+    def test_only_changed_entities_are_rewritten(self):
+        self.publish()
+        self.c.slot.weeks.remove(SemesterWeek.objects.get(semester=self.c.semester, index=8))
+
+        result = self.publish()
+
+        # MH01 chỉ liên quan K25A, P101, GV01
+        self.assertEqual((result["written"], result["unchanged"], result["removed"]), (3, 3, 0))
+
+    def test_entities_without_slots_are_removed(self):
+        self.publish()
+        out_dir = semester_publish_dir(self.c.semester)
+        self.c.slot2.delete()
+
+        result = self.publish()
+
+        self.assertEqual(result["removed"], 3)
+        self.assertFalse((out_dir / f"room/{self.c.room2.pk}.html").exists())
+        self.assertFalse((out_dir / f"class/{self.c.k25b.pk}.json").exists())
+
+
+# =============== API JSON TKB chỉ đọc, GET có điều kiện ===============
+
+class TimetableApiTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        self.url = reverse("timetable:timetable_api", args=[self.c.semester.pk, "class", self.c.k25a.pk])
+
+    def test_payload_lists_slots_with_week_masks(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        fields = data["fields"]
+        slots = [dict(zip(fields, row)) for row in data["slots"]]
+        self.assertEqual([s["section_code"] for s in slots], ["MH01_K25A", "CT01_K25"])
+        self.assertEqual(slots[0]["weeks_mask"], 0b11111111)
+        self.assertEqual(slots[1]["class_codes"], ["K25A", "K25B"])
+        self.assertEqual(slots[1]["weeks_mask"], 0b10101)
+
+    def test_warm_304_costs_no_query(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_bump_invalidates_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        # Ghi hàng loạt (import, xếp TKB...) tăng phiên bản qua bump, không phát signal
+        bump_semester_data_version([self.c.semester.pk])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_slot_change_invalidates_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.c.slot.start_period = 2
+        self.c.slot.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["slots"][0][2], 2)
+
+    def test_unknown_entity_type_is_404(self):
+        url = reverse("timetable:timetable_api", args=[self.c.semester.pk, "building", 1])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+# =============== Danh sách LHP phân trang keyset + tìm kiếm ===============
+
+@mock.patch("timetable.views.SECTION_PAGE_SIZE", 3)
+class SectionListViewTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        for i in range(1, 5):
+            CourseSection.objects.create(subject=self.c.subject, semester=self.c.semester, code=f"MH01_N{i}")
+        self.url = reverse("timetable:section_list")
+
+    def codes(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [s.code for s in response.context["sections"]]
+
+    def test_first_page_without_cursor(self):
+        response = self.client.get(self.url, {"semester_id": self.c.semester.pk})
+
+        self.assertEqual(self.codes(response), ["CT01_K25", "MH01_K25A", "MH01_N1"])
+        self.assertIsNone(response.context["prev_url"])
+        self.assertIn(f"after={self.c.semester.pk}%3AMH01_N1", response.context["next_url"])
+
+    def test_cursor_walks_forward_and_back(self):
+        first = self.client.get(self.url, {"semester_id": self.c.semester.pk})
+        second = self.client.get(self.url + first.context["next_url"])
+
+        self.assertEqual(self.codes(second), ["MH01_N2", "MH01_N3", "MH01_N4"])
+        self.assertIsNone(second.context["next_url"])
+
+        back = self.client.get(self.url + second.context["prev_url"])
+        self.assertEqual(self.codes(back), ["CT01_K25", "MH01_K25A", "MH01_N1"])
+        self.assertIsNotNone(back.context["next_url"])
+
+    def test_search_filters_and_keeps_params_in_cursor(self):
+        response = self.client.get(self.url, {"q": "chính trị"})
+        self.assertEqual(self.codes(response), ["CT01_K25"])
+
+        response = self.client.get(self.url, {"q": "MH01"})
+        self.assertEqual(self.codes(response), ["MH01_K25A", "MH01_N1", "MH01_N2"])
+        self.assertIn("q=MH01", response.context["next_url"])
+
+        response = self.client.get(self.url, {"q": "GV02"})
+        self.assertEqual(self.codes(response), ["CT01_K25"])
+
+    def test_bad_cursor_falls_back_to_first_page(self):
+        response = self.client.get(self.url, {"after": "abc"})
+        self.assertEqual(self.codes(response), ["CT01_K25", "MH01_K25A", "MH01_N1"])
+
+
+# =============== Báo cáo trùng lịch cả học kỳ ===============
+
+class SemesterConflictTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+
+    def conflicts(self):
+        return [
+            (x["kind"], x["entity"], x["day"], x["from_period"], x["to_period"], x["weeks_label"])
+            for x in find_semester_conflicts(self.c.semester)
+        ]
+
+    def test_clean_timetable_has_no_conflicts(self):
+        self.assertEqual(self.conflicts(), [])
+        self.assertEqual(summarize_conflicts([]), {"room": 0, "class": 0, "instructor": 0})
+
+    def test_room_class_and_instructor_overlaps(self):
+        # Cùng GV01 + P101 + Lớp K25A (qua section2 có K25A), Thứ 2 tiết 3-4, tuần 5-10
+        section = CourseSection.objects.create(
+            subject=self.c.subject2, semester=self.c.semester, code="CT01_K25A_2", instructor=self.c.instructor,
+        )
+        section.classes.set([self.c.k25a])
+        add_slot(section, self.c.room, 2, 3, 4, range(5, 11))
+
+        conflicts = self.conflicts()
+
+        self.assertEqual(conflicts, [
+            ("room", "P101", 2, 3, 3, "5–8"),
+            ("class", "K25A", 2, 3, 3, "5–8"),
+            ("instructor", "Nguyễn Văn A", 2, 3, 3, "5–8"),
+        ])
+        self.assertEqual(
+            summarize_conflicts(find_semester_conflicts(self.c.semester)),
+            {"room": 1, "class": 1, "instructor": 1},
+        )
+
+    def test_disjoint_weeks_or_periods_do_not_conflict(self):
+        # Cùng phòng P201, Thứ 3 tiết 4-6 nhưng tuần chẵn (section2 học tuần 1, 3, 5)
+        even = CourseSection.objects.create(subject=self.c.subject2, semester=self.c.semester, code="CT01_X")
+        add_slot(even, self.c.room2, 3, 4, 6, [2, 4, 6])
+        # Cùng phòng P101, Thứ 2 nhưng tiết 4-5 (section học tiết 1-3)
+        later = CourseSection.objects.create(subject=self.c.subject2, semester=self.c.semester, code="CT01_Y")
+        add_slot(later, self.c.room, 2, 4, 5, range(1, 16))
+
+        self.assertEqual(self.conflicts(), [])
+
+    def test_sweep_reports_every_overlapping_pair(self):
+        for i, (start, end) in enumerate([(2, 4), (3, 5)], start=1):
+            section = CourseSection.objects.create(subject=self.c.subject2, semester=self.c.semester, code=f"CT01_R{i}")
+            add_slot(section, self.c.room, 2, start, end, [1])
+
+        rooms = [(x[3], x[4]) for x in self.conflicts() if x[0] == "room"]
+
+        # tiết 1-3 ∩ 2-4, 1-3 ∩ 3-5, 2-4 ∩ 3-5
+        self.assertEqual(sorted(rooms), [(2, 3), (3, 3), (3, 4)])
+
+    def test_view_shows_summary(self):
+        response = self.client.get(reverse("timetable:semester_conflicts"), {"semester_id": self.c.semester.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["summary"], [("Phòng", 0), ("Lớp SV", 0), ("Giảng viên", 0)])
+
+
+# =============== Lịch iCalendar theo Lớp / Phòng / GV ===============
+
+class IcsFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = make_timetable()
+        for index, start, end in [(1, "07:00", "07:45"), (2, "07:50", "08:35"), (3, "08:40", "09:25")]:
+            PeriodSlot.objects.create(
+                index=index,
+                start_time=datetime.time.fromisoformat(start),
+                end_time=datetime.time.fromisoformat(end),
+            )
+        PublicHoliday.objects.create(date=datetime.date(2025, 9, 2), name="Quốc khánh")
+
+    def test_fold_keeps_lines_within_75_octets(self):
+        line = "DESCRIPTION:" + "Lập trình hướng đối tượng " * 10
+        folded = _fold(line)
+
+        parts = folded[:-2].split("\r\n")
+        self.assertTrue(all(len(part.encode("utf-8")) <= 75 for part in parts))
+        self.assertTrue(all(part.startswith(" ") for part in parts[1:]))
+        self.assertEqual("".join(part[1:] if i else part for i, part in enumerate(parts)), line)
+        self.assertEqual(_fold("SUMMARY:ngắn"), "SUMMARY:ngắn\r\n")
+
+    def test_escape_text_values(self):
+        self.assertEqual(_escape("a,b;c\\d\ne"), "a\\,b\\;c\\\\d\\ne")
+        self.assertEqual(_escape(None), "")
+
+    def test_feed_has_one_event_per_teaching_week(self):
+        body = "".join(iter_ics_feed(self.c.semester, "class", self.c.k25a, "TKB K25A"))
+
+        self.assertTrue(body.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(body.endswith("END:VCALENDAR\r\n"))
+        # section: Thứ 3 tiết 1-3 tuần 1-8 (02/09 là Quốc khánh -> không có buổi);
+        # section2 học tiết 4-6 chưa cấu hình giờ -> bỏ qua
+        self.assertNotIn("DTSTART;TZID=Asia/Ho_Chi_Minh:20250902T070000", body)
+        self.assertIn("DTSTART;TZID=Asia/Ho_Chi_Minh:20250909T070000", body)
+        self.assertIn("DTEND;TZID=Asia/Ho_Chi_Minh:20250909T092500", body)
+        self.assertEqual(body.count("BEGIN:VEVENT"), 7)
+        self.assertIn(f"UID:slot-{self.c.slot.pk}-w2@hotec-timetable", body)
+
+    def test_view_streams_calendar(self):
+        url = reverse("timetable:timetable_ics", args=[self.c.semester.pk, "room", self.c.room.pk])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        body = b"".join(response.streaming_content).decode("utf-8")
+        self.assertIn("LOCATION:P101", body)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+# =============== Xem TKB theo tuần (ngày, ngày lễ) ===============
+
+class WeekViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = make_timetable()
+
+    def test_resolve_week_by_index_or_date(self):
+        week3 = resolve_semester_week(self.c.semester, week_index=3)
+        self.assertEqual(week3.start_date, datetime.date(2025, 9, 15))
+
+        self.assertEqual(resolve_semester_week(self.c.semester, date=datetime.date(2025, 9, 20)), week3)
+        self.assertEqual(resolve_semester_week(self.c.semester, date=datetime.date(2025, 9, 15)), week3)
+        self.assertIsNone(resolve_semester_week(self.c.semester, week_index=16))
+        self.assertIsNone(resolve_semester_week(self.c.semester, date=datetime.date(2025, 8, 31)))
+        self.assertIsNone(resolve_semester_week(self.c.semester))
+
+    def test_week_filters_slots_by_mask(self):
+        week2 = resolve_semester_week(self.c.semester, week_index=2)
+        week3 = resolve_semester_week(self.c.semester, week_index=3)
+
+        # K25A: section học tuần 1-8, section2 chỉ tuần 1, 3, 5
+        self.assertEqual(list(timetable_slots(self.c.semester, "class", self.c.k25a, week=week2)), [self.c.slot])
+        self.assertEqual(
+            list(timetable_slots(self.c.semester, "class", self.c.k25a, week=week3)), [self.c.slot, self.c.slot2],
+        )
+
+    def test_holidays_and_day_columns(self):
+        PublicHoliday.objects.create(date=datetime.date(2025, 9, 2), name="Quốc khánh")
+        PublicHoliday.objects.create(date=datetime.date(2020, 9, 5), name="Khai giảng", is_recurring=True)
+        PublicHoliday.objects.create(date=datetime.date(2024, 9, 3), name="Năm khác")
+        week1 = resolve_semester_week(self.c.semester, week_index=1)
+
+        holidays = week_holidays(week1)
+        self.assertEqual(holidays, {2: "Quốc khánh", 5: "Khai giảng"})
+
+        columns = day_columns(week1, holidays)
+        self.assertEqual([col["value"] for col in columns], [day for day, _ in DAYS])
+        self.assertEqual(columns[0]["date"], datetime.date(2025, 9, 1))
+        self.assertEqual(columns[1]["holiday"], "Quốc khánh")
+        self.assertEqual(day_columns()[0]["date"], None)
+
+    def test_view_by_date_and_unknown_week(self):
+        url = reverse("timetable:timetable_by_class")
+        params = {"semester": self.c.semester.pk, "student_class": self.c.k25a.pk}
+
+        response = self.client.get(url, {**params, "date": "2025-09-10"})
+        self.assertEqual(response.context["week"].index, 2)
+        self.assertIn("week=1", response.context["week_nav"]["prev_url"])
+        self.assertIn("week=3", response.context["week_nav"]["next_url"])
+
+        response = self.client.get(url, {**params, "week": 20})
+        self.assertIsNone(response.context["week"])
+        self.assertEqual(
+            [str(m) for m in response.context["messages"]],
+            ["Học kỳ không có Tuần 20, đang hiển thị cả học kỳ."],
+        )
+
+
+# =============== Xuất TKB Lớp HP / cả học kỳ ra Excel ===============
+
+class TimetableExcelExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        export_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(export_dir.cleanup)
+        patcher = override_settings(TIMETABLE_EXPORT_CACHE_DIR=export_dir.name)
+        patcher.enable()
+        self.addCleanup(patcher.disable)
+        self.c = make_timetable()
+
+    def test_section_workbook_has_info_slots_and_merged_grid(self):
+        wb = load_workbook(build_section_workbook(self.c.section))
+        ws = wb["LHP MH01_K25A"]
+
+        self.assertEqual(ws["A1"].value, "Mã LHP")
+        self.assertEqual(ws["B1"].value, "MH01_K25A")
+        self.assertEqual(ws["B4"].value, "K25A")
+        self.assertEqual([c.value for c in ws[9]][:4], ["Thứ 3", "1–3", "P101", "1–8"])
+        # Lưới: tiêu đề ở dòng 11, Thứ 3 tiết 1-3 là 1 ô gộp 3 dòng ở cột C
+        self.assertEqual(ws["A11"].value, "Tiết / Thứ")
+        self.assertIn("C12:C14", {str(r) for r in ws.merged_cells.ranges})
+        self.assertTrue(ws["C12"].value.startswith("MH01 - Lập trình"))
+
+    def test_semester_workbook_cached_per_data_version(self):
+        path = semester_workbook_path(self.c.semester)
+        sheets = load_workbook(path).sheetnames
+        self.assertEqual(sheets[:2], ["Lớp K25A", "Lớp K25B"])
+        self.assertEqual(len(sheets), 6)
+
+        self.assertEqual(semester_workbook_path(self.c.semester), path)
+
+        self.c.slot.start_period = 4
+        self.c.slot.end_period = 5
+        self.c.slot.save()
+        new_path = semester_workbook_path(self.c.semester)
+        self.assertNotEqual(new_path, path)
+        self.assertFalse(path.exists())
+
+    def test_download_views(self):
+        response = self.client.get(reverse("timetable:section_export_excel", args=[self.c.section.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="TKB_MH01_K25A.xlsx"', response["Content-Disposition"])
+
+        response = self.client.get(reverse("timetable:semester_timetable_excel", args=[self.c.semester.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('filename="TKB_2025-2026_HK1.xlsx"', response["Content-Disposition"])
+        response.close()
+
+
+# =============== In TKB ra PDF (1 đối tượng / cả Khoa) ===============
+
+class TimetablePdfTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        # Lớp / GV / phòng của Khoa khác: không được lọt vào zip của Khoa CNTT
+        other = Department.objects.create(code="KT", name="Kinh tế")
+        other_class = StudentClass.objects.create(
+            code="K25KT", name="K25KT", size=20, major=self.c.major, academic_year=self.c.year, department=other,
+        )
+        room = Room.objects.create(code="P301", name="P301", room_type=self.c.lt, capacity=30)
+        section = CourseSection.objects.create(subject=self.c.subject2, semester=self.c.semester, code="CT01_KT")
+        section.classes.set([other_class])
+        add_slot(section, room, 5, 1, 2, [1])
+
+    def test_department_jobs_cover_own_classes_rooms_and_instructors(self):
+        jobs = department_pdf_jobs(self.c.semester, self.c.dept)
+
+        self.assertEqual([job[0] for job in jobs], [
+            "class/K25A.pdf", "class/K25B.pdf",
+            "instructor/GV01.pdf", "instructor/GV02.pdf",
+            "room/P101.pdf", "room/P201.pdf",
+        ])
+        name, title, subtitle, days, grid_rows, font_path = jobs[0]
+        self.assertEqual(title, "TKB Lớp K25A")
+        self.assertEqual(len(grid_rows), len(PERIODS))
+        first = next(cell for cell in grid_rows[0]["cells"] if "text" in cell)
+        self.assertEqual(first["rowspan"], 3)
+        self.assertTrue(first["text"].startswith("MH01 - Lập trình"))
+
+    def test_ascii_fallback_drops_vietnamese_marks(self):
+        self.assertEqual(_ascii("Thời khoá biểu Đợt 1–2"), "Thoi khoa bieu Dot 1-2")
+
+    def test_department_zip(self):
+        try:
+            fh, count = build_department_pdf_zip(self.c.semester, self.c.dept, workers=1)
+        except PdfUnavailable:
+            self.skipTest("Chưa cài fpdf2")
+        with zipfile.ZipFile(fh) as zf:
+            self.assertEqual(len(zf.namelist()), count)
+            self.assertTrue(zf.read("class/K25A.pdf").startswith(b"%PDF"))
+
+    def test_view_returns_pdf_or_501(self):
+        url = reverse("timetable:timetable_pdf", args=[self.c.semester.pk, "section", self.c.section.pk])
+        response = self.client.get(url)
+
+        if response.status_code == 501:
+            self.assertIn("fpdf2", response.content.decode("utf-8"))
+        else:
+            self.assertEqual(response["Content-Type"], "application/pdf")
+            self.assertIn('filename="TKB_section_MH01_K25A_HK1.pdf"', response["Content-Disposition"])
+
+        with mock.patch("timetable.views.build_timetable_pdf", side_effect=PdfUnavailable("Cần cài fpdf2")):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 501)
+
+
+# =============== Sinh Lớp HP theo lô từ CTĐT nạp sẵn ===============
+
+class CourseSectionGenerationTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        CurriculumSubject.objects.create(curriculum=self.c.curriculum, subject=self.c.subject2, semester_index=1)
+        external = Subject.objects.create(code="QP01", name="Quốc phòng", total_periods=30, is_external_managed=True)
+        CurriculumSubject.objects.create(curriculum=self.c.curriculum, subject=external, semester_index=1)
+        later = Subject.objects.create(code="MH02", name="CSDL", subject_type="LT", total_periods=30)
+        CurriculumSubject.objects.create(curriculum=self.c.curriculum, subject=later, semester_index=2)
+
+    def test_creates_sections_for_current_semester_index(self):
+        created = generate_course_sections_for_semester(self.c.semester, "CNTT")
+
+        codes = sorted(s.code for s in created)
+        # MH01 (tối đa 32): 70 SV -> 3 LHP; CT01 (LT, tối đa 35): 70 SV -> 2 LHP; QP01 do đơn vị khác xếp
+        self.assertEqual(codes, [
+            "K25A_CT01_01", "K25A_CT01_02", "K25A_MH01_01", "K25A_MH01_02", "K25A_MH01_03",
+        ])
+        for subject in (self.c.subject, self.c.subject2):
+            sections = CourseSection.objects.filter(code__startswith=f"K25A_{subject.code}_")
+            self.assertEqual(sum(s.student_count or s.total_students for s in sections), 70)
+            self.assertTrue(all(s.planned_periods == subject.total_periods for s in sections))
+        section = CourseSection.objects.get(code="K25A_MH01_01")
+        self.assertTrue(set(section.classes.all()) <= {self.c.k25a, self.c.k25b})
+
+    def test_rerun_creates_nothing(self):
+        generate_course_sections_for_semester(self.c.semester, "CNTT")
+
+        self.assertEqual(generate_course_sections_for_semester(self.c.semester, "CNTT"), [])
+        self.assertEqual(generate_course_sections_for_semester(self.c.semester, "KT"), [])
+
+    def test_query_count_does_not_grow_with_classes(self):
+        with CaptureQueriesContext(connection) as small:
+            generate_course_sections_for_semester(self.c.semester, None)
+        CourseSection.objects.filter(code__startswith="K25A_").delete()
+        for i in range(3):
+            StudentClass.objects.create(
+                code=f"K25C{i}", name=f"K25C{i}", size=25, major=self.c.major, academic_year=self.c.year,
+                department=self.c.dept,
+            )
+
+        with CaptureQueriesContext(connection) as large:
+            generate_course_sections_for_semester(self.c.semester, None)
+        self.assertEqual(len(large), len(small))
+
+
+# =============== Chia lớp vào LHP cân bằng sĩ số ===============
+
+class PartitionClassesTests(TestCase):
+    def classes(self, *sizes):
+        return [SimpleNamespace(pk=i, code=f"L{i}", size=size) for i, size in enumerate(sizes, start=1)]
+
+    def sizes(self, partitions):
+        return [sorted(((cls.code, count) for cls, count in part), key=lambda x: x[0]) for part in partitions]
+
+    def test_splits_largest_class_to_balance_sections(self):
+        # Nhóm 24CDTH của dữ liệu thật: 25 + 7 + 1 SV, môn MH tối đa 32 -> 17 + 16 (không phải 25 + 8)
+        partitions = partition_classes(self.classes(25, 7, 1), 32)
+
+        self.assertEqual(self.sizes(partitions), [
+            [("L1", 17)],
+            [("L1", 8), ("L2", 7), ("L3", 1)],
+        ])
+
+    def test_section_sizes_differ_by_at_most_one(self):
+        for sizes, max_size in [((40, 30), 32), ((20, 20, 20, 10), 35), ((60,), 20), ((19, 18, 3, 3), 20)]:
+            with self.subTest(sizes=sizes, max_size=max_size):
+                partitions = partition_classes(self.classes(*sizes), max_size)
+                loads = [sum(count for _, count in part) for part in partitions]
+
+                self.assertEqual(len(partitions), -(-sum(sizes) // max_size))
+                self.assertEqual(sum(loads), sum(sizes))
+                self.assertLessEqual(max(loads) - min(loads), 1)
+                self.assertLessEqual(max(loads), max_size)
+
+    def test_small_group_stays_whole(self):
+        partitions = partition_classes(self.classes(12, 10, 0), 32)
+
+        self.assertEqual(self.sizes(partitions), [[("L1", 12), ("L2", 10), ("L3", 0)]])
+
+    def test_only_sections_holding_part_of_a_class_get_student_count(self):
+        c = make_timetable()
+        for sizes, expected in [((40, 10), [25, 25]), ((20, 20), [None, None])]:
+            with self.subTest(sizes=sizes):
+                StudentClass.objects.filter(pk=c.k25a.pk).update(size=sizes[0])
+                StudentClass.objects.filter(pk=c.k25b.pk).update(size=sizes[1])
+                CourseSection.objects.filter(code__startswith="K25A_").delete()
+
+                generate_course_sections_for_semester(c.semester, "CNTT")
+
+                # MH01 tối đa 32: 40 + 10 -> 25 + 25 (K25A chia 2 nhóm); 20 + 20 -> 2 LHP nguyên lớp
+                sections = CourseSection.objects.filter(code__startswith="K25A_MH01_").order_by("code")
+                self.assertEqual([s.student_count for s in sections], expected)
+
+
+class SplitClassConflictTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        self.week_ids = list(SemesterWeek.objects.filter(semester=self.c.semester, index__lte=8))
+
+    def add_group(self, code, student_count):
+        section = CourseSection.objects.create(
+            subject=self.c.subject, semester=self.c.semester, code=code, student_count=student_count,
+        )
+        section.classes.set([self.c.k25a])
+        return section
+
+    def check(self, section):
+        return has_conflict_for_class([self.c.k25a], self.c.semester, 2, 1, 3, self.week_ids, section=section)
+
+    def test_groups_of_a_split_class_may_run_in_parallel(self):
+        CourseSection.objects.filter(pk=self.c.section.pk).update(student_count=20)
+        group = self.add_group("MH01_K25A_02", 20)
+
+        self.assertFalse(self.check(group))
+        add_slot(group, self.c.room2, 2, 1, 3, range(1, 9))
+        self.assertEqual([x["kind"] for x in find_semester_conflicts(self.c.semester)], [])
+
+    def test_same_subject_without_split_marker_is_a_conflict(self):
+        # Lớp K25A bị gắn nhầm vào 2 LHP cùng môn học nguyên lớp
+        duplicate = self.add_group("MH01_K25A_DUP", None)
+
+        self.assertTrue(self.check(duplicate))
+        add_slot(duplicate, self.c.room2, 2, 1, 3, range(1, 9))
+        self.assertEqual([x["kind"] for x in find_semester_conflicts(self.c.semester)], ["class"])
+
+        # Chỉ 1 bên có sĩ số nhóm -> vẫn là trùng
+        split = self.add_group("MH01_K25A_02", 20)
+        self.assertTrue(self.check(split))
+
+
+# =============== Bảng tra học kỳ thứ mấy theo (Khoá, Học kỳ) ===============
+
+class SemesterIndexMappingTests(TestCase):
+    def setUp(self):
+        self.intakes = [AcademicYear.objects.create(code=code) for code in ("2023-2024", "K24", "2025-2026")]
+        self.semesters = {
+            code: Semester.objects.create(academic_year=self.intakes[2], code=code, name=code)
+            for code in ("HK1", "HK2", "HK hè", "HKX")
+        }
+
+    def test_rules(self):
+        self.assertEqual([academic_year_start(c) for c in ("2025", "2025-2026", "K25", "NH25-26", "")],
+                         [2025, 2025, 2025, 2025, None])
+        self.assertEqual(compute_semester_index(2023, "HK1", 2025), 5)
+        self.assertEqual(compute_semester_index(2023, "hk2", 2025), 6)
+        self.assertEqual(compute_semester_index(2023, "HK_HE", 2025), 6)
+        self.assertIsNone(compute_semester_index(2023, "HKX", 2025))
+        self.assertIsNone(compute_semester_index(2026, "HK1", 2025))
+
+    def test_map_is_built_on_demand_then_read_in_one_query(self):
+        ids = [year.pk for year in self.intakes]
+        SemesterIndexMapping.objects.all().delete()
+
+        self.assertEqual(get_semester_index_map(self.semesters["HK hè"], ids), dict(zip(ids, [6, 4, 2])))
+        self.assertEqual(get_semester_index_map(self.semesters["HKX"], ids), dict.fromkeys(ids))
+        get_semester_index_map(self.semesters["HK1"], ids)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_semester_index_map(self.semesters["HK1"], ids), dict(zip(ids, [5, 3, 1])))
+
+    def test_manual_rows_survive_recalculation(self):
+        semester = self.semesters["HKX"]
+        get_semester_index_map(semester, [self.intakes[0].pk])
+        SemesterIndexMapping.objects.filter(semester=semester, intake_year=self.intakes[0]).update(
+            semester_index=5, is_manual=True,
+        )
+
+        semester.code = "HK3"
+        semester.save()
+
+        self.assertEqual(get_semester_index_map(semester, [self.intakes[0].pk, self.intakes[2].pk]),
+                         {self.intakes[0].pk: 5, self.intakes[2].pk: 2})
+
+    def test_excel_import_fills_map(self):
+        # bulk_upsert không phát signal: after_write của sheet Năm học / Học kỳ tự tính bảng tra
+        years = make_workbook(IMPORT_CONFIG["academic_years"]["columns"], [("2022-2023",), ("2026-2027",)])
+        import_academic_years_from_excel(years.active)
+        old_intake = AcademicYear.objects.get(code="2022-2023")
+        self.assertEqual(
+            SemesterIndexMapping.objects.get(intake_year=old_intake, semester=self.semesters["HK1"]).semester_index, 7,
+        )
+        year = AcademicYear.objects.get(code="2026-2027")
+
+        semesters = make_workbook(IMPORT_CONFIG["semesters"]["columns"], [("2026-2027", "HK1", "HK1", None, 15)])
+        import_semesters_from_excel(semesters.active)
+
+        semester = Semester.objects.get(academic_year=year, code="HK1")
+        self.assertEqual(
+            dict(SemesterIndexMapping.objects.filter(semester=semester).values_list("intake_year_id", "semester_index")),
+            {old_intake.pk: 9, self.intakes[0].pk: 7, self.intakes[1].pk: 5, self.intakes[2].pk: 3, year.pk: 1},
+        )
+
+    def test_migration_backfills_existing_semesters(self):
+        migration = importlib.import_module("timetable.migrations.0014_backfill_semester_index_mapping")
+        SemesterIndexMapping.objects.all().delete()
+        manual = SemesterIndexMapping.objects.create(
+            intake_year=self.intakes[0], semester=self.semesters["HKX"], semester_index=5, is_manual=True,
+        )
+
+        migration.backfill_semester_index_mapping(apps, None)
+
+        self.assertEqual(SemesterIndexMapping.objects.count(), 12)
+        self.assertEqual(SemesterIndexMapping.objects.get(pk=manual.pk).semester_index, 5)
+        self.assertEqual(
+            get_semester_index_map(self.semesters["HK2"], [y.pk for y in self.intakes]),
+            dict(zip([y.pk for y in self.intakes], [6, 4, 2])),
+        )
+
+
+# =============== Xem trước / áp dụng thay đổi Lớp HP ===============
+
+class SectionPlanPreviewTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        # Kế hoạch MH01 (tối đa 32) cho K25A 40 + K25B 30 = 70 SV: K25A_MH01_01..03
+        generate_course_sections_for_semester(self.c.semester, "CNTT")
+
+    def preview(self):
+        # Bỏ 2 LHP tạo tay của make_timetable (ngoài kế hoạch, đã có buổi học -> luôn bị chặn xoá)
+        return [
+            c for c in preview_course_sections(self.c.semester, "CNTT")
+            if c["code"] not in ("MH01_K25A", "CT01_K25")
+        ]
+
+    def by_key(self, changes):
+        return {c["key"]: c for c in changes}
+
+    def test_preview_writes_nothing_and_is_empty_after_generation(self):
+        self.assertEqual(self.preview(), [])
+
+        StudentClass.objects.filter(pk=self.c.k25b.pk).update(size=60)
+        with CaptureQueriesContext(connection) as queries:
+            changes = self.preview()
+        self.assertFalse(any(q["sql"].startswith(("INSERT", "UPDATE", "DELETE")) for q in queries))
+
+        # 100 SV -> 4 LHP
+        self.assertEqual(summarize_changes(changes)["create"], 1)
+        self.assertIn("create:K25A_MH01_04", self.by_key(changes))
+
+    def test_apply_only_accepted_changes(self):
+        CourseSection.objects.filter(code="K25A_MH01_02").update(planned_periods=10)
+        CourseSection.objects.filter(code="K25A_MH01_03").update(planned_periods=20, is_locked=True)
+        changes = self.by_key(self.preview())
+        self.assertEqual(changes["update:K25A_MH01_02"]["fields"]["planned_periods"], (10, 45))
+        self.assertEqual(changes["update:K25A_MH01_03"]["blocked"], "LHP đã khoá")
+        version = get_semester_data_version(self.c.semester.pk)
+
+        result = apply_course_section_changes(
+            self.c.semester, list(changes.values()), accepted_keys=["update:K25A_MH01_02", "update:K25A_MH01_03"],
+        )
+
+        self.assertEqual(result["updated"], 1)
+        self.assertEqual(CourseSection.objects.get(code="K25A_MH01_02").planned_periods, 45)
+        self.assertEqual(CourseSection.objects.get(code="K25A_MH01_03").planned_periods, 20)
+        self.assertEqual(get_semester_data_version(self.c.semester.pk), version + 1)
+
+    def test_sections_out_of_plan_are_deleted_unless_scheduled(self):
+        CurriculumSubject.objects.filter(curriculum=self.c.curriculum, subject=self.c.subject).delete()
+        add_slot(CourseSection.objects.get(code="K25A_MH01_01"), self.c.room, 4, 1, 2, [1])
+
+        changes = self.by_key(self.preview())
+        self.assertEqual(
+            sorted(k for k in changes if k.startswith("delete:K25A")),
+            ["delete:K25A_MH01_01", "delete:K25A_MH01_02", "delete:K25A_MH01_03"],
+        )
+        self.assertTrue(changes["delete:K25A_MH01_01"]["blocked"])
+
+        result = apply_course_section_changes(self.c.semester, list(changes.values()), accepted_keys=list(changes))
+
+        self.assertEqual(result["deleted"], 2)
+        self.assertEqual(
+            list(CourseSection.objects.filter(code__startswith="K25A_").values_list("code", flat=True)),
+            ["K25A_MH01_01"],
+        )
+
+    def test_deleted_count_excludes_sections_locked_after_preview(self):
+        CurriculumSubject.objects.filter(curriculum=self.c.curriculum, subject=self.c.subject).delete()
+        changes = self.by_key(self.preview())
+        # Khoá LHP sau khi xem trước: thay đổi "delete" vẫn được chọn nhưng không được xoá
+        CourseSection.objects.filter(code="K25A_MH01_02").update(is_locked=True)
+
+        result = apply_course_section_changes(
+            self.c.semester, list(changes.values()),
+            accepted_keys=["delete:K25A_MH01_01", "delete:K25A_MH01_02", "delete:K25A_MH01_03"],
+        )
+
+        self.assertEqual(result["deleted"], 2)
+        self.assertEqual(result["delete_skipped"], ["K25A_MH01_02"])
+        self.assertTrue(CourseSection.objects.filter(code="K25A_MH01_02").exists())
+
+    def test_plan_view_preview_and_apply(self):
+        url = reverse("timetable:section_plan", args=[self.c.semester.pk])
+        CourseSection.objects.filter(code="K25A_MH01_01").update(planned_periods=1)
+
+        response = self.client.get(url, {"department_code": "CNTT"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("update:K25A_MH01_01", [c["key"] for c in response.context["changes"]])
+
+        response = self.client.post(url, {"department_code": "CNTT", "accepted": ["update:K25A_MH01_01"]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(CourseSection.objects.get(code="K25A_MH01_01").planned_periods, 45)
+
+
+# =============== Lịch học kỳ (tuần học, ngày nghỉ, ngày lễ) ===============
+
+class SemesterCalendarTests(TestCase):
+    def test_merge_intervals(self):
+        d = datetime.date
+        self.assertEqual(
+            merge_intervals([(d(2026, 2, 10), d(2026, 2, 12)), (d(2026, 1, 1), d(2026, 1, 2)),
+                             (d(2026, 2, 13), d(2026, 2, 20)), (d(2026, 2, 11), d(2026, 2, 11))]),
+            [(d(2026, 1, 1), d(2026, 1, 2)), (d(2026, 2, 10), d(2026, 2, 20))],
+        )
+
+    def test_break_covering_week_start_skips_whole_break(self):
+        d = datetime.date
+        # Tết: 09/02 - 22/02/2026 (2 tuần) -> tuần 2 lùi sang 23/02
+        weeks = build_semester_calendar(d(2026, 2, 2), 3, [(d(2026, 2, 9), d(2026, 2, 22))], [])
+
+        self.assertEqual([w["start_date"] for w in weeks], [d(2026, 2, 2), d(2026, 2, 23), d(2026, 3, 2)])
+        self.assertEqual([w["index"] for w in weeks], [1, 2, 3])
+        self.assertEqual({w["teaching_days_mask"] for w in weeks}, {0b1111111})
+
+    def test_single_days_off_only_clear_their_bit(self):
+        d = datetime.date
+        weeks = build_semester_calendar(
+            d(2025, 9, 1), 2,
+            [(d(2025, 9, 12), d(2025, 9, 12))],                      # nghỉ lẻ Thứ 6 tuần 2
+            [(d(2025, 9, 2), False), (d(2000, 9, 3), True), (d(2024, 9, 4), False)],
+        )
+
+        # Tuần 1: 02/09 (Thứ 3) + 03/09 lặp lại hằng năm (Thứ 4) nghỉ; 04/09/2024 khác năm
+        self.assertEqual(weeks[0]["teaching_days_mask"], 0b1111001)
+        self.assertEqual(weeks[1]["teaching_days_mask"], 0b1101111)
+
+    def test_migration_backfill_matches_calendar_services(self):
+        migration = importlib.import_module("timetable.migrations.0007_semesterweek_teaching_days_mask")
+        c = make_timetable()
+        PublicHoliday.objects.create(date=datetime.date(2025, 9, 2), name="Quốc khánh")
+        expected = dict(SemesterWeek.objects.filter(semester=c.semester).values_list("index", "teaching_days_mask"))
+        self.assertEqual(expected[1], 0b1111101)
+        SemesterWeek.objects.update(teaching_days_mask=0b1111111)
+
+        migration.backfill_teaching_days(apps, None)
+
+        self.assertEqual(
+            dict(SemesterWeek.objects.filter(semester=c.semester).values_list("index", "teaching_days_mask")),
+            expected,
+        )
+
+
+# =============== Sinh lại tuần học idempotent, giữ liên kết buổi học ===============
+
+class RegenerateWeeksTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+
+    def week_indexes(self, slot):
+        return sorted(slot.weeks.values_list("index", flat=True))
+
+    def test_unchanged_inputs_do_not_rewrite(self):
+        week_ids = list(SemesterWeek.objects.filter(semester=self.c.semester).values_list("id", flat=True))
+        version = get_semester_data_version(self.c.semester.pk)
+
+        with self.assertNumQueries(1):
+            self.assertIsNone(regenerate_semester_weeks(self.c.semester))
+
+        self.assertEqual(list(SemesterWeek.objects.filter(semester=self.c.semester).values_list("id", flat=True)),
+                         week_ids)
+        self.assertEqual(get_semester_data_version(self.c.semester.pk), version)
+
+    def test_break_shifts_dates_and_keeps_links_by_index(self):
+        # Nghỉ tuần 15/09 - 21/09: từ tuần 3 trở đi lùi 1 tuần, dòng tuần dùng lại theo số thứ tự
+        week3_id = SemesterWeek.objects.get(semester=self.c.semester, index=3).pk
+        SemesterBreak.objects.create(
+            semester=self.c.semester, name="Nghỉ", start_date=datetime.date(2025, 9, 15),
+            end_date=datetime.date(2025, 9, 21),
+        )
+
+        week3 = SemesterWeek.objects.get(semester=self.c.semester, index=3)
+        self.assertEqual((week3.pk, week3.start_date), (week3_id, datetime.date(2025, 9, 22)))
+        self.assertEqual(self.week_indexes(self.c.slot2), [1, 3, 5])
+        self.assertIsNone(regenerate_semester_weeks(Semester.objects.get(pk=self.c.semester.pk)))
+
+    def test_remap_by_date_and_dropped_links(self):
+        semester = Semester.objects.get(pk=self.c.semester.pk)
+        semester.start_date = datetime.date(2025, 9, 8)
+        semester.weeks = 10
+        semester.save()
+
+        result = regenerate_semester_weeks(semester, remap="date")
+
+        # Tuần cũ n (bắt đầu 01/09 + n-1 tuần) -> tuần mới n-1; tuần 1 cũ không còn tuần tương ứng
+        self.assertEqual(self.week_indexes(self.c.slot), [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(self.week_indexes(self.c.slot2), [2, 4])
+        self.assertEqual(result["dropped"], 2)
+        self.assertEqual(result["deleted"], 5)
+        self.c.slot.refresh_from_db()
+        self.assertEqual(self.c.slot.weeks_mask, 0b1111111)
+
+    def test_migration_backfills_signature(self):
+        migration = importlib.import_module("timetable.migrations.0008_semester_weeks_signature")
+        Semester.objects.update(weeks_signature="")
+        empty = Semester.objects.create(academic_year=self.c.year, code="HK2", name="HK2",
+                                        start_date=datetime.date(2026, 1, 5), weeks=15)
+        SemesterWeek.objects.filter(semester=empty).delete()
+        Semester.objects.filter(pk=empty.pk).update(weeks_signature="")
+
+        migration.backfill_weeks_signature(apps, None)
+
+        self.assertIsNone(regenerate_semester_weeks(Semester.objects.get(pk=self.c.semester.pk)))
+        self.assertEqual(Semester.objects.get(pk=empty.pk).weeks_signature, "")
+
+
+# =============== Cột bitmask tuần học trên TeachingSlot ===============
+
+class WeeksMaskSyncTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+
+    def mask(self, slot):
+        return TeachingSlot.objects.get(pk=slot.pk).weeks_mask
+
+    def test_mask_follows_m2m_changes_from_both_sides(self):
+        weeks = {w.index: w for w in SemesterWeek.objects.filter(semester=self.c.semester)}
+        self.assertEqual(self.mask(self.c.slot2), 0b10101)
+
+        self.c.slot2.weeks.add(weeks[15])
+        self.assertEqual(self.mask(self.c.slot2), 0b100000000010101)
+        self.c.slot2.weeks.remove(weeks[1])
+        self.assertEqual(self.mask(self.c.slot2), 0b100000000010100)
+
+        # Từ phía tuần: gỡ mọi buổi của tuần 3, gắn buổi vào tuần 2
+        weeks[3].teaching_slots.clear()
+        weeks[2].teaching_slots.add(self.c.slot2)
+        self.assertEqual(self.mask(self.c.slot2), 0b100000000010010)
+        self.assertEqual(self.mask(self.c.slot), 0b11111011)
+
+        self.c.slot2.weeks.clear()
+        self.assertEqual(self.mask(self.c.slot2), 0)
+
+    def test_deleting_a_week_clears_its_bit(self):
+        SemesterWeek.objects.get(semester=self.c.semester, index=5).delete()
+
+        self.assertEqual(self.mask(self.c.slot), 0b11101111)
+        self.assertEqual(self.mask(self.c.slot2), 0b00101)
+
+    def test_migration_backfill(self):
+        migration = importlib.import_module("timetable.migrations.0009_teachingslot_weeks_mask")
+        TeachingSlot.objects.update(weeks_mask=0)
+
+        migration.backfill_weeks_mask(apps, None)
+
+        self.assertEqual(self.mask(self.c.slot), 0b11111111)
+        self.assertEqual(self.mask(self.c.slot2), 0b10101)
+
+    def test_teaching_day_masks_skip_holidays(self):
+        PublicHoliday.objects.create(date=datetime.date(2025, 9, 2), name="Quốc khánh")
+
+        masks = teaching_day_week_masks([self.c.semester.pk])
+
+        # Thứ 3 tuần 1 là ngày lễ -> buổi của section (tuần 1-8) thực dạy 7 buổi
+        self.assertEqual(masks[(self.c.semester.pk, 2)] & 1, 0)
+        self.assertEqual(bin(self.c.slot.weeks_mask & masks[(self.c.semester.pk, 2)]).count("1"), 7)
+        self.assertEqual(masks[(self.c.semester.pk, 3)], (1 << 15) - 1)
+
+
+# =============== Index ghép cho các truy vấn nóng của engine xếp TKB ===============
+
+class HotQueryPlanTests(TestCase):
+    def test_hot_queries_use_their_composite_index(self):
+        results = explain_hot_queries()
+        self.assertEqual(len(results), 6)
+        for r in results:
+            with self.subTest(query=r["name"]):
+                self.assertEqual(r["full_scans"], [], r["plan"])
+                self.assertTrue(r["uses_index"], r["plan"])
+
+    def test_full_scan_detection(self):
+        plan = "\n".join([
+            "SEARCH timetable_teachingslot USING INDEX slot_section_day_idx (course_section_id=? AND day_of_week=?)",
+            "SCAN CONSTANT ROW",
+            "SCAN timetable_coursesection",
+        ])
+        self.assertEqual(full_scan_lines(plan, "sqlite"), ["SCAN timetable_coursesection"])
+        self.assertEqual(
+            full_scan_lines("Index Scan using x\n  ->  Seq Scan on timetable_room", "postgresql"),
+            ["->  Seq Scan on timetable_room"],
+        )
+
+    def test_command_reports_ok(self):
+        out = StringIO()
+        call_command("check_query_plans", stdout=out)
+        self.assertIn("6 truy vấn nóng đều dùng index", out.getvalue())
+
+
+# =============== Hồ sơ CSDL triển khai (SQLite tinh chỉnh / PostgreSQL) ===============
+
+class DatabaseProfileTests(TestCase):
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA {name}")
+            return cursor.fetchone()[0]
+
+    def set_pragmas(self, values):
+        with connection.cursor() as cursor:
+            for name, value in values.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+
+    def test_sqlite_profile_info(self):
+        info = database_profile_info()
+
+        self.assertEqual((info["profile"], info["vendor"]), ("sqlite", "sqlite"))
+        self.assertEqual(info["settings"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(info["settings"]["busy_timeout"], settings.TIMETABLE_SQLITE_PRAGMAS["busy_timeout"])
+
+    def test_fixture_db_gets_no_persistent_pragma(self):
+        # db.sqlite3 mẫu trong repo (không đặt TIMETABLE_SQLITE_PATH): không bật WAL
+        if not settings.TIMETABLE_SQLITE_PATH:
+            self.assertNotIn("journal_mode", settings.TIMETABLE_SQLITE_PRAGMAS)
+
+    def test_pragmas_applied_per_connection(self):
+        before = {name: self.pragma(name) for name in ("busy_timeout", "cache_size")}
+        self.addCleanup(self.set_pragmas, before)
+
+        with override_settings(TIMETABLE_SQLITE_PRAGMAS={"busy_timeout": 1234, "cache_size": -1000}):
+            tune_sqlite_connection(sender=None, connection=connection)
+
+        self.assertEqual(self.pragma("busy_timeout"), 1234)
+        self.assertEqual(self.pragma("cache_size"), -1000)
+
+
+# =============== Sĩ số / Khoa tính sẵn trên Lớp HP (lọc không join Lớp SV) ===============
+
+class SectionRollupTests(TestCase):
+    def setUp(self):
+        self.c = make_timetable()
+        self.kt = Department.objects.create(code="KT", name="Kinh tế")
+
+    def reload(self, section):
+        return CourseSection.objects.get(pk=section.pk)
+
+    def test_rollups_from_classes(self):
+        section2 = self.reload(self.c.section2)
+
+        self.assertEqual(section2.total_students, 70)
+        self.assertEqual(section2.department_id, self.c.dept.pk)
+
+    def test_majority_department_tie_lower_id(self):
+        StudentClass.objects.filter(pk=self.c.k25b.pk).update(department=self.kt, size=50)
+        refresh_section_rollups([self.c.section2.pk])
+        self.assertEqual(self.reload(self.c.section2).department_id, self.kt.pk)
+
+        StudentClass.objects.filter(pk=self.c.k25b.pk).update(size=40)
+        refresh_section_rollups([self.c.section2.pk])
+        self.assertEqual(self.reload(self.c.section2).department_id, min(self.c.dept.pk, self.kt.pk))
+
+    def test_signals_keep_rollups_in_sync(self):
+        self.c.k25b.size = 35
+        self.c.k25b.save()
+        self.assertEqual(self.reload(self.c.section2).total_students, 75)
+
+        self.c.section2.classes.remove(self.c.k25a)
+        self.assertEqual(self.reload(self.c.section2).total_students, 35)
+
+        self.c.k25a.delete()
+        section = self.reload(self.c.section)
+        self.assertEqual((section.total_students, section.department_id), (0, None))
+
+    def test_section_student_count_split_vs_whole(self):
+        section = self.reload(self.c.section)
+        self.assertEqual(section_student_count(section), 40)
+
+        # Nhóm của lớp bị chia: sĩ số nhóm, không phải sĩ số cả lớp
+        section.student_count = 20
+        self.assertEqual(section_student_count(section), 20)
+        self.assertEqual(section.total_students, 40)
+
+    def test_shared_section_scheduled_by_owner_department_only(self):
+        self.c.k25b.department = self.kt
+        self.c.k25b.size = 50
+        self.c.k25b.save()
+
+        with mock.patch("timetable.services.auto_schedule_single_section_fixed", return_value=(None, "bỏ qua")) as run:
+            auto_schedule_whole_semester_fixed(self.c.semester, department_code="CNTT", reset_existing=True)
+
+        # LHP ghép thuộc KT: chạy cho CNTT không xếp lại, không xoá buổi học của nó
+        self.assertEqual([call.args[0].pk for call in run.call_args_list], [self.c.section.pk])
+        self.assertTrue(TeachingSlot.objects.filter(pk=self.c.slot2.pk).exists())
+        self.assertFalse(TeachingSlot.objects.filter(pk=self.c.slot.pk).exists())
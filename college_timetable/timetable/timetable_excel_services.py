@@ -0,0 +1,211 @@
+"""
+Xuất TKB ra Excel (layout giống lưới TKB trên web: hàng = tiết, cột = Thứ,
+mỗi buổi 1 ô gộp theo số tiết).
+
+- 1 Lớp HP: thông tin LHP + danh sách buổi học + lưới.
+- Cả học kỳ: 1 sheet / Lớp SV, Phòng, Giảng viên; toàn bộ dữ liệu lấy từ
+  1 query TeachingSlot (+ prefetch) như khi xuất bản TKB tĩnh.
+- Ghi bằng openpyxl write-only. File của cả học kỳ được cache trên đĩa theo
+  data_version của học kỳ: tải lại khi dữ liệu chưa đổi chỉ là gửi file có sẵn.
+"""
+import os
+import re
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from .grid_services import (
+    DAYS, build_compact_grid, get_semester_data_version, slot_cell_data, timetable_slots,
+)
+from .publish_services import collect_semester_slots
+
+SHEET_PREFIXES = {
+    "class": "Lớp",
+    "room": "Phòng",
+    "instructor": "GV",
+}
+SHEET_ORDER = ["class", "room", "instructor"]
+
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]\:\*\?\/\\]")
+
+HEADER_FONT = Font(bold=True)
+HEADER_FILL = PatternFill("solid", fgColor="DDDDDD")
+SLOT_FILL = PatternFill("solid", fgColor="E8F0FE")
+WRAP = Alignment(wrap_text=True, vertical="top")
+
+
+def cell_text(data, entity_type):
+    """Nội dung 1 ô buổi học, giống ô trong _timetable_grid.html."""
+    lines = [f"{data['subject_code']} - {data['subject_name']}"]
+    if entity_type == "class":
+        lines.append(f"LHP: {data['section_code']}")
+    else:
+        lines.append(f"Lớp SV: {data['class_codes']}")
+    if entity_type != "room":
+        lines.append(f"Phòng: {data['room_code'] or '(Không phòng)'}")
+    if entity_type != "instructor":
+        lines.append(f"GV: {data['instructor'] or '(chưa phân công)'}")
+    lines.append(f"Tuần: {data['weeks_label']}")
+    return "\n".join(lines)
+
+
+def _header_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.font = HEADER_FONT
+    cell.fill = HEADER_FILL
+    return cell
+
+
+def write_grid(ws, grid_rows, entity_type, first_row=1):
+    """
+    Ghi lưới TKB (kết quả build_compact_grid) từ dòng first_row:
+    1 dòng tiêu đề Thứ, rồi mỗi tiết 1 dòng; ô buổi học gộp theo rowspan.
+    Trả về số dòng đã ghi.
+    """
+    ws.append([_header_cell(ws, "Tiết / Thứ")] + [_header_cell(ws, label) for _, label in DAYS])
+    day_values = [day for day, _ in DAYS]
+
+    for offset, row in enumerate(grid_rows, start=1):
+        excel_row = first_row + offset
+        cells_by_day = {cell["day"]: cell for cell in row["cells"]}
+        values = [_header_cell(ws, f"Tiết {row['period']}")]
+        for col, day in enumerate(day_values, start=2):
+            cell = cells_by_day.get(day)
+            out = WriteOnlyCell(ws)
+            if cell is not None and cell.get("slots"):
+                out.value = "\n\n".join(cell_text(s, entity_type) for s in cell["slots"])
+                out.fill = SLOT_FILL
+                out.alignment = WRAP
+                if cell["rowspan"] > 1:
+                    letter = get_column_letter(col)
+                    ws.merged_cells.add(f"{letter}{excel_row}:{letter}{excel_row + cell['rowspan'] - 1}")
+            values.append(out)
+        ws.append(values)
+
+    return len(grid_rows) + 1
+
+
+def _setup_grid_columns(ws):
+    ws.column_dimensions["A"].width = 10
+    for col in range(2, len(DAYS) + 2):
+        ws.column_dimensions[get_column_letter(col)].width = 28
+
+
+def _sheet_title(prefix, code, used):
+    """Tên sheet hợp lệ (≤ 31 ký tự, không ký tự cấm) và không trùng."""
+    base = _INVALID_SHEET_CHARS.sub("_", f"{prefix} {code}")[:31]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title = base[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+# =============== 1 LỚP HỌC PHẦN ===============
+
+def build_section_workbook(section):
+    """Workbook TKB của 1 Lớp HP (file tạm, đã tua về đầu)."""
+    slots = list(timetable_slots(section.semester, "section", section))
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=_sheet_title("LHP", section.code, set()))
+    _setup_grid_columns(ws)
+
+    info = [
+        ("Mã LHP", section.code),
+        ("Môn học", f"{section.subject.code} - {section.subject.name}"),
+        ("Học kỳ", str(section.semester)),
+        ("Lớp SV", ", ".join(c.code for c in section.classes.all())),
+        ("Giảng viên", section.instructor.name if section.instructor_id else "(chưa phân công)"),
+        ("Tổng tiết", section.planned_periods or section.subject.total_periods),
+    ]
+    for label, value in info:
+        ws.append([_header_cell(ws, label), value])
+    ws.append([])
+
+    ws.append([_header_cell(ws, h) for h in ("Thứ", "Tiết", "Phòng", "Tuần", "Hình thức")])
+    day_labels = dict(DAYS)
+    for s in slots:
+        data = slot_cell_data(s)
+        ws.append([
+            day_labels.get(s.day_of_week, s.day_of_week),
+            f"{s.start_period}–{s.end_period}",
+            data["room_code"],
+            data["weeks_label"],
+            s.method,
+        ])
+    ws.append([])
+
+    first_row = len(info) + 1 + 1 + len(slots) + 1 + 1
+    write_grid(ws, build_compact_grid(slots), "section", first_row=first_row)
+
+    tmp = tempfile.TemporaryFile(suffix=".xlsx")
+    wb.save(tmp)
+    tmp.seek(0)
+    return tmp
+
+
+# =============== CẢ HỌC KỲ ===============
+
+def write_semester_workbook(semester, fh):
+    """Ghi workbook TKB cả học kỳ (1 sheet / Lớp SV, Phòng, GV) vào file fh."""
+    entities, cell_data = collect_semester_slots(semester)
+
+    wb = Workbook(write_only=True)
+    used_titles = set()
+    ordered = sorted(entities.items(), key=lambda item: (SHEET_ORDER.index(item[0][0]), item[1]["code"]))
+    for (entity_type, _), entity in ordered:
+        ws = wb.create_sheet(title=_sheet_title(SHEET_PREFIXES[entity_type], entity["code"], used_titles))
+        _setup_grid_columns(ws)
+        ws.freeze_panes = "B2"
+        grid_rows = build_compact_grid(entity["slots"], cell_data=lambda s: cell_data[s.pk])
+        write_grid(ws, grid_rows, entity_type)
+
+    if not ordered:
+        wb.create_sheet(title="TKB").append(["Học kỳ chưa có buổi học nào."])
+    wb.save(fh)
+
+
+def _export_cache_dir() -> Path:
+    path = Path(settings.TIMETABLE_EXPORT_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def semester_workbook_path(semester) -> Path:
+    """
+    Đường dẫn file Excel TKB cả học kỳ ứng với data_version hiện tại;
+    chưa có thì dựng rồi lưu (ghi file tạm rồi đổi tên), đồng thời xoá các bản cũ.
+    """
+    version = get_semester_data_version(semester.pk)
+    cache_dir = _export_cache_dir()
+    path = cache_dir / f"tkb_semester_{semester.pk}_v{version}.xlsx"
+    if path.exists():
+        return path
+
+    fd, tmp_name = tempfile.mkstemp(dir=cache_dir, suffix=".xlsx.tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write_semester_workbook(semester, fh)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+    # Chỉ xoá bản cũ hơn (request khác có thể vừa dựng bản mới hơn)
+    for old in cache_dir.glob(f"tkb_semester_{semester.pk}_v*.xlsx"):
+        old_version = old.stem.rpartition("_v")[2]
+        if old_version.isdigit() and int(old_version) < version:
+            old.unlink(missing_ok=True)
+    return path
+
+
+def semester_workbook_filename(semester):
+    return f"TKB_{semester.academic_year.code}_{semester.code}.xlsx"
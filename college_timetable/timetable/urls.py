@@ -8,11 +8,28 @@ urlpatterns = [
 
     path("semester/", views.semester_overview, name="semester_overview"),
     path("sections/", views.section_list, name="section_list"),
+    path("semester/conflicts/", views.semester_conflicts_view, name="semester_conflicts"),
+    path("semester/<int:pk>/section-plan/", views.section_plan_view, name="section_plan"),
 
     # ✅ TKB theo Lớp / Phòng / Giảng viên
-    path("timetable/class/", views.timetable_by_class, name="timetable_by_class"),
-    path("timetable/room/", views.timetable_by_room, name="timetable_by_room"),
-    path("timetable/instructor/", views.timetable_by_instructor, name="timetable_by_instructor"),
+    path("timetable/class/", views.class_timetable_view, name="timetable_by_class"),
+    path("timetable/room/", views.room_timetable_view, name="timetable_by_room"),
+    path("timetable/instructor/", views.instructor_timetable_view, name="timetable_by_instructor"),
+    path(
+        "api/semesters/<int:semester_id>/<str:entity_type>/<int:entity_id>/",
+        views.timetable_api,
+        name="timetable_api",
+    ),
+    path(
+        "ics/<int:semester_id>/<str:entity_type>/<int:entity_id>.ics",
+        views.timetable_ics,
+        name="timetable_ics",
+    ),
+    path(
+        "pdf/<int:semester_id>/<str:entity_type>/<int:entity_id>.pdf",
+        views.timetable_pdf,
+        name="timetable_pdf",
+    ),
     path("section/<int:pk>/schedule/", views.section_schedule, name="section_schedule"),
     path("instructor-workload/", views.instructor_workload_view, name="instructor_workload"),
     path(
@@ -20,7 +37,16 @@ urlpatterns = [
         views.instructor_workload_detail,
         name="instructor_workload_detail",    ),
     path("import/", views.data_import_menu, name="data_import_menu"),
+    path("import/jobs/", views.import_job_list, name="import_job_list"),
+    path("import/jobs/<int:pk>/", views.import_job_detail, name="import_job_detail"),
+    path("import/jobs/<int:pk>/resume/", views.import_job_resume, name="import_job_resume"),
     path("import/<str:data_type>/", views.data_import_view, name="data_import_view"),
+    path("export/<str:data_type>/", views.data_export_view, name="data_export"),
+    path(
+        "semester/<int:pk>/timetable.xlsx",
+        views.semester_timetable_excel,
+        name="semester_timetable_excel",
+    ),
     path(
         "sections/<int:pk>/export/",
         views.section_export_excel,
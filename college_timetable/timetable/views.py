@@ -1,15 +1,18 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import condition, require_GET
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db.models import Q
 from .forms import ExcelUploadForm
-from . import import_services
 import csv
 from urllib.parse import urlencode
 
 from .models import (
     AcademicYear,
     CourseSection,Department,
+    ImportJob,
     Instructor,   
     Room,
     ResearchMember,
@@ -34,9 +37,42 @@ from .services import (
     generate_course_sections_for_semester,  
 )
 
-from .import_services import import_all_from_excel
+from .import_services import import_all_from_excel, IMPORT_CONFIG, ALL_SHEETS
+from .export_services import (
+    EXPORT_SPECS,
+    build_export_workbook,
+    export_filename,
+)
+from .conflict_services import CONFLICT_KINDS, find_semester_conflicts, summarize_conflicts
+from .section_plan_services import (
+    CHANGE_ACTIONS, apply_course_section_changes, preview_course_sections, summarize_changes,
+)
+from .grid_services import (
+    get_semester_data_stamp,
+    render_timetable_grid,
+    resolve_semester_week,
+    timetable_api_payload,
+)
+from .ics_services import iter_ics_feed
+from .pdf_render import PdfUnavailable
+from .pdf_services import build_timetable_pdf, timetable_pdf_filename
+from .timetable_excel_services import (
+    build_section_workbook,
+    semester_workbook_filename,
+    semester_workbook_path,
+)
+from .import_job_services import (
+    IMPORT_ALL,
+    create_import_job,
+    is_job_running,
+    resume_import_job,
+    start_import_job,
+)
+
 
 
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 
 def home(request):
     return render(request, "timetable/home.html")
@@ -67,42 +103,33 @@ def data_import_all_view(request):
 #     # TODO: viết code xuất Excel tại đây
 #     return HttpResponse(f"Export Excel cho học kỳ: {semester}", content_type="text/plain")
 def section_export_excel(request, pk):
-    section = get_object_or_404(CourseSection, pk=pk)
-
-    # TODO: sau này bạn dùng openpyxl để xuất file thật.
-    # Tạm thời trả text để test cho nhanh:
-    return HttpResponse(
-        f"Export Excel cho LHP: {section.code}",
-        content_type="text/plain",
+    """Xuất TKB 1 Lớp HP ra Excel (thông tin LHP + danh sách buổi + lưới)."""
+    section = get_object_or_404(
+        CourseSection.objects.select_related(
+            "subject", "instructor", "semester__academic_year",
+        ).prefetch_related("classes"),
+        pk=pk,
+    )
+    return FileResponse(
+        build_section_workbook(section),
+        as_attachment=True,
+        filename=f"TKB_{section.code}.xlsx",
+        content_type=XLSX_CONTENT_TYPE,
     )
 
-DAYS = [
-    (1, "Thứ 2"),
-    (2, "Thứ 3"),
-    (3, "Thứ 4"),
-    (4, "Thứ 5"),
-    (5, "Thứ 6"),
-    (6, "Thứ 7"),
-]
-
-# Giả sử tối đa 10 tiết / ngày
-PERIODS = list(range(1, 15))
 
-def build_timetable_grid(slots):
+def semester_timetable_excel(request, pk):
     """
-    slots: queryset TeachingSlot đã lọc theo lớp và học kỳ.
-    Trả về dict:
-        grid[(day, period)] = list các slot rơi vào ô đó (thường 0 hoặc 1)
+    Xuất TKB cả học kỳ: 1 sheet / Lớp SV, Phòng, GV.
+    File được cache trên đĩa theo phiên bản dữ liệu học kỳ.
     """
-    grid = {(day, p): [] for day, _ in DAYS for p in PERIODS}
-
-    for s in slots:
-        for p in range(s.start_period, s.end_period + 1):
-            key = (s.day_of_week, p)
-            if key in grid:
-                grid[key].append(s)
-
-    return grid
+    semester = get_object_or_404(Semester.objects.select_related("academic_year"), pk=pk)
+    return FileResponse(
+        open(semester_workbook_path(semester), "rb"),
+        as_attachment=True,
+        filename=semester_workbook_filename(semester),
+        content_type=XLSX_CONTENT_TYPE,
+    )
 
 # def semester_overview(request): 
     """
@@ -137,8 +164,8 @@ def build_timetable_grid(slots):
 
             sections = CourseSection.objects.filter(
                 semester=semester,
-                classes__department__code=department_code,
-            ).distinct().select_related("subject", "instructor")
+                department__code=department_code,
+            ).select_related("subject", "instructor")
     else:
         form = SemesterChoiceForm()
 
@@ -282,7 +309,7 @@ def semester_overview(request):
             # --- sinh LHP nếu chưa có cho kỳ + khoa này ---
             qs = CourseSection.objects.filter(semester=selected_semester)
             if dept_code:
-                qs = qs.filter(classes__department__code=dept_code)
+                qs = qs.filter(department__code=dept_code)
 
             if not qs.exists():
                 created_sections = generate_course_sections_for_semester(
@@ -306,6 +333,14 @@ def semester_overview(request):
                 url = f"{url}?{urlencode(params)}"
             return redirect(url)
 
+        # 1b) NÚT "Xem trước sinh LHP"
+        if "preview_sections" in request.POST and selected_semester:
+            url = reverse("timetable:section_plan", args=[selected_semester.pk])
+            preview_code = dept_code or form.cleaned_data.get("department_code")
+            if preview_code:
+                url = f"{url}?{urlencode({'department_code': preview_code})}"
+            return redirect(url)
+
         # 2) NÚT "Xếp TKB tự động"
         if "auto_schedule" in request.POST and selected_semester:
             ok_sections, fail_sections = auto_schedule(
@@ -360,7 +395,7 @@ def section_schedule(request, pk):
             )
 
             # Lấy lại các slot hiện tại để hiển thị
-            current_slots = TeachingSlot.objects.filter(course_section=section).prefetch_related("weeks", "room")
+            current_slots = TeachingSlot.objects.filter(course_section=section).select_related("room")
 
             return render(
                 request,
@@ -377,7 +412,7 @@ def section_schedule(request, pk):
         form = SemiAutoScheduleForm()
         form.fields["allowed_rooms"].queryset = Room.objects.all()
 
-    current_slots = TeachingSlot.objects.filter(course_section=section).prefetch_related("weeks", "room")
+    current_slots = TeachingSlot.objects.filter(course_section=section).select_related("room")
 
     return render(
         request,
@@ -391,261 +426,382 @@ def section_schedule(request, pk):
         },
     )
 
-# def section_list(request):
-#     """
-#     Danh sách Lớp học phần, để sau này chọn vào xếp bán tự động / chỉnh tay.
-#     """
-#     sections = CourseSection.objects.select_related(
-#         "subject", "semester", "student_class", "instructor"
-#     ).order_by("semester__start_date", "code")
+SECTION_PAGE_SIZE = 50
+
+
+def _parse_section_cursor(value):
+    """Con trỏ trang dạng "<semester_id>:<mã LHP>" -> (semester_id, code) hoặc None."""
+    sem_id, sep, code = (value or "").partition(":")
+    if not sep or not sem_id.isdigit():
+        return None
+    return int(sem_id), code
 
-#     return render(request, "timetable/section_list.html", {
-#         "sections": sections,
-#     })
 
-# def section_list(request):
+def section_list(request):
     """
     Danh sách Lớp học phần.
     Có thể lọc theo:
       - Học kỳ: ?semester_id=...
       - Khoa phụ trách môn: ?department_id=...
+      - Tìm theo mã LHP / mã, tên môn / mã, tên GV: ?q=...
+    Phân trang keyset theo (Học kỳ, mã LHP) (dùng index unique (semester, code)):
+      - ?after=<semester_id>:<code>  trang sau
+      - ?before=<semester_id>:<code> trang trước
+    => chỉ đọc đúng 1 trang, không COUNT / OFFSET, tốc độ không phụ thuộc tổng số LHP.
     """
     qs = CourseSection.objects.select_related(
         "subject",
-        "semester",
+        "semester__academic_year",
         "instructor",
-    ).prefetch_related(
-        "classes",   # vì CourseSection.classes là ManyToMany
     )
 
     semester_id = request.GET.get("semester_id")
     department_id = request.GET.get("department_id")
+    search = request.GET.get("q", "").strip()
 
     semester = None
     department = None
 
     if semester_id:
         qs = qs.filter(semester_id=semester_id)
-        semester = Semester.objects.filter(id=semester_id).first()
+        semester = Semester.objects.select_related("academic_year").filter(id=semester_id).first()
 
     if department_id:
-        # dùng khoa phụ trách môn: managing_department
+        # dùng Khoa phụ trách môn: managing_department
         qs = qs.filter(subject__managing_department_id=department_id)
         department = Department.objects.filter(id=department_id).first()
 
-    qs = qs.order_by(
-        "semester__academic_year__code",
-        "semester__code",
-        "code",
-    )
+    if search:
+        qs = qs.filter(
+            Q(code__icontains=search)
+            | Q(subject__code__icontains=search)
+            | Q(subject__name__icontains=search)
+            | Q(instructor__code__icontains=search)
+            | Q(instructor__name__icontains=search)
+        )
+
+    after = _parse_section_cursor(request.GET.get("after"))
+    before = _parse_section_cursor(request.GET.get("before"))
+
+    if before:
+        sem, code = before
+        qs = qs.filter(Q(semester_id__lt=sem) | Q(semester_id=sem, code__lt=code))
+        qs = qs.order_by("-semester_id", "-code")
+    else:
+        if after:
+            sem, code = after
+            qs = qs.filter(Q(semester_id__gt=sem) | Q(semester_id=sem, code__gt=code))
+        qs = qs.order_by("semester_id", "code")
+
+    # Lấy dư 1 dòng để biết còn trang tiếp theo không
+    # (prefetch Lớp SV chỉ chạy cho các LHP của trang này)
+    sections = list(qs.prefetch_related("classes")[:SECTION_PAGE_SIZE + 1])
+    has_more = len(sections) > SECTION_PAGE_SIZE
+    sections = sections[:SECTION_PAGE_SIZE]
+    if before:
+        sections.reverse()
+
+    def page_url(direction, section):
+        params = {k: v for k, v in (
+            ("semester_id", semester_id), ("department_id", department_id), ("q", search),
+        ) if v}
+        params[direction] = f"{section.semester_id}:{section.code}"
+        return "?" + urlencode(params)
+
+    next_url = prev_url = None
+    if sections:
+        if has_more or before:
+            next_url = page_url("after", sections[-1])
+        if (has_more and before) or after:
+            prev_url = page_url("before", sections[0])
 
     context = {
-        "sections": qs,
+        "sections": sections,
         "semester": semester,
         "department": department,
         "semester_id": semester_id,
         "department_id": department_id,
+        "search": search,
+        "next_url": next_url,
+        "prev_url": prev_url,
+        "is_first_page": not (after or before),
     }
     return render(request, "timetable/section_list.html", context)
 
-def section_list(request):
+def _timetable_week(form, semester):
     """
-    Danh sách Lớp học phần.
-    Có thể lọc theo:
-      - Học kỳ: ?semester_id=...
-      - Khoa phụ trách môn: ?department_id=...
+    Tuần đang xem theo ?week=N hoặc ?date=YYYY-MM-DD (None = cả học kỳ).
+    Trả về (SemesterWeek | None, thông báo lỗi | None).
     """
-    qs = CourseSection.objects.select_related(
-        "subject",
-        "semester",
-        "instructor",
-    ).prefetch_related(
-        "classes",
-    )
-
-    semester_id = request.GET.get("semester_id")
-    department_id = request.GET.get("department_id")
-
+    week_index = form.cleaned_data.get("week")
+    date = form.cleaned_data.get("date")
+    if week_index is None and date is None:
+        return None, None
+
+    week = resolve_semester_week(semester, week_index=week_index, date=date)
+    if week is None:
+        if week_index is not None:
+            return None, f"Học kỳ không có Tuần {week_index}, đang hiển thị cả học kỳ."
+        return None, f"Ngày {date:%d/%m/%Y} không thuộc tuần học nào của học kỳ, đang hiển thị cả học kỳ."
+    return week, None
+
+
+def _week_nav(request, week, semester):
+    """Link Tuần trước / Tuần sau / Cả học kỳ (giữ các tham số lọc khác)."""
+    params = request.GET.copy()
+    params.pop("date", None)
+    params.pop("week", None)
+    nav = {"all_url": "?" + params.urlencode()}
+    if week is not None:
+        for name, index in (("prev_url", week.index - 1), ("next_url", week.index + 1)):
+            if 1 <= index <= (semester.weeks or index):
+                params["week"] = index
+                nav[name] = "?" + params.urlencode()
+    return nav
+
+
+def _timetable_view(request, form_class, entity_field, entity_type, template, entity_context):
+    """Xem TKB theo Lớp / Phòng / GV (cả học kỳ hoặc 1 tuần)."""
+    form = form_class(request.GET or None)
+
+    grid_html = None
+    entity = None
     semester = None
-    department = None
-
-    if semester_id:
-        qs = qs.filter(semester_id=semester_id)
-        semester = Semester.objects.filter(id=semester_id).first()
+    week = None
+    week_nav = None
 
-    if department_id:
-        # dùng Khoa phụ trách môn: managing_department
-        qs = qs.filter(subject__managing_department_id=department_id)
-        department = Department.objects.filter(id=department_id).first()
-
-    qs = qs.order_by(
-        "semester__academic_year__code",
-        "semester__code",
-        "code",
-    )
+    if form.is_valid():
+        semester = form.cleaned_data["semester"]
+        entity = form.cleaned_data[entity_field]
+        week, week_error = _timetable_week(form, semester)
+        if week_error:
+            messages.warning(request, week_error)
+        # Lưới đã render được cache theo (tuần, phiên bản dữ liệu của học kỳ)
+        grid_html = render_timetable_grid(semester, entity_type, entity, week=week)
+        week_nav = _week_nav(request, week, semester)
 
     context = {
-        "sections": qs,
+        "form": form,
+        "grid_html": grid_html,
+        entity_context: entity,
         "semester": semester,
-        "department": department,
-        "semester_id": semester_id,
-        "department_id": department_id,
+        "week": week,
+        "week_nav": week_nav,
     }
-    return render(request, "timetable/section_list.html", context)
+    return render(request, template, context)
+
 
 def class_timetable_view(request):
     """
-    Xem thời khóa biểu theo Lớp sinh viên, cho 1 Học kỳ.
+    Xem thời khóa biểu theo Lớp sinh viên, cho 1 Học kỳ (?week=N / ?date=... để xem 1 tuần).
     """
-    form = ClassTimetableForm(request.GET or None)
+    return _timetable_view(
+        request, ClassTimetableForm, "student_class", "class",
+        "timetable/class_timetable.html", "selected_class",
+    )
 
-    grid_rows = None
-    selected_class = None
-    semester = None
-    slots = None
+def room_timetable_view(request):
+    """
+    Xem thời khóa biểu theo PHÒNG học, cho 1 Học kỳ (?week=N / ?date=... để xem 1 tuần).
+    """
+    return _timetable_view(
+        request, RoomTimetableForm, "room", "room",
+        "timetable/room_timetable.html", "room",
+    )
 
-    if form.is_valid():
-        semester = form.cleaned_data["semester"]
-        selected_class = form.cleaned_data["student_class"]
-
-        # Lấy tất cả slot của lớp này trong học kỳ đó
-        slots = TeachingSlot.objects.filter(
-            course_section__semester=semester,
-            course_section__classes=selected_class,
-        ).select_related(
-            "course_section__subject",
-            "course_section__instructor",
-            "room",
-        ).prefetch_related("weeks", "course_section__classes").order_by(
-            "day_of_week", "start_period"
-        )
+def instructor_timetable_view(request):
+    """
+    Xem thời khóa biểu theo GIẢNG VIÊN, cho 1 Học kỳ (?week=N / ?date=... để xem 1 tuần).
+    """
+    return _timetable_view(
+        request, InstructorTimetableForm, "instructor", "instructor",
+        "timetable/instructor_timetable.html", "instructor",
+    )
 
-        # Dựng lưới
-        grid = build_timetable_grid(slots)
+def semester_conflicts_view(request):
+    """
+    Báo cáo trùng lịch Phòng / Lớp SV / GV của 1 học kỳ: ?semester_id=...
+    """
+    semesters = Semester.objects.select_related("academic_year").order_by("-academic_year__code", "code")
+    semester_id = request.GET.get("semester_id")
+    semester = None
+    conflicts = None
+    summary = None
 
-        # Chuẩn bị dữ liệu thân thiện cho template
-        grid_rows = []
-        for p in PERIODS:
-            row = {"period": p, "cells": []}
-            for day_val, day_label in DAYS:
-                cell_slots = grid.get((day_val, p), [])
-                row["cells"].append(cell_slots)
-            grid_rows.append(row)
+    if semester_id:
+        semester = get_object_or_404(Semester.objects.select_related("academic_year"), pk=semester_id)
+        conflicts = find_semester_conflicts(semester)
+        counts = summarize_conflicts(conflicts)
+        summary = [(label, counts[kind]) for kind, label in CONFLICT_KINDS.items()]
 
     context = {
-        "form": form,
-        "grid_rows": grid_rows,
-        "days": DAYS,
-        "selected_class": selected_class,
+        "semesters": semesters,
         "semester": semester,
+        "conflicts": conflicts,
+        "summary": summary,
     }
-    return render(request, "timetable/class_timetable.html", context)
+    return render(request, "timetable/semester_conflicts.html", context)
 
-def room_timetable_view(request):
+
+def section_plan_view(request, pk):
     """
-    Xem thời khóa biểu theo PHÒNG học, cho 1 Học kỳ.
+    Xem trước việc sinh Lớp HP của học kỳ (?department_code=...): LHP sẽ tạo mới,
+    LHP cần cập nhật số tiết / sĩ số / lớp, LHP không còn trong kế hoạch.
+    POST: chỉ áp dụng các thay đổi được chọn.
     """
-    form = RoomTimetableForm(request.GET or None)
+    semester = get_object_or_404(Semester.objects.select_related("academic_year"), pk=pk)
+    department_code = (request.POST.get("department_code") or request.GET.get("department_code") or "").strip()
 
-    grid_rows = None
-    room = None
-    semester = None
-    slots = None
-
-    if form.is_valid():
-        semester = form.cleaned_data["semester"]
-        room = form.cleaned_data["room"]
-
-        # Lấy tất cả slot trong phòng này ở học kỳ đó
-        slots = TeachingSlot.objects.filter(
-            course_section__semester=semester,
-            room=room,
-        ).select_related(
-            "course_section__subject",
-            "course_section__instructor",
-            "room",
-        ).prefetch_related("weeks", "course_section__classes").order_by(
-            "day_of_week", "start_period"
+    if request.method == "POST":
+        # Tính lại diff phía server, chỉ áp dụng những key được chọn
+        changes = preview_course_sections(semester, department_code or None)
+        result = apply_course_section_changes(semester, changes, request.POST.getlist("accepted"))
+        messages.success(
+            request,
+            f"Đã tạo {len(result['created'])}, cập nhật {result['updated']}, "
+            f"xoá {result['deleted']} lớp học phần.",
         )
+        if result["delete_skipped"]:
+            messages.warning(
+                request,
+                f"Không xoá {len(result['delete_skipped'])} lớp học phần đã khoá / đã xếp lịch: "
+                + ", ".join(result["delete_skipped"]),
+            )
+        url = reverse("timetable:section_plan", args=[semester.pk])
+        if department_code:
+            url = f"{url}?{urlencode({'department_code': department_code})}"
+        return redirect(url)
 
-        grid = build_timetable_grid(slots)
-
-        grid_rows = []
-        for p in PERIODS:
-            row = {"period": p, "cells": []}
-            for day_val, day_label in DAYS:
-                cell_slots = grid.get((day_val, p), [])
-                row["cells"].append(cell_slots)
-            grid_rows.append(row)
-
+    changes = preview_course_sections(semester, department_code or None)
+    counts = summarize_changes(changes)
     context = {
-        "form": form,
-        "grid_rows": grid_rows,
-        "days": DAYS,
-        "room": room,
         "semester": semester,
+        "department_code": department_code,
+        "changes": changes,
+        "summary": [(label, counts[action]) for action, label in CHANGE_ACTIONS.items()],
     }
-    return render(request, "timetable/room_timetable.html", context)
+    return render(request, "timetable/section_plan.html", context)
+
 
-def build_timetable_grid(slots):
+# =============== JSON API TKB ===============
+
+API_ENTITY_MODELS = {
+    "class": StudentClass,
+    "room": Room,
+    "instructor": Instructor,
+    "section": CourseSection,
+}
+
+
+def _request_data_stamp(request, semester_id):
     """
-    slots: queryset TeachingSlot đã filter theo lớp hoặc theo GV và theo Học kỳ.
-    Trả về:
-        grid[(day, period)] = list các slot rơi vào ô đó (thường 0 hoặc 1)
+    (data_version, data_updated_at) của học kỳ, đọc 1 lần cho mỗi request
+    (ETag và Last-Modified dùng chung) qua cache phiên bản -> 304 không tốn query nào.
     """
-    grid = {(day, p): [] for day, _ in DAYS for p in PERIODS}
+    stamps = request.__dict__.setdefault("_semester_data_stamps", {})
+    if semester_id not in stamps:
+        stamps[semester_id] = get_semester_data_stamp(semester_id)
+    return stamps[semester_id]
 
-    for s in slots:
-        for p in range(s.start_period, s.end_period + 1):
-            if (s.day_of_week, p) in grid:
-                grid[(s.day_of_week, p)].append(s)
 
-    return grid
+def _timetable_etag(request, kind, semester_id, entity_type, entity_id):
+    version, _ = _request_data_stamp(request, semester_id)
+    return f'"{kind}-{semester_id}-{entity_type}-{entity_id}-v{version}"'
 
-def instructor_timetable_view(request):
+
+def _timetable_api_etag(request, semester_id, entity_type, entity_id):
+    return _timetable_etag(request, "tkb", semester_id, entity_type, entity_id)
+
+
+def _timetable_ics_etag(request, semester_id, entity_type, entity_id):
+    return _timetable_etag(request, "ics", semester_id, entity_type, entity_id)
+
+
+def _timetable_last_modified(request, semester_id, entity_type, entity_id):
+    return _request_data_stamp(request, semester_id)[1]
+
+
+@require_GET
+@condition(etag_func=_timetable_api_etag, last_modified_func=_timetable_last_modified)
+def timetable_api(request, semester_id, entity_type, entity_id):
     """
-    Xem thời khóa biểu theo GIẢNG VIÊN, cho 1 Học kỳ.
+    API JSON (chỉ đọc) TKB của 1 Lớp SV / Phòng / GV / Lớp HP trong học kỳ.
+    GET /api/semesters/<semester_id>/<class|room|instructor|section>/<id>/
     """
-    form = InstructorTimetableForm(request.GET or None)
+    model = API_ENTITY_MODELS.get(entity_type)
+    if model is None:
+        raise Http404("Loại đối tượng không hợp lệ")
 
-    grid_rows = None
-    instructor = None
-    semester = None
-    slots = None
+    semester = get_object_or_404(Semester, pk=semester_id)
+    lookup = {"semester": semester} if entity_type == "section" else {}
+    entity = get_object_or_404(model, pk=entity_id, **lookup)
 
-    if form.is_valid():
-        semester = form.cleaned_data["semester"]
-        instructor = form.cleaned_data["instructor"]
-
-        # Lấy tất cả slot của GV này trong học kỳ
-        slots = TeachingSlot.objects.filter(
-            course_section__semester=semester,
-            course_section__instructor=instructor,
-        ).select_related(
-            "course_section__subject",
-            "room",
-        ).prefetch_related("weeks", "course_section__classes").order_by(
-            "day_of_week", "start_period"
-        )
+    return JsonResponse(
+        timetable_api_payload(semester, entity_type, entity),
+        json_dumps_params={"ensure_ascii": False, "separators": (",", ":")},
+    )
 
-        grid = build_timetable_grid(slots)
+ICS_ENTITY_LABELS = {
+    "class": "Lớp",
+    "room": "Phòng",
+    "instructor": "GV",
+}
 
-        grid_rows = []
-        for p in PERIODS:
-            row = {"period": p, "cells": []}
-            for day_val, day_label in DAYS:
-                cell_slots = grid.get((day_val, p), [])
-                row["cells"].append(cell_slots)
-            grid_rows.append(row)
 
-    context = {
-        "form": form,
-        "grid_rows": grid_rows,
-        "days": DAYS,
-        "instructor": instructor,
-        "semester": semester,
-    }
-    return render(request, "timetable/instructor_timetable.html", context)
+@require_GET
+@condition(etag_func=_timetable_ics_etag, last_modified_func=_timetable_last_modified)
+def timetable_ics(request, semester_id, entity_type, entity_id):
+    """
+    Lịch .ics của 1 Lớp SV / Phòng / GV trong học kỳ (thêm vào Google / Apple Calendar).
+    GET /ics/<semester_id>/<class|room|instructor>/<id>.ics
+    App lịch gọi lại định kỳ: dữ liệu chưa đổi thì trả 304 (phiên bản đọc từ cache).
+    """
+    if entity_type not in ICS_ENTITY_LABELS:
+        raise Http404("Loại đối tượng không hợp lệ")
+
+    semester = get_object_or_404(Semester.objects.select_related("academic_year"), pk=semester_id)
+    entity = get_object_or_404(API_ENTITY_MODELS[entity_type], pk=entity_id)
+    calendar_name = f"TKB {ICS_ENTITY_LABELS[entity_type]} {entity.code} - {semester}"
+
+    response = StreamingHttpResponse(
+        iter_ics_feed(semester, entity_type, entity, calendar_name),
+        content_type="text/calendar; charset=utf-8",
+    )
+    response["Content-Disposition"] = (
+        f'inline; filename="tkb_{entity_type}_{entity.code}_{semester.code}.ics"'
+    )
+    return response
+
+
+def _timetable_pdf_etag(request, semester_id, entity_type, entity_id):
+    return _timetable_etag(request, "pdf", semester_id, entity_type, entity_id)
+
+
+@require_GET
+@condition(etag_func=_timetable_pdf_etag, last_modified_func=_timetable_last_modified)
+def timetable_pdf(request, semester_id, entity_type, entity_id):
+    """
+    Bản in PDF (A4 ngang) TKB cả học kỳ của 1 Lớp SV / Phòng / GV / Lớp HP.
+    GET /pdf/<semester_id>/<class|room|instructor|section>/<id>.pdf
+    """
+    model = API_ENTITY_MODELS.get(entity_type)
+    if model is None:
+        raise Http404("Loại đối tượng không hợp lệ")
+
+    semester = get_object_or_404(Semester.objects.select_related("academic_year"), pk=semester_id)
+    lookup = {"semester": semester} if entity_type == "section" else {}
+    entity = get_object_or_404(model, pk=entity_id, **lookup)
+
+    try:
+        data = build_timetable_pdf(semester, entity_type, entity)
+    except PdfUnavailable as e:
+        return HttpResponse(str(e), status=501, content_type="text/plain; charset=utf-8")
+
+    response = HttpResponse(data, content_type="application/pdf")
+    response["Content-Disposition"] = (
+        f'inline; filename="{timetable_pdf_filename(semester, entity_type, entity.code)}"'
+    )
+    return response
 
 def instructor_workload_view(request):
     form = InstructorWorkloadForm(request.GET or None)
@@ -731,103 +887,6 @@ def instructor_workload_detail(request, instructor_id, year_id):
     return render(request, "timetable/instructor_workload_detail.html", context)
 
 
-IMPORT_CONFIG = {
-    "departments": {
-        "label": "Khoa (Department)",
-        "function": import_services.import_departments_from_excel,
-        "columns": ["code", "name"],
-        "description": "Danh sách Khoa quản lý.",
-    },
-    "training_levels": {
-        "label": "Bậc đào tạo (TrainingLevel)",
-        "function": import_services.import_training_levels_from_excel,
-        "columns": ["code", "name", "form"],
-        "description": "VD: Cao đẳng, Trung cấp...",
-    },
-    "academic_years": {
-        "label": "Năm học (AcademicYear)",
-        "function": import_services.import_academic_years_from_excel,
-        "columns": ["code"],
-        "description": "VD: 2025, 2025-2026...",
-    },
-    "semesters": {
-        "label": "Học kỳ (Semester)",
-        "function": import_services.import_semesters_from_excel,
-        "columns": ["academic_year_code", "code", "name", "start_date", "weeks"],
-        "description": "HK1, HK2... với ngày bắt đầu & số tuần.",
-    },
-    "room_types": {
-        "label": "Loại phòng (RoomType)",
-        "function": import_services.import_roomtypes_from_excel,
-        "columns": ["code", "name"],
-        "description": "LT, TH, ONLINE, SÂN...",
-    },
-    "specialization_groups": {
-        "label": "Nhóm chuyên môn (SpecializationGroup)",
-        "function": import_services.import_specialization_groups_from_excel,
-        "columns": ["code", "name"],
-        "description": "Nhóm ngành, nhóm môn thực hành...",
-    },
-    "room_capabilities": {
-        "label": "Khả năng chuyên môn chi tiết (RoomCapability)",
-        "function": import_services.import_room_capabilities_from_excel,
-        "columns": ["room_code", "group_code", "priority"],
-        "description": "Cập nhật mức ưu tiên (1-3) cho cặp Phòng - Nhóm CM.",
-    },
-    "rooms": {
-        "label": "Phòng học (Room)",
-        "function": import_services.import_rooms_from_excel,
-        "columns": ["code", "name", "room_type_code", "specialization_group_codes"],
-        "description": "Phòng Lý thuyết / Thực hành / Online...",
-    },
-    "majors": {
-        "label": "Ngành (Major)",
-        "function": import_services.import_majors_from_excel,
-        "columns": ["code", "name", "level_code", "department_code", "is_general", "total_credits", "total_semesters"],
-        "description": "Ngành Cao đẳng/Trung cấp CNTT...",
-    },
-    "instructors": {
-        "label": "Giảng viên (Instructor)",
-        "function": import_services.import_instructors_from_excel,
-        "columns": ["code", "name", "department_code", "is_leader", "teaching_quota", "admin_quota", "conversion_ratio"],
-        "description": "Danh sách Giảng viên khoa.",
-    },
-    "student_classes": {
-        "label": "Lớp sinh viên (StudentClass)",
-        "function": import_services.import_student_classes_from_excel,
-        "columns": ["code", "name", "size", "major_code", "academic_year_code", "homeroom_teacher_code"],
-        "description": "Các lớp K25..., sĩ số, GVCN...",
-    },
-    "subjects": {
-        "label": "Môn học (Subject)",
-        "function": import_services.import_subjects_from_excel,
-        "columns": ["code", "name", "major_code", "department_code", "required_room_type_code", "specialization_group_code", "total_periods", "form", "semester_index"],
-        "description": "Danh mục môn dùng để xếp TKB.",
-    },
-    "curriculums": {
-        "label": "Chương trình đào tạo (Curriculum)",
-        "function": import_services.import_curriculums_from_excel,
-        "columns": ["major_code", "intake_year_code", "name"],
-        "description": "Mỗi Ngành + Khoá tuyển tạo 1 Curriculum.",
-    },
-    "curriculum_subjects": {
-        "label": "Môn trong CTĐT (CurriculumSubject)",
-        "function": import_services.import_curriculum_subjects_from_excel,
-        "columns": [
-            "curriculum_major_code",
-            "curriculum_intake_year_code",
-            "subject_code",
-            "semester_index",
-            "is_optional",
-            "total_periods",
-        ],
-        "description": "Gán Môn vào từng CTĐT, học kỳ, tự chọn/BB, số tiết.",
-    },
-
-
-}
-
-
 def data_import_menu(request):
     """Trang liệt kê các loại dữ liệu có thể import."""
     return render(request, "timetable/data_import_menu.html", {
@@ -835,55 +894,120 @@ def data_import_menu(request):
     })
 
 
+# Cấu hình cho loại import "tất cả" (1 file nhiều sheet, xem import_services.ALL_SHEETS)
+IMPORT_ALL_CONFIG = {
+    "label": "Tất cả danh mục (file nhiều sheet)",
+    "columns": [sheet_name for sheet_name, _ in ALL_SHEETS],
+    "description": "Mỗi sheet là 1 danh mục, import lần lượt theo thứ tự phụ thuộc.",
+    "is_multi_sheet": True,
+}
+
+
+def _get_import_config(data_type):
+    if data_type == IMPORT_ALL:
+        return IMPORT_ALL_CONFIG
+    return IMPORT_CONFIG.get(data_type)
+
+
 def data_import_view(request, data_type):
-    config = IMPORT_CONFIG.get(data_type)
+    """
+    Upload file Excel -> lưu vào thư mục tạm và tạo ImportJob chạy nền,
+    rồi chuyển sang trang theo dõi tiến độ (không import trong request nữa).
+    """
+    config = _get_import_config(data_type)
     if not config:
         messages.error(request, "Loại dữ liệu không hợp lệ.")
         return redirect("timetable:data_import_menu")
 
     form = ExcelUploadForm(request.POST or None, request.FILES or None)
-    result = None
 
     if request.method == "POST" and form.is_valid():
-        file = form.cleaned_data["file"]
-        import_func = config["function"]
-        created, updated, errors = import_func(file)
-        result = {
-            "created": created,
-            "updated": updated,
-            "errors": errors,
-        }
-        if not errors:
-            messages.success(request, f"Import thành công! Tạo mới {created}, cập nhật {updated}.")
+        try:
+            job = create_import_job(data_type, form.cleaned_data["file"])
+        except ValueError as e:
+            messages.error(request, str(e))
         else:
-            messages.warning(request, f"Tạo mới {created}, cập nhật {updated}, có {len(errors)} lỗi.")
+            start_import_job(job)
+            messages.info(request, f"Đã nhận file '{job.original_name}', hệ thống đang import nền.")
+            return redirect("timetable:import_job_detail", pk=job.pk)
+
+    recent_jobs = ImportJob.objects.filter(data_type=data_type)[:10]
+
+    # Lớp HP / Buổi học export theo Học kỳ
+    semesters = None
+    if data_type in EXPORT_SPECS and EXPORT_SPECS[data_type][3] and data_type != "semesters":
+        semesters = Semester.objects.select_related("academic_year").order_by("-start_date")
 
     return render(request, "timetable/data_import_view.html", {
         "config": config,
         "data_type": data_type,
         "form": form,
-        "result": result,
+        "recent_jobs": recent_jobs,
+        "semesters": semesters,
     })
 
-def timetable_by_class(request):
+
+def data_export_view(request, data_type):
     """
-    TKB theo Lớp sinh viên.
-    Tạm thời hiển thị trang trống / đang xây dựng.
-    Sau này mình sẽ fill logic ở đây.
+    Export 1 loại dữ liệu (hoặc "all": file nhiều sheet) ra Excel đúng layout import,
+    sửa xong có thể import lại. ?semester_id=... để chỉ export 1 Học kỳ.
     """
-    return render(request, "timetable/timetable_by_class.html")
+    if data_type == IMPORT_ALL:
+        data_types = [dt for _, dt in ALL_SHEETS]
+        data_types += [dt for dt in IMPORT_CONFIG if dt not in data_types]
+    elif data_type in EXPORT_SPECS:
+        data_types = [data_type]
+    else:
+        messages.error(request, "Loại dữ liệu không hợp lệ.")
+        return redirect("timetable:data_import_menu")
 
+    semester = None
+    if request.GET.get("semester_id"):
+        semester = get_object_or_404(
+            Semester.objects.select_related("academic_year"), pk=request.GET["semester_id"]
+        )
 
-def timetable_by_room(request):
-    """
-    TKB theo Phòng học.
-    """
-    return render(request, "timetable/timetable_by_room.html")
+    return FileResponse(
+        build_export_workbook(data_types, semester=semester),
+        as_attachment=True,
+        filename=export_filename(data_type, semester),
+        content_type=XLSX_CONTENT_TYPE,
+    )
+
+
+def import_job_list(request):
+    """Danh sách các lần import gần đây."""
+    jobs = ImportJob.objects.all()[:50]
+    return render(request, "timetable/import_job_list.html", {"jobs": jobs})
 
 
-def timetable_by_instructor(request):
+def import_job_detail(request, pk):
     """
-    TKB theo Giảng viên.
+    Theo dõi tiến độ 1 ImportJob: tiến độ từng sheet / từng lô,
+    danh sách lỗi được lưu trong DB và phân trang.
     """
-    return render(request, "timetable/timetable_by_instructor.html")
+    job = get_object_or_404(ImportJob, pk=pk)
+    config = _get_import_config(job.data_type)
+
+    paginator = Paginator(job.errors.select_related("sheet"), 50)
+    errors_page = paginator.get_page(request.GET.get("page"))
+
+    return render(request, "timetable/import_job_detail.html", {
+        "job": job,
+        "config": config,
+        "sheets": job.sheets.all(),
+        "errors_page": errors_page,
+        "is_running": is_job_running(job.pk),
+        "auto_refresh": job.status in ("PENDING", "RUNNING"),
+    })
+
 
+def import_job_resume(request, pk):
+    """Chạy tiếp job bị ngắt / bị lỗi từ lô cuối cùng đã commit."""
+    job = get_object_or_404(ImportJob, pk=pk)
+    if request.method == "POST":
+        if resume_import_job(job):
+            messages.info(request, "Đã chạy tiếp import từ lô cuối cùng đã lưu.")
+        else:
+            messages.warning(request, "Job đã hoàn tất hoặc đang chạy, không cần chạy lại.")
+    return redirect("timetable:import_job_detail", pk=job.pk)